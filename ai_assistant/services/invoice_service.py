@@ -1,6 +1,8 @@
 from django.db.models import Q
 from django.utils import timezone
-from billing.models import SalesInvoice, Customer
+from django.utils.dateparse import parse_date
+from billing.models import Customer, DocumentSequence
+from billing.sequences import allocate_number, fiscal_year, tenant_prefix
 from inventory.models import Product
 from billing.serializers import SalesInvoiceSerializer
 from decimal import Decimal
@@ -23,29 +25,12 @@ def search_products(user, query):
     )[:5]
 
 
-def get_next_invoice_number_internal(user, prefix='INV-'):
+def get_next_invoice_number_internal(user, prefix='INV-', invoice_date=None):
     tenant = getattr(user, 'active_tenant', user)
-    tenant_id = str(tenant.id)[:4].upper()
-    full_prefix = f'{prefix}{tenant_id}-'
-
-    invoices = SalesInvoice.objects.filter(
-        created_by=tenant,
-        invoice_number__startswith=full_prefix,
+    return allocate_number(
+        tenant, DocumentSequence.INVOICE, tenant_prefix(tenant, prefix), fiscal_year=fiscal_year(invoice_date),
     )
 
-    max_num = 0
-    for inv in invoices:
-        suffix = inv.invoice_number.replace(full_prefix, '')
-        try:
-            num = int(suffix)
-            if num > max_num:
-                max_num = num
-        except ValueError:
-            continue
-
-    next_num = max_num + 1
-    return f"{full_prefix}{next_num:03d}"
-
 def create_invoice_from_ai(user, entities, request=None):
     """
     Directly creates an invoice from AI extracted entities.
@@ -55,16 +40,19 @@ def create_invoice_from_ai(user, entities, request=None):
     
     data = entities.copy()
     
-    # Ensure invoice number
-    if not data.get('invoice_number'):
-        profile = getattr(user, 'profile', None)
-        prefix = getattr(profile, 'invoice_prefix', 'INV-') or 'INV-'
-        data['invoice_number'] = get_next_invoice_number_internal(user, prefix)
-
-    
     # Ensure date
     if not data.get('invoice_date'):
         data['invoice_date'] = timezone.now().date().isoformat()
+
+    # Ensure invoice number, numbered in the invoice date's fiscal year
+    if not data.get('invoice_number'):
+        profile = getattr(user, 'profile', None)
+        prefix = getattr(profile, 'invoice_prefix', 'INV-') or 'INV-'
+        try:
+            invoice_date = parse_date(str(data['invoice_date']))
+        except ValueError:
+            invoice_date = None
+        data['invoice_number'] = get_next_invoice_number_internal(user, prefix, invoice_date)
     
     # Set status to final for direct creation
     data['status'] = 'final'
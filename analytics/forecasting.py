@@ -0,0 +1,192 @@
+"""
+Demand forecasting over the ``DailyProductFact`` rollup.
+
+One query pulls the tenant x product x day sales matrix; NumPy then smooths
+every product at once (additive Holt-Winters with a weekly season) and derives
+velocities, stockout dates and reorder points. ``refresh_product_forecasts``
+stores the result in ``ProductForecast`` for the ML predictions endpoint.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+
+from inventory.models import Product
+
+from .models import DailyProductFact, DailyTenantFact, ProductForecast
+
+HISTORY_DAYS = 56
+VELOCITY_DAYS = 30
+HORIZON_DAYS = 14
+SEASON_LENGTH = 7
+
+LEAD_TIME_DAYS = 3
+SAFETY_BUFFER_DAYS = 3
+SERVICE_LEVEL_Z = 1.65  # ~95% cycle service level
+COVER_DAYS = 14
+
+ALPHA = 0.3  # level
+BETA = 0.05  # trend
+GAMMA = 0.2  # weekly season
+PHI = 0.9  # trend damping, so a recent step change is not extrapolated
+
+
+def daily_matrix(rows, keys, start, days):
+    """
+    Scatter ``(key, day, value)`` rows into a ``len(keys) x days`` float matrix,
+    one column per calendar day from ``start``; missing days are zero.
+    """
+    matrix = np.zeros((len(keys), days))
+    if not rows:
+        return matrix
+    index = {key: position for position, key in enumerate(keys)}
+    key_idx, day_idx, values = zip(*(
+        (index[key], (day - start).days, float(value or 0)) for key, day, value in rows
+    ))
+    np.add.at(matrix, (np.array(key_idx), np.array(day_idx)), np.array(values))
+    return matrix
+
+
+def holt_winters(series, horizon=HORIZON_DAYS, season_length=SEASON_LENGTH,
+                 alpha=ALPHA, beta=BETA, gamma=GAMMA, phi=PHI):
+    """
+    Additive damped-trend Holt-Winters for every row of ``series`` (products x
+    days) at once.
+
+    Returns ``(forecast, residual_std)``: a products x ``horizon`` array of
+    non-negative daily forecasts and the one-step-ahead error spread per row.
+    Histories shorter than two seasons fall back to a flat mean.
+    """
+    series = np.atleast_2d(np.asarray(series, dtype=float))
+    rows, length = series.shape
+    if length < 2 * season_length:
+        mean = series.mean(axis=1, keepdims=True) if length else np.zeros((rows, 1))
+        std = series.std(axis=1) if length else np.zeros(rows)
+        return np.repeat(mean, horizon, axis=1), std
+
+    first = series[:, :season_length].mean(axis=1)
+    second = series[:, season_length:2 * season_length].mean(axis=1)
+    level = first
+    trend = (second - first) / season_length
+    season = series[:, :season_length] - first[:, None]
+
+    errors = np.zeros((rows, length - season_length))
+    for t in range(season_length, length):
+        slot = t % season_length
+        observed = series[:, t]
+        errors[:, t - season_length] = observed - (level + phi * trend + season[:, slot])
+        previous_level = level
+        level = alpha * (observed - season[:, slot]) + (1 - alpha) * (level + phi * trend)
+        trend = beta * (level - previous_level) + (1 - beta) * phi * trend
+        season[:, slot] = gamma * (observed - level) + (1 - gamma) * season[:, slot]
+
+    steps = np.arange(1, horizon + 1)
+    slots = (length + steps - 1) % season_length
+    damping = np.cumsum(phi ** steps)
+    forecast = level[:, None] + trend[:, None] * damping + season[:, slots]
+    return np.clip(forecast, 0, None), errors.std(axis=1)
+
+
+def restock_plan(stock, velocity, forecast, demand_std,
+                 lead_time_days=LEAD_TIME_DAYS, safety_buffer_days=SAFETY_BUFFER_DAYS):
+    """
+    Vectorised stockout and reorder arithmetic for parallel arrays of products.
+
+    Returns a dict of arrays: ``daily_rate`` (forecast demand per day, falling
+    back to the trailing velocity), ``days_until_stockout`` (``inf`` when not
+    selling), ``reorder_point`` and ``suggested_qty``.
+    """
+    stock = np.asarray(stock, dtype=float)
+    daily_rate = forecast.mean(axis=1) if forecast.size else np.zeros(len(stock))
+    daily_rate = np.where(daily_rate > 0, daily_rate, velocity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_until_stockout = np.where(daily_rate > 0, stock / daily_rate, np.inf)
+
+    safety_stock = SERVICE_LEVEL_Z * demand_std * np.sqrt(lead_time_days) + daily_rate * safety_buffer_days
+    reorder_point = np.ceil(daily_rate * lead_time_days + safety_stock)
+    suggested_qty = np.ceil(daily_rate * COVER_DAYS + safety_stock)
+    return {
+        'daily_rate': daily_rate,
+        'days_until_stockout': days_until_stockout,
+        'reorder_point': reorder_point,
+        'suggested_qty': suggested_qty,
+    }
+
+
+def _decimal(value, places='0.001'):
+    return Decimal(str(float(value))).quantize(Decimal(places))
+
+
+@transaction.atomic
+def refresh_product_forecasts(tenant, today=None):
+    """Recompute ``ProductForecast`` rows for every product ``tenant`` sold recently."""
+    today = today or date.today()
+    start = today - timedelta(days=HISTORY_DAYS)
+
+    rows = list(
+        DailyProductFact.objects.filter(created_by=tenant, date__gte=start, date__lt=today)
+        .values_list('product_id', 'date', 'sales_quantity')
+    )
+    product_ids = sorted({product_id for product_id, _day, _qty in rows}, key=str)
+    ProductForecast.objects.filter(created_by=tenant).delete()
+    if not product_ids:
+        return 0
+
+    matrix = daily_matrix(rows, product_ids, start, HISTORY_DAYS)
+    forecast, demand_std = holt_winters(matrix)
+    velocity = matrix[:, -VELOCITY_DAYS:].sum(axis=1) / VELOCITY_DAYS
+
+    stock_by_product = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'))
+    stock = np.array([max(stock_by_product.get(product_id, 0), 0) for product_id in product_ids])
+    plan = restock_plan(stock, velocity, forecast, demand_std)
+
+    forecasts = []
+    for i, product_id in enumerate(product_ids):
+        if product_id not in stock_by_product:
+            continue
+        days_left = plan['days_until_stockout'][i]
+        selling = np.isfinite(days_left)
+        stockout_date = today + timedelta(days=int(days_left)) if selling else None
+        forecasts.append(ProductForecast(
+            created_by=tenant,
+            product_id=product_id,
+            generated_on=today,
+            stock=int(stock[i]),
+            avg_daily_sales=_decimal(velocity[i]),
+            forecast_daily=_decimal(plan['daily_rate'][i]),
+            demand_std=_decimal(demand_std[i]),
+            forecast=[round(float(value), 2) for value in forecast[i]],
+            days_until_stockout=_decimal(days_left, '0.1') if selling else None,
+            stockout_date=stockout_date,
+            reorder_date=(
+                stockout_date - timedelta(days=LEAD_TIME_DAYS + SAFETY_BUFFER_DAYS) if selling else None
+            ),
+            reorder_point=int(plan['reorder_point'][i]),
+            suggested_qty=int(plan['suggested_qty'][i]),
+        ))
+
+    ProductForecast.objects.bulk_create(forecasts, batch_size=1000)
+    return len(forecasts)
+
+
+def tenant_sales_forecast(tenant, today=None, horizon=7):
+    """
+    ``(history, forecast, slope, active_days)`` for the tenant's daily net
+    sales over the last 30 days, read from ``DailyTenantFact``. ``history`` has
+    one value per calendar day, ``slope`` is the least-squares trend per day
+    and ``active_days`` counts the days with any activity.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=VELOCITY_DAYS)
+    rows = list(
+        DailyTenantFact.objects.filter(created_by=tenant, date__gte=start, date__lte=today)
+        .values_list('date', 'sales_amount', 'sales_returns')
+    )
+    history = daily_matrix(
+        [('sales', day, (amount or 0) - (returns or 0)) for day, amount, returns in rows],
+        ['sales'], start, VELOCITY_DAYS + 1,
+    )[0]
+    forecast, _std = holt_winters(history, horizon=horizon)
+    slope = np.polyfit(np.arange(len(history)), history, 1)[0] if history.any() else 0.0
+    return history, forecast[0], float(slope), len(rows)
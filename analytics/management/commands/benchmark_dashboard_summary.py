@@ -0,0 +1,38 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from analytics.views import build_dashboard_summary
+
+
+class Command(BaseCommand):
+    help = "Time the dashboard summary build (cache bypassed) and report its query count."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', required=True, help="User id of the tenant to benchmark.")
+        parser.add_argument('--runs', type=int, default=5, help="Number of timed builds (default 5).")
+
+    def handle(self, *args, **options):
+        try:
+            tenant = get_user_model().objects.get(pk=options['tenant'])
+        except (get_user_model().DoesNotExist, ValueError) as exc:
+            raise CommandError(f"Unknown tenant {options['tenant']!r}.") from exc
+
+        timings = []
+        query_counts = []
+        for _run in range(max(options['runs'], 1)):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                build_dashboard_summary(tenant)
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(queries.captured_queries))
+
+        self.stdout.write(
+            f"dashboard_summary: {query_counts[-1]} queries, "
+            f"median {statistics.median(timings):.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms "
+            f"over {len(timings)} runs"
+        )
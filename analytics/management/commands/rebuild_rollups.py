@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily and monthly fact rollups from the posted documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', help="User id of a tenant to rebuild (repeatable). Defaults to all tenants.")
+
+    def handle(self, *args, **options):
+        tenant_ids = options['tenant']
+        if tenant_ids:
+            users = get_user_model().objects.filter(pk__in=tenant_ids, parent__isnull=True)
+            try:
+                found = {str(pk) for pk in users.values_list('pk', flat=True)}
+            except (ValidationError, ValueError) as exc:
+                raise CommandError(f"Invalid tenant id: {exc}") from exc
+            missing = sorted(set(tenant_ids) - found)
+            if missing:
+                raise CommandError(f"Unknown tenant(s): {', '.join(missing)}.")
+
+        rebuilt = rebuild_rollups(tenant_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {rebuilt} tenant(s)."))
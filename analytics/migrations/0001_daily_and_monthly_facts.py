@@ -0,0 +1,88 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('inventory', '0018_productmeta_storage_condition_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sales_quantity', models.BigIntegerField(default=0)),
+                ('sales_taxable', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('returned_quantity', models.BigIntegerField(default=0)),
+                ('returns_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchase_quantity', models.BigIntegerField(default=0)),
+                ('purchase_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_facts', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'date'], name='analytics_dpf_product_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'date', 'product'), name='analytics_daily_product_fact_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyTenantFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('sales_quantity', models.BigIntegerField(default=0)),
+                ('sales_taxable', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_cgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_sgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_igst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_amount', models.DecimalField(decimal_places=2, default=0, help_text='Sum of invoice totals', max_digits=14)),
+                ('sales_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_returns', models.DecimalField(decimal_places=2, default=0, help_text='Sum of credit note totals', max_digits=14)),
+                ('bill_count', models.PositiveIntegerField(default=0)),
+                ('purchase_quantity', models.BigIntegerField(default=0)),
+                ('purchase_taxable', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchase_cgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchase_sgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchase_igst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchase_amount', models.DecimalField(decimal_places=2, default=0, help_text='Sum of purchase bill totals', max_digits=14)),
+                ('purchase_returns', models.DecimalField(decimal_places=2, default=0, help_text='Sum of debit note totals', max_digits=14)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'date'), name='analytics_daily_tenant_fact_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyTaxFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('direction', models.CharField(choices=[('sales', 'Sales'), ('sales_returns', 'Sales Returns'), ('purchases', 'Purchases'), ('purchase_returns', 'Purchase Returns')], max_length=20)),
+                ('hsn_sac_code', models.CharField(blank=True, default='', max_length=20)),
+                ('tax_rate', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('taxable_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('igst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'month', 'direction', 'hsn_sac_code', 'tax_rate'), name='analytics_monthly_tax_fact_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_daily_and_monthly_facts'),
+        ('inventory', '0018_productmeta_storage_condition_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generated_on', models.DateField()),
+                ('stock', models.IntegerField(default=0, help_text='Stock when the forecast was generated')),
+                ('avg_daily_sales', models.DecimalField(decimal_places=3, default=0, help_text='Trailing 30-day average', max_digits=12)),
+                ('forecast_daily', models.DecimalField(decimal_places=3, default=0, help_text='Forecast demand per day', max_digits=12)),
+                ('demand_std', models.DecimalField(decimal_places=3, default=0, max_digits=12)),
+                ('forecast', models.JSONField(default=list, help_text='Forecast quantity for each of the next days')),
+                ('days_until_stockout', models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True)),
+                ('stockout_date', models.DateField(blank=True, null=True)),
+                ('reorder_date', models.DateField(blank=True, null=True)),
+                ('reorder_point', models.PositiveIntegerField(default=0)),
+                ('suggested_qty', models.PositiveIntegerField(default=0)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_by', 'reorder_date'], name='analytics_pf_reorder_idx')],
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'product'), name='analytics_product_forecast_uniq')],
+            },
+        ),
+    ]
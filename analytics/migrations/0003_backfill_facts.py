@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def backfill_facts(apps, schema_editor):
+    # Runs the live rebuild, so this migration depends on the latest schema
+    # of every app the rollups read.
+    from analytics.rollups import rebuild_rollups
+
+    rebuild_rollups()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_productforecast'),
+        ('billing', '0029_salesinvoiceitem_cost_price'),
+        ('inventory', '0021_costing_incremental'),
+        ('users', '0014_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_facts, migrations.RunPython.noop),
+    ]
@@ -1,33 +1,18 @@
 """
 ML Predictions Module
-Sales Forecasting and Restock Predictions using simple ML
-No external dependencies - pure Python implementation
+Sales Forecasting and Restock Predictions
+
+Forecasts come from ``analytics.forecasting``: the sales forecast smooths the
+daily rollup on request, restock predictions read the nightly
+``ProductForecast`` table.
 """
 from datetime import date, timedelta
-from decimal import Decimal
-from django.db.models import Sum, Avg, F
-from django.db.models.functions import TruncDate
-
-from billing.models import SalesInvoice, SalesInvoiceItem
-from inventory.models import Product
-
 
-# ═══════════════════════════════════════════════════════════════
-# PURE PYTHON MATH HELPERS (No numpy needed)
-# ═══════════════════════════════════════════════════════════════
+import numpy as np
+from django.db.models import Count, Q
 
-def mean(values):
-    """Calculate mean of a list"""
-    if not values:
-        return 0
-    return sum(values) / len(values)
-
-def variance(values):
-    """Calculate variance of a list"""
-    if len(values) < 2:
-        return 0
-    m = mean(values)
-    return sum((x - m) ** 2 for x in values) / len(values)
+from .forecasting import refresh_product_forecasts, tenant_sales_forecast
+from .models import ProductForecast
 
 
 class MLPredictions:
@@ -48,21 +33,11 @@ class MLPredictions:
     
     def get_sales_forecast(self, days_ahead=7):
         """
-        Predict sales for the next N days using Linear Regression
+        Predict sales for the next N days (Holt-Winters with weekly seasonality)
         """
-        # Get historical daily sales (last 30 days)
-        thirty_days_ago = self.today - timedelta(days=30)
-        
-        daily_sales = SalesInvoice.objects.filter(
-            created_by=self.tenant,
-            invoice_date__gte=thirty_days_ago
-        ).annotate(
-            day=TruncDate('invoice_date')
-        ).values('day').annotate(
-            total=Sum('total_amount')
-        ).order_by('day')
+        history, predicted, slope, active_days = tenant_sales_forecast(self.tenant, self.today, horizon=days_ahead)
         
-        if len(daily_sales) < 7:
+        if active_days < 7:
             # Not enough data for meaningful prediction
             return {
                 'forecast': [],
@@ -71,38 +46,13 @@ class MLPredictions:
                 'message': 'Need at least 7 days of sales data for accurate predictions'
             }
         
-        # Prepare data for regression
-        sales_values = [float(d['total'] or 0) for d in daily_sales]
-        
-        # Simple Linear Regression (pure Python)
-        n = len(sales_values)
-        x_values = list(range(n))
-        
-        x_mean = mean(x_values)
-        y_mean = mean(sales_values)
-        
-        # Calculate slope
-        numerator = sum((x_values[i] - x_mean) * (sales_values[i] - y_mean) for i in range(n))
-        denominator = sum((x_values[i] - x_mean) ** 2 for i in range(n))
-        
-        if denominator == 0:
-            slope = 0
-        else:
-            slope = numerator / denominator
-        
-        intercept = y_mean - slope * x_mean
-        
-        # Predict future days
         forecast = []
-        for i in range(days_ahead):
-            future_x = n + i
-            predicted_value = max(0, slope * future_x + intercept)  # Can't be negative
+        for i, predicted_value in enumerate(predicted):
             forecast_date = self.today + timedelta(days=i + 1)
-            
             forecast.append({
                 'date': forecast_date.isoformat(),
                 'day_name': forecast_date.strftime('%A'),
-                'predicted_sales': round(predicted_value, 2)
+                'predicted_sales': round(float(predicted_value), 2)
             })
         
         predicted_total = sum(f['predicted_sales'] for f in forecast)
@@ -115,7 +65,7 @@ class MLPredictions:
             trend = 'declining'
         
         # Confidence based on data variance
-        data_variance = variance(sales_values)
+        data_variance = float(np.var(history))
         confidence = 'high' if data_variance < 100000 else 'medium' if data_variance < 500000 else 'low'
         
         return {
@@ -124,7 +74,7 @@ class MLPredictions:
             'daily_average': round(predicted_total / days_ahead, 2),
             'trend': trend,
             'confidence': confidence,
-            'historical_avg': round(y_mean, 2),
+            'historical_avg': round(float(history.mean()), 2),
             'message': self._generate_forecast_message(predicted_total, trend, days_ahead)
         }
     
@@ -141,50 +91,31 @@ class MLPredictions:
     # RESTOCK PREDICTIONS
     # ═══════════════════════════════════════════════════════════════
     
-    def get_restock_predictions(self, safety_buffer_days=3):
+    def get_restock_predictions(self, refresh=False):
         """
-        Predict when products will run out and when to reorder
-        Uses sales velocity + safety stock calculation
+        Predict when products will run out and when to reorder, read from the
+        nightly ``ProductForecast`` rows (``refresh`` recomputes them first)
         """
-        products = Product.objects.filter(
+        if refresh:
+            refresh_product_forecasts(self.tenant, self.today)
+        
+        forecasts = ProductForecast.objects.filter(
             created_by=self.tenant,
-            stock__gt=0  # Only products with stock
+            product__stock__gt=0,  # Only products with stock
+            reorder_date__isnull=False,  # Skip products with no sales
+        )
+        counts = forecasts.aggregate(
+            total=Count('pk'),
+            critical=Count('pk', filter=Q(reorder_date__lte=self.today)),
+            high=Count('pk', filter=Q(reorder_date__gt=self.today, reorder_date__lte=self.today + timedelta(days=3))),
         )
         
         predictions = []
-        thirty_days_ago = self.today - timedelta(days=30)
-        
-        for product in products:
-            # Calculate average daily sales velocity
-            sales_data = SalesInvoiceItem.objects.filter(
-                sales_invoice__created_by=self.tenant,
-                product=product,
-                sales_invoice__invoice_date__gte=thirty_days_ago
-            ).aggregate(
-                total_qty=Sum('quantity'),
-                total_revenue=Sum(F('quantity') * F('price'))
-            )
-            
-            total_sold = float(sales_data['total_qty'] or 0)
-            avg_daily_sales = total_sold / 30
-            
-            if avg_daily_sales <= 0:
-                continue  # Skip products with no sales
-            
-            # Calculate days until stockout
-            current_stock = float(product.stock)
-            days_until_stockout = current_stock / avg_daily_sales
-            stockout_date = self.today + timedelta(days=int(days_until_stockout))
-            
-            # Calculate reorder date (stockout - lead time - safety buffer)
-            lead_time_days = 3  # Assume 3 days for supplier delivery
-            reorder_date = stockout_date - timedelta(days=lead_time_days + safety_buffer_days)
-            
-            # Calculate suggested reorder quantity (2 weeks of sales + safety stock)
-            suggested_qty = int(avg_daily_sales * 14 + (avg_daily_sales * safety_buffer_days))
+        for forecast in forecasts.select_related('product').order_by('reorder_date', 'product__name')[:10]:
+            product = forecast.product
+            days_to_reorder = (forecast.reorder_date - self.today).days
             
             # Urgency level
-            days_to_reorder = (reorder_date - self.today).days
             if days_to_reorder <= 0:
                 urgency = 'critical'
                 urgency_color = 'red'
@@ -202,26 +133,25 @@ class MLPredictions:
                 'product_id': str(product.id),
                 'product_name': product.name,
                 'current_stock': product.stock,
-                'avg_daily_sales': round(avg_daily_sales, 1),
-                'days_until_stockout': round(days_until_stockout, 1),
-                'stockout_date': stockout_date.isoformat(),
-                'reorder_date': reorder_date.isoformat(),
+                'avg_daily_sales': round(float(forecast.avg_daily_sales), 1),
+                'forecast_daily_sales': round(float(forecast.forecast_daily), 1),
+                'days_until_stockout': float(forecast.days_until_stockout),
+                'stockout_date': forecast.stockout_date.isoformat(),
+                'reorder_date': forecast.reorder_date.isoformat(),
+                'reorder_point': forecast.reorder_point,
                 'days_to_reorder': days_to_reorder,
-                'suggested_qty': suggested_qty,
+                'suggested_qty': forecast.suggested_qty,
                 'urgency': urgency,
                 'urgency_color': urgency_color,
-                'message': self._generate_restock_message(product.name, days_to_reorder, reorder_date)
+                'generated_on': forecast.generated_on.isoformat(),
+                'message': self._generate_restock_message(product.name, days_to_reorder, forecast.reorder_date)
             })
         
-        # Sort by urgency (critical first)
-        urgency_order = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
-        predictions.sort(key=lambda x: (urgency_order.get(x['urgency'], 4), x['days_to_reorder']))
-        
         return {
-            'predictions': predictions[:10],  # Top 10 most urgent
-            'critical_count': sum(1 for p in predictions if p['urgency'] == 'critical'),
-            'high_count': sum(1 for p in predictions if p['urgency'] == 'high'),
-            'total_products_analyzed': len(predictions)
+            'predictions': predictions,  # Top 10 most urgent
+            'critical_count': counts['critical'],
+            'high_count': counts['high'],
+            'total_products_analyzed': counts['total']
         }
     
     def _generate_restock_message(self, product_name, days_to_reorder, reorder_date):
@@ -239,9 +169,9 @@ class MLPredictions:
     # COMBINED PREDICTIONS
     # ═══════════════════════════════════════════════════════════════
     
-    def get_all_predictions(self):
+    def get_all_predictions(self, refresh=False):
         """Get all ML predictions in one call"""
         return {
             'sales_forecast': self.get_sales_forecast(),
-            'restock_predictions': self.get_restock_predictions(),
+            'restock_predictions': self.get_restock_predictions(refresh=refresh),
         }
@@ -1,3 +1,144 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+# Fact rollups maintained by ``analytics.rollups``. Each row is rebuilt from the
+# source documents whenever a posting touches its day (or month), so dashboards
+# read pre-aggregated rows instead of scanning invoice history.
+
+_AMOUNT = {'max_digits': 14, 'decimal_places': 2, 'default': 0}
+
+
+class DailyTenantFact(models.Model):
+    """Tenant x day totals of posted sales, purchases and returns."""
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+
+    invoice_count = models.PositiveIntegerField(default=0)
+    sales_quantity = models.BigIntegerField(default=0)
+    sales_taxable = models.DecimalField(**_AMOUNT)
+    sales_cgst = models.DecimalField(**_AMOUNT)
+    sales_sgst = models.DecimalField(**_AMOUNT)
+    sales_igst = models.DecimalField(**_AMOUNT)
+    sales_amount = models.DecimalField(**_AMOUNT, help_text="Sum of invoice totals")
+    sales_cost = models.DecimalField(**_AMOUNT)
+    sales_returns = models.DecimalField(**_AMOUNT, help_text="Sum of credit note totals")
+
+    bill_count = models.PositiveIntegerField(default=0)
+    purchase_quantity = models.BigIntegerField(default=0)
+    purchase_taxable = models.DecimalField(**_AMOUNT)
+    purchase_cgst = models.DecimalField(**_AMOUNT)
+    purchase_sgst = models.DecimalField(**_AMOUNT)
+    purchase_igst = models.DecimalField(**_AMOUNT)
+    purchase_amount = models.DecimalField(**_AMOUNT, help_text="Sum of purchase bill totals")
+    purchase_returns = models.DecimalField(**_AMOUNT, help_text="Sum of debit note totals")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'date'], name='analytics_daily_tenant_fact_uniq'),
+        ]
+
+    @property
+    def sales_tax(self):
+        return self.sales_cgst + self.sales_sgst + self.sales_igst
+
+    @property
+    def purchase_tax(self):
+        return self.purchase_cgst + self.purchase_sgst + self.purchase_igst
+
+    def __str__(self):
+        return f"{self.created_by_id} {self.date}"
+
+
+class DailyProductFact(models.Model):
+    """Tenant x day x product movement and value."""
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='daily_facts')
+
+    sales_quantity = models.BigIntegerField(default=0)
+    sales_taxable = models.DecimalField(**_AMOUNT)
+    sales_tax = models.DecimalField(**_AMOUNT)
+    sales_amount = models.DecimalField(**_AMOUNT)
+    sales_cost = models.DecimalField(**_AMOUNT)
+    returned_quantity = models.BigIntegerField(default=0)
+    returns_amount = models.DecimalField(**_AMOUNT)
+    purchase_quantity = models.BigIntegerField(default=0)
+    purchase_amount = models.DecimalField(**_AMOUNT)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'date', 'product'], name='analytics_daily_product_fact_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'date'], name='analytics_dpf_product_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.date}"
+
+
+class MonthlyTaxFact(models.Model):
+    """Tenant x month x HSN/SAC x tax rate, per direction, for GST returns."""
+    SALES = 'sales'
+    SALES_RETURNS = 'sales_returns'
+    PURCHASES = 'purchases'
+    PURCHASE_RETURNS = 'purchase_returns'
+    DIRECTION_CHOICES = [
+        (SALES, 'Sales'),
+        (SALES_RETURNS, 'Sales Returns'),
+        (PURCHASES, 'Purchases'),
+        (PURCHASE_RETURNS, 'Purchase Returns'),
+    ]
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    month = models.DateField(help_text="First day of the month")
+    direction = models.CharField(max_length=20, choices=DIRECTION_CHOICES)
+    hsn_sac_code = models.CharField(max_length=20, blank=True, default='')
+    tax_rate = models.DecimalField(max_digits=8, decimal_places=2)
+
+    quantity = models.BigIntegerField(default=0)
+    taxable_value = models.DecimalField(**_AMOUNT)
+    cgst = models.DecimalField(**_AMOUNT)
+    sgst = models.DecimalField(**_AMOUNT)
+    igst = models.DecimalField(**_AMOUNT)
+    amount = models.DecimalField(**_AMOUNT)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['created_by', 'month', 'direction', 'hsn_sac_code', 'tax_rate'],
+                name='analytics_monthly_tax_fact_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.created_by_id} {self.month:%Y-%m} {self.direction} {self.hsn_sac_code}@{self.tax_rate}"
+
+
+class ProductForecast(models.Model):
+    """Nightly demand forecast and reorder plan per tenant product (``analytics.forecasting``)."""
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='forecasts')
+    generated_on = models.DateField()
+
+    stock = models.IntegerField(default=0, help_text="Stock when the forecast was generated")
+    avg_daily_sales = models.DecimalField(max_digits=12, decimal_places=3, default=0, help_text="Trailing 30-day average")
+    forecast_daily = models.DecimalField(max_digits=12, decimal_places=3, default=0, help_text="Forecast demand per day")
+    demand_std = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    forecast = models.JSONField(default=list, help_text="Forecast quantity for each of the next days")
+    days_until_stockout = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)
+    stockout_date = models.DateField(null=True, blank=True)
+    reorder_date = models.DateField(null=True, blank=True)
+    reorder_point = models.PositiveIntegerField(default=0)
+    suggested_qty = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'product'], name='analytics_product_forecast_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['created_by', 'reorder_date'], name='analytics_pf_reorder_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.generated_on}"
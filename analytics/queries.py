@@ -0,0 +1,36 @@
+"""
+Database-side aggregates shared by the analytics endpoints.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Coalesce
+
+_ZERO = Decimal('0')
+TAX_AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=4)
+
+
+def line_tax_amount(prefix=''):
+    """
+    Tax on one line item: quantity x price x (1 - discount%) x tax%.
+
+    ``prefix`` points at the item from a related model, e.g. ``'items__'``.
+    """
+    discount = Coalesce(F(f'{prefix}discount'), Value(_ZERO))
+    tax_rate = Coalesce(F(f'{prefix}tax'), Value(_ZERO))
+    return ExpressionWrapper(
+        # Scale by 0.0001 rather than dividing by 10000 so SQLite, which stores
+        # whole-number decimals as integers, does not truncate.
+        F(f'{prefix}quantity') * F(f'{prefix}price') * (Value(Decimal('100')) - discount) * tax_rate * Value(Decimal('0.0001')),
+        output_field=TAX_AMOUNT_FIELD,
+    )
+
+
+def line_taxable_value(prefix=''):
+    """Taxable value of one line item: quantity x price x (1 - discount%)."""
+    discount = Coalesce(F(f'{prefix}discount'), Value(_ZERO))
+    return ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}price') * (Value(Decimal('100')) - discount) * Value(Decimal('0.01')),
+        output_field=TAX_AMOUNT_FIELD,
+    )
+
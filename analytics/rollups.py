@@ -0,0 +1,416 @@
+"""
+Fact rollups: ``DailyTenantFact``, ``DailyProductFact`` and ``MonthlyTaxFact``.
+
+Each posted document contributes fixed amounts to the fact rows of its tenant,
+day and month. Writes are applied as per-document deltas: before an existing
+document changes (``note_changing``) its current contribution is read from its
+own header and lines, after the change (``note_changed``) the new one is read,
+and only the difference is added to the fact rows. Missing rows are inserted
+with ``ON CONFLICT DO NOTHING`` and the deltas applied with one ``F()`` update
+per fact table under row locks taken in pk order, so concurrent postings to
+the same day add up instead of colliding. Rows that fall back to zero are
+removed. Updates run inside the posting transaction, so facts commit (or roll
+back) with the documents.
+
+``rebuild_rollups`` recomputes a tenant's rows from the same per-document
+contributions, so a rebuild matches the incremental rows exactly.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, NullIf, Trim, Upper
+
+from billing.models import PurchaseBill, PurchaseBillItem, SalesInvoice, SalesInvoiceItem
+from billing.models_returns import CreditNote, CreditNoteItem, DebitNote, DebitNoteItem
+
+from .models import DailyProductFact, DailyTenantFact, MonthlyTaxFact
+from .queries import line_tax_amount, line_taxable_value
+
+_ZERO = Decimal('0')
+_CENT = Decimal('0.01')
+
+_pending_changes = ContextVar('analytics_rollup_pending_changes', default=None)
+
+# Line fields that feed the facts; saves touching none of them are skipped.
+ITEM_FIELDS = frozenset({'product', 'quantity', 'price', 'discount', 'tax', 'amount', 'hsn_sac_code'})
+
+
+class _Source:
+    """How one document type feeds the facts."""
+
+    def __init__(self, name, document, item, parent, date_field, places, direction, fields,
+                 count_field, total_field, exclude=None):
+        self.name = name
+        self.document = document
+        self.item = item
+        self.parent = parent
+        self.date_field = date_field
+        self.places = places
+        self.direction = direction
+        self.fields = frozenset(fields)
+        self.count_field = count_field
+        self.total_field = total_field
+        self.exclude = exclude or {}
+
+    def documents(self, tenant_id):
+        return self.document.objects.filter(
+            Q(created_by=tenant_id) | Q(created_by__parent=tenant_id)
+        ).exclude(**self.exclude)
+
+    def posted(self, document_ids):
+        return self.document.objects.filter(pk__in=document_ids).exclude(**self.exclude)
+
+    def items(self, documents):
+        parent = self.parent
+        return self.item.objects.filter(**{f'{parent}__in': documents}).annotate(
+            tenant=_tenant(f'{parent}__'),
+            day=F(f'{parent}__{self.date_field}'),
+            place=Upper(Coalesce(*[NullIf(field, Value('')) for field in self.places], Value(''))),
+            seller=_seller_state(f'{parent}__'),
+            interstate=_INTERSTATE,
+            hsn=Coalesce(NullIf('hsn_sac_code', Value('')), NullIf('product__hsn_sac_code', Value('')), Value('')),
+        )
+
+
+def _tenant(prefix=''):
+    """The owning tenant of a document: the creator's parent, or the creator."""
+    return Coalesce(F(f'{prefix}created_by__parent'), F(f'{prefix}created_by'))
+
+
+def _seller_state(prefix=''):
+    return Upper(Trim(Coalesce(
+        Case(
+            When(**{f'{prefix}created_by__parent__isnull': False}, then=F(f'{prefix}created_by__parent__state')),
+            default=F(f'{prefix}created_by__state'),
+        ),
+        Value(''),
+    )))
+
+
+# Same rule as SalesInvoiceSerializer.get_tax_type: inter-state only when both
+# sides are known and differ.
+_INTERSTATE = Case(
+    When(~Q(place='') & ~Q(seller='') & ~Q(place=F('seller')), then=Value(True)),
+    default=Value(False),
+    output_field=BooleanField(),
+)
+
+
+SOURCES = (
+    _Source(
+        'sales', SalesInvoice, SalesInvoiceItem, 'sales_invoice', 'invoice_date',
+        ('sales_invoice__place_of_supply', 'sales_invoice__customer__state'),
+        MonthlyTaxFact.SALES,
+        fields=('invoice_date', 'status', 'total_amount', 'created_by', 'place_of_supply', 'customer'),
+        count_field='invoice_count', total_field='sales_amount', exclude={'status': 'draft'},
+    ),
+    _Source(
+        'sales_returns', CreditNote, CreditNoteItem, 'credit_note', 'date',
+        ('credit_note__original_invoice__place_of_supply', 'credit_note__customer__state'),
+        MonthlyTaxFact.SALES_RETURNS,
+        fields=('date', 'total_amount', 'created_by', 'original_invoice', 'customer'),
+        count_field=None, total_field='sales_returns',
+    ),
+    _Source(
+        'purchases', PurchaseBill, PurchaseBillItem, 'purchase_bill', 'bill_date',
+        ('purchase_bill__vendor__state',),
+        MonthlyTaxFact.PURCHASES,
+        fields=('bill_date', 'total_amount', 'created_by', 'vendor'),
+        count_field='bill_count', total_field='purchase_amount',
+    ),
+    _Source(
+        'purchase_returns', DebitNote, DebitNoteItem, 'debit_note', 'date',
+        ('debit_note__original_bill__vendor__state',),
+        MonthlyTaxFact.PURCHASE_RETURNS,
+        fields=('date', 'total_amount', 'created_by', 'original_bill'),
+        count_field=None, total_field='purchase_returns',
+    ),
+)
+_SOURCE_BY_DOCUMENT = {source.document: source for source in SOURCES}
+
+# Fact model -> the fields its delta keys are made of.
+_KEYS = {
+    DailyTenantFact: ('created_by_id', 'date'),
+    DailyProductFact: ('created_by_id', 'date', 'product_id'),
+    MonthlyTaxFact: ('created_by_id', 'month', 'direction', 'hsn_sac_code', 'tax_rate'),
+}
+
+
+def _measures(model):
+    keys = set(_KEYS[model])
+    return [field for field in model._meta.concrete_fields if not field.primary_key and field.attname not in keys]
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _split_tax(tax, interstate):
+    """``(cgst, sgst, igst)`` for a tax amount."""
+    tax = _money(tax)
+    if interstate:
+        return _ZERO, _ZERO, tax
+    cgst = (tax / 2).quantize(_CENT, rounding=ROUND_HALF_UP)
+    return cgst, tax - cgst, _ZERO
+
+
+def _new_delta():
+    """``{fact model: {key: {field: amount}}}``."""
+    return {model: defaultdict(lambda: defaultdict(int)) for model in _KEYS}
+
+
+def _merge(target, delta, sign=1):
+    for model, rows in delta.items():
+        for key, fields in rows.items():
+            row = target[model][key]
+            for field, value in fields.items():
+                row[field] += sign * value
+
+
+def _cost_price(source):
+    # Sales lines keep the cost they were posted at; older lines fall back to
+    # the product's current cost price.
+    if source.item is SalesInvoiceItem:
+        return Coalesce('cost_price', 'product__price')
+    return F('product__price')
+
+
+def _contributions(source, documents):
+    """What the posted ``documents`` (a queryset of ``source.document``) add to the facts."""
+    delta = _new_delta()
+    tenant_days = delta[DailyTenantFact]
+    product_days = delta[DailyProductFact]
+    tax_months = delta[MonthlyTaxFact]
+
+    # Grouped per document, so every document is rounded on its own and a
+    # rebuild adds up to exactly what the incremental updates wrote.
+    lines = (
+        source.items(documents)
+        .values(f'{source.parent}_id', 'tenant', 'day', 'product_id', 'interstate', 'hsn', 'tax')
+        .annotate(
+            quantity_total=Sum('quantity'),
+            taxable_total=Sum(line_taxable_value()),
+            tax_total=Sum(line_tax_amount()),
+            amount_total=Sum('amount'),
+            cost_total=Sum(F('quantity') * _cost_price(source)),
+        )
+        .order_by()
+    )
+    for line in lines:
+        tenant_id, day = line['tenant'], line['day']
+        quantity = line['quantity_total'] or 0
+        taxable = _money(line['taxable_total'])
+        tax = _money(line['tax_total'])
+        amount = _money(line['amount_total'])
+        cost = _money(line['cost_total'])
+        cgst, sgst, igst = _split_tax(tax, line['interstate'])
+        fact = tenant_days[(tenant_id, day)]
+        product = product_days[(tenant_id, day, line['product_id'])]
+
+        if source.name == 'sales':
+            fact['sales_quantity'] += quantity
+            fact['sales_taxable'] += taxable
+            fact['sales_cgst'] += cgst
+            fact['sales_sgst'] += sgst
+            fact['sales_igst'] += igst
+            fact['sales_cost'] += cost
+            product['sales_quantity'] += quantity
+            product['sales_taxable'] += taxable
+            product['sales_tax'] += tax
+            product['sales_amount'] += amount
+            product['sales_cost'] += cost
+        elif source.name == 'sales_returns':
+            product['returned_quantity'] += quantity
+            product['returns_amount'] += amount
+        elif source.name == 'purchases':
+            fact['purchase_quantity'] += quantity
+            fact['purchase_taxable'] += taxable
+            fact['purchase_cgst'] += cgst
+            fact['purchase_sgst'] += sgst
+            fact['purchase_igst'] += igst
+            product['purchase_quantity'] += quantity
+            product['purchase_amount'] += amount
+
+        month = day.replace(day=1)
+        tax_row = tax_months[(tenant_id, month, source.direction, line['hsn'], _money(line['tax']))]
+        tax_row['quantity'] += quantity
+        tax_row['taxable_value'] += taxable
+        tax_row['cgst'] += cgst
+        tax_row['sgst'] += sgst
+        tax_row['igst'] += igst
+        tax_row['amount'] += amount
+
+    # Document totals include round-off and documents without lines.
+    for row in documents.values('total_amount', tenant=_tenant(), day=F(source.date_field)).order_by():
+        fact = tenant_days[(row['tenant'], row['day'])]
+        if source.count_field:
+            fact[source.count_field] += 1
+        fact[source.total_field] += _money(row['total_amount'])
+    return delta
+
+
+def _document_contributions(documents):
+    delta = _new_delta()
+    by_source = defaultdict(set)
+    for source_name, document_id in documents:
+        by_source[source_name].add(document_id)
+    for source in SOURCES:
+        if by_source.get(source.name):
+            _merge(delta, _contributions(source, source.posted(list(by_source[source.name]))))
+    return delta
+
+
+def _output_field(field):
+    output = field.clone()
+    output.null = True
+    return output
+
+
+def _apply(delta):
+    """Add ``delta`` to the fact rows, creating and removing rows as needed."""
+    for model, rows in delta.items():
+        rows = {
+            key: {field: value for field, value in fields.items() if value}
+            for key, fields in rows.items()
+            if key[-1] is not None or model is not DailyProductFact
+        }
+        rows = {key: fields for key, fields in sorted(rows.items(), key=lambda item: str(item[0])) if fields}
+        if not rows:
+            continue
+
+        key_fields = _KEYS[model]
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key in rows], ignore_conflicts=True, batch_size=1000,
+        )
+        candidates = model.objects.select_for_update().filter(**{
+            f'{field}__in': {key[position] for key in rows} for position, field in enumerate(key_fields)
+        })
+        pks = {
+            tuple(values[1:]): values[0]
+            for values in candidates.order_by('pk').values_list('pk', *key_fields)
+            if tuple(values[1:]) in rows
+        }
+
+        updates = {}
+        for field in _measures(model):
+            changes = [(pks[key], fields[field.attname]) for key, fields in rows.items() if field.attname in fields]
+            if changes:
+                updates[field.attname] = F(field.attname) + Case(
+                    *[When(pk=pk, then=Value(value)) for pk, value in changes],
+                    default=Value(0),
+                    output_field=_output_field(field),
+                )
+        model.objects.filter(pk__in=list(pks.values())).update(**updates)
+
+        if any(value < 0 for fields in rows.values() for value in fields.values()):
+            model.objects.filter(
+                pk__in=list(pks.values()), **{field.attname: 0 for field in _measures(model)}
+            ).delete()
+
+
+class _Changes:
+    """Documents changed so far and what they contributed before their first change."""
+
+    def __init__(self):
+        self.documents = set()
+        self.before = _new_delta()
+
+    def remember(self, keys):
+        new = [key for key in keys if key not in self.documents]
+        if new:
+            self.documents.update(new)
+            _merge(self.before, _document_contributions(new))
+
+    def add(self, keys):
+        # A document seen for the first time here is new: it contributed nothing.
+        self.documents.update(keys)
+
+    def apply(self):
+        if not self.documents:
+            return
+        delta = _document_contributions(self.documents)
+        _merge(delta, self.before, sign=-1)
+        _apply(delta)
+
+
+def _keys(documents):
+    return {(_SOURCE_BY_DOCUMENT[type(document)].name, document.pk) for document in documents if document.pk}
+
+
+@contextmanager
+def batched_rollups():
+    """
+    Collect the documents changed by every write inside the block and apply
+    their deltas once on the way out. Nested blocks join the outermost one.
+    """
+    changes = _pending_changes.get()
+    if changes is not None:
+        yield changes
+        return
+
+    changes = _Changes()
+    token = _pending_changes.set(changes)
+    try:
+        yield changes
+    finally:
+        _pending_changes.reset(token)
+    with transaction.atomic():
+        changes.apply()
+
+
+def note_changing(documents):
+    """
+    Call before ``documents`` (existing rows) change. Inside a batch the batch
+    keeps their contribution; otherwise it is returned for ``note_changed``.
+    """
+    changes = _pending_changes.get()
+    if changes is None:
+        changes = _Changes()
+        changes.remember(_keys(documents))
+        return changes
+    changes.remember(_keys(documents))
+    return None
+
+
+def note_changed(documents, changing=None):
+    """
+    Call after ``documents`` were created, edited or deleted: apply their
+    delta now, or defer it to the enclosing batch. ``changing`` is what
+    ``note_changing`` returned for them outside a batch.
+    """
+    changes = _pending_changes.get()
+    if changes is not None:
+        changes.add(_keys(documents))
+        return
+    changes = changing or _Changes()
+    changes.add(_keys(documents))
+    with transaction.atomic():
+        changes.apply()
+
+
+def rebuild_rollups(tenant_ids=None):
+    """Recompute every fact row from scratch, for all tenants or only ``tenant_ids``."""
+    users = get_user_model().objects.filter(parent__isnull=True)
+    if tenant_ids is not None:
+        users = users.filter(pk__in=tenant_ids)
+
+    rebuilt = 0
+    for tenant_id in list(users.values_list('pk', flat=True)):
+        delta = _new_delta()
+        for source in SOURCES:
+            _merge(delta, _contributions(source, source.documents(tenant_id)))
+        with transaction.atomic():
+            for model, rows in delta.items():
+                model.objects.filter(created_by_id=tenant_id).delete()
+                model.objects.bulk_create([
+                    model(**dict(zip(_KEYS[model], key)), **{field: value for field, value in fields.items()})
+                    for key, fields in rows.items()
+                    if any(fields.values()) and (key[-1] is not None or model is not DailyProductFact)
+                ], batch_size=1000)
+        rebuilt += 1
+    return rebuilt
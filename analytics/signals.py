@@ -0,0 +1,80 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from billing.posting import item_signals_suppressed
+
+from .rollups import ITEM_FIELDS, SOURCES, note_changed, note_changing
+
+
+def _touches(fields, update_fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+def remember_document_rollup(sender, instance, update_fields=None, **kwargs):
+    instance._rollup_skip = False
+    if instance._state.adding:
+        return
+    source = _SOURCE_BY_DOCUMENT[sender]
+    if not _touches(source.fields | _ATTNAMES[sender], update_fields):
+        instance._rollup_skip = True
+        return
+    # A header save leaves the lines alone, so an unchanged header changes nothing.
+    stored = sender.objects.filter(pk=instance.pk).values(*_ATTNAMES[sender]).first()
+    if stored is not None and all(
+        sender._meta.get_field(name).to_python(getattr(instance, name)) == value for name, value in stored.items()
+    ):
+        instance._rollup_skip = True
+        return
+    instance._rollup_changing = note_changing([instance])
+
+
+def apply_document_rollup(sender, instance, **kwargs):
+    if instance.__dict__.pop('_rollup_skip', False):
+        return
+    note_changed([instance], instance.__dict__.pop('_rollup_changing', None))
+
+
+def remember_deleted_document(sender, instance, **kwargs):
+    instance._rollup_changing = note_changing([instance])
+
+
+def remember_item_document(sender, instance, update_fields=None, **kwargs):
+    # Lines written through ``billing.posting`` are reported by the posting
+    # itself, and the lines of a deleted document with the document.
+    if item_signals_suppressed() or _cascaded(kwargs.get('origin')):
+        return
+    if not _touches(ITEM_FIELDS | _ITEM_ATTNAMES, update_fields):
+        return
+    document = getattr(instance, _SOURCE_BY_ITEM[sender].parent)
+    instance._rollup_document = document
+    instance._rollup_changing = note_changing([document])
+
+
+def apply_item_rollup(sender, instance, **kwargs):
+    document = instance.__dict__.pop('_rollup_document', None)
+    if document is not None:
+        note_changed([document], instance.__dict__.pop('_rollup_changing', None))
+
+
+def _cascaded(origin):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in _SOURCE_BY_DOCUMENT
+
+
+_SOURCE_BY_DOCUMENT = {source.document: source for source in SOURCES}
+_SOURCE_BY_ITEM = {source.item: source for source in SOURCES}
+_ATTNAMES = {
+    source.document: frozenset(source.document._meta.get_field(name).attname for name in source.fields)
+    for source in SOURCES
+}
+_ITEM_ATTNAMES = frozenset({'product_id'})
+
+for _source in SOURCES:
+    pre_save.connect(remember_document_rollup, sender=_source.document, dispatch_uid=f'rollup_pre_{_source.name}')
+    post_save.connect(apply_document_rollup, sender=_source.document, dispatch_uid=f'rollup_doc_{_source.name}')
+    pre_delete.connect(remember_deleted_document, sender=_source.document, dispatch_uid=f'rollup_pre_del_{_source.name}')
+    post_delete.connect(apply_document_rollup, sender=_source.document, dispatch_uid=f'rollup_del_{_source.name}')
+    pre_save.connect(remember_item_document, sender=_source.item, dispatch_uid=f'rollup_item_pre_{_source.name}')
+    post_save.connect(apply_item_rollup, sender=_source.item, dispatch_uid=f'rollup_item_{_source.name}')
+    pre_delete.connect(remember_item_document, sender=_source.item, dispatch_uid=f'rollup_item_pre_del_{_source.name}')
+    post_delete.connect(apply_item_rollup, sender=_source.item, dispatch_uid=f'rollup_item_del_{_source.name}')
@@ -2,8 +2,13 @@
 Smart Dashboard - Business Intelligence Module
 Provides actionable insights for shopkeepers
 """
+import logging
+import time
 from datetime import date, timedelta
 from decimal import Decimal
+from functools import cached_property
+
+from django.contrib.auth import get_user_model
 from django.db.models import Sum, F, Count, Q, Avg
 from django.db.models.functions import TruncDate, TruncHour
 from django.utils import timezone
@@ -26,6 +31,45 @@ class SmartDashboard:
         ist = pytz.timezone('Asia/Kolkata')
         self.today = timezone.now().astimezone(ist).date()
         self.yesterday = self.today - timedelta(days=1)
+
+    # ═══════════════════════════════════════════════════════════════
+    # SHARED QUERIES - computed once per dashboard build
+    # ═══════════════════════════════════════════════════════════════
+
+    @cached_property
+    def _owner_ids(self):
+        """The tenant and its team members, so shared queries avoid the parent join."""
+        return [self.owner.pk, *get_user_model().objects.filter(parent=self.owner).values_list('pk', flat=True)]
+
+    @cached_property
+    def _product_velocity(self):
+        """
+        ``{product_id: row}`` of final sales in the last 60 days, one grouped
+        query. Each row has ``name``, ``sold_30d``, ``revenue_30d`` and ``sold_60d``.
+        """
+        thirty_days_ago = self.today - timedelta(days=30)
+        recent = Q(sales_invoice__invoice_date__gte=thirty_days_ago)
+        rows = SalesInvoiceItem.objects.filter(
+            sales_invoice__created_by__in=self._owner_ids,
+            sales_invoice__invoice_date__gte=self.today - timedelta(days=60),
+            sales_invoice__status='final'
+        ).values('product_id', name=F('product__name')).annotate(
+            sold_30d=Sum('quantity', filter=recent),
+            revenue_30d=Sum(F('quantity') * F('price'), filter=recent),
+            sold_60d=Sum('quantity'),
+        )
+        return {row['product_id']: row for row in rows}
+
+    @cached_property
+    def _overdue_invoices_by_customer(self):
+        """``{customer_id: count}`` of final invoices past their due date, one grouped query."""
+        rows = SalesInvoice.objects.filter(
+            created_by__in=self._owner_ids,
+            customer__isnull=False,
+            due_date__lt=self.today,
+            status='final',
+        ).values('customer_id').annotate(overdue=Count('id'))
+        return {row['customer_id']: row['overdue'] for row in rows}
     
     # ═══════════════════════════════════════════════════════════════
     # THE PULSE - What happened today?
@@ -264,17 +308,9 @@ class SmartDashboard:
     
     def _estimate_days_remaining(self, product_id, current_stock):
         """Estimate how many days stock will last based on sales velocity"""
-        # Get average daily sales for last 30 days
-        thirty_days_ago = self.today - timedelta(days=30)
-        
-        result = SalesInvoiceItem.objects.filter(
-            Q(sales_invoice__created_by=self.owner) | Q(sales_invoice__created_by__parent=self.owner),
-            product_id=product_id,
-            sales_invoice__invoice_date__gte=thirty_days_ago,
-            sales_invoice__status='final'
-        ).aggregate(total_qty=Sum('quantity'))
-        
-        total_sold = result['total_qty'] or 0
+        # Average daily sales over the last 30 days
+        velocity = self._product_velocity.get(product_id)
+        total_sold = (velocity and velocity['sold_30d']) or 0
         avg_daily = total_sold / 30
         
         if avg_daily == 0:
@@ -293,13 +329,7 @@ class SmartDashboard:
         ).values('id', 'name', 'current_balance', 'credit_limit')[:5]
         
         for c in customers_with_credit:
-            # Check for overdue invoices
-            overdue_invoices = SalesInvoice.objects.filter(
-                Q(created_by=self.owner) | Q(created_by__parent=self.owner),
-                customer_id=c['id'],
-                due_date__lt=self.today,
-                status='final',
-            ).count()
+            overdue_invoices = self._overdue_invoices_by_customer.get(c['id'], 0)
             
             if overdue_invoices > 0 or c['current_balance'] > 0:
                 overdue_customers.append({
@@ -316,25 +346,17 @@ class SmartDashboard:
     
     def _get_dead_stock_warnings(self):
         """Products that haven't sold in 60+ days"""
-        sixty_days_ago = self.today - timedelta(days=60)
-        
-        # Get products with stock but no recent sales
+        # Products with significant stock value; recent sales come from the shared velocity query
         products_with_stock = Product.objects.filter(
-            Q(created_by=self.owner) | Q(created_by__parent=self.owner),
+            created_by__in=self._owner_ids,
             stock__gt=0
-        ).values('id', 'name', 'stock', 'price')
+        ).annotate(
+            stock_value=F('stock') * F('price')
+        ).filter(stock_value__gt=1000).values('id', 'name', 'stock', 'price')
         
         dead_stock = []
-        for p in products_with_stock:
-            # Check if sold in last 60 days
-            recent_sales = SalesInvoiceItem.objects.filter(
-                Q(sales_invoice__created_by=self.owner) | Q(sales_invoice__created_by__parent=self.owner),
-                product_id=p['id'],
-                sales_invoice__invoice_date__gte=sixty_days_ago,
-                sales_invoice__status='final'
-            ).exists()
-            
-            if not recent_sales:
+        for p in products_with_stock.iterator(chunk_size=500):
+            if not self._product_velocity.get(p['id']):
                 trapped_value = p['stock'] * float(p['price'] or 0)
                 if trapped_value > 1000:  # Only show if significant value
                     dead_stock.append({
@@ -346,8 +368,10 @@ class SmartDashboard:
                         'trapped_value': trapped_value,
                         'action': 'discount'
                     })
+                    if len(dead_stock) >= 3:  # Limit to 3
+                        break
         
-        return dead_stock[:3]  # Limit to 3
+        return dead_stock
     
     def _get_cash_flow_warnings(self):
         """Detect if purchases significantly exceed sales"""
@@ -393,28 +417,23 @@ class SmartDashboard:
     
     def _get_top_products(self):
         """Top 5 best-selling products by revenue"""
-        thirty_days_ago = self.today - timedelta(days=30)
+        top_products = sorted(
+            (p for p in self._product_velocity.values() if p['sold_30d']),
+            key=lambda p: p['revenue_30d'] or 0,
+            reverse=True,
+        )[:5]
         
-        top_products = SalesInvoiceItem.objects.filter(
-            Q(sales_invoice__created_by=self.owner) | Q(sales_invoice__created_by__parent=self.owner),
-            sales_invoice__invoice_date__gte=thirty_days_ago,
-            sales_invoice__status='final'
-        ).values('product__name', 'product__id').annotate(
-            total_revenue=Sum(F('quantity') * F('price')),
-            total_qty=Sum('quantity')
-        ).order_by('-total_revenue')[:5]
-        
-        total_revenue = float(sum(float(p['total_revenue'] or 0) for p in top_products))
+        total_revenue = float(sum(float(p['revenue_30d'] or 0) for p in top_products))
         
         result = []
         for p in top_products:
-            revenue = float(p['total_revenue'] or 0)
+            revenue = float(p['revenue_30d'] or 0)
             percent_of_total = (revenue / total_revenue * 100) if total_revenue > 0 else 0
             result.append({
-                'name': p['product__name'],
-                'product_id': str(p['product__id']),
+                'name': p['name'],
+                'product_id': str(p['product_id']),
                 'revenue': revenue,
-                'quantity': p['total_qty'] or 0,
+                'quantity': p['sold_30d'] or 0,
                 'percent_of_total': round(percent_of_total, 1)
             })
         
@@ -422,28 +441,16 @@ class SmartDashboard:
     
     def _get_slow_movers(self):
         """Products with low sales velocity"""
-        thirty_days_ago = self.today - timedelta(days=30)
-        
         # Get all products with stock
         products_with_stock = list(Product.objects.filter(
-            Q(created_by=self.owner) | Q(created_by__parent=self.owner),
+            created_by__in=self._owner_ids,
             stock__gt=10  # Only consider if decent stock
         ).order_by('-stock')[:10])
-
-        product_ids = [product.id for product in products_with_stock]
-        sales_by_product = {
-            row['product_id']: row['total'] or 0
-            for row in SalesInvoiceItem.objects.filter(
-                Q(sales_invoice__created_by=self.owner) | Q(sales_invoice__created_by__parent=self.owner),
-                product_id__in=product_ids,
-                sales_invoice__invoice_date__gte=thirty_days_ago,
-                sales_invoice__status='final'
-            ).values('product_id').annotate(total=Sum('quantity'))
-        }
         
         slow_movers = []
         for product in products_with_stock:
-            sales_qty = sales_by_product.get(product.id, 0)
+            velocity = self._product_velocity.get(product.id)
+            sales_qty = (velocity and velocity['sold_30d']) or 0
             
             # If selling less than 1 per week
             if sales_qty < 4:
@@ -610,9 +617,10 @@ class SmartDashboard:
     # HEALTH STATUS - Overall business health indicator
     # ═══════════════════════════════════════════════════════════════
     
-    def get_health_status(self):
+    def get_health_status(self, warnings=None):
         """Calculate overall business health status (🟢🟡🔴)"""
-        warnings = self.get_warnings()
+        if warnings is None:
+            warnings = self.get_warnings()
         
         red_count = sum(1 for w in warnings if w['severity'] == 'red')
         yellow_count = sum(1 for w in warnings if w['severity'] == 'yellow')
@@ -636,22 +644,37 @@ class SmartDashboard:
                 'message': 'Business is running smoothly'
             }
     
-    def get_full_dashboard(self):
-        """Get complete smart dashboard data"""
-        def safe_call(func, default):
+    def get_full_dashboard(self, debug_timing=False):
+        """
+        Get complete smart dashboard data.
+
+        With ``debug_timing`` the response also carries a ``timing`` map of
+        milliseconds per section; shared queries count towards the first
+        section that uses them.
+        """
+        timing = {}
+
+        def safe_call(name, func, default):
+            started = time.perf_counter()
             try:
                 return func()
             except Exception as e:
-                import logging
-                logging.error(f"Dashboard Error in {func.__name__}: {e}")
+                logging.error(f"Dashboard Error in {name}: {e}")
                 return default
+            finally:
+                timing[name] = round((time.perf_counter() - started) * 1000, 1)
 
-        return {
-            'pulse': safe_call(self.get_pulse, {}),
-            'warnings': safe_call(self.get_warnings, []),
-            'insights': safe_call(self.get_insights, {}),
-            'gst_shield': safe_call(self.get_gst_shield, {}),
-            'health_status': safe_call(self.get_health_status, {
+        warnings = safe_call('warnings', self.get_warnings, [])
+        dashboard = {
+            'pulse': safe_call('pulse', self.get_pulse, {}),
+            'warnings': warnings,
+            'insights': safe_call('insights', self.get_insights, {}),
+            'gst_shield': safe_call('gst_shield', self.get_gst_shield, {}),
+            'health_status': safe_call('health_status', lambda: self.get_health_status(warnings), {
                 'status': 'green', 'emoji': '🟢', 'message': 'Business is running smoothly (Safe mode)'
             }),
         }
+        if debug_timing:
+            timing['total'] = round(sum(timing.values()), 1)
+            dashboard['timing'] = timing
+        return dashboard
@@ -0,0 +1,49 @@
+"""
+Analytics background tasks: nightly demand forecasts.
+"""
+import logging
+from datetime import date, timedelta
+
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from cenvoras.cache_utils import tenant_cache_key
+
+from .forecasting import HISTORY_DAYS, refresh_product_forecasts
+from .models import DailyProductFact, ProductForecast
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_tenant_product_forecasts(tenant_id):
+    tenant = User.objects.filter(pk=tenant_id).first()
+    if tenant is None:
+        return 0
+    count = refresh_product_forecasts(tenant)
+    cache.delete(tenant_cache_key('analytics', tenant.id, 'ml-predictions'))
+    return count
+
+
+@shared_task
+def refresh_all_product_forecasts():
+    """
+    Fan out one forecast refresh per tenant that sold anything in the history
+    window, or that still has forecasts (so a tenant that stopped selling has
+    its stale rows cleared).
+    """
+    since = date.today() - timedelta(days=HISTORY_DAYS)
+    selling = (
+        DailyProductFact.objects.filter(date__gte=since, sales_quantity__gt=0)
+        .order_by().values_list('created_by_id', flat=True)
+    )
+    forecasted = ProductForecast.objects.order_by().values_list('created_by_id', flat=True)
+    tenant_ids = selling.union(forecasted)
+    queued = 0
+    for tenant_id in tenant_ids:
+        refresh_tenant_product_forecasts.delay(str(tenant_id))
+        queued += 1
+    logger.info("Queued product forecast refresh for %s tenant(s)", queued)
+    return queued
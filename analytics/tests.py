@@ -1,3 +1,380 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from billing.models import Customer, PurchaseBill, PurchaseBillItem, SalesInvoice, SalesInvoiceItem
+from inventory.models import Product
+
+from .models import DailyProductFact, DailyTenantFact, MonthlyTaxFact, ProductForecast
+from .rollups import batched_rollups, rebuild_rollups
+
+User = get_user_model()
+
+
+class DashboardSummaryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="dashboard_user",
+            email="dashboard@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(name="Taxed Item", stock=1000, created_by=self.user)
+
+    # Sales item signals add each line's amount to the invoice total.
+    def _sale(self, day, lines, status="final"):
+        invoice = SalesInvoice.objects.create(
+            customer_name="Walk-in", invoice_number=f"INV-{day}-{status}", invoice_date=day,
+            total_amount=0, status=status, created_by=self.user,
+        )
+        for quantity, price, discount, tax in lines:
+            SalesInvoiceItem.objects.create(
+                sales_invoice=invoice, product=self.product, quantity=quantity, price=price,
+                discount=discount, tax=tax, amount=quantity * price,
+            )
+
+    def _purchase(self, day, quantity, price, tax):
+        bill = PurchaseBill.objects.create(
+            bill_number=f"PB-{day}", bill_date=day, total_amount=quantity * price, created_by=self.user,
+        )
+        PurchaseBillItem.objects.create(
+            purchase_bill=bill, product=self.product, quantity=quantity, price=price, tax=tax, amount=quantity * price,
+        )
+
+    def test_gst_and_chart_come_from_grouped_queries(self):
+        from analytics.views import build_dashboard_summary
+
+        # 2 x 100 less 10% = 180 taxable at 18% -> 32.40; 1 x 50 at 5% -> 2.50
+        self._sale(date(2024, 1, 10), [(2, 100, 10, 18), (1, 50, 0, 5)])
+        self._sale(date(2024, 2, 5), [(1, 200, 0, 12)])
+        self._sale(date(2024, 2, 6), [(5, 100, 0, 18)], status="draft")
+        self._purchase(date(2024, 1, 3), 10, 20, 18)
+
+        with self.assertNumQueries(3):
+            summary = build_dashboard_summary(self.user)
+
+        self.assertAlmostEqual(summary["gst_collected"], 32.40 + 2.50 + 24.00, places=2)
+        self.assertAlmostEqual(summary["gst_paid"], 36.00, places=2)
+        self.assertEqual(summary["total_sales"], 450)
+        self.assertEqual(summary["sales_vs_purchases"], [
+            {"name": "Jan 2024", "Sales": 250.0, "Purchases": 200.0},
+            {"name": "Feb 2024", "Sales": 200.0, "Purchases": 0},
+        ])
+
+    def test_query_count_does_not_grow_with_line_items(self):
+        from analytics.views import build_dashboard_summary
+
+        self._sale(date(2024, 1, 10), [(1, 100, 0, 18)])
+        with self.assertNumQueries(3):
+            build_dashboard_summary(self.user)
+
+        for day in range(1, 20):
+            self._sale(date(2024, 3, day), [(1, 10, 0, 5)] * 5)
+        with self.assertNumQueries(3):
+            build_dashboard_summary(self.user)
+
+    def test_endpoint_returns_summary(self):
+        res = self.client.get("/api/analytics/dashboard/", {"refresh": "true"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("gst_payable", res.data)
+
+
+class FactRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="rollup_user", email="rollup@test.com", password="testpass", state="Maharashtra",
+        )
+        self.product = Product.objects.create(
+            name="Rolled Item", stock=1000, price=40, hsn_sac_code="8471", created_by=self.user,
+        )
+        self.local = Customer.objects.create(name="Local", state="maharashtra", created_by=self.user)
+        self.remote = Customer.objects.create(name="Remote", state="Karnataka", created_by=self.user)
+
+    def _sale(self, day, customer, quantity, price, tax, number="INV-1", owner=None):
+        invoice = SalesInvoice.objects.create(
+            customer=customer, customer_name=customer.name, invoice_number=number, invoice_date=day,
+            total_amount=0, status="final", created_by=owner or self.user,
+        )
+        SalesInvoiceItem.objects.create(
+            sales_invoice=invoice, product=self.product, quantity=quantity, price=price,
+            tax=tax, amount=quantity * price,
+        )
+        return invoice
+
+    def _facts(self):
+        return {
+            "tenant": list(DailyTenantFact.objects.filter(created_by=self.user).order_by("date").values(
+                "date", "invoice_count", "sales_quantity", "sales_taxable", "sales_cgst", "sales_sgst",
+                "sales_igst", "sales_amount", "sales_cost", "bill_count", "purchase_amount",
+            )),
+            "product": list(DailyProductFact.objects.filter(created_by=self.user).order_by("date").values(
+                "date", "product_id", "sales_quantity", "sales_tax", "purchase_quantity",
+            )),
+            "tax": list(MonthlyTaxFact.objects.filter(created_by=self.user).order_by("direction", "tax_rate").values(
+                "month", "direction", "hsn_sac_code", "tax_rate", "taxable_value", "cgst", "sgst", "igst",
+            )),
+        }
+
+    def test_posting_splits_tax_by_place_of_supply(self):
+        self._sale(date(2024, 1, 10), self.local, 2, 100, 18, number="INV-1")
+        self._sale(date(2024, 1, 10), self.remote, 1, 50, 12, number="INV-2")
+
+        fact = DailyTenantFact.objects.get(created_by=self.user, date=date(2024, 1, 10))
+        self.assertEqual(fact.invoice_count, 2)
+        self.assertEqual(fact.sales_quantity, 3)
+        self.assertEqual(fact.sales_taxable, Decimal("250.00"))
+        self.assertEqual((fact.sales_cgst, fact.sales_sgst, fact.sales_igst), (Decimal("18.00"), Decimal("18.00"), Decimal("6.00")))
+        self.assertEqual(fact.sales_amount, Decimal("250.00"))
+        self.assertEqual(fact.sales_cost, Decimal("120.00"))
+
+        product_fact = DailyProductFact.objects.get(product=self.product, date=date(2024, 1, 10))
+        self.assertEqual(product_fact.sales_quantity, 3)
+        self.assertEqual(product_fact.sales_tax, Decimal("42.00"))
+
+        rates = MonthlyTaxFact.objects.filter(created_by=self.user, month=date(2024, 1, 1)).order_by("tax_rate")
+        self.assertEqual(
+            [(row.hsn_sac_code, row.tax_rate, row.taxable_value, row.igst) for row in rates],
+            [("8471", Decimal("12.00"), Decimal("50.00"), Decimal("6.00")), ("8471", Decimal("18.00"), Decimal("200.00"), Decimal("0.00"))],
+        )
+
+    def test_moving_and_deleting_documents_updates_both_days(self):
+        invoice = self._sale(date(2024, 1, 10), self.local, 1, 100, 18)
+        bill = PurchaseBill.objects.create(bill_number="PB-1", bill_date=date(2024, 1, 10), total_amount=300, created_by=self.user)
+        PurchaseBillItem.objects.create(purchase_bill=bill, product=self.product, quantity=3, price=100, tax=18, amount=300)
+
+        invoice.invoice_date = date(2024, 2, 1)
+        invoice.save()
+        january = DailyTenantFact.objects.get(created_by=self.user, date=date(2024, 1, 10))
+        self.assertEqual((january.invoice_count, january.sales_amount, january.bill_count), (0, Decimal("0.00"), 1))
+        self.assertEqual(DailyTenantFact.objects.get(created_by=self.user, date=date(2024, 2, 1)).invoice_count, 1)
+        self.assertFalse(MonthlyTaxFact.objects.filter(month=date(2024, 1, 1), direction=MonthlyTaxFact.SALES).exists())
+
+        invoice.delete()
+        self.assertFalse(DailyTenantFact.objects.filter(created_by=self.user, date=date(2024, 2, 1)).exists())
+
+    def test_team_documents_roll_up_to_tenant_and_rebuild_matches(self):
+        member = User.objects.create_user(
+            username="rollup_member", email="member@test.com", password="testpass", parent=self.user,
+        )
+        self._sale(date(2024, 3, 5), self.local, 2, 100, 5, number="INV-1")
+        self._sale(date(2024, 3, 5), self.remote, 1, 100, 5, number="INV-2", owner=member)
+        with batched_rollups():
+            bill = PurchaseBill.objects.create(bill_number="PB-1", bill_date=date(2024, 3, 6), total_amount=80, created_by=self.user)
+            PurchaseBillItem.objects.create(purchase_bill=bill, product=self.product, quantity=2, price=40, tax=18, amount=80)
+
+        self.assertFalse(DailyTenantFact.objects.filter(created_by=member).exists())
+        incremental = self._facts()
+        self.assertEqual(incremental["tenant"][0]["invoice_count"], 2)
+
+        DailyTenantFact.objects.all().delete()
+        DailyProductFact.objects.all().delete()
+        MonthlyTaxFact.objects.all().delete()
+        self.assertEqual(rebuild_rollups([self.user.pk]), 1)
+        self.assertEqual(self._facts(), incremental)
+
+    def test_line_edits_apply_deltas_that_match_a_rebuild(self):
+        invoice = self._sale(date(2024, 4, 2), self.local, 2, 100, 18)
+        item = invoice.items.get()
+        item.quantity = 3
+        item.amount = 300
+        item.save()
+        SalesInvoiceItem.objects.create(
+            sales_invoice=invoice, product=self.product, quantity=1, price=50, tax=5, amount=50,
+        )
+
+        fact = DailyTenantFact.objects.get(created_by=self.user, date=date(2024, 4, 2))
+        self.assertEqual((fact.invoice_count, fact.sales_quantity, fact.sales_taxable), (1, 4, Decimal("350.00")))
+        incremental = self._facts()
+        rebuild_rollups([self.user.pk])
+        self.assertEqual(self._facts(), incremental)
+
+    def test_sales_cost_keeps_the_posted_cost_price(self):
+        self._sale(date(2024, 4, 2), self.local, 2, 100, 18)
+        incremental = self._facts()
+
+        Product.objects.filter(pk=self.product.pk).update(price=999)
+        rebuild_rollups([self.user.pk])
+        self.assertEqual(self._facts(), incremental)
+
+    def test_saves_that_leave_fact_fields_alone_skip_the_rollup(self):
+        invoice = self._sale(date(2024, 4, 2), self.local, 1, 100, 18)
+        invoice.refresh_from_db()
+
+        with CaptureQueriesContext(connection) as queries:
+            invoice.amount_paid = 10
+            invoice.save(update_fields=["amount_paid"])
+            invoice.save()
+        self.assertFalse([query["sql"] for query in queries if "analytics_" in query["sql"]])
+
+    def test_sales_and_gst_readers_use_the_facts(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self._sale(date(2024, 1, 10), self.local, 2, 100, 18, number="INV-1")
+        self._sale(date(2024, 1, 12), self.remote, 1, 50, 12, number="INV-2")
+
+        with CaptureQueriesContext(connection) as queries:
+            sales = client.get("/api/analytics/sales-summary/", {"date_from": "2024-01-01", "date_to": "2024-01-31"})
+            gst = client.get("/api/analytics/gst-summary/", {"date_from": "2024-01-01", "date_to": "2024-01-31"})
+            hsn = client.get("/api/analytics/gstr1-report/", {"date_from": "2024-01-01", "date_to": "2024-01-31", "section": "hsn"})
+        self.assertFalse([query["sql"] for query in queries if "billing_salesinvoiceitem" in query["sql"]])
+
+        self.assertEqual(sales.data["total_sales"], Decimal("250.00"))
+        self.assertEqual([row["total"] for row in sales.data["sales_by_product"]], [Decimal("250.00")])
+        self.assertEqual(
+            [(row["invoice_date"], row["total"]) for row in sales.data["sales_by_date"]],
+            [(date(2024, 1, 10), Decimal("200.00")), (date(2024, 1, 12), Decimal("50.00"))],
+        )
+        self.assertEqual(gst.data["gst_collected"], Decimal("42.00"))
+        self.assertEqual(list(gst.data["gst_by_month"]), [{"month": 1, "total_gst": Decimal("42.00")}])
+        self.assertEqual(
+            [(row["hsn_sac_code"], row["tax_rate"], row["taxable_value"], row["igst"]) for row in hsn.data],
+            [("8471", Decimal("12.00"), Decimal("50.00"), Decimal("6.00")), ("8471", Decimal("18.00"), Decimal("200.00"), Decimal("0.00"))],
+        )
+
+
+class SmartDashboardQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="smart_user", email="smart@test.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(name="Debtor", current_balance=500, created_by=self.user)
+
+    def _catalogue(self, count, start=0):
+        for index in range(start, start + count):
+            product = Product.objects.create(
+                name=f"Item {index}", stock=5, price=500, low_stock_alert=10, created_by=self.user,
+            )
+            invoice = SalesInvoice.objects.create(
+                customer=self.customer, customer_name="Debtor", invoice_number=f"INV-{index}",
+                invoice_date=date.today(), due_date=date.today() - timedelta(days=1),
+                total_amount=0, status="final", created_by=self.user,
+            )
+            SalesInvoiceItem.objects.create(
+                sales_invoice=invoice, product=product, quantity=3, price=10, amount=30,
+            )
+            Product.objects.create(name=f"Dead {index}", stock=50, price=100, created_by=self.user)
+
+    def _warning_queries(self):
+        from analytics.smart_dashboard import SmartDashboard
+
+        with CaptureQueriesContext(connection) as queries:
+            warnings = SmartDashboard(self.user).get_warnings()
+        return len(queries.captured_queries), warnings
+
+    def test_warning_queries_do_not_grow_with_catalogue(self):
+        self._catalogue(2)
+        small, warnings = self._warning_queries()
+        low_stock = [w for w in warnings if w["type"] == "low_stock"]
+        self.assertEqual(len(low_stock), 2)
+        # 3 sold in 30 days: 0.1 a day against the 2 left in stock
+        self.assertEqual(low_stock[0]["days_remaining"], 20)
+        self.assertEqual(len([w for w in warnings if w["type"] == "dead_stock"]), 2)
+        self.assertEqual(len([w for w in warnings if w["type"] == "payment_due"]), 1)
+
+        self._catalogue(8, start=2)
+        large, warnings = self._warning_queries()
+        self.assertEqual(large, small)
+        self.assertEqual(len([w for w in warnings if w["type"] == "dead_stock"]), 3)
+
+    def test_debug_timing_reports_sections(self):
+        self._catalogue(1)
+        res = self.client.get("/api/analytics/smart-dashboard/")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("timing", res.data)
+        self.assertEqual(res.data["insights"]["top_5_products"][0]["quantity"], 3)
+
+        res = self.client.get("/api/analytics/smart-dashboard/", {"debug_timing": "1"})
+        self.assertEqual(
+            set(res.data["timing"]),
+            {"pulse", "warnings", "insights", "gst_shield", "health_status", "total"},
+        )
+
+
+class ForecastingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="forecast_user", email="forecast@test.com", password="testpass"
+        )
+        self.today = date.today()
+
+    def _daily_sales(self, product, quantity, days):
+        with batched_rollups():
+            for offset in range(1, days + 1):
+                invoice = SalesInvoice.objects.create(
+                    customer_name="Walk-in", invoice_number=f"INV-{product.name}-{offset}",
+                    invoice_date=self.today - timedelta(days=offset), total_amount=0,
+                    status="final", created_by=self.user,
+                )
+                SalesInvoiceItem.objects.create(
+                    sales_invoice=invoice, product=product, quantity=quantity, price=10, amount=quantity * 10,
+                )
+
+    def test_holt_winters_follows_weekly_season(self):
+        import numpy as np
+
+        from analytics.forecasting import holt_winters
+
+        week = np.array([10, 10, 10, 10, 10, 40, 40], dtype=float)
+        series = np.vstack([np.tile(week, 8), np.full(56, 5.0)])
+        forecast, residual_std = holt_winters(series, horizon=7)
+
+        self.assertEqual(forecast.shape, (2, 7))
+        np.testing.assert_allclose(forecast[0], week, atol=0.5)
+        np.testing.assert_allclose(forecast[1], 5.0, atol=1e-6)
+        self.assertAlmostEqual(residual_std[1], 0.0)
+
+    def test_restock_predictions_read_stored_forecasts(self):
+        from analytics.forecasting import refresh_product_forecasts
+        from analytics.ml_predictions import MLPredictions
+
+        fast = Product.objects.create(name="Fast", stock=1000, price=5, created_by=self.user)
+        slow = Product.objects.create(name="Slow", stock=1000, price=5, created_by=self.user)
+        Product.objects.create(name="Idle", stock=1000, price=5, created_by=self.user)
+        self._daily_sales(fast, 20, 28)
+        self._daily_sales(slow, 1, 28)
+
+        self.assertEqual(refresh_product_forecasts(self.user), 2)
+        forecast = ProductForecast.objects.get(product=fast)
+        # 1000 - 28 x 20 sold leaves 440 at ~20 a day
+        self.assertEqual(forecast.stock, 440)
+        self.assertAlmostEqual(float(forecast.forecast_daily), 20, delta=1)
+        self.assertEqual(forecast.stockout_date, self.today + timedelta(days=int(forecast.days_until_stockout)))
+        self.assertEqual(forecast.reorder_date, forecast.stockout_date - timedelta(days=6))
+        self.assertGreaterEqual(forecast.reorder_point, 120)
+
+        with self.assertNumQueries(2):
+            restock = MLPredictions(self.user).get_restock_predictions()
+        self.assertEqual(restock["total_products_analyzed"], 2)
+        self.assertEqual([p["product_name"] for p in restock["predictions"]], ["Fast", "Slow"])
+
+    def test_nightly_refresh_clears_forecasts_of_tenants_that_stopped_selling(self):
+        from analytics.tasks import refresh_all_product_forecasts
+
+        product = Product.objects.create(name="Dormant", stock=100, price=5, created_by=self.user)
+        ProductForecast.objects.create(
+            product=product, created_by=self.user, stock=100, generated_on=self.today - timedelta(days=60),
+            reorder_date=self.today - timedelta(days=30), stockout_date=self.today - timedelta(days=24),
+        )
+
+        self.assertEqual(refresh_all_product_forecasts(), 1)
+        self.assertFalse(ProductForecast.objects.filter(created_by=self.user).exists())
+
+    def test_sales_forecast_from_daily_rollup(self):
+        from analytics.ml_predictions import MLPredictions
+
+        product = Product.objects.create(name="Steady", stock=1000, price=5, created_by=self.user)
+        self._daily_sales(product, 10, 14)
 
-# Create your tests here.
+        forecast = MLPredictions(self.user).get_sales_forecast()
+        self.assertEqual(len(forecast["forecast"]), 7)
+        self.assertEqual(forecast["trend"], "stable")
+        self.assertGreater(forecast["predicted_total"], 0)
@@ -2,7 +2,7 @@ from django.shortcuts import render
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from billing.models import SalesInvoice, SalesInvoiceItem, PurchaseBill, PurchaseBillItem
+from billing.models import SalesInvoice, PurchaseBill
 from inventory.models import Product, StockPoint
 from django.db.models import Sum, F
 from datetime import datetime
@@ -16,6 +16,16 @@ from cenvoras.cache_utils import CACHE_TTL_MEDIUM, cache_get_or_set, tenant_cach
 
 # Create your views here.
 
+
+def _fact_range(facts, date_from, date_to):
+    """Daily fact rows within the optional ``date_from``/``date_to`` bounds."""
+    if date_from:
+        facts = facts.filter(date__gte=date_from)
+    if date_to:
+        facts = facts.filter(date__lte=date_to)
+    return facts
+
+
 @swagger_auto_schema(
     method='get',
     manual_parameters=[
@@ -57,6 +67,21 @@ def sales_summary(request):
 
     tenant = getattr(request.user, 'active_tenant', request.user)
     from django.db.models import Q
+    from .models import DailyProductFact, DailyTenantFact
+
+    # Totals, products and dates come from the daily rollups; only the
+    # per-customer split still reads the invoices (no line items).
+    days = _fact_range(DailyTenantFact.objects.filter(created_by=tenant), date_from, date_to)
+    totals = days.aggregate(invoices=Sum('sales_amount'), returns=Sum('sales_returns'))
+    total_sales = (totals['invoices'] or 0) - (totals['returns'] or 0)
+
+    products = _fact_range(DailyProductFact.objects.filter(created_by=tenant), date_from, date_to)
+    sales_by_product = (
+        products.exclude(sales_quantity=0, sales_amount=0)
+        .values('product__name').annotate(total=Sum('sales_amount')).order_by('-total')
+    )
+    sales_by_date = days.filter(invoice_count__gt=0).values(invoice_date=F('date'), total=F('sales_amount')).order_by('date')
+
     qs = SalesInvoice.objects.filter(
         Q(created_by=tenant) | Q(created_by__parent=tenant)
     ).filter(status='final')
@@ -64,26 +89,7 @@ def sales_summary(request):
         qs = qs.filter(invoice_date__gte=date_from)
     if date_to:
         qs = qs.filter(invoice_date__lte=date_to)
-        
-    total_invoices = qs.aggregate(total=Sum('total_amount'))['total'] or 0
-    
-    # Subtract Returns (Credit Notes)
-    from billing.models_returns import CreditNote
-    returns_qs = CreditNote.objects.filter(
-        Q(created_by=tenant) | Q(created_by__parent=tenant)
-    )
-    if date_from:
-        returns_qs = returns_qs.filter(date__gte=date_from)
-    if date_to:
-        returns_qs = returns_qs.filter(date__lte=date_to)
-    total_returns = returns_qs.aggregate(total=Sum('total_amount'))['total'] or 0
-    
-    total_sales = total_invoices - total_returns
-
-    items = SalesInvoiceItem.objects.filter(sales_invoice__in=qs)
-    sales_by_product = items.values('product__name').annotate(total=Sum('amount')).order_by('-total')
     sales_by_customer = qs.values('customer__name').annotate(total=Sum('total_amount')).order_by('-total')
-    sales_by_date = qs.values('invoice_date').annotate(total=Sum('total_amount')).order_by('invoice_date')
 
     if export == 'csv':
         response = HttpResponse(content_type='text/csv')
@@ -288,25 +294,28 @@ def gst_summary(request):
     export = request.query_params.get('export')
 
     tenant = getattr(request.user, 'active_tenant', request.user)
-    # GST collected from sales
-    sales_items = SalesInvoiceItem.objects.filter(sales_invoice__created_by=tenant)
-    if date_from:
-        sales_items = sales_items.filter(sales_invoice__invoice_date__gte=date_from)
-    if date_to:
-        sales_items = sales_items.filter(sales_invoice__invoice_date__lte=date_to)
-    gst_collected = sales_items.aggregate(total_gst=Sum('tax'))['total_gst'] or 0
-
-    # GST paid on purchases
-    purchase_items = PurchaseBillItem.objects.filter(purchase_bill__created_by=tenant)
-    if date_from:
-        purchase_items = purchase_items.filter(purchase_bill__bill_date__gte=date_from)
-    if date_to:
-        purchase_items = purchase_items.filter(purchase_bill__bill_date__lte=date_to)
-    gst_paid = purchase_items.aggregate(total_gst=Sum('tax'))['total_gst'] or 0
-
-    # GST by product
-    gst_by_product = sales_items.values('product__name').annotate(total_gst=Sum('tax')).order_by('-total_gst')
-    gst_by_month = sales_items.annotate(month=F('sales_invoice__invoice_date__month')).values('month').annotate(total_gst=Sum('tax')).order_by('month')
+    from django.db.models.functions import ExtractMonth
+    from .models import DailyProductFact, DailyTenantFact
+
+    sales_tax = F('sales_cgst') + F('sales_sgst') + F('sales_igst')
+    days = _fact_range(DailyTenantFact.objects.filter(created_by=tenant), date_from, date_to)
+    totals = days.aggregate(
+        collected=Sum(sales_tax),
+        paid=Sum(F('purchase_cgst') + F('purchase_sgst') + F('purchase_igst')),
+    )
+    # GST collected from sales, paid on purchases: tax amounts, not rates
+    gst_collected = totals['collected'] or 0
+    gst_paid = totals['paid'] or 0
+
+    products = _fact_range(DailyProductFact.objects.filter(created_by=tenant), date_from, date_to)
+    gst_by_product = (
+        products.exclude(sales_tax=0)
+        .values('product__name').annotate(total_gst=Sum('sales_tax')).order_by('-total_gst')
+    )
+    gst_by_month = (
+        days.annotate(month=ExtractMonth('date')).values('month')
+        .annotate(total_gst=Sum(sales_tax)).filter(total_gst__gt=0).order_by('month')
+    )
 
     if export == 'csv':
         response = HttpResponse(content_type='text/csv')
@@ -364,120 +373,84 @@ def dashboard_summary(request):
         from django.core.cache import cache
         cache.delete(cache_key)
 
-    def build_summary():
-        from django.db.models.functions import TruncMonth
-        from collections import defaultdict
-        from decimal import Decimal
-
-        from django.db.models import Q
-        # Sales
-        sales_qs = SalesInvoice.objects.filter(
-            Q(created_by=tenant) | Q(created_by__parent=tenant)
-        ).exclude(status='draft')
-        total_invoices = sales_qs.aggregate(total=Sum('total_amount'))['total'] or 0
-
-        # Subtract returns
-        from billing.models_returns import CreditNote
-        total_returns = CreditNote.objects.filter(
-            Q(created_by=tenant) | Q(created_by__parent=tenant)
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        total_sales = total_invoices - total_returns
-
-        # Purchases
-        purchase_qs = PurchaseBill.objects.filter(
-            Q(created_by=tenant) | Q(created_by__parent=tenant)
+    return Response(cache_get_or_set(cache_key, CACHE_TTL_MEDIUM, lambda: build_dashboard_summary(tenant)))
+
+
+def build_dashboard_summary(tenant):
+    """
+    Totals, GST and the monthly sales-vs-purchases chart for ``tenant``.
+
+    Read from the ``DailyTenantFact`` rollup (one grouped query), so the cost
+    grows with the number of months, not with invoices or line items.
+    """
+    from decimal import Decimal
+
+    from django.db.models.functions import TruncMonth
+
+    from .models import DailyTenantFact
+
+    months = list(
+        DailyTenantFact.objects.filter(created_by=tenant)
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(
+            sales=Sum('sales_amount'),
+            returns=Sum('sales_returns'),
+            purchases=Sum('purchase_amount'),
+            sales_tax=Sum(F('sales_cgst') + F('sales_sgst') + F('sales_igst')),
+            purchase_tax=Sum(F('purchase_cgst') + F('purchase_sgst') + F('purchase_igst')),
         )
-        total_purchases = purchase_qs.aggregate(total=Sum('total_amount'))['total'] or 0
-
-        # Inventory
-        products = Product.objects.filter(created_by=tenant)
-        total_inventory_value = products.aggregate(
-            value=Sum(F('stock') * F('price'))
-        )['value'] or 0
-        low_stock_count = products.filter(stock__lte=F('low_stock_alert')).count()
-
-        # GST Calculation (FIXED: Calculate actual tax amount, not sum of percentages)
-        # For sales: tax_amount = (quantity * price - discount_amount) * tax_rate / 100
-        sales_items = SalesInvoiceItem.objects.filter(
-            sales_invoice__created_by=tenant,
-        ).exclude(sales_invoice__status='draft')
-        gst_collected = Decimal('0.00')
-        for item in sales_items:
-            qty = Decimal(item.quantity)
-            price = Decimal(item.price)
-            discount_pct = Decimal(item.discount or 0)
-            tax_rate = Decimal(item.tax or 0)
-
-            line_value = qty * price
-            discount_amount = (line_value * discount_pct) / Decimal('100')
-            taxable_value = line_value - discount_amount
-            tax_amount = (taxable_value * tax_rate) / Decimal('100')
-            gst_collected += tax_amount
-
-        purchase_items = PurchaseBillItem.objects.filter(purchase_bill__created_by=tenant)
-        gst_paid = Decimal('0.00')
-        for item in purchase_items:
-            qty = Decimal(item.quantity)
-            price = Decimal(item.price)
-            discount_pct = Decimal(item.discount or 0)
-            tax_rate = Decimal(item.tax or 0)
-
-            line_value = qty * price
-            discount_amount = (line_value * discount_pct) / Decimal('100')
-            taxable_value = line_value - discount_amount
-            tax_amount = (taxable_value * tax_rate) / Decimal('100')
-            gst_paid += tax_amount
-
-        gst_payable = gst_collected - gst_paid
-
-        # Sales vs Purchases Chart Data (Monthly aggregation)
-        sales_by_month = sales_qs.annotate(
-            month=TruncMonth('invoice_date')
-        ).values('month').annotate(
-            total=Sum('total_amount')
-        ).order_by('month')
-
-        purchases_by_month = purchase_qs.annotate(
-            month=TruncMonth('bill_date')
-        ).values('month').annotate(
-            total=Sum('total_amount')
-        ).order_by('month')
-
-        # Merge into chart format
-        month_data = defaultdict(lambda: {'Sales': 0, 'Purchases': 0})
-        for entry in sales_by_month:
-            if entry['month']:
-                month_name = entry['month'].strftime('%b %Y')
-                month_data[month_name]['Sales'] = float(entry['total'] or 0)
-        for entry in purchases_by_month:
-            if entry['month']:
-                month_name = entry['month'].strftime('%b %Y')
-                month_data[month_name]['Purchases'] = float(entry['total'] or 0)
-
-        # Convert to list for chart
-        sales_vs_purchases = [
-            {'name': month, 'Sales': data['Sales'], 'Purchases': data['Purchases']}
-            for month, data in sorted(month_data.items())
-        ]
-
-        return {
-            'total_sales': total_sales,
-            'total_purchases': total_purchases,
-            'total_inventory_value': total_inventory_value,
-            'low_stock_count': low_stock_count,
-            'gst_collected': float(gst_collected),
-            'gst_paid': float(gst_paid),
-            'gst_payable': float(gst_payable),
-            'sales_vs_purchases': sales_vs_purchases,
-        }
+        .order_by('month')
+    )
+
+    def total(field):
+        return sum((row[field] or 0 for row in months), Decimal('0'))
+
+    # Sales (net of returns)
+    total_sales = total('sales') - total('returns')
+
+    # Purchases
+    total_purchases = total('purchases')
+
+    # Inventory
+    products = Product.objects.filter(created_by=tenant)
+    total_inventory_value = products.aggregate(
+        value=Sum(F('stock') * F('price'))
+    )['value'] or 0
+    low_stock_count = products.filter(stock__lte=F('low_stock_alert')).count()
+
+    # GST: actual tax amounts, (quantity * price - discount) * tax_rate / 100 per line
+    gst_collected = total('sales_tax')
+    gst_paid = total('purchase_tax')
+    gst_payable = gst_collected - gst_paid
+
+    # Chart, oldest month first
+    sales_vs_purchases = [
+        {'name': row['month'].strftime('%b %Y'), 'Sales': float(row['sales'] or 0), 'Purchases': float(row['purchases'] or 0)}
+        for row in months
+        if row['sales'] or row['purchases']
+    ]
+
+    return {
+        'total_sales': total_sales,
+        'total_purchases': total_purchases,
+        'total_inventory_value': total_inventory_value,
+        'low_stock_count': low_stock_count,
+        'gst_collected': float(gst_collected),
+        'gst_paid': float(gst_paid),
+        'gst_payable': float(gst_payable),
+        'sales_vs_purchases': sales_vs_purchases,
+    }
+
+
 
-    return Response(cache_get_or_set(cache_key, CACHE_TTL_MEDIUM, build_summary))
 @swagger_auto_schema(
     method='get',
     manual_parameters=[
         openapi.Parameter('date_from', openapi.IN_QUERY, description="Start date (YYYY-MM-DD)", type=openapi.TYPE_STRING, required=True),
         openapi.Parameter('date_to', openapi.IN_QUERY, description="End date (YYYY-MM-DD)", type=openapi.TYPE_STRING, required=True),
         openapi.Parameter('export', openapi.IN_QUERY, description="Set to 'json' or 'csv'", type=openapi.TYPE_STRING),
+        openapi.Parameter('section', openapi.IN_QUERY, description="Set to 'hsn' for the HSN-wise summary of the months in the range", type=openapi.TYPE_STRING),
     ],
     responses={200: openapi.Response(
         description="GSTR-1 Report Data",
@@ -516,6 +489,9 @@ def gstr1_report(request):
     if not date_from or not date_to:
         return Response({"error": "date_from and date_to are required"}, status=400)
 
+    if request.query_params.get('section') == 'hsn':
+        return _gstr1_hsn_summary(getattr(request.user, 'active_tenant', request.user), date_from, date_to, export)
+
     # Fetch User State (Place of Supply Origin)
     user_state_code = request.user.state
     if not user_state_code:
@@ -619,6 +595,54 @@ def gstr1_report(request):
     return Response(report_data)
 
 
+def _gstr1_hsn_summary(tenant, date_from, date_to, export):
+    """
+    GSTR-1 HSN-wise summary of outward supplies, read from ``MonthlyTaxFact``:
+    one row per HSN/SAC code and tax rate over the calendar months that
+    ``date_from``..``date_to`` touches.
+    """
+    from .models import MonthlyTaxFact
+
+    try:
+        first_month = datetime.strptime(date_from, '%Y-%m-%d').date().replace(day=1)
+        last_month = datetime.strptime(date_to, '%Y-%m-%d').date().replace(day=1)
+    except ValueError:
+        return Response({"error": "date_from and date_to must be YYYY-MM-DD"}, status=400)
+
+    rows = list(
+        MonthlyTaxFact.objects.filter(
+            created_by=tenant, direction=MonthlyTaxFact.SALES, month__gte=first_month, month__lte=last_month,
+        )
+        .values('hsn_sac_code', 'tax_rate')
+        .annotate(
+            quantity=Sum('quantity'),
+            taxable_value=Sum('taxable_value'),
+            igst=Sum('igst'),
+            cgst=Sum('cgst'),
+            sgst=Sum('sgst'),
+            total_value=Sum('amount'),
+        )
+        .order_by('hsn_sac_code', 'tax_rate')
+    )
+
+    if export == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="gstr1_hsn_summary.csv"'
+        writer = csv.writer(response)
+        writer.writerow([
+            'HSN/SAC', 'Rate (%)', 'Total Quantity', 'Total Value', 'Taxable Value',
+            'Integrated Tax', 'Central Tax', 'State/UT Tax',
+        ])
+        for r in rows:
+            writer.writerow([
+                r['hsn_sac_code'], r['tax_rate'], r['quantity'], r['total_value'], r['taxable_value'],
+                r['igst'], r['cgst'], r['sgst'],
+            ])
+        return response
+
+    return Response(rows)
+
+
 @swagger_auto_schema(
     method='get',
     manual_parameters=[
@@ -734,7 +758,9 @@ def smart_dashboard(request):
 
     def build_dashboard():
         dashboard = SmartDashboard(request.user)
-        return dashboard.get_full_dashboard()
+        return dashboard.get_full_dashboard(
+            debug_timing=request.query_params.get('debug_timing') in ('1', 'true'),
+        )
 
     return Response(build_dashboard())
 
@@ -772,12 +798,13 @@ def ml_predictions(request):
     tenant = getattr(request.user, 'active_tenant', request.user)
     cache_key = tenant_cache_key('analytics', tenant.id, 'ml-predictions')
 
-    if request.query_params.get('refresh') == 'true':
+    refresh = request.query_params.get('refresh') == 'true'
+    if refresh:
         from django.core.cache import cache
         cache.delete(cache_key)
 
     def build_predictions():
         ml = MLPredictions(request.user)
-        return ml.get_all_predictions()
+        return ml.get_all_predictions(refresh=refresh)
 
     return Response(cache_get_or_set(cache_key, CACHE_TTL_MEDIUM, build_predictions))
@@ -5,4 +5,5 @@ class AuditLogConfig(AppConfig):
     name = 'audit_log'
 
     def ready(self):
-        import audit_log.signals
+        from audit_log.signals import connect_audit_signals
+        connect_audit_signals()
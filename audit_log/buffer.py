@@ -0,0 +1,85 @@
+"""
+Batched audit log writes.
+
+Model signals ``record`` entries; each entry is released only when the
+transaction that produced it commits (``transaction.on_commit``), so work that
+rolls back, including a rolled-back savepoint, is never logged. Released
+entries collect in the active ``audit_buffer`` (one per request, opened by
+``AuditMiddleware``) and are written with a single ``bulk_create``, or handed
+to the ``write_audit_entries`` Celery task when ``AUDIT_LOG_ASYNC`` is on.
+Outside a buffer each committed entry is written on its own.
+"""
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_committed_entries = ContextVar('audit_log_committed_entries', default=None)
+
+
+def sample_rate(model_name):
+    """Fraction of events kept for ``model_name`` (``AUDIT_LOG_SAMPLE_RATES``, default 1)."""
+    rates = getattr(settings, 'AUDIT_LOG_SAMPLE_RATES', {}) or {}
+    return rates.get(model_name, rates.get('*', 1.0))
+
+
+def sampled(model_name):
+    rate = sample_rate(model_name)
+    return rate >= 1 or random.random() < rate
+
+
+def record(entry, using=None):
+    """Queue one ``AuditLog`` field dict for writing once its transaction commits."""
+    transaction.on_commit(partial(_release, entry), using=using)
+
+
+def _release(entry):
+    pending = _committed_entries.get()
+    if pending is not None:
+        pending.append(entry)
+    else:
+        write_entries([entry])
+
+
+@contextmanager
+def audit_buffer():
+    """Collect committed entries inside the block and write them together on exit."""
+    if _committed_entries.get() is not None:
+        yield
+        return
+
+    pending = []
+    token = _committed_entries.set(pending)
+    try:
+        yield
+    finally:
+        _committed_entries.reset(token)
+        if pending:
+            write_entries(pending)
+
+
+def write_entries(entries):
+    """Persist entries now, or hand them to Celery when ``AUDIT_LOG_ASYNC`` is set."""
+    if getattr(settings, 'AUDIT_LOG_ASYNC', False):
+        from .tasks import write_audit_entries
+        try:
+            write_audit_entries.delay(entries)
+            return
+        except Exception:
+            logger.exception("Could not queue %s audit entries; writing inline", len(entries))
+    bulk_write(entries)
+
+
+def bulk_write(entries):
+    from .models import AuditLog
+    try:
+        AuditLog.objects.bulk_create([AuditLog(**entry) for entry in entries], batch_size=500)
+    except Exception:
+        # Auditing must never break the request that already committed.
+        logger.exception("Failed to write %s audit entries", len(entries))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from audit_log.partitions import add_months, archive_months_before, ensure_partitions, month_start, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Archives audit log months older than the retention window to compressed files and removes them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, help='Months to keep (defaults to AUDIT_LOG_RETENTION_MONTHS)')
+        parser.add_argument('--dry-run', action='store_true', help='List the months that would be archived')
+
+    def handle(self, *args, **options):
+        if options['months'] is not None:
+            cutoff = add_months(month_start(timezone.localdate()), -options['months'])
+        else:
+            cutoff = retention_cutoff()
+
+        if not options['dry_run']:
+            ensure_partitions()
+
+        archived = archive_months_before(cutoff, dry_run=options['dry_run'])
+        for month, path, count in archived:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {month:%Y-%m}")
+            else:
+                self.stdout.write(f"Archived {month:%Y-%m}: {count} rows -> {path or '(empty)'}")
+        self.stdout.write(self.style.SUCCESS(f"{len(archived)} month(s) before {cutoff:%Y-%m} processed."))
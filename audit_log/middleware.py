@@ -1,5 +1,7 @@
 from threading import local
 
+from .buffer import audit_buffer
+
 _thread_locals = local()
 
 def get_current_user():
@@ -12,6 +14,7 @@ class AuditMiddleware:
     """
     Middleware to store the request/user in thread local storage.
     This allows signals to access the current user/IP even outside views.
+    It also opens the per-request audit buffer.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -20,7 +23,9 @@ class AuditMiddleware:
         _thread_locals.user = getattr(request, 'user', None)
         _thread_locals.request = request
         
-        response = self.get_response(request)
+        # Audit entries committed during the request are written in one batch.
+        with audit_buffer():
+            response = self.get_response(request)
         
         # Cleanup
         if hasattr(_thread_locals, 'user'):
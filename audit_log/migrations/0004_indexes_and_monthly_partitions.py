@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_by_month(apps, schema_editor):
+    from audit_log.partitions import convert_to_partitioned
+    convert_to_partitioned(schema_editor.connection)
+
+
+def unpartition(apps, schema_editor):
+    from audit_log.partitions import convert_to_plain
+    convert_to_plain(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_log', '0003_add_download_action_choice'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['tenant', 'timestamp', 'id'], name='audit_tenant_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['tenant', 'model_name', 'timestamp'], name='audit_tenant_model_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['tenant', 'action', 'timestamp'], name='audit_tenant_action_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['model_name', 'object_id'], name='audit_object_idx'),
+        ),
+        # PostgreSQL only; other databases keep the plain table.
+        migrations.RunPython(partition_by_month, unpartition),
+    ]
@@ -45,6 +45,13 @@ class AuditLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        # Stored in monthly partitions on PostgreSQL, see audit_log.partitions.
+        indexes = [
+            models.Index(fields=['tenant', 'timestamp', 'id'], name='audit_tenant_ts_idx'),
+            models.Index(fields=['tenant', 'model_name', 'timestamp'], name='audit_tenant_model_ts_idx'),
+            models.Index(fields=['tenant', 'action', 'timestamp'], name='audit_tenant_action_ts_idx'),
+            models.Index(fields=['model_name', 'object_id'], name='audit_object_idx'),
+        ]
         verbose_name = _('Audit Log')
         verbose_name_plural = _('Audit Logs')
 
@@ -0,0 +1,263 @@
+"""
+Monthly storage for ``AuditLog``.
+
+On PostgreSQL the table is range-partitioned by ``timestamp`` into one
+partition per month (``audit_log_auditlog_pYYYYMM``) plus a default partition.
+Old months are archived by exporting them to a gzip NDJSON file and dropping
+the whole partition, so retention never runs a large ``DELETE`` and leaves
+nothing to vacuum. Other databases (SQLite in development and tests) keep a
+plain table; archiving there exports the month and deletes its rows.
+"""
+import gzip
+import json
+import logging
+import tempfile
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+TABLE = AuditLog._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+ARCHIVE_DIR = 'audit_archive'
+EXPORT_CHUNK_SIZE = 5000
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def _bound(month):
+    return timezone.make_aware(datetime.combine(month, time.min)) if settings.USE_TZ else datetime.combine(month, time.min)
+
+
+def is_partitioned(conn=connection):
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partition_months(conn=connection):
+    """Months that currently have their own partition, oldest first."""
+    if not is_partitioned(conn):
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname LIKE %s
+            """,
+            [TABLE, f'{TABLE}_p%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(datetime.strptime(name[-6:], '%Y%m').date() for name in names)
+
+
+def create_partition(month, conn=connection):
+    """Create the partition for ``month`` if it does not exist."""
+    quote = conn.ops.quote_name
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {quote(partition_name(month))} PARTITION OF {quote(TABLE)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [_bound(month), _bound(add_months(month, 1))],
+        )
+
+
+def ensure_partitions(months_ahead=2, conn=connection):
+    """Make sure the current month and the next ``months_ahead`` months have partitions."""
+    if not is_partitioned(conn):
+        return []
+    current = month_start(timezone.localdate())
+    months = [add_months(current, offset) for offset in range(months_ahead + 1)]
+    for month in months:
+        create_partition(month, conn)
+    return months
+
+
+def _rename_primary_key(cursor, table, quote):
+    """Free the ``<table>_pkey`` name so the rebuilt table can take it."""
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'", [table])
+    row = cursor.fetchone()
+    if row:
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME CONSTRAINT {quote(row[0])} TO {quote(table + '_pkey')}")
+
+
+def _local_date(value):
+    return timezone.localtime(value).date() if settings.USE_TZ else value.date()
+
+
+def convert_to_partitioned(conn=connection, first_month=None, months_ahead=2):
+    """
+    Rebuild the plain ``AuditLog`` table as a monthly range-partitioned table,
+    keeping its rows, indexes and foreign keys. PostgreSQL only; the primary
+    key becomes ``(id, timestamp)`` because it must include the partition key.
+    """
+    if conn.vendor != 'postgresql' or is_partitioned(conn):
+        return
+    quote = conn.ops.quote_name
+    legacy = f'{TABLE}_unpartitioned'
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE %s",
+            [TABLE, '%_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT min(timestamp) FROM {quote(TABLE)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(legacy)}")
+        _rename_primary_key(cursor, legacy, quote)
+        cursor.execute(
+            f"CREATE TABLE {quote(TABLE)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (timestamp)"
+        )
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, timestamp)")
+        cursor.execute(f"CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT")
+
+        start = month_start(first_month or (_local_date(oldest) if oldest else timezone.localdate()))
+        last = add_months(month_start(timezone.localdate()), months_ahead)
+        month = start
+        while month <= last:
+            create_partition(month, conn)
+            month = add_months(month, 1)
+
+        cursor.execute(f"INSERT INTO {quote(TABLE)} SELECT * FROM {quote(legacy)}")
+        cursor.execute(f"DROP TABLE {quote(legacy)}")
+        for _name, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def convert_to_plain(conn=connection):
+    """Reverse of ``convert_to_partitioned``."""
+    if not is_partitioned(conn):
+        return
+    quote = conn.ops.quote_name
+    partitioned = f'{TABLE}_partitioned'
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE %s",
+            [TABLE, '%_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(partitioned)}")
+        _rename_primary_key(cursor, partitioned, quote)
+        cursor.execute(
+            f"CREATE TABLE {quote(TABLE)} (LIKE {quote(partitioned)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id)")
+        cursor.execute(f"INSERT INTO {quote(TABLE)} SELECT * FROM {quote(partitioned)}")
+        cursor.execute(f"DROP TABLE {quote(partitioned)} CASCADE")
+        for _name, definition in indexes:
+            cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def _serialize(row):
+    return json.dumps(row, separators=(',', ':'), default=str)
+
+
+def export_month(month, storage=default_storage):
+    """
+    Write every ``AuditLog`` row of ``month`` to ``audit_archive/audit_log_YYYYMM.ndjson.gz``
+    and return ``(path, row_count)``; an empty month writes nothing and returns
+    ``(None, 0)``. Rows are streamed and compressed through a spooled temp file.
+    """
+    rows = (
+        AuditLog.objects.filter(timestamp__gte=_bound(month), timestamp__lt=_bound(add_months(month, 1)))
+        .order_by()
+        .values()
+    )
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buffer:
+        count = 0
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as archive:
+            for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                archive.write(_serialize(row).encode('utf-8') + b'\n')
+                count += 1
+        if not count:
+            return None, 0
+        path = f'{ARCHIVE_DIR}/audit_log_{month:%Y%m}.ndjson.gz'
+        if storage.exists(path):
+            storage.delete(path)
+        buffer.seek(0)
+        return storage.save(path, File(buffer)), count
+
+
+def archive_months_before(cutoff, storage=default_storage, dry_run=False):
+    """
+    Export and remove every month that ends on or before ``cutoff`` (a month
+    start). Returns ``[(month, path, row_count)]``; ``dry_run`` only lists months.
+    """
+    cutoff = month_start(cutoff)
+    if is_partitioned():
+        months = [month for month in partition_months() if month < cutoff]
+    else:
+        oldest = AuditLog.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+        months = []
+        if oldest is not None:
+            month = month_start(_local_date(oldest))
+            while month < cutoff:
+                months.append(month)
+                month = add_months(month, 1)
+
+    archived = []
+    for month in months:
+        if dry_run:
+            archived.append((month, None, None))
+            continue
+        path, count = export_month(month, storage)
+        with transaction.atomic():
+            if is_partitioned():
+                quote = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(partition_name(month))}")
+                    cursor.execute(f"DROP TABLE {quote(partition_name(month))}")
+            else:
+                AuditLog.objects.filter(
+                    timestamp__gte=_bound(month), timestamp__lt=_bound(add_months(month, 1))
+                ).delete()
+        logger.info("Archived %s audit log rows for %s to %s", count, f'{month:%Y-%m}', path)
+        archived.append((month, path, count))
+    return archived
+
+
+def retention_cutoff(today=None):
+    """First month kept under ``AUDIT_LOG_RETENTION_MONTHS``."""
+    today = today or timezone.localdate()
+    return add_months(month_start(today), -getattr(settings, 'AUDIT_LOG_RETENTION_MONTHS', 12))
@@ -1,8 +1,7 @@
-from threading import local
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.forms.models import model_to_dict
-from .models import AuditLog
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save
+from .buffer import record, sampled
 from .middleware import get_current_user, get_current_request
 import json
 from decimal import Decimal
@@ -12,7 +11,11 @@ import uuid
 # Models to exclude from logging to avoid noise/recursion
 EXCLUDED_MODELS = [
     'AuditLog', 'Session', 'LogEntry', 'Migration', 'ContentType', 
-    'Permission', 'Group', 'Token', 'OutstandingToken', 'BlacklistedToken'
+    'Permission', 'Group', 'Token', 'OutstandingToken', 'BlacklistedToken',
+    # Derived costing rows, rebuilt from stock documents on every posting.
+    'CostLayer', 'IssueCost', 'ProductCost', 'ValuationSnapshot',
+    # Append-only stock movement ledger; the documents behind it are audited.
+    'StockMovement', 'StockCheckpoint',
 ]
 
 # Fields to exclude from diffing (noisy system fields)
@@ -45,92 +48,131 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
-# Store old instance state for diffing
-_old_instances = local()
+def _jsonable(value):
+    """Cheap per-value equivalent of a round-trip through ``AuditJSONEncoder``."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (list, dict)):
+        return json.loads(json.dumps(value, cls=AuditJSONEncoder))
+    return str(value)
 
-@receiver(post_save)
-def audit_log_save(sender, instance, created, **kwargs):
-    if sender.__name__ in EXCLUDED_MODELS:
-        return
-        
+
+def is_audited(model):
+    """
+    ``AUDIT_LOG_MODELS`` ("app_label.Model" or "Model" names) limits auditing
+    to those models; when empty every model outside ``EXCLUDED_MODELS`` is audited.
+    """
+    if model.__name__ in EXCLUDED_MODELS or model._meta.abstract or model._meta.proxy:
+        return False
+    allowlist = getattr(settings, 'AUDIT_LOG_MODELS', None)
+    if not allowlist:
+        return True
+    return model.__name__ in allowlist or model._meta.label in allowlist
+
+
+_audit_fields_by_model = {}
+
+
+def _audit_fields(model):
+    fields = _audit_fields_by_model.get(model)
+    if fields is None:
+        # Editable concrete fields, as ``model_to_dict`` reported them (by name, FKs as ids)
+        fields = _audit_fields_by_model[model] = tuple(
+            (field.name, field.attname) for field in model._meta.concrete_fields
+            if field.editable and field.name not in EXCLUDED_FIELDS
+        )
+    return fields
+
+
+def _state(instance):
+    loaded = instance.__dict__
+    return {name: loaded[attname] for name, attname in _audit_fields(type(instance)) if attname in loaded}
+
+
+def audit_log_snapshot(sender, instance, **kwargs):
+    """Remember loaded field values so updates can be diffed without a re-fetch."""
+    # ``_state.adding`` is only cleared after ``__init__``, so every instance is snapshotted.
+    instance._audit_snapshot = _state(instance)
+
+
+def _actor():
     request = get_current_request()
     user = getattr(request, 'user', None) if request else get_current_user()
-    
-    action = 'CREATE' if created else 'UPDATE'
-    
-    changes = {}
-    try:
-        new_state = {k: v for k, v in model_to_dict(instance).items() if k not in EXCLUDED_FIELDS}
-        if created:
-            changes = new_state
-        else:
-            # Try to get old state from thread local
-            old_state = getattr(_old_instances, str(instance.pk), None)
-            if old_state:
-                for field, new_val in new_state.items():
-                    if field in EXCLUDED_FIELDS:
-                        continue
-                    old_val = old_state.get(field)
-                    if old_val != new_val:
-                        changes[field] = {'old': old_val, 'new': new_val}
-                # Cleanup
-                delattr(_old_instances, str(instance.pk))
-            else:
-                # Fallback if pre_save didn't catch it
-                changes = new_state
-    except:
-        changes = {}
+    if request is not None and hasattr(request, '_audit_actor'):
+        return request, request._audit_actor
 
+    if user and getattr(user, 'is_authenticated', False):
+        tenant = getattr(user, 'active_tenant', None)
+        actor = {
+            'tenant_id': str(tenant.pk) if tenant else None,
+            'user_id': str(user.pk),
+            'user_email': getattr(user, 'email', 'system'),
+        }
+    else:
+        actor = {'tenant_id': None, 'user_id': None, 'user_email': 'system'}
+    actor['ip_address'] = get_client_ip(request) if request else None
+    if request is not None and actor['user_id']:
+        request._audit_actor = actor
+    return request, actor
+
+
+def _record(sender, instance, action, changes, using):
+    request, actor = _actor()
     if request and request.path.startswith('/admin/'):
         return
+    record({
+        **actor,
+        'action': action,
+        'model_name': sender.__name__,
+        'object_id': str(instance.pk),
+        'object_repr': str(instance)[:255],
+        'changes': changes,
+    }, using=using)
 
-    if action == 'UPDATE' and not changes:
-        return # Nothing changed
-
-    AuditLog.objects.create(
-        tenant=getattr(user, 'active_tenant', None) if user and getattr(user, 'is_authenticated', False) else None,
-        user=user if user and getattr(user, 'is_authenticated', False) else None,
-        user_email=getattr(user, 'email', 'system') if user and getattr(user, 'is_authenticated', False) else 'system',
-        action=action,
-        model_name=sender.__name__,
-        object_id=str(instance.pk),
-        object_repr=str(instance)[:255],
-        changes=json.loads(json.dumps(changes, cls=AuditJSONEncoder)),
-        ip_address=get_client_ip(request) if request else None
-    )
-
-from django.db.models.signals import pre_save
-@receiver(pre_save)
-def audit_log_pre_save(sender, instance, **kwargs):
-    if sender.__name__ in EXCLUDED_MODELS:
-        return
-    if instance.pk:
-        try:
-            old_instance = sender.objects.get(pk=instance.pk)
-            old_dict = {k: v for k, v in model_to_dict(old_instance).items() if k not in EXCLUDED_FIELDS}
-            setattr(_old_instances, str(instance.pk), old_dict)
-        except:
-            pass
-
-@receiver(post_delete)
-def audit_log_delete(sender, instance, **kwargs):
-    if sender.__name__ in EXCLUDED_MODELS:
+
+def audit_log_save(sender, instance, created, using=None, **kwargs):
+    new_state = _state(instance)
+    old_state = getattr(instance, '_audit_snapshot', None)
+    instance._audit_snapshot = new_state
+    if not sampled(sender.__name__):
         return
 
-    request = get_current_request()
-    user = getattr(request, 'user', None) if request else get_current_user()
+    try:
+        if created or old_state is None:
+            changes = {field: _jsonable(value) for field, value in new_state.items()}
+        else:
+            changes = {
+                field: {'old': _jsonable(old_state[field]), 'new': _jsonable(new_val)}
+                for field, new_val in new_state.items()
+                if field in old_state and old_state[field] != new_val
+            }
+    except Exception:
+        changes = {}
 
-    if request and request.path.startswith('/admin/'):
+    if not created and not changes:
+        return  # Nothing changed
+
+    _record(sender, instance, 'CREATE' if created else 'UPDATE', changes, using)
+
+
+def audit_log_delete(sender, instance, using=None, **kwargs):
+    if not sampled(sender.__name__):
         return
+    _record(sender, instance, 'DELETE', {}, using)  # Deleted, no changes to track
+
 
-    AuditLog.objects.create(
-        tenant=getattr(user, 'active_tenant', None) if user and getattr(user, 'is_authenticated', False) else None,
-        user=user if user and getattr(user, 'is_authenticated', False) else None,
-        user_email=getattr(user, 'email', 'system') if user and getattr(user, 'is_authenticated', False) else 'system',
-        action='DELETE',
-        model_name=sender.__name__,
-        object_id=str(instance.pk),
-        object_repr=str(instance)[:255],
-        changes={}, # Deleted, no changes to track, or log snapshot
-        ip_address=get_client_ip(request) if request else None
-    )
+def connect_audit_signals():
+    """Attach the audit receivers to every audited model."""
+    for model in apps.get_models():
+        if not is_audited(model):
+            continue
+        uid = f'audit_log:{model._meta.label}'
+        post_init.connect(audit_log_snapshot, sender=model, dispatch_uid=uid)
+        post_save.connect(audit_log_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(audit_log_delete, sender=model, dispatch_uid=uid)
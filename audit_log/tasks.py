@@ -0,0 +1,25 @@
+import logging
+
+from celery import shared_task
+
+from .buffer import bulk_write
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def write_audit_entries(entries):
+    """Write a batch of audit entries queued by ``audit_log.buffer``."""
+    bulk_write(entries)
+
+
+@shared_task
+def maintain_audit_log_storage():
+    """Create upcoming monthly partitions and archive months past retention."""
+    from .partitions import archive_months_before, ensure_partitions, retention_cutoff
+
+    ensure_partitions()
+    archived = archive_months_before(retention_cutoff())
+    if archived:
+        logger.info("Archived %s audit log month(s)", len(archived))
+    return len(archived)
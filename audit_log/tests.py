@@ -1,3 +1,147 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+from datetime import datetime, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from billing.models import Customer
+from inventory.models import Product
+
+from .buffer import audit_buffer
+from .models import AuditLog
+from .signals import is_audited
+
+User = get_user_model()
+
+
+class AuditPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="audit_user", email="audit@test.com", password="testpass")
+        self.product = Product.objects.create(name="Widget", price=10, created_by=self.user)
+        AuditLog.objects.all().delete()
+
+    def test_update_diffs_against_load_snapshot_without_refetch(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = "Widget v2"
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                product.save()
+        self.assertFalse([q for q in queries.captured_queries if q["sql"].startswith("SELECT")])
+
+        log = AuditLog.objects.get(action="UPDATE", object_id=str(product.pk))
+        self.assertEqual(log.changes, {"name": {"old": "Widget", "new": "Widget v2"}})
+
+        # The snapshot moves forward, so an unchanged save logs nothing.
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(AuditLog.objects.filter(action="UPDATE").count(), 1)
+
+    def test_buffer_writes_committed_entries_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            with audit_buffer():
+                with self.captureOnCommitCallbacks(execute=True):
+                    for index in range(3):
+                        Product.objects.create(name=f"Bulk {index}", created_by=self.user)
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "audit_log_auditlog"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AuditLog.objects.filter(action="CREATE", model_name="Product").count(), 3)
+
+    def test_rolled_back_work_is_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Product.objects.create(name="Ghost", created_by=self.user)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.product.delete()
+        self.assertEqual(list(AuditLog.objects.values_list("action", flat=True)), ["DELETE"])
+
+    @override_settings(AUDIT_LOG_SAMPLE_RATES={"Product": 0})
+    def test_sampling_drops_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Unsampled", created_by=self.user)
+            Customer.objects.create(name="Sampled", created_by=self.user)
+        self.assertEqual(list(AuditLog.objects.values_list("model_name", flat=True)), ["Customer"])
+
+    def test_allowlist_limits_audited_models(self):
+        self.assertTrue(is_audited(Product))
+        self.assertFalse(is_audited(AuditLog))
+        with override_settings(AUDIT_LOG_MODELS=["billing.Customer"]):
+            self.assertTrue(is_audited(Customer))
+            self.assertFalse(is_audited(Product))
+
+
+class AuditStorageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="audit_reader", email="reader@test.com", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        AuditLog.objects.all().delete()
+
+    def _log(self, when, **fields):
+        log = AuditLog.objects.create(
+            tenant=self.user, user=self.user, user_email=self.user.email, action="UPDATE",
+            model_name=fields.pop("model_name", "Product"), object_id=fields.pop("object_id", "1"), **fields,
+        )
+        AuditLog.objects.filter(pk=log.pk).update(timestamp=when)
+        return log
+
+    def test_keyset_pages_cover_every_row_once(self):
+        now = timezone.now()
+        expected = [str(self._log(now - timedelta(hours=hour)).pk) for hour in range(5)]
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            res = self.client.get("/api/audit/logs/", params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [row["id"] for row in res.data["results"]]
+            cursor = res.data["next_cursor"]
+            if not res.data["has_more"]:
+                break
+        self.assertEqual(seen, expected)
+        self.assertIsNone(cursor)
+
+        res = self.client.get("/api/audit/logs/", {"cursor": "not-a-cursor"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_date_and_object_filters(self):
+        today = timezone.localdate()
+        self._log(timezone.now(), object_id="a")
+        self._log(timezone.now() - timedelta(days=10), object_id="a")
+        self._log(timezone.now(), object_id="b")
+
+        res = self.client.get("/api/audit/logs/", {"limit": 10, "date_from": today.isoformat(), "object_id": "a"})
+        self.assertEqual(len(res.data["results"]), 1)
+        # The page-number listing accepts the same filters.
+        res = self.client.get("/api/audit/logs/", {"date_to": (today - timedelta(days=1)).isoformat()})
+        self.assertEqual(res.data["count"], 1)
+
+    def test_archive_exports_and_removes_old_months(self):
+        from audit_log.partitions import add_months, archive_months_before, month_start
+
+        current = month_start(timezone.localdate())
+        old_month = add_months(current, -14)
+        old_time = timezone.make_aware(datetime.combine(old_month.replace(day=5), time(12)))
+        old = [self._log(old_time, object_id=str(index)) for index in range(3)]
+        recent = self._log(timezone.now())
+
+        with tempfile.TemporaryDirectory() as root:
+            storage = FileSystemStorage(location=root)
+            archived = archive_months_before(add_months(current, -12), storage=storage)
+
+            self.assertEqual([(month, count) for month, _path, count in archived if count], [(old_month, 3)])
+            path = next(path for _month, path, count in archived if count)
+            with storage.open(path) as archive:
+                rows = [json.loads(line) for line in gzip.decompress(archive.read()).splitlines()]
+        self.assertEqual(sorted(row["id"] for row in rows), sorted(str(log.pk) for log in old))
+        self.assertEqual(list(AuditLog.objects.values_list("pk", flat=True)), [recent.pk])
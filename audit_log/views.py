@@ -1,16 +1,74 @@
-from rest_framework import generics, permissions
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+
+from cenvoras.pagination import InvalidCursor, cursor_key, decode_cursor, encode_cursor, keyset_page, parse_page_limit
+
 from .models import AuditLog
 from .serializers import AuditLogSerializer
 
+AUDIT_KEYSET_FIELDS = ('timestamp', 'id')
+AUDIT_PAGE_SIZE = 50
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 class AuditLogListView(generics.ListAPIView):
+    """
+    Tenant audit trail, newest first. ``?date_from=``/``?date_to=`` (YYYY-MM-DD)
+    bound the range, which lets PostgreSQL skip monthly partitions. Passing
+    ``?limit=`` or ``?cursor=`` switches to keyset pages (``next_cursor``,
+    ``has_more``) that never count or offset the table.
+    """
     serializer_class = AuditLogSerializer
     
     def get_queryset(self):
         # Exclude internal system actions (e.g. migrations, background tasks)
         # Filter by tenant to ensure account isolation
         tenant = self.request.user.active_tenant
-        return AuditLog.objects.filter(tenant=tenant).select_related('user').exclude(user_email='system').order_by('-timestamp')
+        queryset = AuditLog.objects.filter(tenant=tenant).select_related('user').exclude(user_email='system')
+        date_from = parse_date(self.request.query_params.get('date_from') or '')
+        date_to = parse_date(self.request.query_params.get('date_to') or '')
+        # Plain range bounds on the column keep partition pruning and the indexes usable.
+        if date_from:
+            queryset = queryset.filter(timestamp__gte=_day_start(date_from))
+        if date_to:
+            queryset = queryset.filter(timestamp__lt=_day_start(date_to + timedelta(days=1)))
+        object_id = self.request.query_params.get('object_id')
+        if object_id:
+            queryset = queryset.filter(object_id=object_id)
+        return queryset.order_by('-timestamp')
     permission_classes = [permissions.IsAuthenticated] # Later restrict to Admin/Manager
     filterset_fields = ['action', 'model_name', 'user__email']
     search_fields = ['object_repr', 'changes', 'user_email']
     ordering_fields = ['timestamp']
+
+    def list(self, request, *args, **kwargs):
+        if 'limit' not in request.query_params and 'cursor' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            limit = parse_page_limit(request.query_params.get('limit'), default=AUDIT_PAGE_SIZE)
+            cursor = request.query_params.get('cursor')
+            after = cursor_key(decode_cursor(cursor), AuditLog, AUDIT_KEYSET_FIELDS) if cursor else None
+        except InvalidCursor as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logs, has_more = keyset_page(
+            self.filter_queryset(self.get_queryset()), AUDIT_KEYSET_FIELDS, limit, after=after, descending=True,
+        )
+        next_cursor = None
+        if has_more:
+            last = logs[-1]
+            next_cursor = encode_cursor({'timestamp': last.timestamp.isoformat(), 'id': str(last.id)})
+        return Response({
+            'count': len(logs),
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+            'results': self.get_serializer(logs, many=True).data,
+        })
@@ -0,0 +1,158 @@
+"""
+FEFO batch allocation for sales invoices.
+
+Lines sent without a batch are allocated for the whole invoice at once. One
+query locks the candidate ``StockPoint`` rows of every product on the invoice
+in the invoice's warehouse with ``select_for_update``, in pk order, so
+counters selling overlapping SKUs in parallel queue behind each other in the
+same order instead of deadlocking. The rows are then sorted earliest expiry
+first in memory, each line is split across as many batches as it needs, and
+the resulting plan (one line per batch) is posted in bulk by
+``billing.posting`` inside the same transaction, so the locks cover the
+stock update.
+
+A shortage raises ``InsufficientStock`` rather than drive a ``StockPoint``
+negative. Products without any active batch are not batch-tracked and pass
+through unchanged.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db.models import Q
+
+from inventory.models import Product, ProductBatch, StockPoint, Warehouse
+
+
+class InsufficientStock(ValueError):
+    """The batch stock cannot cover every line of the invoice."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__('; '.join(
+            f"{name}: {requested} {unit} requested, {available} available"
+            for name, requested, available, unit in shortages
+        ))
+
+
+def resolve_warehouse(tenant, warehouse=None):
+    """The warehouse an invoice sells from, as ``billing.posting`` resolves it."""
+    if warehouse is not None:
+        return warehouse
+    return Warehouse.objects.filter(created_by=tenant, is_active=True).first()
+
+
+def _unit_factor(product, unit):
+    if product.secondary_unit and unit == product.secondary_unit:
+        return product.conversion_factor or 1
+    return 1
+
+
+def _lock_stock_points(warehouse, product_ids, released):
+    """
+    ``[(pk, batch_id, product_id, available, expiry_date, created_at)]`` for
+    the candidate rows, locked in pk order so concurrent allocations cannot
+    deadlock; callers sort them FEFO with ``_fefo_key``.
+    """
+    stock_points = (
+        StockPoint.objects.select_for_update(of=('self',))
+        .filter(warehouse=warehouse, batch__product_id__in=product_ids, batch__is_active=True)
+        .filter(Q(quantity__gt=0) | Q(batch_id__in=list(released)))
+        .order_by('pk')
+    )
+    return [
+        (pk, batch_id, product_id, quantity + released.get(batch_id, 0), expiry_date, created_at)
+        for pk, batch_id, product_id, quantity, expiry_date, created_at in stock_points.values_list(
+            'pk', 'batch_id', 'batch__product_id', 'quantity', 'batch__expiry_date', 'batch__created_at',
+        )
+    ]
+
+
+def _fefo_key(point):
+    _pk, _batch_id, _product_id, _quantity, expiry_date, created_at = point
+    return (expiry_date is None, expiry_date or date.min, created_at, point[0])
+
+
+def _split_lines(items_data, pending_ids, products, points):
+    """``(plan, shortages)`` for splitting the pending lines across ``points``."""
+    available = defaultdict(list)
+    for _pk, batch_id, product_id, quantity, _expiry, _created in sorted(points, key=_fefo_key):
+        if quantity > 0:
+            available[product_id].append([batch_id, quantity])
+
+    plan = []
+    shortages = []
+    for item in items_data:
+        if id(item) not in pending_ids:
+            plan.append(item)
+            continue
+
+        line = {key: value for key, value in item.items() if key != 'batch'}
+        product = products[item['product'].pk]
+        factor = _unit_factor(product, item.get('unit'))
+        paid, free = item.get('quantity') or 0, item.get('free_quantity') or 0
+        parts = []
+        for point in available.get(product.pk, []):
+            if not paid and not free:
+                break
+            units = point[1] // factor
+            if units <= 0:
+                continue
+            paid_take = min(paid, units)
+            free_take = min(free, units - paid_take)
+            if not paid_take and not free_take:
+                continue
+            paid, free = paid - paid_take, free - free_take
+            point[1] -= (paid_take + free_take) * factor
+            parts.append({**line, 'batch_id': point[0], 'quantity': paid_take, 'free_quantity': free_take})
+
+        if paid or free:
+            requested = (item.get('quantity') or 0) + (item.get('free_quantity') or 0)
+            shortages.append((product, requested, requested - paid - free, item.get('unit') or product.unit))
+            continue
+        plan.extend(parts)
+    return plan, shortages
+
+
+def allocate_fefo(warehouse, items_data, *, released=None):
+    """
+    Return ``items_data`` with every line without a ``batch`` split across
+    batches, earliest expiry first, each part carrying its ``batch_id``.
+    ``released`` maps batch ids to stock (in primary units) that the posting
+    gives back first, i.e. the lines an edited invoice replaces.
+
+    Must run inside the transaction that posts the plan.
+    """
+    released = released or {}
+    pending = [item for item in items_data if item.get('batch') is None and item.get('product') is not None]
+    if not pending or warehouse is None:
+        return list(items_data)
+
+    product_ids = {item['product'].pk for item in pending}
+    tracked = set(
+        ProductBatch.objects.filter(product_id__in=product_ids, is_active=True)
+        .order_by().values_list('product_id', flat=True).distinct()
+    )
+    if not tracked:
+        return list(items_data)
+
+    products = Product.objects.only('name', 'unit', 'secondary_unit', 'conversion_factor').in_bulk(tracked)
+    pending_ids = {id(item) for item in pending if item['product'].pk in tracked}
+    points = _lock_stock_points(warehouse, list(tracked), released)
+    plan, shortages = _split_lines(items_data, pending_ids, products, points)
+    if shortages:
+        raise InsufficientStock([
+            (product.name, requested, available, unit) for product, requested, available, unit in shortages
+        ])
+    return plan
+
+
+def released_stock(invoice):
+    """``{batch_id: stock units}`` the invoice's current lines hold, for re-allocating an edit."""
+    released = defaultdict(int)
+    lines = invoice.items.filter(batch__isnull=False).values_list(
+        'batch_id', 'quantity', 'free_quantity', 'unit', 'product__secondary_unit', 'product__conversion_factor',
+    )
+    for batch_id, quantity, free_quantity, unit, secondary_unit, conversion_factor in lines:
+        factor = conversion_factor if secondary_unit and unit == secondary_unit else 1
+        released[batch_id] += ((quantity or 0) + (free_quantity or 0)) * (factor or 1)
+    return released
@@ -0,0 +1,388 @@
+"""
+Set-based sales invoice CSV import.
+
+Rows are read in chunks of about ``CHUNK_ROWS``; a chunk only ends between two
+bills, so the lines of a bill (consecutive rows sharing ``bill_number``) become
+one multi-line invoice. Per chunk the customers, products and already-used
+invoice numbers are loaded in a handful of queries, missing customers and
+products are created with ``bulk_create``, and the invoices and their line
+items are written in bulk. Stock moves through ``billing.posting`` in one
+aggregated pass, ledger rows go in with a single ``bulk_create`` and customer
+balances, document sequences and analytics rollups are updated once per
+chunk. Each chunk commits on its own, so progress survives a late failure.
+
+Rows are checked against the column limits of the models they land in before
+anything is written. If a chunk still fails in the database, it is retried one
+bill at a time under a savepoint each, so a bad bill is reported against its
+first row instead of aborting the import.
+"""
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+from analytics.rollups import batched_rollups, note_changed
+from inventory.models import Product
+
+from .models import Customer, DocumentSequence, SalesInvoice, SalesInvoiceItem
+from .posting import post_sales_invoices
+from .sequences import fiscal_year, record_number
+
+CHUNK_ROWS = 2000
+REQUIRED_HEADERS = ('bill_number', 'sale_date', 'customer_name', 'product_name', 'quantity', 'price')
+
+_HUNDRED = Decimal('100')
+_CENT = Decimal('0.01')
+_NUMBER_RE = re.compile(r'^(?P<prefix>.*?)(?P<number>\d+)$')
+_date_field = SalesInvoice._meta.get_field('invoice_date')
+
+# CSV column -> model field whose limits the column's value must fit.
+_TEXT_FIELDS = {
+    'bill_number': SalesInvoice._meta.get_field('invoice_number'),
+    'customer_name': SalesInvoice._meta.get_field('customer_name'),
+    'customer_gstin': Customer._meta.get_field('gstin'),
+    'product_name': Product._meta.get_field('name'),
+    'unit': SalesInvoiceItem._meta.get_field('unit'),
+    'hsn_code': SalesInvoiceItem._meta.get_field('hsn_sac_code'),
+}
+_NUMBER_FIELDS = {
+    'quantity': SalesInvoiceItem._meta.get_field('quantity'),
+    'price': SalesInvoiceItem._meta.get_field('price'),
+    'discount': SalesInvoiceItem._meta.get_field('discount'),
+    'tax': Product._meta.get_field('tax'),
+    'amount': SalesInvoiceItem._meta.get_field('amount'),
+}
+_MAX_INTEGER = 2147483647
+
+
+def _text(row, key):
+    return (row.get(key) or '').strip()
+
+
+def _decimal(row, key, default='0'):
+    try:
+        return Decimal(str(row.get(key) or default).strip())
+    except InvalidOperation:
+        raise ValueError(f'Invalid number in column {key}: {row.get(key)!r}.')
+
+
+def _date(value):
+    try:
+        return _date_field.to_python(value)
+    except ValidationError as exc:
+        raise ValueError(' '.join(exc.messages))
+
+
+def _check_limits(line):
+    for key, field in _TEXT_FIELDS.items():
+        if len(line[key]) > field.max_length:
+            raise ValueError(f'Column {key} is longer than {field.max_length} characters.')
+    for key, field in _NUMBER_FIELDS.items():
+        value = line[key]
+        if field.get_internal_type() == 'PositiveIntegerField':
+            if value > _MAX_INTEGER:
+                raise ValueError(f'Column {key} is too large: {value}.')
+            continue
+        if not value.is_finite() or abs(value) >= Decimal(10) ** (field.max_digits - field.decimal_places):
+            raise ValueError(
+                f'Column {key} must have at most {field.max_digits - field.decimal_places} digits '
+                f'before the decimal point: {value}.'
+            )
+
+
+def parse_row(row):
+    """Validate one CSV row and return its header and line fields."""
+    bill_number = _text(row, 'bill_number')
+    sale_date = _text(row, 'sale_date')
+    customer_name = _text(row, 'customer_name')
+    product_name = _text(row, 'product_name')
+    try:
+        quantity = int(float(row.get('quantity') or 0))
+    except (ValueError, OverflowError):
+        raise ValueError(f"Invalid number in column quantity: {row.get('quantity')!r}.")
+
+    if not (bill_number and sale_date and customer_name and product_name and quantity > 0):
+        raise ValueError('Each row must include bill_number, sale_date, customer_name, product_name, and a quantity greater than 0.')
+
+    price = _decimal(row, 'price')
+    discount = _decimal(row, 'discount')
+    tax = _decimal(row, 'tax')
+    try:
+        base_amount = Decimal(quantity) * price
+        taxable_amount = base_amount - base_amount * discount / _HUNDRED
+        amount = (taxable_amount + taxable_amount * tax / _HUNDRED).quantize(_CENT)
+    except InvalidOperation:
+        raise ValueError('Invalid price, discount or tax.')
+
+    line = {
+        'bill_number': bill_number,
+        'sale_date': _date(sale_date),
+        'due_date': _date(_text(row, 'due_date')) if _text(row, 'due_date') else None,
+        'customer_name': customer_name,
+        'customer_address': _text(row, 'customer_address'),
+        'customer_gstin': _text(row, 'customer_gstin'),
+        'product_name': product_name,
+        'quantity': quantity,
+        'unit': _text(row, 'unit') or 'pcs',
+        'price': price,
+        'discount': discount,
+        'tax': tax,
+        'hsn_code': _text(row, 'hsn_code'),
+        'amount': amount,
+    }
+    _check_limits(line)
+    return line
+
+
+def read_chunks(reader, chunk_rows=CHUNK_ROWS):
+    """
+    Yield lists of ``(line_number, row)`` from a ``csv.DictReader``, skipping
+    blank rows. A chunk grows past ``chunk_rows`` until the bill number changes.
+    """
+    chunk = []
+    for line_number, row in enumerate(reader, start=2):
+        if not any((value or '').strip() for value in row.values() if isinstance(value, str)):
+            continue
+        if len(chunk) >= chunk_rows and _text(row, 'bill_number') != _text(chunk[-1][1], 'bill_number'):
+            yield chunk
+            chunk = []
+        chunk.append((line_number, row))
+    if chunk:
+        yield chunk
+
+
+def check_headers(fieldnames):
+    if not fieldnames or not set(REQUIRED_HEADERS).issubset({name.strip() for name in fieldnames if name}):
+        raise ValueError(f"Invalid CSV template. Required columns: {', '.join(REQUIRED_HEADERS)}.")
+
+
+class SalesInvoiceImport:
+    """
+    Import sales invoice rows for ``tenant``. ``progress`` is called with the
+    running totals after every committed chunk.
+    """
+
+    def __init__(self, tenant, *, chunk_rows=CHUNK_ROWS, progress=None):
+        self.tenant = tenant
+        self.chunk_rows = chunk_rows
+        self.progress = progress
+        self.processed_rows = 0
+        self.created_count = 0
+        self.line_count = 0
+        self.skipped_count = 0
+        self.errors = []
+        self._seen_bills = set()
+
+    def run(self, reader):
+        check_headers(reader.fieldnames)
+        for chunk in read_chunks(reader, self.chunk_rows):
+            bills = self._group_rows(chunk)
+            if bills:
+                try:
+                    with transaction.atomic(), batched_rollups():
+                        counts = self._import_bills(bills)
+                except DatabaseError:
+                    counts = self._import_bills_one_by_one(bills)
+                self.created_count += counts[0]
+                self.line_count += counts[1]
+            self.processed_rows += len(chunk)
+            if self.progress:
+                self.progress(self.summary())
+        return self.result()
+
+    def summary(self):
+        return {
+            'processed_rows': self.processed_rows,
+            'created_count': self.created_count,
+            'line_count': self.line_count,
+            'skipped_count': self.skipped_count,
+            'failed_count': len(self.errors),
+        }
+
+    def result(self):
+        return {**self.summary(), 'errors': self.errors}
+
+    def _fail(self, line_number, message):
+        self.errors.append({'row': line_number, 'error': message})
+
+    def _group_rows(self, chunk):
+        bills = {}
+        for line_number, row in chunk:
+            try:
+                line = parse_row(row)
+            except ValueError as exc:
+                self._fail(line_number, str(exc))
+                continue
+            line['line_number'] = line_number
+            bill_number = line['bill_number']
+            if bill_number not in bills and bill_number in self._seen_bills:
+                self._fail(line_number, f'Rows of bill {bill_number} must be consecutive; this line was not imported.')
+                continue
+            bills.setdefault(bill_number, []).append(line)
+        self._seen_bills.update(bills)
+
+        # Numbering restarts every April, so a bill only exists already within its fiscal year.
+        existing = {
+            bill_number
+            for bill_number, invoice_date in SalesInvoice.objects.filter(
+                created_by=self.tenant, invoice_number__in=list(bills),
+            ).values_list('invoice_number', 'invoice_date')
+            if fiscal_year(invoice_date) == fiscal_year(bills[bill_number][0]['sale_date'])
+        }
+        for bill_number in existing:
+            self.skipped_count += len(bills.pop(bill_number))
+        return bills
+
+    def _customers(self, bills):
+        """``{name: Customer}`` for every bill, creating and updating customers in bulk."""
+        details = {}
+        for lines in bills.values():
+            for line in lines:
+                address, gstin = details.get(line['customer_name'], ('', ''))
+                details[line['customer_name']] = (line['customer_address'] or address, line['customer_gstin'] or gstin)
+
+        customers = {}
+        for customer in Customer.objects.filter(created_by=self.tenant, name__in=list(details)).order_by('created_at', 'pk'):
+            customers.setdefault(customer.name, customer)
+
+        changed = []
+        for name, customer in customers.items():
+            address, gstin = details[name]
+            if (address and customer.address != address) or (gstin and customer.gstin != gstin):
+                customer.address = address or customer.address
+                customer.gstin = gstin or customer.gstin
+                changed.append(customer)
+        if changed:
+            Customer.objects.bulk_update(changed, ['address', 'gstin'])
+
+        missing = [
+            Customer(created_by=self.tenant, name=name, address=address or None, gstin=gstin or None)
+            for name, (address, gstin) in details.items() if name not in customers
+        ]
+        Customer.objects.bulk_create(missing)
+        customers.update((customer.name, customer) for customer in missing)
+        return customers
+
+    def _products(self, bills):
+        """``{name: Product}`` for every line, creating missing products from their first line."""
+        first_lines = {}
+        for lines in bills.values():
+            for line in lines:
+                first_lines.setdefault(line['product_name'], line)
+
+        products = {}
+        for product in Product.objects.filter(created_by=self.tenant, name__in=list(first_lines)).order_by('pk'):
+            products.setdefault(product.name, product)
+
+        missing = [
+            Product(
+                created_by=self.tenant,
+                name=name,
+                unit=line['unit'],
+                hsn_sac_code=line['hsn_code'] or None,
+                price=line['price'],
+                tax=line['tax'],
+            )
+            for name, line in first_lines.items() if name not in products
+        ]
+        Product.objects.bulk_create(missing)
+        products.update((product.name, product) for product in missing)
+        return products
+
+    def _import_bills_one_by_one(self, bills):
+        """Retry a failed chunk with a savepoint per bill, recording the bills that still fail."""
+        created = lines = 0
+        with transaction.atomic(), batched_rollups():
+            for bill_number, bill_lines in bills.items():
+                try:
+                    with transaction.atomic():
+                        bill_created, bill_line_count = self._import_bills({bill_number: bill_lines})
+                except DatabaseError as exc:
+                    self._fail(bill_lines[0]['line_number'], f'Bill {bill_number} was not imported: {exc}')
+                    continue
+                created += bill_created
+                lines += bill_line_count
+        return created, lines
+
+    def _import_bills(self, bills):
+        """Write ``bills`` and return ``(invoices, lines)`` created; the caller owns the transaction."""
+        customers = self._customers(bills)
+        products = self._products(bills)
+
+        postings = []
+        for bill_number, lines in bills.items():
+            header = lines[0]
+            customer = customers[header['customer_name']]
+            invoice = SalesInvoice(
+                created_by=self.tenant,
+                customer=customer,
+                customer_name=header['customer_name'],
+                customer_address=header['customer_address'] or customer.address,
+                invoice_number=bill_number,
+                invoice_date=header['sale_date'],
+                due_date=header['due_date'],
+                total_amount=sum((line['amount'] for line in lines), Decimal('0')),
+                journal='Sales',
+                status='final',
+            )
+            items_data = [
+                {
+                    'product': products[line['product_name']],
+                    'quantity': line['quantity'],
+                    'price': line['price'],
+                    'discount': line['discount'],
+                    'tax': line['tax'],
+                    'amount': line['amount'],
+                    'unit': line['unit'],
+                    'hsn_sac_code': line['hsn_code'] or None,
+                }
+                for line in lines
+            ]
+            postings.append((invoice, items_data))
+
+        invoices = SalesInvoice.objects.bulk_create([invoice for invoice, _items in postings], batch_size=1000)
+        note_changed(invoices)
+        items = post_sales_invoices(postings)
+
+        items_by_invoice = defaultdict(list)
+        for item in items:
+            items_by_invoice[item.sales_invoice_id].append(item)
+
+        from ledger.services import AccountingService
+        AccountingService.create_sales_invoices_entries(
+            [(invoice, items_by_invoice[invoice.pk]) for invoice in invoices]
+        )
+
+        self._add_customer_balances(invoices)
+        self._record_numbers(invoices)
+
+        return len(invoices), len(items)
+
+    def _add_customer_balances(self, invoices):
+        deltas = defaultdict(Decimal)
+        for invoice in invoices:
+            deltas[invoice.customer_id] += invoice.total_amount
+        Customer.objects.filter(pk__in=list(deltas)).update(
+            current_balance=F('current_balance') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                default=Value(Decimal('0')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+    def _record_numbers(self, invoices):
+        """Advance matching invoice sequences past the highest imported number per prefix and fiscal year."""
+        highest = {}
+        for invoice in invoices:
+            match = _NUMBER_RE.match(invoice.invoice_number)
+            if not match:
+                continue
+            key = (match.group('prefix'), fiscal_year(invoice.invoice_date))
+            value = int(match.group('number'))
+            if value > highest.get(key, (-1, ''))[0]:
+                highest[key] = (value, invoice.invoice_number)
+        for (_prefix, invoice_fiscal_year), (_value, number) in highest.items():
+            record_number(self.tenant, DocumentSequence.INVOICE, number, fiscal_year=invoice_fiscal_year)
@@ -18,7 +18,9 @@ def _csv_job_status(task_id):
         'state': task.state,
         'ready': task.ready(),
     }
-    if task.state == 'SUCCESS':
+    if task.state == 'PROGRESS':
+        payload['progress'] = task.info
+    elif task.state == 'SUCCESS':
         payload['result'] = task.result
     elif task.state == 'FAILURE':
         payload['error'] = str(task.result)
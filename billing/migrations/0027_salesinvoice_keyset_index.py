@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0026_alter_customer_state_and_more'),
+        ('inventory', '0018_productmeta_storage_condition_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salesinvoice',
+            index=models.Index(fields=['created_by', 'invoice_date', 'created_at', 'id'], name='billing_si_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0027_salesinvoice_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('invoice', 'Sales Invoice'), ('quotation', 'Quotation'), ('sales_order', 'Sales Order'), ('delivery_challan', 'Delivery Challan'), ('credit_note', 'Credit Note'), ('debit_note', 'Debit Note'), ('purchase_order', 'Purchase Order')], max_length=30)),
+                ('prefix', models.CharField(max_length=50)),
+                ('fiscal_year', models.CharField(blank=True, default='', help_text='Empty for numbering that never resets', max_length=9)),
+                ('last_number', models.PositiveBigIntegerField(default=0)),
+                ('padding', models.PositiveSmallIntegerField(default=3)),
+                ('gapless', models.BooleanField(default=False, help_text='Allocate under a row lock so rolled-back documents leave no gaps')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_sequences', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'doc_type', 'prefix', 'fiscal_year'), name='billing_document_sequence_uniq')],
+            },
+        ),
+    ]
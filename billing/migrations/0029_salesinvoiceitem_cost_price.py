@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_cost_price(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    SalesInvoiceItem = apps.get_model('billing', 'SalesInvoiceItem')
+
+    SalesInvoiceItem.objects.filter(cost_price__isnull=True).update(
+        cost_price=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0028_documentsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesinvoiceitem',
+            name='cost_price',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Product cost price when the line was posted', max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_cost_price, migrations.RunPython.noop),
+    ]
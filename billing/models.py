@@ -207,6 +207,12 @@ class SalesInvoice(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset paging of the invoice list (newest first).
+            models.Index(fields=['created_by', 'invoice_date', 'created_at', 'id'], name='billing_si_keyset_idx'),
+        ]
+
     def refresh_payment_status(self, save=True):
         if self.amount_paid <= 0:
             status_value = BillPaymentStatus.PENDING
@@ -242,7 +248,13 @@ class SalesInvoiceItem(models.Model):
     
     # Scheme Support (Phase 6)
     free_quantity = models.PositiveIntegerField(default=0, help_text="Qty given free under scheme (Buy X Get Y)")
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Product cost price when the line was posted")
+
+    def save(self, *args, **kwargs):
+        if self.cost_price is None and self.product_id:
+            self.cost_price = self.product.price
+        super().save(*args, **kwargs)
 
 # Import Sidecar Models to ensure they are registered
-from .models_sidecar import TransactionMeta, InvoiceSettings, SalesOrder, SalesOrderItem, DeliveryChallan, DeliveryChallanItem, PurchaseIndent, PurchaseIndentItem
+from .models_sidecar import TransactionMeta, InvoiceSettings, DocumentSequence, SalesOrder, SalesOrderItem, DeliveryChallan, DeliveryChallanItem, PurchaseIndent, PurchaseIndentItem
 from .models_returns import CreditNote, CreditNoteItem, DebitNote, DebitNoteItem
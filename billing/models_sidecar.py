@@ -115,6 +115,53 @@ class InvoiceSettings(models.Model):
     def __str__(self):
         return f"Invoice Settings for {self.user}"
 
+
+class DocumentSequence(models.Model):
+    """
+    Per-tenant document number counter, one row per (tenant, doc type, prefix, fiscal year).
+    Numbers are handed out by ``billing.sequences``; ``gapless`` sequences are
+    allocated under a row lock inside the document's own transaction.
+    """
+    INVOICE = 'invoice'
+    QUOTATION = 'quotation'
+    SALES_ORDER = 'sales_order'
+    DELIVERY_CHALLAN = 'delivery_challan'
+    CREDIT_NOTE = 'credit_note'
+    DEBIT_NOTE = 'debit_note'
+    PURCHASE_ORDER = 'purchase_order'
+    DOC_TYPE_CHOICES = [
+        (INVOICE, 'Sales Invoice'),
+        (QUOTATION, 'Quotation'),
+        (SALES_ORDER, 'Sales Order'),
+        (DELIVERY_CHALLAN, 'Delivery Challan'),
+        (CREDIT_NOTE, 'Credit Note'),
+        (DEBIT_NOTE, 'Debit Note'),
+        (PURCHASE_ORDER, 'Purchase Order'),
+    ]
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='document_sequences')
+    doc_type = models.CharField(max_length=30, choices=DOC_TYPE_CHOICES)
+    prefix = models.CharField(max_length=50)
+    fiscal_year = models.CharField(max_length=9, blank=True, default='', help_text="Empty for numbering that never resets")
+    last_number = models.PositiveBigIntegerField(default=0)
+    padding = models.PositiveSmallIntegerField(default=3)
+    gapless = models.BooleanField(default=False, help_text="Allocate under a row lock so rolled-back documents leave no gaps")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['created_by', 'doc_type', 'prefix', 'fiscal_year'],
+                name='billing_document_sequence_uniq',
+            ),
+        ]
+
+    def format(self, number):
+        return f"{self.prefix}{number:0{self.padding}d}"
+
+    def __str__(self):
+        return f"{self.doc_type} {self.prefix} ({self.last_number})"
+
 # =============================================================================
 # NEW VOUCHER TYPES (Non-Accounting)
 # =============================================================================
@@ -0,0 +1,255 @@
+"""
+Batched stock posting for sales invoices and purchase bills.
+
+The per-item ``post_save``/``post_delete`` receivers in ``billing.signals``
+touch ``Product``, ``Warehouse`` and ``StockPoint`` once per line. The
+serializers post a whole document through here instead: line items are
+written with ``bulk_create`` and the quantity deltas are aggregated per
+product and per (batch, warehouse) before being applied in one ``UPDATE``
+per table. Bulk imports post many documents in the same pass. Ad-hoc
+``SalesInvoiceItem``/``PurchaseBillItem`` saves still go through the signals.
+Each line also appends its ``StockMovement`` rows (replaced lines get
+reversal rows), the touched products are then re-costed by
+``inventory.costing`` and the documents' analytics facts updated by
+``analytics.rollups``.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections, router
+from django.db.models import Case, F, Q, Value, When
+
+from analytics import rollups
+from inventory import movements
+from inventory.costing import note_recorded as note_costs_recorded
+from inventory.models import Product, StockMovement, StockPoint, Warehouse
+
+from .models import PurchaseBillItem, SalesInvoiceItem
+
+_posting_in_progress = ContextVar('billing_posting_in_progress', default=False)
+
+
+def item_signals_suppressed() -> bool:
+    """True while a document is being posted in bulk by this module."""
+    return _posting_in_progress.get()
+
+
+@contextmanager
+def _suppress_item_signals():
+    token = _posting_in_progress.set(True)
+    try:
+        yield
+    finally:
+        _posting_in_progress.reset(token)
+
+
+def _stock_quantity(product, quantity, free_quantity, unit):
+    total_qty = (quantity or 0) + (free_quantity or 0)
+    if product is not None and product.secondary_unit and unit == product.secondary_unit:
+        return total_qty * product.conversion_factor
+    return total_qty
+
+
+def _resolve_warehouse(document, *, create_default=False):
+    if document.warehouse_id:
+        return document.warehouse
+    warehouse = Warehouse.objects.filter(created_by=document.created_by, is_active=True).first()
+    if warehouse is None and create_default:
+        warehouse = Warehouse.objects.create(name="Main Warehouse", created_by=document.created_by)
+    return warehouse
+
+
+def _apply_deltas(model, field, deltas):
+    """Add ``deltas[pk]`` to ``field`` for every row in a single statement."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        table = connection.ops.quote_name(model._meta.db_table)
+        column = connection.ops.quote_name(model._meta.get_field(field).column)
+        pk_column = connection.ops.quote_name(model._meta.pk.column)
+        pk_type = model._meta.pk.rel_db_type(connection)
+        values_sql = ', '.join([f'(%s::{pk_type}, %s::integer)'] * len(deltas))
+        params = []
+        for pk, delta in deltas.items():
+            params.extend([pk, int(delta)])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} AS t SET {column} = t.{column} + v.delta '
+                f'FROM (VALUES {values_sql}) AS v(id, delta) '
+                f'WHERE t.{pk_column} = v.id',
+                params,
+            )
+        return
+
+    model.objects.using(using).filter(pk__in=list(deltas)).update(**{
+        field: F(field) + Case(
+            *[When(pk=pk, then=Value(int(delta))) for pk, delta in deltas.items()],
+            default=Value(0),
+        )
+    })
+
+
+def _ensure_stock_points(keys):
+    """Return ``{(batch_id, warehouse_id): stock_point_id}``, creating missing rows."""
+    if not keys:
+        return {}
+
+    lookup = Q()
+    for batch_id, warehouse_id in keys:
+        lookup |= Q(batch_id=batch_id, warehouse_id=warehouse_id)
+
+    existing = {
+        (batch_id, warehouse_id): pk
+        for pk, batch_id, warehouse_id in StockPoint.objects.filter(lookup).values_list('pk', 'batch_id', 'warehouse_id')
+    }
+    missing = [key for key in keys if key not in existing]
+    if missing:
+        StockPoint.objects.bulk_create(
+            [StockPoint(batch_id=batch_id, warehouse_id=warehouse_id, quantity=0) for batch_id, warehouse_id in missing],
+            ignore_conflicts=True,
+        )
+        existing = {
+            (batch_id, warehouse_id): pk
+            for pk, batch_id, warehouse_id in StockPoint.objects.filter(lookup).values_list('pk', 'batch_id', 'warehouse_id')
+        }
+    return existing
+
+
+def _post_documents(item_model, parent_field, postings, *, sign, replace, create_default_warehouse,
+                    movement_type, date_field, number_field):
+    """
+    Write the line items of every ``(document, items_data)`` in ``postings``
+    and move stock by ``sign`` (+1 purchase, -1 sale) per converted quantity,
+    aggregated across all documents.
+
+    With ``replace`` the current line items are deleted first and their stock
+    effect reverted, netted against the new lines before anything is applied.
+    Their movements are reversed and the new lines' movements appended as
+    ``movement_type``, dated by the document's ``date_field``.
+    """
+    documents = {document.pk: document for document, _items_data in postings}
+    changing = rollups.note_changing(documents.values())
+    old_lines = []
+    if replace:
+        old_lines = list(
+            item_model.objects.filter(**{f'{parent_field}__in': list(documents)})
+            .values_list('id', f'{parent_field}_id', 'product_id', 'batch_id', 'quantity', 'free_quantity', 'unit')
+        )
+
+    new_items = [
+        item_model(**{parent_field: document}, **item_data)
+        for document, items_data in postings
+        for item_data in items_data
+    ]
+
+    product_ids = {line[2] for line in old_lines} | {item.product_id for item in new_items}
+    products = Product.objects.only('secondary_unit', 'conversion_factor', 'unit', 'price').in_bulk(product_ids)
+    if item_model is SalesInvoiceItem:
+        # Keep the cost the sale was made at, so the analytics facts do not
+        # drift when the product's price changes later.
+        for item in new_items:
+            if item.cost_price is None and item.product_id in products:
+                item.cost_price = products[item.product_id].price
+
+    product_deltas = defaultdict(int)
+    batch_deltas = defaultdict(int)
+
+    def collect(document_id, product_id, batch_id, quantity, free_quantity, unit, direction):
+        qty = _stock_quantity(products.get(product_id), quantity, free_quantity, unit) * direction
+        product_deltas[product_id] += qty
+        if batch_id:
+            batch_deltas[(document_id, batch_id)] += qty
+
+    for _line_id, document_id, product_id, batch_id, quantity, free_quantity, unit in old_lines:
+        collect(document_id, product_id, batch_id, quantity, free_quantity, unit, -sign)
+    for item in new_items:
+        collect(
+            getattr(item, f'{parent_field}_id'), item.product_id, item.batch_id,
+            item.quantity, item.free_quantity, item.unit, sign,
+        )
+
+    with _suppress_item_signals():
+        if old_lines:
+            item_model.objects.filter(**{f'{parent_field}__in': list(documents)}).delete()
+        created = item_model.objects.bulk_create(new_items, batch_size=1000)
+
+    _apply_deltas(Product, 'stock', product_deltas)
+
+    warehouses = {}
+
+    def warehouse_for(document):
+        warehouse_key = (document.created_by_id, document.warehouse_id)
+        if warehouse_key not in warehouses:
+            warehouses[warehouse_key] = _resolve_warehouse(document, create_default=create_default_warehouse)
+        return warehouses[warehouse_key]
+
+    point_deltas = defaultdict(int)
+    for (document_id, batch_id), delta in batch_deltas.items():
+        if not delta:
+            continue
+        warehouse = warehouse_for(documents[document_id])
+        if warehouse is not None:
+            point_deltas[(batch_id, warehouse.pk)] += delta
+
+    if point_deltas:
+        stock_points = _ensure_stock_points(list(point_deltas))
+        _apply_deltas(StockPoint, 'quantity', {stock_points[key]: delta for key, delta in point_deltas.items()})
+
+    recorded = movements.reverse([line[0] for line in old_lines]) if old_lines else []
+    new_movements = []
+    for item in created:
+        document = documents[getattr(item, f'{parent_field}_id')]
+        quantity = _stock_quantity(products.get(item.product_id), item.quantity, item.free_quantity, item.unit)
+        warehouse = warehouse_for(document)
+        new_movements.append(StockMovement(
+            product_id=item.product_id,
+            batch_id=item.batch_id,
+            warehouse_id=warehouse.pk if warehouse is not None else None,
+            date=getattr(document, date_field),
+            quantity=quantity * sign,
+            unit_cost=(
+                movements.purchase_unit_cost(item.quantity, item.price, item.discount, quantity)
+                if sign > 0 else None
+            ),
+            source_type=movement_type,
+            source_id=item.pk,
+            reference=getattr(document, number_field) or '',
+            created_by_id=document.created_by_id,
+        ))
+    recorded += movements.record(new_movements)
+
+    note_costs_recorded(recorded)
+    rollups.note_changed(documents.values(), changing)
+    return created
+
+
+def post_sales_invoice_items(invoice, items_data, *, replace=False):
+    """Create the invoice's line items and deduct their stock in bulk."""
+    return _post_documents(
+        SalesInvoiceItem, 'sales_invoice', [(invoice, items_data)],
+        sign=-1, replace=replace, create_default_warehouse=False,
+        movement_type=StockMovement.SALE, date_field='invoice_date', number_field='invoice_number',
+    )
+
+
+def post_sales_invoices(postings):
+    """Create the line items of many new invoices and deduct their stock in one pass."""
+    return _post_documents(
+        SalesInvoiceItem, 'sales_invoice', postings,
+        sign=-1, replace=False, create_default_warehouse=False,
+        movement_type=StockMovement.SALE, date_field='invoice_date', number_field='invoice_number',
+    )
+
+
+def post_purchase_bill_items(bill, items_data, *, replace=False):
+    """Create the bill's line items and add their stock in bulk."""
+    return _post_documents(
+        PurchaseBillItem, 'purchase_bill', [(bill, items_data)],
+        sign=1, replace=replace, create_default_warehouse=True,
+        movement_type=StockMovement.PURCHASE, date_field='bill_date', number_field='bill_number',
+    )
@@ -9,8 +9,12 @@ from django.db import transaction
 from django.db.models import F
 from django.db.models.functions import Greatest
 from .models_returns import CreditNote, CreditNoteItem, DebitNote, DebitNoteItem
-from .models import Customer
-from inventory.models import Product, ProductBatch, StockPoint, Warehouse
+from .models import Customer, DocumentSequence
+from .sequences import allocate_number, fiscal_year
+from analytics.rollups import batched_rollups
+from inventory import movements
+from inventory.costing import note_changed as note_costs_changed, note_recorded as note_costs_recorded
+from inventory.models import Product, ProductBatch, StockMovement, StockPoint, Warehouse
 
 
 # ─── Serializers ──────────────────────────────────────────────
@@ -36,21 +40,16 @@ class CreditNoteSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'credit_note_number', 'created_by', 'created_at']
 
     @transaction.atomic
+    @batched_rollups()
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         user = getattr(self.context['request'].user, 'active_tenant', self.context['request'].user)
         validated_data['created_by'] = user
         
-        # Auto-generate credit note number if not provided
-        last_note = CreditNote.objects.order_by('-created_at').first()
-        if last_note and last_note.credit_note_number.startswith('CN-'):
-            try:
-                last_num = int(last_note.credit_note_number.split('-')[1])
-                validated_data['credit_note_number'] = f"CN-{last_num + 1:04d}"
-            except ValueError:
-                validated_data['credit_note_number'] = "CN-0001"
-        else:
-            validated_data['credit_note_number'] = "CN-0001"
+        # Auto-generate credit note number from the tenant's sequence
+        validated_data['credit_note_number'] = allocate_number(
+            user, DocumentSequence.CREDIT_NOTE, 'CN-', fiscal_year=fiscal_year(validated_data.get('date')), padding=4,
+        )
             
         credit_note = CreditNote.objects.create(**validated_data)
 
@@ -58,8 +57,9 @@ class CreditNoteSerializer(serializers.ModelSerializer):
         if not target_warehouse:
             target_warehouse = Warehouse.objects.filter(created_by=user, is_active=True).first()
 
+        note_movements = []
         for item_data in items_data:
-            CreditNoteItem.objects.create(credit_note=credit_note, **item_data)
+            item = CreditNoteItem.objects.create(credit_note=credit_note, **item_data)
 
             # Restore stock (returned goods come back in)
             qty = item_data['quantity']
@@ -72,6 +72,15 @@ class CreditNoteSerializer(serializers.ModelSerializer):
                 )
                 StockPoint.objects.filter(pk=sp.pk).update(quantity=F('quantity') + qty)
 
+            note_movements.append(StockMovement(
+                product_id=item.product_id, batch_id=item.batch_id,
+                warehouse_id=target_warehouse.pk if target_warehouse else None,
+                date=credit_note.date, quantity=qty, source_type=StockMovement.SALES_RETURN, source_id=item.pk,
+                reference=credit_note.credit_note_number, created_by=user,
+            ))
+
+        note_costs_recorded(movements.record(note_movements))
+
         # Reduce customer balance
         if credit_note.customer:
             Customer.objects.filter(pk=credit_note.customer.pk).update(
@@ -105,21 +114,16 @@ class DebitNoteSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'debit_note_number', 'created_by', 'created_at']
 
     @transaction.atomic
+    @batched_rollups()
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         user = getattr(self.context['request'].user, 'active_tenant', self.context['request'].user)
         validated_data['created_by'] = user
         
-        # Auto-generate debit note number if not provided
-        last_note = DebitNote.objects.order_by('-created_at').first()
-        if last_note and last_note.debit_note_number.startswith('DN-'):
-            try:
-                last_num = int(last_note.debit_note_number.split('-')[1])
-                validated_data['debit_note_number'] = f"DN-{last_num + 1:04d}"
-            except ValueError:
-                validated_data['debit_note_number'] = "DN-0001"
-        else:
-            validated_data['debit_note_number'] = "DN-0001"
+        # Auto-generate debit note number from the tenant's sequence
+        validated_data['debit_note_number'] = allocate_number(
+            user, DocumentSequence.DEBIT_NOTE, 'DN-', fiscal_year=fiscal_year(validated_data.get('date')), padding=4,
+        )
             
         debit_note = DebitNote.objects.create(**validated_data)
 
@@ -127,8 +131,9 @@ class DebitNoteSerializer(serializers.ModelSerializer):
         if not source_warehouse:
             source_warehouse = Warehouse.objects.filter(created_by=user, is_active=True).first()
 
+        note_movements = []
         for item_data in items_data:
-            DebitNoteItem.objects.create(debit_note=debit_note, **item_data)
+            item = DebitNoteItem.objects.create(debit_note=debit_note, **item_data)
 
             # Decrease stock (goods being returned to vendor)
             qty = item_data['quantity']
@@ -143,6 +148,15 @@ class DebitNoteSerializer(serializers.ModelSerializer):
                 )
                 StockPoint.objects.filter(pk=sp.pk).update(quantity=F('quantity') - qty)
 
+            note_movements.append(StockMovement(
+                product_id=item.product_id, batch_id=item.batch_id,
+                warehouse_id=source_warehouse.pk if source_warehouse else None,
+                date=debit_note.date, quantity=-qty, source_type=StockMovement.PURCHASE_RETURN, source_id=item.pk,
+                reference=debit_note.debit_note_number, created_by=user,
+            ))
+
+        note_costs_recorded(movements.record(note_movements))
+
         # Create Ledger Entries
         from ledger.services import AccountingService
         AccountingService.create_debit_note_entries(debit_note)
@@ -183,7 +197,10 @@ def credit_note_detail(request, pk):
     if request.method == 'GET':
         return Response(CreditNoteSerializer(note).data)
     elif request.method == 'DELETE':
+        lines = list(note.items.values_list('pk', 'product_id'))
         note.delete()
+        movements.reverse([pk for pk, _product_id in lines])
+        note_costs_changed({product_id for _pk, product_id in lines})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -214,5 +231,8 @@ def debit_note_detail(request, pk):
     if request.method == 'GET':
         return Response(DebitNoteSerializer(note).data)
     elif request.method == 'DELETE':
+        lines = list(note.items.values_list('pk', 'product_id'))
         note.delete()
+        movements.reverse([pk for pk, _product_id in lines])
+        note_costs_changed({product_id for _pk, product_id in lines})
         return Response(status=status.HTTP_204_NO_CONTENT)
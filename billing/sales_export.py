@@ -0,0 +1,385 @@
+"""
+Constant-memory sales invoice CSV export.
+
+Invoices are read in keyset-ordered chunks of ``EXPORT_CHUNK_SIZE`` with flat
+``.values()`` queries: one for the chunk's invoices (customer, warehouse and
+transaction meta joined in) and one for all of their line items (product,
+product meta and batch joined in). Rows are written to the output file as each
+chunk is built, optionally through gzip, so memory stays flat however many
+invoices the filters match. The column layout matches the serializer-based
+export it replaces.
+"""
+import csv
+import gzip
+import json
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from cenvoras.pagination import keyset_page
+
+from .models import SalesInvoice, SalesInvoiceItem
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+EXPORT_CHUNK_SIZE = 500
+GZIP_VALUES = {'1', 'true', 'yes', 'on', 'gzip'}
+
+ALLOWED_ORDERING = {
+    'invoice_date', '-invoice_date',
+    'created_at', '-created_at',
+    'total_amount', '-total_amount',
+    'invoice_number', '-invoice_number',
+    'customer_name', '-customer_name',
+}
+
+SALES_EXPORT_HEADERS = [
+    'invoice_row_type', 'invoice_index', 'item_index', 'items_count',
+    'invoice_id', 'invoice_number', 'invoice_date', 'due_date',
+    'po_number', 'po_date', 'challan_number', 'challan_date',
+    'delivery_address', 'place_of_supply', 'gst_treatment', 'journal',
+    'warehouse', 'status', 'total_amount', 'amount_paid', 'payment_status',
+    'round_off', 'created_by', 'created_at',
+    'customer_name', 'customer_email', 'customer_phone', 'customer_address',
+    'customer_details_json', 'invoice_payload_json',
+    'item_id', 'item_product', 'item_product_detail_json', 'item_hsn_sac_code',
+    'item_unit', 'item_quantity', 'item_free_quantity', 'item_price',
+    'item_discount', 'item_tax', 'item_amount', 'item_batch_json',
+    'product_id', 'product_name', 'product_description', 'product_hsn_sac_code', 'product_unit',
+    'batch_id', 'batch_number', 'batch_expiry_date', 'batch_manufacturing_date',
+    'batch_mrp', 'batch_cost_price', 'batch_sale_price', 'batch_notes',
+    'item_payload_json', 'batch_payload_json', 'meta_json',
+]
+
+_INVOICE_FIELDS = (
+    'id', 'customer_id', 'customer_name', 'customer_address', 'invoice_number', 'invoice_date', 'due_date',
+    'po_number', 'po_date', 'challan_number', 'challan_date', 'delivery_address', 'place_of_supply',
+    'gst_treatment', 'journal', 'warehouse_id', 'status', 'total_amount', 'amount_paid', 'payment_status',
+    'round_off', 'created_by_id', 'created_at',
+    'created_by__state',
+    'customer__name', 'customer__email', 'customer__phone', 'customer__address', 'customer__gstin',
+    'customer__state',
+    'meta__id', 'meta__status', 'meta__delivery_status', 'meta__delivery_boy_id', 'meta__tags',
+)
+
+_ITEM_FIELDS = (
+    'id', 'sales_invoice_id', 'product_id', 'hsn_sac_code', 'unit', 'quantity', 'free_quantity',
+    'price', 'discount', 'tax', 'amount', 'batch_id',
+    'product__name', 'product__description', 'product__hsn_sac_code', 'product__unit',
+    'product__meta__id', 'product__meta__storage_condition', 'product__meta__temperature',
+    'batch__batch_number', 'batch__expiry_date', 'batch__manufacturing_date', 'batch__mrp',
+    'batch__cost_price', 'batch__sale_price', 'batch__notes',
+)
+
+_INVOICE_COLUMNS = SALES_EXPORT_HEADERS[
+    SALES_EXPORT_HEADERS.index('invoice_number'):SALES_EXPORT_HEADERS.index('customer_details_json')
+]
+_EMPTY_ITEM_COLUMNS = dict.fromkeys(
+    SALES_EXPORT_HEADERS[SALES_EXPORT_HEADERS.index('item_id'):SALES_EXPORT_HEADERS.index('meta_json')], '',
+)
+
+
+def apply_sales_export_filters(queryset, filters):
+    """Apply the sales list filters; returns ``(queryset, ordering_field, descending)``."""
+    search = (filters.get('search') or '').strip()
+    if search:
+        queryset = queryset.filter(
+            Q(invoice_number__icontains=search)
+            | Q(customer_name__icontains=search)
+            | Q(customer__name__icontains=search)
+        )
+
+    status_filter = (filters.get('status') or '').strip()
+    if status_filter and status_filter != 'all':
+        queryset = queryset.filter(status=status_filter)
+
+    customer_filter = (filters.get('customer') or '').strip()
+    if customer_filter:
+        queryset = queryset.filter(
+            Q(customer_name__icontains=customer_filter)
+            | Q(customer__name__icontains=customer_filter)
+        )
+
+    date_start = (filters.get('date_start') or '').strip() or (filters.get('invoice_date_after') or '').strip()
+    date_end = (filters.get('date_end') or '').strip() or (filters.get('invoice_date_before') or '').strip()
+    if date_start:
+        queryset = queryset.filter(invoice_date__gte=date_start)
+    if date_end:
+        queryset = queryset.filter(invoice_date__lte=date_end)
+
+    amount_min = (filters.get('amount_min') or '').strip()
+    amount_max = (filters.get('amount_max') or '').strip()
+    if amount_min:
+        queryset = queryset.filter(total_amount__gte=amount_min)
+    if amount_max:
+        queryset = queryset.filter(total_amount__lte=amount_max)
+
+    has_overdue = str(filters.get('has_overdue') or '').strip().lower() in {'1', 'true', 'yes', 'on'}
+    if has_overdue:
+        today = timezone.localdate()
+        queryset = queryset.filter(
+            Q(due_date__lt=today) | (Q(due_date__isnull=True) & Q(invoice_date__lt=today))
+        )
+
+    selected_ids_param = (filters.get('selected_ids') or '').strip()
+    if selected_ids_param:
+        selected_ids = [value.strip() for value in selected_ids_param.split(',') if value.strip()]
+        if selected_ids:
+            queryset = queryset.filter(id__in=selected_ids)
+
+    ordering = (filters.get('ordering') or '-invoice_date').strip()
+    if ordering not in ALLOWED_ORDERING:
+        ordering = '-invoice_date'
+    return queryset, ordering.lstrip('-'), ordering.startswith('-')
+
+
+def iter_invoice_chunks(queryset, ordering_field, descending, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of invoice ``.values()`` dicts, walking ``queryset`` by keyset
+    on ``(ordering_field, created_at, id)`` so no chunk needs an ``OFFSET``.
+    """
+    sort_field = ordering_field
+    if SalesInvoice._meta.get_field(ordering_field).null:
+        # NULL breaks the keyset comparison; sort missing values as ''.
+        sort_field = 'export_sort'
+        queryset = queryset.annotate(export_sort=Coalesce(ordering_field, Value('')))
+    fields = [sort_field] if sort_field == 'created_at' else [sort_field, 'created_at']
+    fields.append('id')
+
+    queryset = queryset.values(*dict.fromkeys(_INVOICE_FIELDS + tuple(fields)))
+    after = None
+    while True:
+        rows, has_more = keyset_page(queryset, fields, chunk_size, after=after, descending=descending)
+        if rows:
+            yield rows
+        if not has_more:
+            return
+        after = tuple(rows[-1][field] for field in fields)
+
+
+def _items_by_invoice(invoice_ids):
+    items = defaultdict(list)
+    rows = SalesInvoiceItem.objects.filter(sales_invoice_id__in=invoice_ids).order_by('sales_invoice_id', 'id')
+    for item in rows.values(*_ITEM_FIELDS):
+        items[item['sales_invoice_id']].append(item)
+    return items
+
+
+def _plain(value):
+    """Render a database value the way the API serializers do."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool, list, dict)):
+        return value
+    return str(value)
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return value
+
+
+def _tax_type(invoice):
+    seller_state = invoice['created_by__state']
+    place_of_supply = invoice['place_of_supply'] or invoice['customer__state']
+    if not seller_state or not place_of_supply:
+        return 'cgst_sgst'
+    return 'igst' if seller_state.upper() != place_of_supply.upper() else 'cgst_sgst'
+
+
+def _invoice_payload(invoice):
+    has_customer = invoice['customer_id'] is not None
+    meta = None
+    if invoice['meta__id'] is not None:
+        meta = {
+            'status': invoice['meta__status'],
+            'delivery_status': invoice['meta__delivery_status'],
+            'delivery_boy': _plain(invoice['meta__delivery_boy_id']),
+            'tags': invoice['meta__tags'],
+        }
+    payload = {
+        'id': _plain(invoice['id']),
+        'customer_name': invoice['customer_name'],
+        'customer_email': invoice['customer__email'] if has_customer else None,
+        'customer_phone': invoice['customer__phone'] if has_customer else None,
+        'customer_address': invoice['customer_address'] or (invoice['customer__address'] if has_customer else None),
+        'customer_gstin': invoice['customer__gstin'] if has_customer else None,
+        'created_by': _plain(invoice['created_by_id']),
+        'warehouse': _plain(invoice['warehouse_id']),
+        'meta': meta,
+        'tax_type': _tax_type(invoice),
+    }
+    for field in (
+        'invoice_number', 'invoice_date', 'due_date', 'po_number', 'po_date', 'challan_number', 'challan_date',
+        'delivery_address', 'place_of_supply', 'gst_treatment', 'journal', 'status', 'total_amount',
+        'amount_paid', 'payment_status', 'round_off', 'created_at',
+    ):
+        payload[field] = _plain(invoice[field])
+
+    customer_details = None
+    if has_customer:
+        customer_details = {
+            'id': _plain(invoice['customer_id']),
+            'name': invoice['customer__name'],
+            'email': invoice['customer__email'],
+            'phone': invoice['customer__phone'],
+            'address': invoice['customer__address'],
+            'gstin': invoice['customer__gstin'],
+            'state': invoice['customer__state'],
+        }
+    return payload, customer_details
+
+
+def _item_payloads(item):
+    product_detail = {
+        'id': _plain(item['product_id']),
+        'name': item['product__name'],
+        'description': item['product__description'],
+        'hsn_sac_code': item['product__hsn_sac_code'],
+        'unit': item['product__unit'],
+    }
+    if item['product__meta__id'] is not None:
+        product_detail['storage_condition'] = item['product__meta__storage_condition']
+        product_detail['temperature'] = item['product__meta__temperature']
+
+    payload = {
+        'id': _plain(item['id']),
+        'product': item['product__name'],
+        'product_detail': product_detail,
+        'hsn_sac_code': item['hsn_sac_code'],
+        'unit': item['unit'],
+        'quantity': item['quantity'],
+        'free_quantity': item['free_quantity'],
+        'price': _plain(item['price']),
+        'discount': _plain(item['discount']),
+        'tax': _plain(item['tax']),
+        'amount': _plain(item['amount']),
+        'batch': _plain(item['batch_id']),
+    }
+
+    has_batch = item['batch_id'] is not None
+    batch = {'id': _plain(item['batch_id']) or ''}
+    for field in ('batch_number', 'expiry_date', 'manufacturing_date', 'mrp', 'cost_price', 'sale_price', 'notes'):
+        batch[field] = _plain(item[f'batch__{field}']) if has_batch else ''
+    return payload, product_detail, batch
+
+
+def invoice_rows(invoice, items, invoice_index):
+    """The CSV rows of one invoice: one per line item, or a single row when it has none."""
+    payload, customer_details = _invoice_payload(invoice)
+    base_row = {
+        'invoice_row_type': 'invoice',
+        'invoice_index': invoice_index,
+        'item_index': '',
+        'items_count': len(items),
+        'invoice_id': payload['id'],
+        **{field: payload[field] for field in _INVOICE_COLUMNS},
+        'customer_details_json': customer_details,
+        'invoice_payload_json': payload,
+        'meta_json': payload['meta'],
+    }
+    if not items:
+        yield {**base_row, **_EMPTY_ITEM_COLUMNS}
+        return
+
+    for item_index, item in enumerate(items, start=1):
+        item_payload, product_detail, batch = _item_payloads(item)
+        yield {
+            **base_row,
+            'invoice_row_type': 'item',
+            'item_index': item_index,
+            'item_id': item_payload['id'],
+            'item_product': item_payload['product'],
+            'item_product_detail_json': product_detail,
+            'item_hsn_sac_code': item_payload['hsn_sac_code'],
+            'item_unit': item_payload['unit'],
+            'item_quantity': item_payload['quantity'],
+            'item_free_quantity': item_payload['free_quantity'],
+            'item_price': item_payload['price'],
+            'item_discount': item_payload['discount'],
+            'item_tax': item_payload['tax'],
+            'item_amount': item_payload['amount'],
+            'item_batch_json': item_payload['batch'],
+            'product_id': product_detail['id'],
+            'product_name': product_detail['name'],
+            'product_description': product_detail['description'],
+            'product_hsn_sac_code': product_detail['hsn_sac_code'],
+            'product_unit': product_detail['unit'],
+            'batch_id': batch['id'],
+            'batch_number': batch['batch_number'],
+            'batch_expiry_date': batch['expiry_date'],
+            'batch_manufacturing_date': batch['manufacturing_date'],
+            'batch_mrp': batch['mrp'],
+            'batch_cost_price': batch['cost_price'],
+            'batch_sale_price': batch['sale_price'],
+            'batch_notes': batch['notes'],
+            'item_payload_json': item_payload,
+            'batch_payload_json': batch,
+        }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def write_sales_export(tenant, filters, *, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write the filtered invoices of ``tenant`` to a temp file and return the
+    task result: file location plus invoice/row counts, throughput and the
+    worker's peak RSS. ``filters['compression'] == 'gzip'`` gzips the output.
+    """
+    filters = filters or {}
+    compress = str(filters.get('compression') or filters.get('gzip') or '').strip().lower() in GZIP_VALUES
+    queryset, ordering_field, descending = apply_sales_export_filters(
+        SalesInvoice.objects.filter(created_by=tenant), filters,
+    )
+
+    started = time.monotonic()
+    invoice_count = 0
+    row_count = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.csv.gz' if compress else '.csv') as temp_file:
+        file_path = temp_file.name
+
+    opener = gzip.open if compress else open
+    with opener(file_path, 'wt', encoding='utf-8', newline='') as stream:
+        writer = csv.DictWriter(stream, fieldnames=SALES_EXPORT_HEADERS, extrasaction='ignore')
+        writer.writeheader()
+        for invoices in iter_invoice_chunks(queryset, ordering_field, descending, chunk_size):
+            items = _items_by_invoice([invoice['id'] for invoice in invoices])
+            for invoice in invoices:
+                invoice_count += 1
+                for row in invoice_rows(invoice, items.get(invoice['id'], []), invoice_count):
+                    writer.writerow({key: _cell(value) for key, value in row.items()})
+                    row_count += 1
+
+    elapsed = time.monotonic() - started
+    return {
+        'file_path': file_path,
+        'rows': invoice_count,
+        'csv_rows': row_count,
+        'compressed': compress,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(row_count / elapsed, 1) if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
@@ -0,0 +1,209 @@
+"""
+Per-tenant document numbering.
+
+Each (tenant, doc type, prefix, fiscal year) has one ``DocumentSequence``
+row, so numbering restarts every April; the fiscal year comes from the
+document's date (``fiscal_year``). The first use seeds a row once from the
+highest number already issued under the prefix in that fiscal year; after
+that a number costs a single ``UPDATE ... RETURNING``. When the shared cache
+is Redis, non-gapless sequences are served by ``INCR`` instead and written
+back to the row after the allocating transaction commits. A counter missing
+from Redis is re-seeded under the row lock from the row and the documents
+already issued, whichever is higher. Gapless
+sequences are incremented under ``SELECT ... FOR UPDATE`` in the caller's
+transaction, so a rolled-back document gives its number back.
+
+Numbers typed in by hand (or imported) are folded back in by
+``record_number`` so the counter never hands out a number already in use.
+"""
+import re
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from cenvoras.cache_utils import tenant_cache_key
+
+from .models import DocumentSequence, PurchaseOrder, SalesInvoice
+from .models_returns import CreditNote, DebitNote
+from .models_sidecar import DeliveryChallan, Quotation, SalesOrder
+
+_NAMESPACE = 'doc_sequence'
+_NUMBER_RE = re.compile(r'^(?P<prefix>.*?)(?P<number>\d+)$')
+
+# Where each document type keeps its number and its date, used to seed a new
+# sequence. Purchase orders carry no document date and use their creation day.
+SEQUENCE_SOURCES = {
+    DocumentSequence.INVOICE: (SalesInvoice, 'invoice_number', 'invoice_date'),
+    DocumentSequence.QUOTATION: (Quotation, 'quotation_number', 'quotation_date'),
+    DocumentSequence.SALES_ORDER: (SalesOrder, 'order_number', 'date'),
+    DocumentSequence.DELIVERY_CHALLAN: (DeliveryChallan, 'challan_number', 'date'),
+    DocumentSequence.CREDIT_NOTE: (CreditNote, 'credit_note_number', 'date'),
+    DocumentSequence.DEBIT_NOTE: (DebitNote, 'debit_note_number', 'date'),
+    DocumentSequence.PURCHASE_ORDER: (PurchaseOrder, 'po_number', 'created_at__date'),
+}
+
+
+def fiscal_year(day=None):
+    """``'2024-25'`` for any day from 1 April 2024 to 31 March 2025; defaults to today."""
+    day = day or timezone.localdate()
+    start = day.year if day.month >= 4 else day.year - 1
+    return f'{start}-{(start + 1) % 100:02d}'
+
+
+def document_fiscal_year(instance):
+    """The fiscal year a saved document is numbered in."""
+    for model, _field, date_field in SEQUENCE_SOURCES.values():
+        if isinstance(instance, model):
+            value = getattr(instance, date_field.split('__')[0])
+            if isinstance(value, datetime):
+                value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+            return fiscal_year(value)
+    raise TypeError(f'{type(instance).__name__} is not a numbered document')
+
+
+def fiscal_year_range(fiscal_year):
+    """First and last day of a ``'2024-25'`` fiscal year."""
+    start = int(fiscal_year[:4])
+    return date(start, 4, 1), date(start + 1, 3, 31)
+
+
+def tenant_prefix(tenant, prefix):
+    """``INV-`` -> ``INV-1A2B-``: the tenant-qualified prefix used across billing."""
+    return f'{prefix}{str(tenant.id)[:4].upper()}-'
+
+
+def _highest_existing(tenant, doc_type, prefix, fiscal_year=''):
+    model, field, date_field = SEQUENCE_SOURCES[doc_type]
+    highest = 0
+    numbers = model.objects.filter(created_by=tenant, **{f'{field}__startswith': prefix})
+    if fiscal_year:
+        numbers = numbers.filter(**{f'{date_field}__range': fiscal_year_range(fiscal_year)})
+    numbers = numbers.values_list(field, flat=True)
+    for number in numbers.iterator():
+        suffix = number[len(prefix):]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return highest
+
+
+def get_sequence(tenant, doc_type, prefix, *, fiscal_year='', padding=3):
+    lookup = {'created_by': tenant, 'doc_type': doc_type, 'prefix': prefix, 'fiscal_year': fiscal_year}
+    sequence = DocumentSequence.objects.filter(**lookup).first()
+    if sequence is not None:
+        return sequence
+    try:
+        with transaction.atomic():
+            return DocumentSequence.objects.create(
+                **lookup, padding=padding, last_number=_highest_existing(tenant, doc_type, prefix, fiscal_year),
+            )
+    except IntegrityError:
+        return DocumentSequence.objects.get(**lookup)
+
+
+def _redis_counters():
+    return settings.CACHES['default']['BACKEND'].startswith('django_redis')
+
+
+def _uses_redis(sequence):
+    return not sequence.gapless and _redis_counters()
+
+
+def _counter_key(sequence):
+    return tenant_cache_key(_NAMESPACE, sequence.created_by_id, sequence.pk)
+
+
+def _increment_row(sequence):
+    model = DocumentSequence
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET last_number = last_number + 1 WHERE id = %s RETURNING last_number',
+            [sequence.pk],
+        )
+        return cursor.fetchone()[0]
+
+
+def _increment_locked(sequence):
+    with transaction.atomic():
+        locked = DocumentSequence.objects.select_for_update().get(pk=sequence.pk)
+        locked.last_number += 1
+        locked.save(update_fields=['last_number', 'updated_at'])
+        return locked.last_number
+
+
+def _write_back(sequence_id, number):
+    DocumentSequence.objects.filter(pk=sequence_id, last_number__lt=number).update(last_number=number)
+
+
+def _seed_counter(sequence, key):
+    """
+    Start a missing Redis counter. The row lags behind numbers handed out but
+    not yet written back, so it is compared with the documents already
+    issued, under the row lock so concurrent seeders agree.
+    """
+    with transaction.atomic():
+        locked = DocumentSequence.objects.select_for_update().get(pk=sequence.pk)
+        highest = _highest_existing(locked.created_by_id, locked.doc_type, locked.prefix, locked.fiscal_year)
+        cache.add(key, max(locked.last_number, highest), timeout=None)
+
+
+def _increment_cached(sequence):
+    key = _counter_key(sequence)
+    try:
+        number = cache.incr(key)
+    except ValueError:
+        _seed_counter(sequence, key)
+        number = cache.incr(key)
+    transaction.on_commit(lambda: _write_back(sequence.pk, number))
+    return number
+
+
+def allocate_number(tenant, doc_type, prefix, *, fiscal_year='', padding=3):
+    """
+    Hand out the next number of the sequence, formatted with its prefix.
+    Pass the document's ``fiscal_year`` so numbering restarts every April.
+    """
+    sequence = get_sequence(tenant, doc_type, prefix, fiscal_year=fiscal_year, padding=padding)
+    if sequence.gapless:
+        number = _increment_locked(sequence)
+    elif _uses_redis(sequence):
+        number = _increment_cached(sequence)
+    else:
+        number = _increment_row(sequence)
+    return sequence.format(number)
+
+
+def peek_next_number(tenant, doc_type, prefix, *, fiscal_year='', padding=3):
+    """The number ``allocate_number`` would return next, without consuming it."""
+    sequence = get_sequence(tenant, doc_type, prefix, fiscal_year=fiscal_year, padding=padding)
+    last_number = sequence.last_number
+    if _uses_redis(sequence):
+        last_number = max(last_number, cache.get(_counter_key(sequence)) or 0)
+    return sequence.format(last_number + 1)
+
+
+def record_number(tenant, doc_type, number, *, fiscal_year=''):
+    """Advance a matching sequence past a number that was issued without it."""
+    match = _NUMBER_RE.match(number or '')
+    if not match:
+        return
+    value = int(match.group('number'))
+    lookup = {'created_by': tenant, 'doc_type': doc_type, 'prefix': match.group('prefix'), 'fiscal_year': fiscal_year}
+
+    if _redis_counters():
+        sequence = DocumentSequence.objects.filter(**lookup).first()
+        if sequence is None:
+            return
+        current = cache.get(_counter_key(sequence)) if not sequence.gapless else None
+        if current is not None:
+            # Redis is ahead of the row; keep it authoritative and the row lock-free.
+            if current < value:
+                cache.incr(_counter_key(sequence), value - current)
+                transaction.on_commit(lambda: _write_back(sequence.pk, value))
+            return
+
+    DocumentSequence.objects.filter(**lookup, last_number__lt=value).update(last_number=value)
@@ -1,8 +1,12 @@
 from rest_framework import serializers
 from rest_framework import serializers
 from .models import PurchaseBill, PurchaseBillItem, SalesInvoice, SalesInvoiceItem, Customer, Vendor, Payment
-from .models_sidecar import TransactionMeta, SalesOrder, SalesOrderItem, DeliveryChallan, DeliveryChallanItem, PurchaseIndent, PurchaseIndentItem, InvoiceSettings
+from .models_sidecar import DocumentSequence, TransactionMeta, SalesOrder, SalesOrderItem, DeliveryChallan, DeliveryChallanItem, PurchaseIndent, PurchaseIndentItem, InvoiceSettings
 from .serializers_sidecar import TransactionMetaSerializer, SalesOrderSerializer, DeliveryChallanSerializer, PurchaseIndentSerializer, InvoiceSettingsSerializer
+from .allocation import InsufficientStock, allocate_fefo, released_stock, resolve_warehouse
+from .posting import post_purchase_bill_items, post_sales_invoice_items
+from .sequences import allocate_number, fiscal_year, fiscal_year_range, tenant_prefix
+from analytics.rollups import batched_rollups
 from inventory.models import Product, ProductBatch
 from cenvoras.constants import IndianStates
 from subscription.services import can_auto_create_inventory_product
@@ -76,23 +80,15 @@ def normalize_indian_state_choice(value):
 
 
 def _rebuild_sales_invoice_ledger(invoice_id):
-    from ledger.models import GeneralLedgerEntry
     from ledger.services import AccountingService
-    from django.db import transaction as db_transaction
-    with db_transaction.atomic():
-        sales_invoice = SalesInvoice.objects.select_related('customer').get(pk=invoice_id)
-        GeneralLedgerEntry.objects.filter(sales_invoice=sales_invoice).delete()
-        AccountingService.create_sales_invoice_entries(sales_invoice)
+    sales_invoice = SalesInvoice.objects.select_related('customer', 'created_by').get(pk=invoice_id)
+    AccountingService.sync_sales_invoice_entries(sales_invoice)
 
 
 def _rebuild_purchase_bill_ledger(bill_id):
-    from ledger.models import GeneralLedgerEntry
     from ledger.services import AccountingService
-    from django.db import transaction as db_transaction
-    with db_transaction.atomic():
-        purchase_bill = PurchaseBill.objects.select_related('vendor').get(pk=bill_id)
-        GeneralLedgerEntry.objects.filter(purchase_bill=purchase_bill).delete()
-        AccountingService.create_purchase_bill_entries(purchase_bill)
+    purchase_bill = PurchaseBill.objects.select_related('vendor', 'created_by').get(pk=bill_id)
+    AccountingService.sync_purchase_bill_entries(purchase_bill)
 
 class ProductField(serializers.Field):
     def to_internal_value(self, value):
@@ -251,6 +247,7 @@ class PurchaseBillSerializer(serializers.ModelSerializer):
         tax_amount = (taxable_amount * tax) / Decimal('100')
         return (taxable_amount + tax_amount).quantize(Decimal('0.01'))
 
+    @batched_rollups()
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         meta_data = validated_data.pop('meta', None)
@@ -295,8 +292,7 @@ class PurchaseBillSerializer(serializers.ModelSerializer):
         purchase_bill = PurchaseBill.objects.create(**validated_data)
         for item_data in items_data:
             item_data['amount'] = self._calculate_line_amount(item_data)
-            # Ensure price is passed as 'price' to the model (serializer uses 'price' field)
-            PurchaseBillItem.objects.create(purchase_bill=purchase_bill, **item_data)
+        post_purchase_bill_items(purchase_bill, items_data)
 
         # Refresh payment status in case amount_paid was provided
         purchase_bill.refresh_payment_status(save=True)
@@ -304,6 +300,7 @@ class PurchaseBillSerializer(serializers.ModelSerializer):
         transaction.on_commit(lambda bill_id=purchase_bill.id: _rebuild_purchase_bill_ledger(bill_id))
         return purchase_bill
 
+    @batched_rollups()
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', [])
         user = getattr(self.context['request'].user, 'active_tenant', self.context['request'].user)
@@ -341,14 +338,12 @@ class PurchaseBillSerializer(serializers.ModelSerializer):
 
         # Delete existing items and create new ones
         if items_data:
-            instance.items.all().delete()
             for item_data in items_data:
                 item_data['amount'] = self._calculate_line_amount(item_data)
-                PurchaseBillItem.objects.create(purchase_bill=instance, **item_data)
+            items = post_purchase_bill_items(instance, items_data, replace=True)
 
-            recalculated_total = sum((item.amount for item in instance.items.all()), Decimal('0'))
+            recalculated_total = sum((item.amount for item in items), Decimal('0'))
             instance.total_amount = recalculated_total
-            instance.save(update_fields=['total_amount'])
             if instance.amount_paid > instance.total_amount:
                 instance.amount_paid = instance.total_amount
 
@@ -493,28 +488,8 @@ class SalesInvoiceItemSerializer(serializers.ModelSerializer):
         if data.get('tax') is None:
             data['tax'] = 0
             
-        # FEFO Logic: Auto-select batch if not provided
-        if 'batch' not in data and product:
-            print(f"DEBUG SalesInvoiceItemSerializer: No batch provided for {product.name}, attempting FEFO selection")
-            # Find batch with earliest expiry that has stock > 0
-            # Note: We filter by is_active=True to properly exclude deleted/blocked batches
-            best_batch = ProductBatch.objects.filter(
-                product=product, 
-                is_active=True,
-                stock_points__quantity__gt=0
-            ).order_by('expiry_date').first()
-            
-            if best_batch:
-                print(f"DEBUG SalesInvoiceItemSerializer: FEFO selected batch {best_batch.batch_number} (Exp: {best_batch.expiry_date})")
-                data['batch'] = best_batch.id
-            else:
-                 # Fallback: Try to find ANY active batch, even if stock is 0 (to record the sale against something)
-                 # Or just leave it null (Global stock)
-                 print("DEBUG SalesInvoiceItemSerializer: No suitable batch found with stock. Checking any active batch.")
-                 any_batch = ProductBatch.objects.filter(product=product, is_active=True).order_by('expiry_date').first()
-                 if any_batch:
-                     data['batch'] = any_batch.id
-                     print(f"DEBUG SalesInvoiceItemSerializer: Fallback selected batch {any_batch.batch_number}")
+        # Lines without a batch are split across batches (FEFO) for the whole
+        # invoice by billing.allocation when it is posted.
 
         print("DEBUG SalesInvoiceItemSerializer: Product processed successfully, calling super()")
         print("DEBUG SalesInvoiceItemSerializer: Final data before super():", data)
@@ -600,12 +575,36 @@ class SalesInvoiceSerializer(serializers.ModelSerializer):
         tax_amount = (taxable_amount * tax) / Decimal('100')
         return (taxable_amount + tax_amount).quantize(Decimal('0.01'))
 
+    def validate_invoice_number(self, value):
+        """Blank on create means "number it for me"; uniqueness is checked in ``validate``."""
+        value = (value or '').strip()
+        if not value and self.instance is not None:
+            raise serializers.ValidationError('Invoice number cannot be blank.')
+        return value
+
+    def _check_invoice_number_unique(self, data, tenant):
+        """Numbering restarts every April, so a number must be unique per tenant and fiscal year."""
+        value = data.get('invoice_number')
+        if not value or tenant is None:
+            return
+        if self.instance is not None and value == self.instance.invoice_number:
+            return
+        invoice_date = data.get('invoice_date', getattr(self.instance, 'invoice_date', None))
+        duplicates = SalesInvoice.objects.filter(
+            created_by=tenant, invoice_number=value, invoice_date__range=fiscal_year_range(fiscal_year(invoice_date)),
+        )
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError({'invoice_number': f'Invoice with number {value} already exists.'})
+
     def validate(self, data):
         """
         Check for Credit Limit violations.
         """
         request = self.context.get('request')
         user = getattr(request.user, 'active_tenant', request.user) if request else None
+        self._check_invoice_number_unique(data, user)
         
         # We need to resolve the customer to check their limit
         # Use the customer object resolved in to_internal_value
@@ -794,9 +793,26 @@ class SalesInvoiceSerializer(serializers.ModelSerializer):
             print("DEBUG SalesInvoiceSerializer: Super call error -", error_msg)
             raise serializers.ValidationError({'non_field_errors': [error_msg]})
 
+    @staticmethod
+    def _allocate_batches(tenant, warehouse, items_data, released=None):
+        try:
+            return allocate_fefo(resolve_warehouse(tenant, warehouse), items_data, released=released)
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'items': [f'Insufficient batch stock. {exc}']})
+
+    @transaction.atomic
+    @batched_rollups()
     def create(self, validated_data):
         print("DEBUG SalesInvoiceSerializer: Creating sales invoice with data:", validated_data)
         items_data = validated_data.pop('items')
+        items_data = self._allocate_batches(validated_data.get('created_by'), validated_data.get('warehouse'), items_data)
+        if not validated_data.get('invoice_number'):
+            # Allocated inside this transaction, so parallel invoices never share a number.
+            tenant = validated_data.get('created_by')
+            validated_data['invoice_number'] = allocate_number(
+                tenant, DocumentSequence.INVOICE, tenant_prefix(tenant, 'INV-'),
+                fiscal_year=fiscal_year(validated_data.get('invoice_date')),
+            )
         meta_data = validated_data.pop('meta', None)
         provided_total_amount = validated_data.pop('total_amount', None)
         print("DEBUG SalesInvoiceSerializer: Items data:", items_data)
@@ -821,16 +837,14 @@ class SalesInvoiceSerializer(serializers.ModelSerializer):
             sales_invoice = SalesInvoice.objects.create(**validated_data)
             print("DEBUG SalesInvoiceSerializer: Sales invoice created:", sales_invoice.id)
             
-            for i, item_data in enumerate(items_data):
+            for item_data in items_data:
                 item_data['amount'] = self._calculate_line_amount(item_data)
-                print(f"DEBUG SalesInvoiceSerializer: Creating item {i+1}:", item_data)
-                SalesInvoiceItem.objects.create(sales_invoice=sales_invoice, **item_data)
-                print(f"DEBUG SalesInvoiceSerializer: Item {i+1} created successfully")
+            items = post_sales_invoice_items(sales_invoice, items_data)
 
             print("DEBUG SalesInvoiceSerializer: All items created successfully")
 
             round_off = validated_data.get('round_off', Decimal('0.00'))
-            recalculated_total = sum((item.amount for item in sales_invoice.items.all()), Decimal('0')) + Decimal(str(round_off))
+            recalculated_total = sum((item.amount for item in items), Decimal('0')) + Decimal(str(round_off))
             sales_invoice.total_amount = recalculated_total
             sales_invoice.round_off = round_off
             if sales_invoice.amount_paid > sales_invoice.total_amount:
@@ -868,6 +882,7 @@ class SalesInvoiceSerializer(serializers.ModelSerializer):
             traceback.print_exc()
             raise
 
+    @batched_rollups()
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', [])
         validated_data.pop('total_amount', None)
@@ -876,6 +891,11 @@ class SalesInvoiceSerializer(serializers.ModelSerializer):
         old_status = instance.status
         old_total_amount = Decimal(str(instance.total_amount or 0))
         resolved_customer = getattr(self, '_customer_obj', None)
+        if items_data:
+            items_data = self._allocate_batches(
+                instance.created_by, validated_data.get('warehouse', instance.warehouse), items_data,
+                released=released_stock(instance),
+            )
         
         # Update the sales invoice fields
         for attr, value in validated_data.items():
@@ -907,13 +927,12 @@ class SalesInvoiceSerializer(serializers.ModelSerializer):
 
         # Delete existing items and create new ones when provided
         if items_data:
-            instance.items.all().delete()
             for item_data in items_data:
                 item_data['amount'] = self._calculate_line_amount(item_data)
-                SalesInvoiceItem.objects.create(sales_invoice=instance, **item_data)
+            items = post_sales_invoice_items(instance, items_data, replace=True)
 
             round_off = validated_data.get('round_off', instance.round_off)
-            recalculated_total = sum((item.amount for item in instance.items.all()), Decimal('0')) + Decimal(str(round_off))
+            recalculated_total = sum((item.amount for item in items), Decimal('0')) + Decimal(str(round_off))
             instance.total_amount = recalculated_total
             instance.round_off = round_off
 
@@ -961,6 +980,79 @@ class SalesInvoiceSerializer(serializers.ModelSerializer):
 
         return instance
 
+
+class SalesInvoiceListItemSerializer(serializers.Serializer):
+    """Read-only line item row for the invoice list, fed by ``.values()`` dicts."""
+    VALUES = {
+        'id': 'id',
+        'product': 'product_id',
+        'product_name': 'product__name',
+        'hsn_sac_code': 'hsn_sac_code',
+        'unit': 'unit',
+        'quantity': 'quantity',
+        'free_quantity': 'free_quantity',
+        'price': 'price',
+        'discount': 'discount',
+        'tax': 'tax',
+        'amount': 'amount',
+    }
+
+    id = serializers.UUIDField()
+    product = serializers.UUIDField(source='product_id')
+    product_name = serializers.CharField(source='product__name')
+    hsn_sac_code = serializers.CharField(allow_null=True)
+    unit = serializers.CharField(allow_null=True)
+    quantity = serializers.IntegerField()
+    free_quantity = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=8, decimal_places=2)
+    tax = serializers.DecimalField(max_digits=8, decimal_places=2)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class SalesInvoiceListSerializer(serializers.Serializer):
+    """
+    Read-only invoice row for the list endpoint, fed by ``.values()`` dicts so
+    no model instances are built. Pass ``fields=`` to keep only a subset of
+    the columns; ``items`` is only present when the view expanded them.
+    """
+    VALUES = {
+        'id': 'id',
+        'invoice_number': 'invoice_number',
+        'invoice_date': 'invoice_date',
+        'due_date': 'due_date',
+        'customer': 'customer_id',
+        'customer_name': 'customer_name',
+        'status': 'status',
+        'place_of_supply': 'place_of_supply',
+        'warehouse': 'warehouse_id',
+        'total_amount': 'total_amount',
+        'amount_paid': 'amount_paid',
+        'payment_status': 'payment_status',
+        'created_at': 'created_at',
+    }
+
+    id = serializers.UUIDField()
+    invoice_number = serializers.CharField()
+    invoice_date = serializers.DateField()
+    due_date = serializers.DateField(allow_null=True)
+    customer = serializers.UUIDField(source='customer_id', allow_null=True)
+    customer_name = serializers.CharField(allow_null=True)
+    status = serializers.CharField()
+    place_of_supply = serializers.CharField(allow_null=True)
+    warehouse = serializers.UUIDField(source='warehouse_id', allow_null=True)
+    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    amount_paid = serializers.DecimalField(max_digits=12, decimal_places=2)
+    payment_status = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    items = SalesInvoiceListItemSerializer(many=True, required=False)
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 from .serializers_sidecar import PartyMetaSerializer
 from .models_sidecar import PartyMeta
 
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import PurchaseOrder, PurchaseOrderItem, Vendor
+from .models import DocumentSequence, PurchaseOrder, PurchaseOrderItem, Vendor
+from .sequences import allocate_number, fiscal_year, tenant_prefix
 from inventory.serializers import ProductSerializer
 
 
@@ -90,6 +91,11 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
         items = validated_data.pop('items', [])
         vendor = self._resolve_vendor(validated_data)
         validated_data['vendor'] = vendor
+        if not validated_data.get('po_number') and validated_data.get('created_by'):
+            validated_data['po_number'] = allocate_number(
+                validated_data['created_by'], DocumentSequence.PURCHASE_ORDER, tenant_prefix(validated_data['created_by'], 'PO-'),
+                fiscal_year=fiscal_year(),
+            )
         po = PurchaseOrder.objects.create(**validated_data)
         for item in items:
             item.pop('product_name', None)
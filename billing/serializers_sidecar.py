@@ -15,7 +15,9 @@ from .models_sidecar import (
     InvoiceSettings,
     Quotation,
     QuotationItem,
+    DocumentSequence,
 )
+from .sequences import allocate_number, fiscal_year, tenant_prefix
 from inventory.models import Product
 
 class TransactionMetaSerializer(serializers.ModelSerializer):
@@ -103,6 +105,7 @@ class SalesOrderSerializer(serializers.ModelSerializer):
         model = SalesOrder
         fields = ['id', 'order_number', 'date', 'customer', 'customer_name', 'customer_display_name', 'customer_email', 'customer_phone', 'stage', 'total_amount', 'notes', 'items', 'created_by', 'created_at']
         read_only_fields = ['id', 'created_at', 'created_by', 'customer']
+        extra_kwargs = {'order_number': {'required': False, 'allow_blank': True}}
 
     def _resolve_customer(self, validated_data):
         """Find or create a Customer from the customer_name field."""
@@ -131,6 +134,11 @@ class SalesOrderSerializer(serializers.ModelSerializer):
         customer = self._resolve_customer(validated_data)
         validated_data['customer'] = customer
         validated_data['created_by'] = getattr(self.context['request'].user, 'active_tenant', self.context['request'].user)
+        if not validated_data.get('order_number'):
+            validated_data['order_number'] = allocate_number(
+                validated_data['created_by'], DocumentSequence.SALES_ORDER, tenant_prefix(validated_data['created_by'], 'SO-'),
+                fiscal_year=fiscal_year(validated_data.get('date')),
+            )
         
         order = SalesOrder.objects.create(**validated_data)
         
@@ -179,10 +187,16 @@ class DeliveryChallanSerializer(serializers.ModelSerializer):
         model = DeliveryChallan
         fields = ['id', 'challan_number', 'date', 'customer', 'customer_name', 'sales_order', 'is_billed', 'items', 'created_by', 'created_at']
         read_only_fields = ['id', 'created_at', 'created_by', 'is_billed']
+        extra_kwargs = {'challan_number': {'required': False, 'allow_blank': True}}
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         validated_data['created_by'] = getattr(self.context['request'].user, 'active_tenant', self.context['request'].user)
+        if not validated_data.get('challan_number'):
+            validated_data['challan_number'] = allocate_number(
+                validated_data['created_by'], DocumentSequence.DELIVERY_CHALLAN, tenant_prefix(validated_data['created_by'], 'DC-'),
+                fiscal_year=fiscal_year(validated_data.get('date')),
+            )
         
         challan = DeliveryChallan.objects.create(**validated_data)
         
@@ -395,8 +409,6 @@ class QuotationSerializer(serializers.ModelSerializer):
 
         # Provide safe defaults so shared form edge-cases do not hard-fail create.
         if self.instance is None:
-            if not attrs.get('quotation_number'):
-                attrs['quotation_number'] = f"QT-{date.today().strftime('%Y%m%d')}-AUTO"
             if not attrs.get('quotation_date'):
                 attrs['quotation_date'] = date.today()
 
@@ -447,6 +459,11 @@ class QuotationSerializer(serializers.ModelSerializer):
         customer = self._resolve_customer(validated_data)
         validated_data['customer'] = customer
         validated_data['created_by'] = self.context['request'].user.active_tenant
+        if not validated_data.get('quotation_number'):
+            validated_data['quotation_number'] = allocate_number(
+                validated_data['created_by'], DocumentSequence.QUOTATION, tenant_prefix(validated_data['created_by'], 'QT-'),
+                fiscal_year=fiscal_year(validated_data.get('quotation_date')),
+            )
 
         quotation = Quotation.objects.create(**validated_data)
         for item_data in items_data:
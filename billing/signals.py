@@ -2,8 +2,12 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from billing.models import PurchaseBillItem, SalesInvoiceItem, SalesInvoice, PurchaseBill, Payment, Customer
 from django.core.exceptions import ValidationError
-from inventory.models import Product, Warehouse, StockPoint
+from inventory.models import Product, Warehouse, StockPoint, StockMovement
+from inventory import movements
 from users.models import ActionLog
+from billing.posting import item_signals_suppressed
+from inventory.costing import note_changed as note_costs_changed, note_recorded as note_costs_recorded
+from billing.sequences import SEQUENCE_SOURCES, document_fiscal_year, record_number
 from django.db.models import F
 from django.db.models.functions import Greatest
 import logging
@@ -12,10 +16,14 @@ logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------
 # INVENTORY SIGNALS (Atomic)
+# Fallback for ad-hoc item saves; serializer-driven documents are posted in
+# bulk by billing.posting, which suppresses these receivers.
 # ---------------------------------------------------------
 
 @receiver(post_save, sender=PurchaseBillItem)
 def increase_stock_on_purchase(sender, instance, created, **kwargs):
+    if item_signals_suppressed():
+        return
     if created:
         total_qty = instance.quantity + instance.free_quantity
         qty_to_add = total_qty
@@ -50,6 +58,8 @@ def increase_stock_on_purchase(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=SalesInvoiceItem)
 def decrease_stock_on_sale(sender, instance, created, **kwargs):
+    if item_signals_suppressed():
+        return
     if created:
         total_qty = instance.quantity + instance.free_quantity
         qty_to_remove = total_qty
@@ -83,6 +93,8 @@ def decrease_stock_on_sale(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=SalesInvoiceItem)
 def update_financials_on_sale_item(sender, instance, created, **kwargs):
+    if item_signals_suppressed():
+        return
     if created and instance.sales_invoice:
         # Atomic increase: Invoice total remains item-driven.
         SalesInvoice.objects.filter(pk=instance.sales_invoice.pk).update(
@@ -91,6 +103,8 @@ def update_financials_on_sale_item(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=SalesInvoiceItem)
 def revert_financials_on_sale_item_delete(sender, instance, **kwargs):
+    if item_signals_suppressed():
+        return
     if instance.sales_invoice:
         # Atomic revert: Invoice total
         SalesInvoice.objects.filter(pk=instance.sales_invoice.pk).update(
@@ -99,6 +113,8 @@ def revert_financials_on_sale_item_delete(sender, instance, **kwargs):
 
 @receiver(post_delete, sender=PurchaseBillItem)
 def decrease_stock_on_purchase_delete(sender, instance, **kwargs):
+    if item_signals_suppressed():
+        return
     # ATOMIC REVERT
     Product.objects.filter(pk=instance.product_id).update(stock=F('stock') - instance.quantity)
     
@@ -120,6 +136,8 @@ def decrease_stock_on_purchase_delete(sender, instance, **kwargs):
 
 @receiver(post_delete, sender=SalesInvoiceItem)
 def increase_stock_on_sale_delete(sender, instance, **kwargs):
+    if item_signals_suppressed():
+        return
     # ATOMIC REVERT
     Product.objects.filter(pk=instance.product_id).update(stock=F('stock') + instance.quantity)
 
@@ -140,6 +158,47 @@ def increase_stock_on_sale_delete(sender, instance, **kwargs):
             print(f"ERROR reverting StockPoint on Sale Delete: {e}")
 
 
+_ITEM_MOVEMENTS = {
+    PurchaseBillItem: ('purchase_bill', StockMovement.PURCHASE, 1, 'bill_date', 'bill_number'),
+    SalesInvoiceItem: ('sales_invoice', StockMovement.SALE, -1, 'invoice_date', 'invoice_number'),
+}
+
+
+@receiver(post_save, sender=PurchaseBillItem)
+@receiver(post_save, sender=SalesInvoiceItem)
+def record_movement_on_item_save(sender, instance, created, **kwargs):
+    if item_signals_suppressed() or not created:
+        return
+    parent_field, source_type, sign, date_field, number_field = _ITEM_MOVEMENTS[sender]
+    document = getattr(instance, parent_field)
+    product = Product.objects.only('secondary_unit', 'conversion_factor').get(pk=instance.product_id)
+    quantity = movements.stock_units(product, instance.quantity, instance.free_quantity, instance.unit)
+    warehouse_id = document.warehouse_id or (
+        Warehouse.objects.filter(created_by=document.created_by, is_active=True).values_list('pk', flat=True).first()
+    )
+    note_costs_recorded(movements.record([StockMovement(
+        product_id=instance.product_id,
+        batch_id=instance.batch_id,
+        warehouse_id=warehouse_id,
+        date=getattr(document, date_field),
+        quantity=quantity * sign,
+        unit_cost=movements.purchase_unit_cost(instance.quantity, instance.price, instance.discount, quantity) if sign > 0 else None,
+        source_type=source_type,
+        source_id=instance.pk,
+        reference=getattr(document, number_field) or '',
+        created_by_id=document.created_by_id,
+    )]))
+
+
+@receiver(post_delete, sender=PurchaseBillItem)
+@receiver(post_delete, sender=SalesInvoiceItem)
+def reverse_movement_on_item_delete(sender, instance, **kwargs):
+    if item_signals_suppressed():
+        return
+    movements.reverse([instance.pk])
+    note_costs_changed({instance.product_id})
+
+
 # ---------------------------------------------------------
 # FINANCIAL SIGNALS (Atomic)
 # ---------------------------------------------------------
@@ -242,4 +301,22 @@ def create_purchase_bill_accounting_entries(sender, instance, created, **kwargs)
 
 @receiver(post_save, sender=PurchaseBill)  
 def create_purchase_bill_accounting_entries_fallback(sender, instance, created, **kwargs):
-    return
\ No newline at end of file
+    return
+
+# ---------------------------------------------------------
+# DOCUMENT NUMBERING
+# Hand-entered and imported numbers advance the matching sequence.
+# ---------------------------------------------------------
+
+def record_document_number(sender, instance, created, **kwargs):
+    if not created:
+        return
+    doc_type, field = _SEQUENCE_FIELDS[sender]
+    record_number(
+        instance.created_by_id, doc_type, getattr(instance, field), fiscal_year=document_fiscal_year(instance),
+    )
+
+
+_SEQUENCE_FIELDS = {model: (doc_type, field) for doc_type, (model, field, _date_field) in SEQUENCE_SOURCES.items()}
+for _model in _SEQUENCE_FIELDS:
+    post_save.connect(record_document_number, sender=_model, dispatch_uid=f'record_document_number_{_model._meta.label_lower}')
@@ -6,6 +6,7 @@ from billing.models import SalesInvoice, PurchaseBill
 from billing.models_sidecar import Quotation
 from inventory.models import Product
 from datetime import date
+from decimal import Decimal
 from datetime import timedelta
 from django.utils import timezone
 from subscription.models import Plan, TenantSubscription
@@ -474,3 +475,559 @@ class PaymentStatusTests(TestCase):
         # Should be rejected
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('invoice', response.data)
+
+
+class DocumentPostingTests(TestCase):
+    def setUp(self):
+        from inventory.models import ProductBatch, Warehouse
+
+        self.user = User.objects.create_user(
+            username="posting_user",
+            email="posting@test.com",
+            password="testpass"
+        )
+        self.warehouse = Warehouse.objects.create(name="Main", created_by=self.user)
+        self.product = Product.objects.create(
+            name="Boxed Item",
+            unit="pcs",
+            secondary_unit="box",
+            conversion_factor=10,
+            created_by=self.user,
+        )
+        self.other_product = Product.objects.create(name="Loose Item", created_by=self.user)
+        self.batch = ProductBatch.objects.create(product=self.product, batch_number="B1")
+
+    def _line(self, product, quantity, **extra):
+        line = {"product": product, "quantity": quantity, "price": 10, "amount": 10 * quantity}
+        line.update(extra)
+        return line
+
+    def _stock_point_quantity(self):
+        from inventory.models import StockPoint
+        return StockPoint.objects.get(batch=self.batch, warehouse=self.warehouse).quantity
+
+    def test_purchase_bill_aggregates_stock_per_product_and_batch(self):
+        from billing.posting import post_purchase_bill_items
+
+        bill = PurchaseBill.objects.create(
+            bill_number="PB-1", bill_date=date(2024, 1, 1), total_amount=0,
+            warehouse=self.warehouse, created_by=self.user,
+        )
+        items = post_purchase_bill_items(bill, [
+            self._line(self.product, 2, unit="box", batch=self.batch),
+            self._line(self.product, 5, free_quantity=1, batch=self.batch),
+            self._line(self.other_product, 3),
+        ])
+
+        self.assertEqual(len(items), 3)
+        self.assertEqual(bill.items.count(), 3)
+        self.product.refresh_from_db()
+        self.other_product.refresh_from_db()
+        self.assertEqual(self.product.stock, 26)
+        self.assertEqual(self.other_product.stock, 3)
+        self.assertEqual(self._stock_point_quantity(), 26)
+
+    def test_sales_invoice_replace_nets_old_and_new_lines(self):
+        from billing.posting import post_sales_invoice_items
+
+        invoice = SalesInvoice.objects.create(
+            created_by=self.user, customer_name="Walk-in", invoice_number="INV-POST-1",
+            invoice_date=date(2024, 1, 1), total_amount=0, warehouse=self.warehouse,
+        )
+        post_sales_invoice_items(invoice, [
+            self._line(self.product, 1, unit="box", batch=self.batch),
+            self._line(self.other_product, 4),
+        ])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, -10)
+        self.assertEqual(self._stock_point_quantity(), -10)
+
+        items = post_sales_invoice_items(invoice, [self._line(self.product, 3, batch=self.batch)], replace=True)
+
+        self.assertEqual([item.quantity for item in items], [3])
+        self.assertEqual(invoice.items.count(), 1)
+        self.product.refresh_from_db()
+        self.other_product.refresh_from_db()
+        self.assertEqual(self.product.stock, -3)
+        self.assertEqual(self.other_product.stock, 0)
+        self.assertEqual(self._stock_point_quantity(), -3)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_amount, 0)
+
+    def test_ad_hoc_item_save_still_uses_signals(self):
+        from billing.models import SalesInvoiceItem
+
+        invoice = SalesInvoice.objects.create(
+            created_by=self.user, customer_name="Walk-in", invoice_number="INV-POST-2",
+            invoice_date=date(2024, 1, 1), total_amount=0,
+        )
+        SalesInvoiceItem.objects.create(sales_invoice=invoice, product=self.other_product, quantity=2, price=10, amount=20)
+
+        self.other_product.refresh_from_db()
+        invoice.refresh_from_db()
+        self.assertEqual(self.other_product.stock, -2)
+        self.assertEqual(invoice.total_amount, 20)
+
+
+class SalesInvoiceListPagingTests(TestCase):
+    def setUp(self):
+        from billing.models import SalesInvoiceItem
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="invoice_list_user",
+            email="invoice_list@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        product = Product.objects.create(name="Listed Item", stock=100, created_by=self.user)
+        for day in range(1, 6):
+            invoice = SalesInvoice.objects.create(
+                customer_name=f"Customer {day}", invoice_number=f"INV-{day}",
+                invoice_date=date(2024, 1, day), total_amount=10 * day, created_by=self.user,
+            )
+            SalesInvoiceItem.objects.create(
+                sales_invoice=invoice, product=product, quantity=day, price=10, amount=10 * day,
+            )
+
+    def test_keyset_pages_walk_newest_first(self):
+        numbers = []
+        params = {"limit": 2, "fields": "invoice_number,total_amount"}
+        while True:
+            res = self.client.get("/api/billing/sales-invoices/", params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            for row in res.data["results"]:
+                self.assertEqual(set(row), {"invoice_number", "total_amount"})
+                numbers.append(row["invoice_number"])
+            if not res.data["next_cursor"]:
+                break
+            params["cursor"] = res.data["next_cursor"]
+
+        self.assertEqual(numbers, ["INV-5", "INV-4", "INV-3", "INV-2", "INV-1"])
+
+    def test_expand_items_loads_lines_for_the_page(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get("/api/billing/sales-invoices/", {"limit": 3, "fields": "id", "expand": "items"})
+
+        selects = [query for query in queries.captured_queries if query["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 2)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["items"][0]["quantity"] for row in res.data["results"]], [5, 4, 3])
+        self.assertEqual(res.data["results"][0]["items"][0]["product_name"], "Listed Item")
+
+    def test_unknown_field_is_rejected(self):
+        res = self.client.get("/api/billing/sales-invoices/", {"fields": "id,secret"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unpaged_request_keeps_full_serializer(self):
+        res = self.client.get("/api/billing/sales-invoices/")
+        self.assertEqual(len(res.data), 5)
+        self.assertIn("items", res.data[0])
+
+
+class DocumentSequenceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="sequence_user",
+            email="sequence@test.com",
+            password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.prefix = f"INV-{str(self.user.id)[:4].upper()}-"
+
+    def _invoice(self, number, invoice_date=None):
+        return SalesInvoice.objects.create(
+            customer_name="Walk-in", invoice_number=number, invoice_date=invoice_date or timezone.localdate(),
+            total_amount=0, created_by=self.user,
+        )
+
+    def test_sequence_seeds_from_existing_numbers_and_allocates(self):
+        from billing.models import DocumentSequence
+        from billing.sequences import allocate_number, fiscal_year
+
+        self._invoice(f"{self.prefix}007")
+        self._invoice(f"{self.prefix}legacy")
+        current = fiscal_year()
+
+        res = self.client.get("/api/billing/sales-invoices/next-number/")
+        self.assertEqual(res.data["next_number"], f"{self.prefix}008")
+        self.assertEqual(self.client.get("/api/billing/sales-invoices/next-number/").data["suffix"], "008")
+
+        self.assertEqual(
+            allocate_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year=current), f"{self.prefix}008",
+        )
+        self.assertEqual(
+            allocate_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year=current), f"{self.prefix}009",
+        )
+
+    def test_hand_entered_number_advances_sequence(self):
+        from billing.models import DocumentSequence
+        from billing.sequences import allocate_number, fiscal_year, peek_next_number
+
+        current = fiscal_year()
+        self.assertEqual(
+            peek_next_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year=current), f"{self.prefix}001",
+        )
+        self._invoice(f"{self.prefix}041")
+
+        self.assertEqual(
+            allocate_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year=current), f"{self.prefix}042",
+        )
+
+    def test_numbering_restarts_every_fiscal_year(self):
+        from billing.models import DocumentSequence
+        from billing.sequences import allocate_number, fiscal_year
+
+        self.assertEqual(fiscal_year(date(2024, 3, 31)), "2023-24")
+        self.assertEqual(fiscal_year(date(2024, 4, 1)), "2024-25")
+        self._invoice(f"{self.prefix}120", invoice_date=date(2024, 3, 31))
+
+        self.assertEqual(
+            allocate_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year="2023-24"), f"{self.prefix}121",
+        )
+        self.assertEqual(
+            allocate_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year="2024-25"), f"{self.prefix}001",
+        )
+
+        payload = {
+            "customer_name": "Walk-in",
+            "invoice_number": f"{self.prefix}120",
+            "invoice_date": "2024-04-02",
+            "items": [{"product": "Numbered Product", "quantity": 1, "price": "10.00"}],
+        }
+        res = self.client.post("/api/billing/sales-invoices/", payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.client.post("/api/billing/sales-invoices/", {**payload, "invoice_date": "2024-05-01"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_flushed_redis_counter_reseeds_past_issued_numbers(self):
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from billing.models import DocumentSequence
+        from billing.sequences import _counter_key, allocate_number, fiscal_year, get_sequence
+
+        current = fiscal_year()
+        with patch("billing.sequences._redis_counters", return_value=True):
+            for expected in ("001", "002", "003"):
+                number = allocate_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year=current)
+                self.assertEqual(number, f"{self.prefix}{expected}")
+                self._invoice(number)
+
+            # The row has not been written back yet when Redis loses the key.
+            sequence = get_sequence(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year=current)
+            self.assertEqual(sequence.last_number, 0)
+            cache.delete(_counter_key(sequence))
+
+            self.assertEqual(
+                allocate_number(self.user, DocumentSequence.INVOICE, self.prefix, fiscal_year=current),
+                f"{self.prefix}004",
+            )
+
+    def test_gapless_sequence_returns_number_on_rollback(self):
+        from django.db import transaction
+        from billing.models import DocumentSequence
+        from billing.sequences import allocate_number, get_sequence
+
+        sequence = get_sequence(self.user, DocumentSequence.CREDIT_NOTE, "CN-", padding=4)
+        sequence.gapless = True
+        sequence.save(update_fields=["gapless"])
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertEqual(allocate_number(self.user, DocumentSequence.CREDIT_NOTE, "CN-"), "CN-0001")
+                raise RuntimeError("document failed")
+
+        self.assertEqual(allocate_number(self.user, DocumentSequence.CREDIT_NOTE, "CN-"), "CN-0001")
+
+    def test_invoice_without_a_number_is_numbered_on_create(self):
+        payload = {
+            "customer_name": "Walk-in",
+            "invoice_date": "2024-01-01",
+            "items": [{"product": "Numbered Product", "quantity": 1, "price": "10.00"}],
+        }
+        first = self.client.post("/api/billing/sales-invoices/", payload, format="json")
+        second = self.client.post("/api/billing/sales-invoices/", {**payload, "invoice_number": "  "}, format="json")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data["invoice_number"], f"{self.prefix}001")
+        self.assertEqual(second.data["invoice_number"], f"{self.prefix}002")
+
+        res = self.client.patch(
+            f"/api/billing/sales-invoices/{first.data['id']}/edit/", {"invoice_number": ""}, format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(SalesInvoice.objects.get(pk=first.data["id"]).invoice_number, f"{self.prefix}001")
+
+
+class SalesInvoiceCsvImportTests(TestCase):
+    HEADER = "bill_number,sale_date,customer_name,customer_address,product_name,quantity,price,discount,tax\n"
+
+    def setUp(self):
+        from billing.models import Customer
+
+        self.user = User.objects.create_user(
+            username="csv_import_user",
+            email="csv_import@test.com",
+            password="testpass"
+        )
+        self.product = Product.objects.create(name="Pen", price=10, stock=50, created_by=self.user)
+        self.customer = Customer.objects.create(name="Acme", created_by=self.user)
+
+    def _import(self, rows, **kwargs):
+        import csv
+        import io
+        from billing.bulk_import import SalesInvoiceImport
+
+        reader = csv.DictReader(io.StringIO(self.HEADER + "".join(rows)))
+        return SalesInvoiceImport(self.user, **kwargs).run(reader)
+
+    def test_rows_sharing_a_bill_number_become_one_invoice(self):
+        from billing.models import Customer
+        from ledger.models import GeneralLedgerEntry
+
+        SalesInvoice.objects.create(
+            created_by=self.user, customer_name="Acme", invoice_number="CSV-9",
+            invoice_date=date(2024, 1, 1), total_amount=0,
+        )
+        progress = []
+        result = self._import([
+            "CSV-1,2024-02-01,Acme,12 Road,Pen,2,10,0,18\n",
+            "CSV-1,2024-02-01,Acme,,Notebook,1,50,10,0\n",
+            "CSV-2,2024-02-02,New Buyer,,Pen,3,10,0,0\n",
+            "CSV-2,not-a-date,New Buyer,,Pen,1,10,0,0\n",
+            "CSV-9,2024-02-03,Acme,,Pen,1,10,0,0\n",
+        ], chunk_rows=2, progress=progress.append)
+
+        self.assertEqual(result["created_count"], 2)
+        self.assertEqual(result["line_count"], 3)
+        self.assertEqual(result["skipped_count"], 1)
+        self.assertEqual(result["failed_count"], 1)
+        self.assertEqual(result["errors"][0]["row"], 5)
+        self.assertEqual([step["processed_rows"] for step in progress], [2, 4, 5])
+
+        first = SalesInvoice.objects.get(created_by=self.user, invoice_number="CSV-1")
+        self.assertEqual(first.items.count(), 2)
+        self.assertEqual(first.total_amount, Decimal("68.60"))
+        self.assertEqual(first.customer, self.customer)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.address, "12 Road")
+        self.assertEqual(self.customer.current_balance, Decimal("68.60"))
+        self.assertTrue(Customer.objects.filter(created_by=self.user, name="New Buyer", current_balance=30).exists())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 45)
+        self.assertTrue(Product.objects.filter(created_by=self.user, name="Notebook", stock=-1, price=50).exists())
+
+        entries = GeneralLedgerEntry.objects.filter(sales_invoice=first)
+        self.assertEqual(entries.count(), 3)
+        self.assertEqual(sum(entry.debit for entry in entries), sum(entry.credit for entry in entries))
+
+    def test_queries_do_not_grow_with_rows(self):
+        def count_queries(prefix, bills):
+            from django.db import connection
+            from django.test.utils import CaptureQueriesContext
+
+            rows = [f"{prefix}-{n},2024-03-01,Acme,,Pen,1,10,0,0\n" for n in range(bills)]
+            with CaptureQueriesContext(connection) as queries:
+                result = self._import(rows)
+            self.assertEqual(result["created_count"], bills)
+            return len(queries)
+
+        count_queries("WARM", 1)
+        self.assertEqual(count_queries("SMALL", 2), count_queries("LARGE", 20))
+
+    def test_rows_beyond_column_limits_fail_on_their_own(self):
+        result = self._import([
+            f"{'X' * 101},2024-02-01,Acme,,Pen,1,10,0,0\n",
+            "CSV-3,2024-02-01,Acme,,Pen,1,100000000,0,0\n",
+            "CSV-4,2024-02-01,Acme,,Pen,1,10,0,0\n",
+        ])
+
+        self.assertEqual(result["created_count"], 1)
+        self.assertEqual([error["row"] for error in result["errors"]], [2, 3])
+        self.assertIn("longer than 100", result["errors"][0]["error"])
+
+    def test_a_bill_failing_in_the_database_does_not_abort_the_chunk(self):
+        from unittest.mock import patch
+        from django.db import DatabaseError
+        from billing import bulk_import
+
+        real_post = bulk_import.post_sales_invoices
+
+        def post(postings):
+            if any(invoice.invoice_number == "CSV-BAD" for invoice, _items in postings):
+                raise DatabaseError("value too long")
+            return real_post(postings)
+
+        with patch.object(bulk_import, "post_sales_invoices", side_effect=post):
+            result = self._import([
+                "CSV-5,2024-02-01,Acme,,Pen,1,10,0,0\n",
+                "CSV-BAD,2024-02-01,Acme,,Pen,1,10,0,0\n",
+                "CSV-6,2024-02-01,Acme,,Pen,1,10,0,0\n",
+            ])
+
+        self.assertEqual(result["created_count"], 2)
+        self.assertEqual(result["errors"][0]["row"], 3)
+        self.assertEqual(
+            set(SalesInvoice.objects.filter(created_by=self.user).values_list("invoice_number", flat=True)),
+            {"CSV-5", "CSV-6"},
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 48)
+
+
+class SalesInvoiceCsvExportTests(TestCase):
+    def setUp(self):
+        from billing.models import Customer
+        from billing.posting import post_sales_invoice_items
+
+        self.user = User.objects.create_user(
+            username="csv_export_user",
+            email="csv_export@test.com",
+            password="testpass"
+        )
+        self.customer = Customer.objects.create(name="Acme", email="acme@test.com", created_by=self.user)
+        self.product = Product.objects.create(name="Pen", price=10, created_by=self.user)
+        for number in range(1, 6):
+            invoice = SalesInvoice.objects.create(
+                created_by=self.user, customer=self.customer, customer_name="Acme",
+                invoice_number=f"EXP-{number}", invoice_date=date(2024, 1, number), total_amount=10 * number,
+            )
+            if number != 3:
+                post_sales_invoice_items(invoice, [
+                    {"product": self.product, "quantity": number, "price": 10, "amount": 10 * number},
+                    {"product": self.product, "quantity": 1, "price": 5, "amount": 5},
+                ])
+
+    def _read(self, result):
+        import csv
+        import gzip
+
+        opener = gzip.open if result["compressed"] else open
+        with opener(result["file_path"], "rt", encoding="utf-8", newline="") as export_file:
+            return list(csv.DictReader(export_file))
+
+    def test_export_walks_invoices_in_chunks(self):
+        import json
+        from billing.sales_export import write_sales_export
+        from billing.serializers import SalesInvoiceSerializer
+
+        result = write_sales_export(self.user, {"ordering": "invoice_date"}, chunk_size=2)
+        rows = self._read(result)
+
+        self.assertEqual(result["rows"], 5)
+        self.assertEqual(result["csv_rows"], 9)
+        self.assertIn("rows_per_second", result)
+        self.assertIn("peak_rss_mb", result)
+        self.assertEqual(
+            [row["invoice_number"] for row in rows if row["item_index"] in ("", "1")],
+            ["EXP-1", "EXP-2", "EXP-3", "EXP-4", "EXP-5"],
+        )
+        empty = next(row for row in rows if row["invoice_number"] == "EXP-3")
+        self.assertEqual((empty["invoice_row_type"], empty["items_count"], empty["item_id"]), ("invoice", "0", ""))
+
+        invoice = SalesInvoice.objects.get(invoice_number="EXP-2")
+        expected = json.loads(json.dumps(SalesInvoiceSerializer(invoice).data, default=str))
+        expected_items = {item["id"]: item for item in expected.pop("items")}
+        customer_details = expected.pop("customer_details")
+        exported = [row for row in rows if row["invoice_number"] == "EXP-2"]
+        self.assertEqual(json.loads(exported[0]["invoice_payload_json"]), expected)
+        self.assertEqual(json.loads(exported[0]["customer_details_json"]), customer_details)
+        for row in exported:
+            self.assertEqual(json.loads(row["item_payload_json"]), expected_items[row["item_id"]])
+
+    def test_gzip_export_and_flat_query_count(self):
+        from billing.sales_export import write_sales_export
+
+        with self.assertNumQueries(2 * 3):
+            result = write_sales_export(self.user, {"ordering": "-customer_name", "compression": "gzip"}, chunk_size=2)
+
+        self.assertTrue(result["file_path"].endswith(".csv.gz"))
+        self.assertEqual(len(self._read(result)), 9)
+
+
+class FefoAllocationTests(TestCase):
+    def setUp(self):
+        from inventory.models import ProductBatch, StockPoint, Warehouse
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="fefo_user", email="fefo@test.com", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(name="Cough Syrup", price=40, sale_price=60, created_by=self.user)
+        self.warehouse = Warehouse.objects.create(name="Counter", created_by=self.user)
+        self.early = ProductBatch.objects.create(product=self.product, batch_number="E1", expiry_date=date(2030, 1, 31))
+        self.late = ProductBatch.objects.create(product=self.product, batch_number="L1", expiry_date=date(2031, 1, 31))
+        self.empty = ProductBatch.objects.create(product=self.product, batch_number="Z0", expiry_date=date(2029, 1, 31))
+        for batch, quantity in ((self.early, 3), (self.late, 10), (self.empty, 0)):
+            StockPoint.objects.create(batch=batch, warehouse=self.warehouse, quantity=quantity)
+
+    def _invoice(self, number, quantity):
+        return self.client.post("/api/billing/sales-invoices/", {
+            "customer_name": "Walk-in",
+            "invoice_number": number,
+            "invoice_date": "2024-01-01",
+            "warehouse": str(self.warehouse.pk),
+            "items": [{"product": str(self.product.pk), "quantity": quantity, "price": "60.00"}],
+        }, format='json')
+
+    def _stock_points(self):
+        from inventory.models import StockPoint
+        return dict(StockPoint.objects.filter(warehouse=self.warehouse).values_list("batch__batch_number", "quantity"))
+
+    def test_line_is_split_across_batches_by_expiry(self):
+        res = self._invoice("FEFO-1", 5)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        invoice = SalesInvoice.objects.get(invoice_number="FEFO-1")
+        self.assertEqual(
+            list(invoice.items.order_by("batch__expiry_date").values_list("batch__batch_number", "quantity")),
+            [("E1", 3), ("L1", 2)],
+        )
+        self.assertEqual(invoice.total_amount, Decimal("300.00"))
+        self.assertEqual(self._stock_points(), {"E1": 0, "L1": 8, "Z0": 0})
+
+    def test_shortage_is_rejected_instead_of_overselling(self):
+        res = self._invoice("FEFO-2", 14)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Cough Syrup: 14 pcs requested, 13 available", str(res.data))
+        self.assertFalse(SalesInvoice.objects.filter(invoice_number="FEFO-2").exists())
+        self.assertEqual(self._stock_points(), {"E1": 3, "L1": 10, "Z0": 0})
+
+    def test_all_candidate_rows_are_locked_once_in_pk_order(self):
+        from unittest.mock import patch
+        from billing import allocation
+
+        real_lock = allocation._lock_stock_points
+        locked = []
+
+        def lock(warehouse, product_ids, released):
+            points = real_lock(warehouse, product_ids, released)
+            locked.append([point[0] for point in points])
+            return points
+
+        with patch.object(allocation, "_lock_stock_points", side_effect=lock):
+            res = self._invoice("FEFO-3", 5)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(locked), 1)
+        self.assertEqual(locked[0], sorted(locked[0]))
+        self.assertEqual(self._stock_points(), {"E1": 0, "L1": 8, "Z0": 0})
+
+    def test_null_batch_is_allocated(self):
+        res = self.client.post("/api/billing/sales-invoices/", {
+            "customer_name": "Walk-in",
+            "invoice_number": "FEFO-4",
+            "invoice_date": "2024-01-01",
+            "warehouse": str(self.warehouse.pk),
+            "items": [{"product": str(self.product.pk), "batch": None, "quantity": 14, "price": "60.00"}],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._stock_points(), {"E1": 3, "L1": 10, "Z0": 0})
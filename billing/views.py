@@ -1,3 +1,4 @@
+from collections import defaultdict
 from decimal import Decimal
 
 from django.db import DatabaseError, ProgrammingError
@@ -9,12 +10,23 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 import logging
 
+from analytics.rollups import batched_rollups
+from cenvoras.pagination import InvalidCursor, cursor_key, decode_cursor, encode_cursor, keyset_page, parse_page_limit
 from inventory.serializers import ProductSerializer
 
-from .models import PurchaseBill, PurchaseBillItem, SalesInvoice, PurchaseOrder
-from .serializers import PurchaseBillSerializer, SalesInvoiceSerializer
+from .models import DocumentSequence, PurchaseBill, PurchaseBillItem, SalesInvoice, SalesInvoiceItem, PurchaseOrder
+from .serializers import (
+    PurchaseBillSerializer,
+    SalesInvoiceListItemSerializer,
+    SalesInvoiceListSerializer,
+    SalesInvoiceSerializer,
+)
+from .sequences import fiscal_year, peek_next_number, tenant_prefix
 from .serializers_purchase_order import PurchaseOrderSerializer
 
+SALES_INVOICE_KEYSET_FIELDS = ('invoice_date', 'created_at', 'id')
+SALES_INVOICE_PAGE_SIZE = 50
+
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
@@ -191,6 +203,7 @@ def purchase_order_detail(request, pk):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@batched_rollups()
 def purchase_order_convert_to_bill(request, pk):
     """Convert a PurchaseOrder into a PurchaseBill (marking as received)."""
     tenant = request.user.active_tenant
@@ -259,7 +272,10 @@ def sales_invoice_list_create(request):
             if status_filter and status_filter != 'all':
                 invoices = invoices.filter(status=status_filter)
 
-            serializer = SalesInvoiceSerializer(invoices, many=True)
+            if any(param in request.GET for param in ('limit', 'cursor', 'fields', 'expand')):
+                return _sales_invoice_page(request, invoices)
+
+            serializer = SalesInvoiceSerializer(invoices.select_related('created_by'), many=True)
             return Response(serializer.data)
         except (ProgrammingError, DatabaseError) as exc:
             return Response(
@@ -286,6 +302,61 @@ def sales_invoice_list_create(request):
     return Response({'error': 'Validation failed', 'details': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _sales_invoice_page(request, invoices):
+    """
+    Lightweight keyset page of the invoice list: newest first, rows read with
+    ``.values()``, ``?fields=`` picks the columns and ``?expand=items`` adds
+    the line items with one extra query for the whole page.
+    """
+    available = SalesInvoiceListSerializer.VALUES
+    requested = request.GET.get('fields')
+    fields = [name.strip() for name in requested.split(',') if name.strip()] if requested else list(available)
+    unknown = [name for name in fields if name not in available]
+    expand = {name.strip() for name in request.GET.get('expand', '').split(',') if name.strip()}
+    if unknown or expand - {'items'}:
+        return Response(
+            {'error': 'Unknown field or expansion.', 'details': sorted(unknown + list(expand - {'items'}))},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        limit = parse_page_limit(request.GET.get('limit'), default=SALES_INVOICE_PAGE_SIZE)
+        cursor = request.GET.get('cursor')
+        after = cursor_key(decode_cursor(cursor), SalesInvoice, SALES_INVOICE_KEYSET_FIELDS) if cursor else None
+    except InvalidCursor as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    columns = {available[name] for name in fields} | set(SALES_INVOICE_KEYSET_FIELDS)
+    rows, has_more = keyset_page(
+        invoices.prefetch_related(None).values(*columns),
+        SALES_INVOICE_KEYSET_FIELDS, limit, after=after, descending=True,
+    )
+
+    if 'items' in expand:
+        items_by_invoice = defaultdict(list)
+        item_rows = (
+            SalesInvoiceItem.objects.filter(sales_invoice_id__in=[row['id'] for row in rows])
+            .values('sales_invoice_id', *SalesInvoiceListItemSerializer.VALUES.values())
+        )
+        for item in item_rows:
+            items_by_invoice[item['sales_invoice_id']].append(item)
+        for row in rows:
+            row['items'] = items_by_invoice[row['id']]
+        fields = fields + ['items']
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor({field: str(last[field]) for field in SALES_INVOICE_KEYSET_FIELDS})
+
+    return Response({
+        'count': len(rows),
+        'has_more': has_more,
+        'next_cursor': next_cursor,
+        'results': SalesInvoiceListSerializer(rows, many=True, fields=fields).data,
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def sales_invoice_detail(request, pk):
@@ -334,31 +405,17 @@ def sales_invoice_update_delete(request, pk):
 @permission_classes([IsAuthenticated])
 def get_next_invoice_number(request):
     prefix = request.GET.get('prefix', 'INV-')
-    tenant_id = str(request.user.active_tenant.id)[:4].upper()
-    full_prefix = f'{prefix}{tenant_id}-'
-
-    invoices = SalesInvoice.objects.filter(
-        created_by=request.user.active_tenant,
-        invoice_number__startswith=full_prefix,
-    )
-
-    max_num = 0
-    for inv in invoices:
-        suffix = inv.invoice_number.replace(full_prefix, '')
-        try:
-            num = int(suffix)
-            if num > max_num:
-                max_num = num
-        except ValueError:
-            continue
+    tenant = request.user.active_tenant
+    tenant_id = str(tenant.id)[:4].upper()
+    full_prefix = tenant_prefix(tenant, prefix)
+    next_number = peek_next_number(tenant, DocumentSequence.INVOICE, full_prefix, fiscal_year=fiscal_year())
 
-    next_num = max_num + 1
     return Response(
         {
             'success': True,
             'uuid_prefix': tenant_id,
-            'next_number': f'{full_prefix}{next_num:03d}',
-            'suffix': f'{next_num:03d}',
+            'next_number': next_number,
+            'suffix': next_number[len(full_prefix):],
         }
     )
 
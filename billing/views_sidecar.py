@@ -5,8 +5,10 @@ from rest_framework.response import Response
 from django.db.models import Q
 from .models_sidecar import SalesOrder, SalesOrderItem, DeliveryChallan, InvoiceSettings, Quotation, QuotationItem
 from .serializers_sidecar import SalesOrderSerializer, DeliveryChallanSerializer, InvoiceSettingsSerializer, QuotationSerializer
-from .models import SalesInvoice, SalesInvoiceItem
+from .models import DocumentSequence, SalesInvoice, SalesInvoiceItem
+from .sequences import allocate_number, fiscal_year, peek_next_number, tenant_prefix
 from cenvoras.pagination import StandardResultsSetPagination
+from analytics.rollups import batched_rollups
 from datetime import date
 from decimal import Decimal
 
@@ -71,6 +73,7 @@ def sales_order_detail(request, pk):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@batched_rollups()
 def convert_order_to_invoice(request, pk):
     tenant = request.user.active_tenant
     try:
@@ -82,23 +85,7 @@ def convert_order_to_invoice(request, pk):
     if not prefix.endswith('-'):
         prefix = f"{prefix}-"
 
-    invoices = SalesInvoice.objects.filter(
-        created_by=tenant,
-        invoice_number__startswith=prefix,
-    )
-
-    max_num = 0
-    for inv in invoices:
-        suffix = inv.invoice_number.replace(prefix, '', 1)
-        try:
-            num = int(suffix)
-            if num > max_num:
-                max_num = num
-        except (TypeError, ValueError):
-            continue
-
-    next_num = max_num + 1
-    next_invoice_number = f"{prefix}{next_num:03d}"
+    next_invoice_number = allocate_number(tenant, DocumentSequence.INVOICE, prefix, fiscal_year=fiscal_year(date.today()))
 
     invoice = SalesInvoice.objects.create(
         customer=order.customer,
@@ -279,25 +266,14 @@ def quotation_next_number(request):
     prefix = request.GET.get('prefix', 'QT-')
 
     tenant_code = str(tenant.id)[:4].upper()
-    full_prefix = f'{prefix}{tenant_code}-'
-    quotations = Quotation.objects.filter(created_by=tenant, quotation_number__startswith=full_prefix)
-
-    max_num = 0
-    for q in quotations:
-        suffix = q.quotation_number.replace(full_prefix, '')
-        try:
-            num = int(suffix)
-            if num > max_num:
-                max_num = num
-        except ValueError:
-            continue
-
-    next_num = max_num + 1
+    full_prefix = tenant_prefix(tenant, prefix)
+    next_number = peek_next_number(tenant, DocumentSequence.QUOTATION, full_prefix, fiscal_year=fiscal_year())
+
     return Response({
         'success': True,
         'uuid_prefix': tenant_code,
-        'next_number': f'{full_prefix}{next_num:03d}',
-        'suffix': f'{next_num:03d}',
+        'next_number': next_number,
+        'suffix': next_number[len(full_prefix):],
     })
 
 
@@ -329,8 +305,9 @@ def quotation_convert_to_sales_order(request, pk):
         )
 
     order_total = sum(Decimal(str(item.amount)) for item in selected_items)
-    next_index = SalesOrder.objects.filter(created_by=tenant).count() + 1
-    order_number = f'SO-{tenant.id.hex[:4].upper()}-{next_index:03d}'
+    order_number = allocate_number(
+        tenant, DocumentSequence.SALES_ORDER, tenant_prefix(tenant, 'SO-'), fiscal_year=fiscal_year(date.today()),
+    )
 
     order_customer = quotation.customer
     if not order_customer:
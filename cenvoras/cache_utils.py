@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import OrderedDict
 from typing import Any, Callable
 
 from django.core.cache import cache
@@ -8,6 +11,7 @@ CACHE_VERSION = 'v1'
 CACHE_TTL_SHORT = 60
 CACHE_TTL_MEDIUM = 300
 CACHE_TTL_LONG = 3600
+CACHE_TTL_LOCAL = 10
 
 
 def _join_key_parts(*parts: Any) -> str:
@@ -33,4 +37,50 @@ def cache_get_or_set(key: str, timeout: int, builder: Callable[[], Any]) -> Any:
 
 
 def cache_delete_many(*keys: str) -> None:
-    cache.delete_many([key for key in keys if key])
\ No newline at end of file
+    cache.delete_many([key for key in keys if key])
+
+
+class LocalLRUCache:
+    """
+    Small thread-safe per-process LRU with per-entry expiry.
+
+    Sits in front of the shared Redis cache for lookups that happen on every
+    request, so the hot path does not pay a network round-trip. Entries are not
+    shared across processes, so keep TTLs short and delete explicitly on change.
+    """
+
+    def __init__(self, maxsize: int = 1024, timeout: int = CACHE_TTL_LOCAL):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, timeout: float | None = None) -> None:
+        ttl = self.timeout if timeout is None else min(timeout, self.timeout)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -51,11 +51,35 @@ app.conf.beat_schedule = {
         # Run every 15 minutes to catch 24h reminder and exact expiry windows reliably.
         'schedule': crontab(minute='*/15'),
     },
+    'subscription-state-sync': {
+        'task': 'subscription.tasks.sync_subscription_states',
+        # Persist pending-plan activation and past_due marking off the request path.
+        'schedule': crontab(minute='*/5'),
+    },
     'subscription-payment-pending-reconciliation': {
         'task': 'subscription.tasks.reconcile_pending_subscription_payments',
         # Run every 5 minutes to heal missed/delayed success webhooks.
         'schedule': crontab(minute='*/5'),
     },
+    'analytics-product-forecast-refresh': {
+        'task': 'analytics.tasks.refresh_all_product_forecasts',
+        # Nightly, after the backup window, so forecasts include the full previous day.
+        'schedule': crontab(minute=30, hour=3),
+    },
+    'audit-log-partition-maintenance': {
+        'task': 'audit_log.tasks.maintain_audit_log_storage',
+        # Keeps next months' partitions ready and archives months past retention.
+        'schedule': crontab(minute=45, hour=3),
+    },
+    'inventory-month-end-valuation-snapshot': {
+        'task': 'inventory.tasks.snapshot_month_end_valuations',
+        # First of the month, for the month that just closed.
+        'schedule': crontab(minute=0, hour=4, day_of_month=1),
+    },
+    'inventory-month-end-stock-checkpoint': {
+        'task': 'inventory.tasks.close_stock_periods',
+        'schedule': crontab(minute=30, hour=3, day_of_month=1),
+    },
 }
 
 
@@ -1,3 +1,8 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
@@ -21,3 +26,77 @@ class StandardResultsSetPagination(PageNumberPagination):
             'current_page': self.page.number,
             'results': data,
         })
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as exc:
+        raise InvalidCursor('Invalid cursor.') from exc
+    if not isinstance(payload, dict):
+        raise InvalidCursor('Invalid cursor.')
+    return payload
+
+
+def parse_page_limit(value, default=100, maximum=1000) -> int:
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor('limit must be a positive integer.') from exc
+    if limit < 1:
+        raise InvalidCursor('limit must be a positive integer.')
+    return min(limit, maximum)
+
+
+def keyset_filter(queryset, fields, values, descending=False):
+    """
+    Restrict ``queryset`` to rows strictly after ``values`` in ``fields`` order,
+    i.e. ``(f1, f2, ...) > (v1, v2, ...)`` (or ``<`` when descending), expanded
+    into an OR of prefixes so the leading index column stays usable.
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for position, field in enumerate(fields):
+        prefix = {fields[i]: values[i] for i in range(position)}
+        condition |= Q(**prefix, **{f'{field}__{lookup}': values[position]})
+    return queryset.filter(condition)
+
+
+def keyset_page(queryset, fields, limit, after=None, descending=False):
+    """
+    Return ``(rows, has_more)`` for the next ``limit`` rows ordered by
+    ``fields``; ``after`` is the key tuple of the last row already served.
+    """
+    ordering = [f'-{field}' if descending else field for field in fields]
+    queryset = queryset.order_by(*ordering)
+    if after is not None:
+        queryset = keyset_filter(queryset, fields, after, descending=descending)
+    rows = list(queryset[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def cursor_for(obj, fields, **extra) -> str:
+    """Encode the ``fields`` values of ``obj`` (plus any ``extra`` state) as a cursor."""
+    payload = {field: str(getattr(obj, field)) for field in fields}
+    payload.update({key: str(value) for key, value in extra.items()})
+    return encode_cursor(payload)
+
+
+def cursor_key(payload, model, fields):
+    """Turn a decoded cursor back into a typed key tuple for ``keyset_page``."""
+    try:
+        return tuple(model._meta.get_field(field).to_python(payload[field]) for field in fields)
+    except (KeyError, ValidationError) as exc:
+        raise InvalidCursor('Invalid cursor.') from exc
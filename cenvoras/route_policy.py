@@ -0,0 +1,153 @@
+"""
+Single registry of API route prefixes used by the access middlewares.
+
+Prefixes are compiled once into a character trie, so a request path is walked
+a single time to find its manager permission module, required plan feature,
+free-plan allowance and permission-check exemption. Results are memoized per
+path and attached to the request as ``request.route_policy``.
+
+Register new API surfaces here rather than in the individual middlewares.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Free plan: only these API surfaces stay unlocked.
+FREE_PLAN_PREFIXES = (
+    '/api/subscription/',
+    '/api/users/profile/',
+    '/api/users/profile/update/',
+    '/api/users/profile/setup/',
+    '/api/billing/sales-invoices/',
+    '/api/billing/customers/',
+    '/api/billing/payments/',
+)
+
+# Plan feature required per route. The most specific prefix wins.
+FEATURE_PREFIXES = (
+    ('/api/analytics/ml-predictions/', 'sales_forecast'),
+    ('/api/inventory/warehouses/', 'multi_warehouse'),
+    ('/api/reports/profit-loss/', 'item_wise_pnl'),
+    ('/api/reports/stock-ledger/', 'stock_ledger'),
+    ('/api/reports/shortage/', 'shortage_management'),
+    ('/api/reports/', 'advanced_reports'),
+    ('/api/integration/', 'integrations'),
+    ('/api/analytics/', 'advanced_analytics'),
+    ('/api/inventory/', 'inventory_core'),
+    ('/api/hr/payroll-runs/', 'hr_payroll'),
+    ('/api/hr/payslips/', 'hr_payroll'),
+    ('/api/hr/', 'hr_basic'),
+)
+
+# Routes that skip manager module permission checks entirely.
+PERMISSION_EXEMPT_PREFIXES = (
+    '/api/users/',
+    '/api/subscription/',
+    '/api/ai/',
+    '/api/integration/',
+)
+
+# Manager permission module per route (raw prefix match, no trailing slash).
+MODULE_PREFIXES = (
+    ('/api/billing/sales-invoices', 'sales'),
+    ('/api/billing/customers', 'sales'),
+    ('/api/billing/quotations', 'sales'),
+    ('/api/billing/sales-orders', 'sales'),
+    ('/api/billing/credit-notes', 'sales'),
+    ('/api/billing/delivery-challans', 'sales'),
+    ('/api/billing/invoice-settings', 'sales'),
+    ('/api/billing/purchase-bills', 'purchases'),
+    ('/api/billing/vendors', 'purchases'),
+    ('/api/billing/vendor-products', 'purchases'),
+    ('/api/billing/debit-notes', 'purchases'),
+    ('/api/inventory', 'inventory'),
+    ('/api/ledger', 'financials'),
+    ('/api/billing/payments', 'financials'),
+    ('/api/billing/gst', 'financials'),
+    ('/api/billing/reports', 'financials'),
+    ('/api/reports', 'financials'),
+    ('/api/analytics', 'financials'),
+)
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    module: str | None = None
+    required_feature: str | None = None
+    free_plan_allowed: bool = False
+    permission_exempt: bool = False
+
+
+def normalize_path(path: str) -> str:
+    if not path:
+        return '/'
+    return path if path.endswith('/') else f'{path}/'
+
+
+class PrefixRouter:
+    """
+    Character trie over route prefixes.
+
+    Each rule is registered with a match mode: ``slash_normalized`` rules
+    compare against the path with a trailing slash added (so ``/api/hr``
+    matches ``/api/hr/``), the others compare against the raw path. Walking
+    the normalized path once answers both kinds; the longest matching prefix
+    wins per attribute.
+    """
+
+    _RULES = '__rules__'
+
+    def __init__(self):
+        self._root: dict = {}
+
+    def register(self, prefix: str, attribute: str, value, *, slash_normalized: bool = True) -> None:
+        key = normalize_path(prefix) if slash_normalized else prefix
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(self._RULES, []).append((attribute, value, slash_normalized))
+
+    def resolve(self, path: str) -> RoutePolicy:
+        raw_length = len(path or '')
+        matched: dict = {}
+        node = self._root
+        for depth, char in enumerate(normalize_path(path), start=1):
+            node = node.get(char)
+            if node is None:
+                break
+            for attribute, value, slash_normalized in node.get(self._RULES, ()):
+                # Raw rules must not consume the slash added by normalization.
+                if slash_normalized or depth <= raw_length:
+                    matched[attribute] = value
+        return RoutePolicy(**matched)
+
+
+def build_router() -> PrefixRouter:
+    router = PrefixRouter()
+    for prefix in FREE_PLAN_PREFIXES:
+        router.register(prefix, 'free_plan_allowed', True)
+    for prefix, feature_code in FEATURE_PREFIXES:
+        router.register(prefix, 'required_feature', feature_code)
+    for prefix in PERMISSION_EXEMPT_PREFIXES:
+        router.register(prefix, 'permission_exempt', True, slash_normalized=False)
+    for prefix, module in MODULE_PREFIXES:
+        router.register(prefix, 'module', module, slash_normalized=False)
+    return router
+
+
+_router = build_router()
+
+
+@lru_cache(maxsize=4096)
+def resolve_route_policy(path: str) -> RoutePolicy:
+    return _router.resolve(path)
+
+
+def get_route_policy(request) -> RoutePolicy:
+    """Resolve the request path once and keep the result on the request."""
+    policy = getattr(request, 'route_policy', None)
+    if policy is None:
+        policy = resolve_route_policy(request.path or '/')
+        request.route_policy = policy
+    return policy
@@ -232,7 +232,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework configuration (basic, can be extended)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -253,6 +253,26 @@ REST_FRAMEWORK = {
     },
 }
 
+# Seconds a validated access token's user row is reused per process before
+# it is re-read from the database.
+JWT_USER_CACHE_SECONDS = int(os.environ.get('JWT_USER_CACHE_SECONDS', 30))
+
+# Automatic audit logging (audit_log.signals). AUDIT_LOG_MODELS limits it to the
+# listed models ("Model" or "app_label.Model"); empty audits every model.
+# AUDIT_LOG_SAMPLE_RATES keeps a fraction of events per model, e.g.
+# "StockPoint=0.1,*=1". AUDIT_LOG_ASYNC hands batches to Celery.
+AUDIT_LOG_MODELS = [name.strip() for name in os.environ.get('AUDIT_LOG_MODELS', '').split(',') if name.strip()]
+AUDIT_LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (
+        item.partition('=') for item in os.environ.get('AUDIT_LOG_SAMPLE_RATES', '').split(',') if '=' in item
+    )
+}
+AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'False').lower() in ('1', 'true', 'yes', 'on')
+# Months of audit history kept in the database; older months are archived to
+# gzip NDJSON under audit_archive/ in default storage and dropped.
+AUDIT_LOG_RETENTION_MONTHS = int(os.environ.get('AUDIT_LOG_RETENTION_MONTHS', 12))
+
 # CORS configuration (allow all for development, restrict in production)
 CORS_ALLOW_ALL_ORIGINS = os.environ.get('CORS_ALLOW_ALL_ORIGINS', 'False').lower() in ('1', 'true', 'yes', 'on')
 CORS_ALLOW_CREDENTIALS = os.environ.get('CORS_ALLOW_CREDENTIALS', 'False').lower() in ('1', 'true', 'yes', 'on')
@@ -0,0 +1,326 @@
+"""
+Set-based product catalogue upload.
+
+The CSV is normalized and validated column by column with pandas (header
+aliases, unit aliases, loose numbers such as ``'18%'`` or ``'1,234.50'``),
+producing per-row errors in the same shape as ``ProductSerializer`` without
+touching the database. Valid rows are then upserted by ``(tenant, name)`` in
+chunks: one query resolves the chunk's existing products, new products and
+their ``ProductMeta`` rows are written with ``bulk_create``, existing products
+with ``bulk_update``, and opening stock of new products is booked as an
+``OPENING`` batch with a ``StockPoint`` in the tenant's default warehouse
+and an opening ``StockMovement``, and costed as an opening layer.
+Stock of existing products is left alone; it is driven by documents.
+A chunk the database rejects is retried one row at a time under a savepoint
+per row, so only the offending rows are reported as failed.
+"""
+import csv
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import movements
+from .costing import note_recorded as note_costs_recorded
+from .models import Product, ProductBatch, StockMovement, StockPoint, Warehouse
+from .models_sidecar import ProductMeta
+
+CHUNK_ROWS = 2000
+_MAX_INTEGER = 2147483647
+OPENING_BATCH_NUMBER = 'OPENING'
+
+HEADER_ALIASES = {
+    'name': ['name', 'product_name', 'item_name', 'product', 'item'],
+    'unit': ['unit', 'uom', 'unit_of_measure', 'measurement_unit'],
+    'cost_price': ['cost_price', 'price', 'purchase_price', 'cost'],
+    'sale_price': ['sale_price', 'sales_price', 'selling_price', 'saleprice', 'salesprice'],
+    'hsn_sac_code': ['hsn_sac_code', 'hsn_code', 'hsn'],
+    'tax': ['tax', 'gst', 'gst_rate', 'tax_rate'],
+    'low_stock_alert': ['low_stock_alert', 'min_stock_level', 'reorder_level'],
+    'stock': ['stock', 'opening_stock', 'current_stock'],
+    'secondary_unit': ['secondary_unit', 'secondaryunit'],
+    'conversion_factor': ['conversion_factor', 'conversionfactor'],
+    'warranty_months': ['warranty_months', 'warranty', 'warranty_month'],
+}
+
+EXPECTED_FIELDS = [
+    'name', 'hsn_sac_code', 'description', 'tax', 'stock', 'unit', 'secondary_unit', 'conversion_factor',
+    'cost_price', 'sale_price', 'low_stock_alert', 'warranty_months',
+]
+OPTIONAL_NULLABLE_FIELDS = {'hsn_sac_code', 'description', 'secondary_unit', 'sale_price'}
+INTEGER_FIELDS = {'stock', 'conversion_factor', 'low_stock_alert', 'warranty_months'}
+NON_NEGATIVE_FIELDS = {'conversion_factor', 'low_stock_alert', 'warranty_months'}
+DECIMAL_FIELDS = {'tax': 5, 'cost_price': 10, 'sale_price': 10}  # field -> max_digits, 2 decimal places
+MAX_LENGTHS = {'name': 255, 'hsn_sac_code': 20, 'secondary_unit': 20}
+
+UNIT_ALIASES = {
+    'nos': 'pcs',
+    'no': 'pcs',
+    'piece': 'pcs',
+    'pieces': 'pcs',
+    'pc': 'pcs',
+    'pcs': 'pcs',
+    'unit': 'pcs',
+    'units': 'pcs',
+    'ltr': 'l',
+    'litre': 'l',
+    'liter': 'l',
+    'litres': 'l',
+    'liters': 'l',
+}
+UNIT_VALUES = {value for value, _label in Product.UNIT_CHOICES}
+
+# Product columns an upload may overwrite on an existing product.
+UPDATE_FIELDS = [
+    'hsn_sac_code', 'description', 'tax', 'unit', 'secondary_unit', 'conversion_factor',
+    'price', 'sale_price', 'low_stock_alert', 'warranty_months',
+]
+_MODEL_FIELD = {'cost_price': 'price'}
+
+_NUMBER_PATTERN = r'(-?\d+(?:\.\d+)?)'
+
+
+def normalize_key(key):
+    return (key or '').strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def _read_frame(csv_content):
+    rows = list(csv.reader(StringIO(csv_content)))
+    if not rows:
+        return pd.DataFrame(columns=['row'])
+    header = [normalize_key(name) for name in rows[0]]
+    width = len(header)
+    records = [row[:width] + [''] * (width - len(row)) for row in rows[1:] if row]
+    frame = pd.DataFrame(records, columns=header, dtype=object)
+    # Duplicate normalized headers: the last column wins, as with a dict row.
+    frame = frame.loc[:, ~frame.columns.duplicated(keep='last')]
+    frame = frame.drop(columns=[''], errors='ignore').apply(lambda column: column.str.strip())
+    frame['row'] = np.arange(2, len(frame) + 2)
+    blank = frame.drop(columns='row').eq('').all(axis=1)
+    return frame[~blank].reset_index(drop=True)
+
+
+def _coalesce_column(frame, field):
+    """The field's own column, falling back to its aliases where blank."""
+    values = pd.Series('', index=frame.index, dtype=object)
+    for column in [field] + HEADER_ALIASES.get(field, []):
+        if column in frame:
+            values = values.where(values != '', frame[column])
+    return values
+
+
+def _extract_numbers(values):
+    text = (
+        values.str.lower()
+        .str.replace(',', '', regex=False)
+        .str.replace('%', '', regex=False)
+        .str.replace('gst', '', regex=False)
+        .str.replace('tax', '', regex=False)
+        .str.strip()
+    )
+    return pd.to_numeric(text.str.extract(_NUMBER_PATTERN, expand=False), errors='coerce')
+
+
+class _Errors:
+    """Collects ``{row: {field: [messages]}}`` from boolean masks."""
+
+    def __init__(self, frame):
+        self.rows = frame['row']
+        self.by_row = {}
+
+    def add(self, mask, field, message):
+        for row, value in zip(self.rows[mask], mask[mask].index):
+            text = message(value) if callable(message) else message
+            self.by_row.setdefault(int(row), {}).setdefault(field, []).append(text)
+
+    def failed(self):
+        return self.rows.isin(list(self.by_row))
+
+    def as_list(self):
+        return [{'row': row, 'errors': errors} for row, errors in sorted(self.by_row.items())]
+
+
+def validate_frame(csv_content):
+    """
+    Normalize and validate every row at once. Returns ``(records, errors)``:
+    ``records`` is a list of ``(row_number, fields)`` for valid rows with only
+    the supplied fields set; ``errors`` uses the serializer's error shape.
+    """
+    frame = _read_frame(csv_content)
+    errors = _Errors(frame)
+    values = {field: _coalesce_column(frame, field) for field in EXPECTED_FIELDS}
+    present = {field: column != '' for field, column in values.items()}
+    parsed = pd.DataFrame(index=frame.index)
+
+    errors.add(~present['name'], 'name', 'This field is required.')
+    errors.add(~present['sale_price'], 'sale_price', 'This field is required.')
+    for field, max_length in MAX_LENGTHS.items():
+        errors.add(values[field].str.len() > max_length, field,
+                   f'Ensure this field has no more than {max_length} characters.')
+
+    units = values['unit'].str.lower()
+    units = units.map(UNIT_ALIASES).fillna(units)
+    parsed['unit'] = units
+    errors.add(present['unit'] & ~units.isin(UNIT_VALUES), 'unit',
+               lambda index: f'"{values["unit"][index]}" is not a valid choice.')
+
+    for field in INTEGER_FIELDS:
+        numbers = _extract_numbers(values[field])
+        errors.add(present[field] & numbers.isna(), field, 'Invalid integer value.')
+        parsed[field] = np.trunc(numbers)
+        errors.add(parsed[field] > _MAX_INTEGER, field, f'Ensure this value is less than or equal to {_MAX_INTEGER}.')
+        if field in NON_NEGATIVE_FIELDS:
+            errors.add(parsed[field] < 0, field, 'Ensure this value is greater than or equal to 0.')
+        else:
+            errors.add(parsed[field] < -_MAX_INTEGER - 1, field,
+                       f'Ensure this value is greater than or equal to {-_MAX_INTEGER - 1}.')
+
+    for field, max_digits in DECIMAL_FIELDS.items():
+        numbers = _extract_numbers(values[field])
+        errors.add(present[field] & numbers.isna(), field, 'Invalid number value.')
+        cents = numbers * 100
+        errors.add((cents - cents.round()).abs() > 1e-6, field, 'Ensure that there are no more than 2 decimal places.')
+        errors.add(numbers.abs() >= 10 ** (max_digits - 2), field,
+                   f'Ensure that there are no more than {max_digits} digits in total.')
+        parsed[field] = numbers.round(2)
+
+    for field in ('name', 'hsn_sac_code', 'description', 'secondary_unit'):
+        parsed[field] = values[field]
+
+    valid = ~errors.failed()
+    repeated = valid & parsed['name'].where(valid).duplicated(keep='first') & present['name']
+    errors.add(repeated, 'name', 'This product name appears earlier in the file.')
+    valid &= ~repeated
+
+    records = []
+    for index in frame.index[valid]:
+        fields = {}
+        for field in EXPECTED_FIELDS:
+            if not present[field][index]:
+                if field in OPTIONAL_NULLABLE_FIELDS:
+                    fields[field] = None
+                continue
+            value = parsed[field][index]
+            if field in INTEGER_FIELDS:
+                value = int(value)
+            elif field in DECIMAL_FIELDS:
+                value = Decimal(str(value)).quantize(Decimal('0.01'))
+            fields[field] = value
+        records.append((int(frame['row'][index]), fields))
+    return records, errors.as_list()
+
+
+class ProductUpload:
+    """Upsert validated rows into ``tenant``'s catalogue, ``chunk_rows`` at a time."""
+
+    def __init__(self, tenant, *, chunk_rows=CHUNK_ROWS):
+        self.tenant = tenant
+        self.chunk_rows = chunk_rows
+        self.created_count = 0
+        self.updated_count = 0
+        self._warehouse = None
+
+    def run(self, csv_content):
+        records, errors = validate_frame(csv_content)
+        for start in range(0, len(records), self.chunk_rows):
+            chunk = records[start:start + self.chunk_rows]
+            try:
+                with transaction.atomic():
+                    self._upsert_chunk(chunk)
+            except DatabaseError:
+                self._warehouse = None
+                errors.extend(self._upsert_one_by_one(chunk))
+        errors.sort(key=lambda error: error['row'])
+        return {
+            'created_count': self.created_count,
+            'updated_count': self.updated_count,
+            'failed_count': len(errors),
+            'errors': errors,
+        }
+
+    def _upsert_one_by_one(self, records):
+        """Retry a failed chunk with a savepoint per row; return the errors of the rows that still fail."""
+        errors = []
+        with transaction.atomic():
+            for row, fields in records:
+                try:
+                    with transaction.atomic():
+                        self._upsert_chunk([(row, fields)])
+                except DatabaseError as exc:
+                    # The warehouse may have been created inside the rolled-back savepoint.
+                    self._warehouse = None
+                    errors.append({'row': row, 'errors': {'non_field_errors': [f'Product was not saved: {exc}']}})
+        return errors
+
+    def _default_warehouse(self):
+        if self._warehouse is None:
+            self._warehouse = (
+                Warehouse.objects.filter(created_by=self.tenant, is_active=True).first()
+                or Warehouse.objects.create(name='Main Warehouse', created_by=self.tenant)
+            )
+        return self._warehouse
+
+    def _upsert_chunk(self, records):
+        names = [fields['name'] for _row, fields in records]
+        existing = {}
+        for product in Product.objects.filter(created_by=self.tenant, name__in=names).order_by('pk'):
+            existing.setdefault(product.name, product)
+
+        new_products = []
+        changed = []
+        for _row, fields in records:
+            attributes = {_MODEL_FIELD.get(field, field): value for field, value in fields.items()}
+            product = existing.get(fields['name'])
+            if product is None:
+                attributes.setdefault('price', Decimal('0'))
+                new_products.append(Product(created_by=self.tenant, **attributes))
+                continue
+            updates = {
+                field: value for field, value in attributes.items()
+                if field in UPDATE_FIELDS and value is not None
+            }
+            if any(getattr(product, field) != value for field, value in updates.items()):
+                for field, value in updates.items():
+                    setattr(product, field, value)
+                changed.append(product)
+
+        Product.objects.bulk_create(new_products, batch_size=1000)
+        if changed:
+            Product.objects.bulk_update(changed, UPDATE_FIELDS, batch_size=1000)
+
+        product_ids = [product.pk for product in new_products] + [product.pk for product in existing.values()]
+        with_meta = set(ProductMeta.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+        ProductMeta.objects.bulk_create(
+            [ProductMeta(product_id=product_id) for product_id in product_ids if product_id not in with_meta],
+            batch_size=1000,
+        )
+
+        opening = [product for product in new_products if product.stock > 0]
+        if opening:
+            warehouse = self._default_warehouse()
+            batches = ProductBatch.objects.bulk_create(
+                [ProductBatch(product=product, batch_number=OPENING_BATCH_NUMBER) for product in opening],
+                batch_size=1000,
+            )
+            StockPoint.objects.bulk_create(
+                [
+                    StockPoint(batch=batch, warehouse=warehouse, quantity=product.stock)
+                    for batch, product in zip(batches, opening)
+                ],
+                batch_size=1000,
+            )
+            today = timezone.localdate()
+            note_costs_recorded(movements.record([
+                StockMovement(
+                    product=product, batch=batch, warehouse=warehouse, date=today, quantity=product.stock,
+                    unit_cost=product.price if product.price and product.price > 0 else None,
+                    source_type=StockMovement.OPENING, reference=OPENING_BATCH_NUMBER, created_by=self.tenant,
+                )
+                for batch, product in zip(batches, opening)
+            ]))
+
+        self.created_count += len(new_products)
+        self.updated_count += len(changed)
@@ -0,0 +1,476 @@
+"""
+Inventory costing: cost layers, moving-average and FIFO.
+
+Stock postings report the movements they recorded (``inventory.movements``)
+to ``note_recorded``. A movement dated on or after everything already costed
+for its product is applied incrementally: with the product rows locked in pk
+order, a receipt appends a ``CostLayer`` and an issue consumes the open
+layers and adds one ``IssueCost`` row, and ``ProductCost`` moves by the
+difference. Receipts open a layer per (product, batch, warehouse); issues
+consume the issuing batch's layers first and then the oldest ones (FIFO)
+while the moving average is carried alongside. Transfers only move stock
+between warehouses and are left out.
+
+Anything else (back-dated postings, reversed lines, stock edits) re-costs the
+product from its whole history with ``refresh_costs``: its movements are
+netted per document line so that reversed lines drop out, replayed in date
+order, and the resulting rows replace the old ones. Valuation and COGS then
+read those tables with one aggregate query instead of walking the catalogue
+or the invoice lines.
+
+Stock on hand that no movement explains (documents from before the movement
+ledger, until ``rebuild_costs`` backfills them) becomes an ``opening`` layer
+at the product's cost price, as the old valuation report assumed.
+"""
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Min, Sum, Value, When
+from django.utils import timezone
+
+from . import movements as stock_movements
+from .models import Product
+from .models_costing import CostLayer, IssueCost, ProductCost, ValuationSnapshot
+from .models_movements import StockMovement
+
+AVERAGE = 'average'
+FIFO = 'fifo'
+METHODS = (AVERAGE, FIFO)
+
+_ZERO = Decimal('0')
+_CENT = Decimal('0.01')
+_UNIT_COST = Decimal('0.0001')
+
+_RECEIPT = 0
+_ISSUE = 1
+
+
+def note_changed(product_ids):
+    """Re-cost the given products from their whole movement history."""
+    refresh_costs(product_ids)
+
+
+def note_recorded(movements):
+    """
+    Cost the ``StockMovement`` rows a posting just recorded, incrementally
+    where they come after everything costed for their product and by a
+    replay of the product otherwise.
+    """
+    by_product = defaultdict(list)
+    for movement in movements:
+        if movement.source_type != StockMovement.TRANSFER:
+            by_product[movement.product_id].append(movement)
+    if by_product:
+        _cost_recorded(by_product)
+
+
+class _Movement:
+    __slots__ = ('product_id', 'day', 'kind', 'stamp', 'source_type', 'source_id',
+                 'batch_id', 'warehouse_id', 'quantity', 'total_cost')
+
+    def __init__(self, product_id, day, kind, stamp, source_type, source_id, batch_id, warehouse_id,
+                 quantity, total_cost=None):
+        self.product_id = product_id
+        self.day = day
+        self.kind = kind
+        self.stamp = stamp
+        self.source_type = source_type
+        self.source_id = source_id
+        self.batch_id = batch_id
+        self.warehouse_id = warehouse_id
+        self.quantity = quantity
+        # Known purchase cost; other receipts come in at the running average.
+        self.total_cost = total_cost
+
+    def sort_key(self):
+        return (self.day, self.kind, self.stamp or '', str(self.source_id))
+
+
+_RECEIPT_TYPES = {choice for choice, _label in CostLayer.SOURCE_CHOICES}
+_ISSUE_TYPES = {choice for choice, _label in IssueCost.SOURCE_CHOICES}
+
+
+def _movement(row, net, stamp):
+    """A ``_Movement`` for ``net`` units of the movement values in ``row``."""
+    if net > 0:
+        kind, quantity = _RECEIPT, net
+        source_type = row['source_type'] if row['source_type'] in _RECEIPT_TYPES else CostLayer.JOURNAL
+        total_cost = row['unit_cost'] * quantity if row['unit_cost'] else None
+    else:
+        kind, quantity = _ISSUE, -net
+        source_type = row['source_type'] if row['source_type'] in _ISSUE_TYPES else IssueCost.JOURNAL
+        total_cost = None
+    return _Movement(
+        row['product_id'], row['date'], kind, str(stamp or ''), source_type, row['source_id'],
+        row['batch_id'], row['warehouse_id'], quantity, total_cost,
+    )
+
+
+def load_movements(products):
+    """``{product_id: [_Movement]}`` in replay order for every product in ``products``."""
+    movements = defaultdict(list)
+    rows = (
+        StockMovement.objects.filter(product_id__in=list(products))
+        .exclude(source_type=StockMovement.TRANSFER)
+        .values('product_id', 'source_type', 'source_id', 'batch_id', 'warehouse_id', 'date', 'unit_cost')
+        .annotate(net=Sum('quantity'), stamp=Min('created_at'))
+        .exclude(net=0)
+        .order_by()
+    )
+    for row in rows:
+        movements[row['product_id']].append(_movement(row, row['net'], row['stamp']))
+
+    for product_rows in movements.values():
+        product_rows.sort(key=_Movement.sort_key)
+    return movements
+
+
+def _net_quantity(movements):
+    return sum(m.quantity if m.kind == _RECEIPT else -m.quantity for m in movements)
+
+
+def _opening_movement(product, movements, opening_day):
+    """Stock on hand that the documents do not account for, as an opening receipt."""
+    quantity = (product.stock or 0) - _net_quantity(movements)
+    if quantity <= 0:
+        return None
+    unit_cost = product.price if product.price and product.price > 0 else (product.sale_price or _ZERO)
+    day = movements[0].day if movements else opening_day
+    return _Movement(product.pk, day, _RECEIPT, '', CostLayer.OPENING, None, None, None, quantity, unit_cost * quantity)
+
+
+class _ProductReplay:
+    """Replays one product's movements under both methods."""
+
+    def __init__(self, product):
+        self.product = product
+        self.layers = []
+        self.issues = []
+        self.quantity = 0
+        self.value = _ZERO
+        self.unit_cost = product.price if product.price and product.price > 0 else (product.sale_price or _ZERO)
+        self.next_sequence = 0
+        self.last_receipt_date = None
+        self.last_issue_date = None
+
+    @classmethod
+    def resume(cls, product, cost, open_layers, next_sequence):
+        """Carry on from the stored ``ProductCost`` with the product's open layers."""
+        state = cls(product)
+        state.layers = open_layers
+        state.quantity = cost.quantity
+        state.value = cost.average_value
+        state.unit_cost = cost.average_cost
+        state.next_sequence = next_sequence
+        state.last_receipt_date = cost.last_receipt_date
+        state.last_issue_date = cost.last_issue_date
+        return state
+
+    def receive(self, movement):
+        if movement.total_cost is not None and movement.quantity:
+            unit_cost = movement.total_cost / movement.quantity
+        else:
+            unit_cost = self.unit_cost
+        unit_cost = unit_cost.quantize(_UNIT_COST)
+        self.layers.append(CostLayer(
+            product_id=movement.product_id,
+            batch_id=movement.batch_id,
+            warehouse_id=movement.warehouse_id,
+            date=movement.day,
+            source_type=movement.source_type,
+            source_id=movement.source_id,
+            quantity=movement.quantity,
+            remaining_quantity=movement.quantity,
+            unit_cost=unit_cost,
+            sequence=self.next_sequence,
+            created_by_id=self.product.created_by_id,
+        ))
+        self.next_sequence += 1
+        self.last_receipt_date = movement.day
+        self.quantity += movement.quantity
+        self.value += unit_cost * movement.quantity
+        if self.quantity > 0:
+            self.unit_cost = self.value / self.quantity
+
+    def issue(self, movement):
+        average_cost = self.unit_cost * movement.quantity
+        self.last_issue_date = movement.day
+        self.quantity -= movement.quantity
+        self.value = self.value - average_cost if self.quantity > 0 else self.unit_cost * self.quantity
+
+        needed = movement.quantity
+        fifo_cost = _ZERO
+        same_batch = [layer for layer in self.layers if movement.batch_id and layer.batch_id == movement.batch_id]
+        for layer in same_batch + self.layers:
+            if not needed:
+                break
+            taken = min(needed, layer.remaining_quantity)
+            if taken <= 0:
+                continue
+            layer.remaining_quantity -= taken
+            fifo_cost += layer.unit_cost * taken
+            needed -= taken
+        # Selling beyond the layers (negative stock) is costed at the running average.
+        fifo_cost += self.unit_cost * needed
+
+        self.issues.append(IssueCost(
+            product_id=movement.product_id,
+            date=movement.day,
+            source_type=movement.source_type,
+            source_id=movement.source_id,
+            quantity=movement.quantity,
+            fifo_cost=fifo_cost.quantize(_CENT),
+            average_cost=average_cost.quantize(_CENT),
+            created_by_id=self.product.created_by_id,
+        ))
+
+    def fifo_value(self):
+        return sum((layer.unit_cost * layer.remaining_quantity for layer in self.layers), _ZERO)
+
+    def cost_values(self):
+        """The ``ProductCost`` fields for the current position."""
+        return {
+            'quantity': self.quantity,
+            'average_cost': self.unit_cost.quantize(_UNIT_COST),
+            'average_value': self.value.quantize(_CENT),
+            'fifo_value': self.fifo_value().quantize(_CENT),
+            'last_receipt_date': self.last_receipt_date,
+            'last_issue_date': self.last_issue_date,
+        }
+
+
+def replay(products, movements, *, opening_day=None):
+    """``{product_id: _ProductReplay}`` after replaying ``movements`` for every product."""
+    opening_day = opening_day or timezone.now().date()
+    results = {}
+    for product_id, product in products.items():
+        rows = movements.get(product_id, [])
+        state = _ProductReplay(product)
+        opening = _opening_movement(product, rows, opening_day)
+        for movement in ([opening] if opening else []) + rows:
+            if movement.kind == _RECEIPT:
+                state.receive(movement)
+            else:
+                state.issue(movement)
+        results[product_id] = state
+    return results
+
+
+def _load_products(product_ids, *, lock=False):
+    # Postings of the same product cost it one at a time; pk order keeps them deadlock-free.
+    products = Product.objects.select_for_update(of=('self',)).order_by('pk') if lock else Product.objects.all()
+    products = products.only(
+        'stock', 'price', 'sale_price', 'secondary_unit', 'conversion_factor', 'created_by_id',
+    ).filter(pk__in=list(product_ids))
+    return {product.pk: product for product in products}
+
+
+_COST_FIELDS = ('quantity', 'average_cost', 'average_value', 'fifo_value', 'last_receipt_date', 'last_issue_date')
+
+
+@transaction.atomic
+def refresh_costs(product_ids):
+    """Rebuild layers, issue costs and the current cost of every product in ``product_ids``."""
+    products = _load_products({product_id for product_id in product_ids if product_id}, lock=True)
+    if not products:
+        return
+
+    results = replay(products, load_movements(products))
+
+    CostLayer.objects.filter(product_id__in=list(products)).delete()
+    IssueCost.objects.filter(product_id__in=list(products)).delete()
+
+    CostLayer.objects.bulk_create([layer for state in results.values() for layer in state.layers], batch_size=1000)
+    IssueCost.objects.bulk_create([issue for state in results.values() for issue in state.issues], batch_size=1000)
+    ProductCost.objects.bulk_create(
+        [
+            ProductCost(product_id=product_id, created_by_id=state.product.created_by_id, **state.cost_values())
+            for product_id, state in results.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=[*_COST_FIELDS, 'updated_at'],
+    )
+
+
+@transaction.atomic
+def _cost_recorded(by_product):
+    products = _load_products(by_product, lock=True)
+    costs = ProductCost.objects.in_bulk(list(products))
+
+    appended = {}
+    replayed = set()
+    for product_id, rows in by_product.items():
+        cost = costs.get(product_id)
+        movements = sorted((_movement(_stored(row), row.quantity, row.created_at) for row in rows), key=_Movement.sort_key)
+        if product_id in products and not any(row.is_reversal for row in rows) and _appends(cost, movements):
+            appended[product_id] = movements
+        else:
+            replayed.add(product_id)
+
+    if appended:
+        _append(products, costs, appended)
+    if replayed:
+        refresh_costs(replayed)
+
+
+def _appends(cost, movements):
+    """
+    Whether ``movements`` (in replay order) sort after everything ``cost``
+    covers, receipts coming before issues on the same day.
+    """
+    # Costs stored without the costed dates predate the incremental path.
+    if cost is None or not (cost.last_receipt_date or cost.last_issue_date):
+        return False
+    receipt_day, issue_day = cost.last_receipt_date, cost.last_issue_date
+    for movement in movements:
+        if movement.kind == _RECEIPT:
+            if (issue_day and movement.day <= issue_day) or (receipt_day and movement.day < receipt_day):
+                return False
+            receipt_day = movement.day
+        else:
+            if any(day and movement.day < day for day in (receipt_day, issue_day)):
+                return False
+            issue_day = movement.day
+    return True
+
+
+def _stored(row):
+    """The movement values of a just-recorded row as the database holds them."""
+    unit_cost = row.unit_cost
+    if unit_cost is not None:
+        unit_cost = Decimal(str(unit_cost)).quantize(_UNIT_COST, rounding=ROUND_HALF_UP)
+    return {
+        'product_id': row.product_id,
+        'source_type': row.source_type,
+        'source_id': row.source_id,
+        'batch_id': row.batch_id,
+        'warehouse_id': row.warehouse_id,
+        'date': StockMovement._meta.get_field('date').to_python(row.date),
+        'unit_cost': unit_cost,
+    }
+
+
+def _append(products, costs, appended):
+    """Apply forward-dated movements on top of the stored costs."""
+    open_layers = defaultdict(list)
+    issuing = [product_id for product_id, rows in appended.items() if any(m.kind == _ISSUE for m in rows)]
+    for layer in CostLayer.objects.filter(product_id__in=issuing, remaining_quantity__gt=0).order_by('sequence', 'date'):
+        open_layers[layer.product_id].append(layer)
+    next_sequence = dict(
+        CostLayer.objects.filter(product_id__in=list(appended))
+        .values('product_id').annotate(last=Max('sequence')).values_list('product_id', 'last')
+    )
+
+    layers = []
+    issues = []
+    consumed = {}
+    cost_values = {}
+    for product_id, rows in appended.items():
+        held = {layer.pk: layer.remaining_quantity for layer in open_layers[product_id]}
+        state = _ProductReplay.resume(
+            products[product_id], costs[product_id], open_layers[product_id],
+            next_sequence.get(product_id, -1) + 1,
+        )
+        for movement in rows:
+            if movement.kind == _RECEIPT:
+                state.receive(movement)
+            else:
+                state.issue(movement)
+        for layer in state.layers:
+            if layer.pk not in held:
+                layers.append(layer)
+            elif layer.remaining_quantity != held[layer.pk]:
+                consumed[layer.pk] = held[layer.pk] - layer.remaining_quantity
+        issues.extend(state.issues)
+        cost_values[product_id] = state.cost_values()
+
+    CostLayer.objects.bulk_create(layers, batch_size=1000)
+    IssueCost.objects.bulk_create(issues, batch_size=1000)
+    if consumed:
+        CostLayer.objects.filter(pk__in=list(consumed)).update(
+            remaining_quantity=F('remaining_quantity') - _by_pk(consumed, IntegerField(), Value(0)),
+        )
+
+    changes = {}
+    for name in _COST_FIELDS:
+        field = ProductCost._meta.get_field(name)
+        if name in ('average_cost', 'last_receipt_date', 'last_issue_date'):
+            changes[name] = _by_pk({pk: values[name] for pk, values in cost_values.items()}, field.clone(), F(name))
+        else:
+            # Quantities and values move by the difference, so they stay additive under the row lock.
+            deltas = {pk: values[name] - getattr(costs[pk], name) for pk, values in cost_values.items()}
+            changes[name] = F(name) + _by_pk(deltas, field.clone(), Value(0))
+    ProductCost.objects.filter(pk__in=list(cost_values)).update(updated_at=timezone.now(), **changes)
+
+
+def _by_pk(values, output_field, default):
+    return Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        default=default,
+        output_field=output_field,
+    )
+
+
+def rebuild_costs(tenant_id=None):
+    """
+    Re-cost every product, or only ``tenant_id``'s, a thousand at a time,
+    first backfilling the movements of products that have none.
+    """
+    products = Product.objects.order_by('pk')
+    if tenant_id is not None:
+        products = products.filter(created_by_id=tenant_id)
+    product_ids = list(products.values_list('pk', flat=True))
+    for start in range(0, len(product_ids), 1000):
+        chunk = product_ids[start:start + 1000]
+        stock_movements.backfill(chunk)
+        refresh_costs(chunk)
+    return len(product_ids)
+
+
+@transaction.atomic
+def snapshot_valuation(tenant, period_end):
+    """
+    Store ``tenant``'s stock valuation as of ``period_end`` (normally a month
+    end), replaying only the movements dated up to that day.
+    """
+    products = _load_products(Product.objects.filter(created_by=tenant).values_list('pk', flat=True))
+    movements = {}
+    for product_id, rows in load_movements(products).items():
+        product = products[product_id]
+        until = [movement for movement in rows if movement.day <= period_end]
+        # Keep the opening quantity implied by today's stock and the full history.
+        product.stock = (product.stock or 0) - _net_quantity(rows) + _net_quantity(until)
+        movements[product_id] = until
+    results = replay(products, movements, opening_day=period_end)
+
+    ValuationSnapshot.objects.filter(created_by=tenant, period_end=period_end).delete()
+    return ValuationSnapshot.objects.bulk_create([
+        ValuationSnapshot(
+            period_end=period_end,
+            product_id=product_id,
+            quantity=state.quantity,
+            average_value=state.value.quantize(_CENT),
+            fifo_value=state.fifo_value().quantize(_CENT),
+            created_by=tenant,
+        )
+        for product_id, state in results.items()
+        if state.quantity
+    ], batch_size=1000)
+
+
+def value_field(method):
+    if method not in METHODS:
+        raise ValueError(f"Unknown costing method {method!r}; use one of {', '.join(METHODS)}.")
+    return 'average_value' if method == AVERAGE else 'fifo_value'
+
+
+def cogs_by_product(tenant, start_date, end_date, method=AVERAGE):
+    """``{product_id: cost of goods sold}`` for sales dated in the range, in one query."""
+    cost_field = 'average_cost' if value_field(method) == 'average_value' else 'fifo_cost'
+    issues = IssueCost.objects.filter(source_type=IssueCost.SALE, date__range=[start_date, end_date])
+    if tenant:
+        issues = issues.filter(created_by=tenant)
+    return dict(issues.values('product_id').annotate(total=Sum(cost_field)).values_list('product_id', 'total'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from inventory.costing import rebuild_costs
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill stock movements for documents posted before the movement ledger, "
+        "then rebuild cost layers, issue costs and product costs from the movements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help="Only rebuild products owned by this user id.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("Rebuilding inventory costs..."))
+        rebuilt = rebuild_costs(options.get('tenant'))
+        self.stdout.write(self.style.SUCCESS(f"Inventory costs rebuilt for {rebuilt} products."))
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:08
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_productmeta_storage_condition_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('source_type', models.CharField(choices=[('purchase', 'Purchase'), ('sales_return', 'Sales Return'), ('journal', 'Stock Journal'), ('opening', 'Opening Stock')], max_length=20)),
+                ('source_id', models.UUIDField(blank=True, help_text='Document line the layer came from', null=True)),
+                ('quantity', models.IntegerField()),
+                ('remaining_quantity', models.IntegerField()),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.productbatch')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.product')),
+                ('warehouse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.warehouse')),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['created_by', 'product'], name='inv_costlayer_tenant_idx'), models.Index(fields=['product', 'batch', 'warehouse', 'date'], name='inv_costlayer_pbw_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='IssueCost',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('source_type', models.CharField(choices=[('sale', 'Sale'), ('purchase_return', 'Purchase Return'), ('journal', 'Stock Journal')], max_length=20)),
+                ('source_id', models.UUIDField(blank=True, null=True)),
+                ('quantity', models.IntegerField()),
+                ('fifo_cost', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('average_cost', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issue_costs', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['created_by', 'date', 'product'], name='inv_issuecost_tenant_day_idx'), models.Index(fields=['product', 'date'], name='inv_issuecost_product_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductCost',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cost', serialize=False, to='inventory.product')),
+                ('quantity', models.IntegerField(default=0)),
+                ('average_cost', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('average_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('fifo_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_by'], name='inv_productcost_tenant_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ValuationSnapshot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period_end', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('average_value', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('fifo_value', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valuation_snapshots', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['-period_end'],
+                'unique_together': {('created_by', 'period_end', 'product')},
+            },
+        ),
+    ]
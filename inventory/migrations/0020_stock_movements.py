@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:17
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_costing_layers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period_end', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.product')),
+                ('warehouse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.warehouse')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_by', 'period_end'], name='inv_checkpoint_tenant_idx')],
+                'unique_together': {('product', 'warehouse', 'period_end')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(help_text='Positive for stock in, negative for stock out (primary unit)')),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('source_type', models.CharField(choices=[('purchase', 'Purchase'), ('sale', 'Sales'), ('sales_return', 'Sales Return'), ('purchase_return', 'Purchase Return'), ('journal', 'Stock Journal'), ('transfer', 'Stock Transfer'), ('opening', 'Opening Stock')], max_length=20)),
+                ('source_id', models.UUIDField(blank=True, help_text='Document line the movement came from', null=True)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('is_reversal', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.productbatch')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.product')),
+                ('warehouse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.warehouse')),
+            ],
+            options={
+                'ordering': ['date', 'created_at'],
+                'indexes': [models.Index(fields=['created_by', 'product', 'date'], name='inv_move_tenant_product_idx'), models.Index(fields=['product', 'date', 'created_at'], name='inv_move_product_day_idx'), models.Index(fields=['batch', 'warehouse'], name='inv_move_batch_wh_idx'), models.Index(fields=['source_id'], name='inv_move_source_idx')],
+            },
+        ),
+    ]
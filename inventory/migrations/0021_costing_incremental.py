@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_stock_movements'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='costlayer',
+            options={'ordering': ['date', 'sequence']},
+        ),
+        migrations.AddField(
+            model_name='costlayer',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0, help_text="Position of the layer in the product's FIFO queue"),
+        ),
+        migrations.AddField(
+            model_name='productcost',
+            name='last_issue_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productcost',
+            name='last_receipt_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
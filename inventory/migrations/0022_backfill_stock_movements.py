@@ -0,0 +1,29 @@
+from django.db import migrations
+
+CHUNK = 1000
+
+
+def backfill_movements(apps, schema_editor):
+    # Runs the live backfill, so this migration depends on the latest schema
+    # of every app whose document lines it books.
+    from inventory.models import Product
+    from inventory.movements import backfill
+
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(product_ids), CHUNK):
+        backfill(product_ids[start:start + CHUNK])
+
+
+class Migration(migrations.Migration):
+
+    # Each chunk commits on its own; the backfill is safe to re-run.
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0021_costing_incremental'),
+        ('billing', '0029_salesinvoiceitem_cost_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_movements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def backfill_costs(apps, schema_editor):
+    # Runs the live rebuild (chunks of a thousand products), so this migration
+    # depends on the latest schema of every app the costing reads.
+    from inventory.costing import rebuild_costs
+
+    rebuild_costs()
+
+
+class Migration(migrations.Migration):
+
+    # Each chunk commits on its own; the rebuild is safe to re-run.
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0022_backfill_stock_movements'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_costs, migrations.RunPython.noop),
+    ]
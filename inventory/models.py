@@ -165,3 +165,5 @@ Product.recalculate_stock = product_recalculate_stock
 # Import Sidecar Models to ensure they are registered
 from .models_sidecar import ProductMeta, ProductBatchMeta, BillOfMaterial, StockJournal, StockJournalItem
 from .models_pricing import PriceList, PriceListItem, Scheme
+from .models_costing import CostLayer, ProductCost, IssueCost, ValuationSnapshot
+from .models_movements import StockMovement, StockCheckpoint
@@ -0,0 +1,117 @@
+from django.db import models
+from django.conf import settings
+import uuid
+from .models import Product, ProductBatch, Warehouse
+
+
+class CostLayer(models.Model):
+    """
+    One receipt of stock at a unit cost, per (product, batch, warehouse).
+    FIFO issues consume ``remaining_quantity`` in ``sequence`` order.
+    Derived from documents by ``inventory.costing``; never edited by hand.
+    """
+    PURCHASE = 'purchase'
+    SALES_RETURN = 'sales_return'
+    JOURNAL = 'journal'
+    OPENING = 'opening'
+    SOURCE_CHOICES = [
+        (PURCHASE, 'Purchase'),
+        (SALES_RETURN, 'Sales Return'),
+        (JOURNAL, 'Stock Journal'),
+        (OPENING, 'Opening Stock'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers')
+    batch = models.ForeignKey(ProductBatch, on_delete=models.SET_NULL, null=True, blank=True)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.SET_NULL, null=True, blank=True)
+    date = models.DateField()
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.UUIDField(null=True, blank=True, help_text="Document line the layer came from")
+    quantity = models.IntegerField()
+    remaining_quantity = models.IntegerField()
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+    sequence = models.PositiveIntegerField(default=0, help_text="Position of the layer in the product's FIFO queue")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ['date', 'sequence']
+        indexes = [
+            models.Index(fields=['created_by', 'product'], name='inv_costlayer_tenant_idx'),
+            models.Index(fields=['product', 'batch', 'warehouse', 'date'], name='inv_costlayer_pbw_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} {self.date}: {self.remaining_quantity}/{self.quantity} @ {self.unit_cost}"
+
+
+class ProductCost(models.Model):
+    """Current on-hand quantity and value of a product under both costing methods."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='cost')
+    quantity = models.IntegerField(default=0)
+    average_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    average_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    fifo_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    last_receipt_date = models.DateField(null=True, blank=True)
+    last_issue_date = models.DateField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by'], name='inv_productcost_tenant_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity} @ {self.average_cost}"
+
+
+class IssueCost(models.Model):
+    """Cost of one outward line (sale, purchase return, journal deduction): the COGS source."""
+    SALE = 'sale'
+    PURCHASE_RETURN = 'purchase_return'
+    JOURNAL = 'journal'
+    SOURCE_CHOICES = [
+        (SALE, 'Sale'),
+        (PURCHASE_RETURN, 'Purchase Return'),
+        (JOURNAL, 'Stock Journal'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='issue_costs')
+    date = models.DateField()
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.UUIDField(null=True, blank=True)
+    quantity = models.IntegerField()
+    fifo_cost = models.DecimalField(max_digits=16, decimal_places=2)
+    average_cost = models.DecimalField(max_digits=16, decimal_places=2)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['created_by', 'date', 'product'], name='inv_issuecost_tenant_day_idx'),
+            models.Index(fields=['product', 'date'], name='inv_issuecost_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} {self.date}: {self.quantity} (FIFO {self.fifo_cost}, avg {self.average_cost})"
+
+
+class ValuationSnapshot(models.Model):
+    """Month-end stock valuation per product, written by ``inventory.costing.snapshot_valuation``."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    period_end = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='valuation_snapshots')
+    quantity = models.IntegerField()
+    average_value = models.DecimalField(max_digits=16, decimal_places=2)
+    fifo_value = models.DecimalField(max_digits=16, decimal_places=2)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('created_by', 'period_end', 'product')
+        ordering = ['-period_end']
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.period_end}: {self.quantity}"
@@ -0,0 +1,77 @@
+from django.db import models
+from django.conf import settings
+import uuid
+from .models import Product, ProductBatch, Warehouse
+
+
+class StockMovement(models.Model):
+    """
+    One signed change of stock, appended by every stock-affecting posting.
+    Rows are never updated or deleted: editing or deleting a document appends
+    reversal rows (``is_reversal``) netting its earlier movements to zero.
+    """
+    PURCHASE = 'purchase'
+    SALE = 'sale'
+    SALES_RETURN = 'sales_return'
+    PURCHASE_RETURN = 'purchase_return'
+    JOURNAL = 'journal'
+    TRANSFER = 'transfer'
+    OPENING = 'opening'
+    SOURCE_CHOICES = [
+        (PURCHASE, 'Purchase'),
+        (SALE, 'Sales'),
+        (SALES_RETURN, 'Sales Return'),
+        (PURCHASE_RETURN, 'Purchase Return'),
+        (JOURNAL, 'Stock Journal'),
+        (TRANSFER, 'Stock Transfer'),
+        (OPENING, 'Opening Stock'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements')
+    batch = models.ForeignKey(ProductBatch, on_delete=models.SET_NULL, null=True, blank=True)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.SET_NULL, null=True, blank=True)
+    date = models.DateField()
+    quantity = models.IntegerField(help_text="Positive for stock in, negative for stock out (primary unit)")
+    # Known cost of a receipt (purchase net of discount, or the batch cost of a journal addition).
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.UUIDField(null=True, blank=True, help_text="Document line the movement came from")
+    reference = models.CharField(max_length=100, blank=True)
+    is_reversal = models.BooleanField(default=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['date', 'created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'product', 'date'], name='inv_move_tenant_product_idx'),
+            models.Index(fields=['product', 'date', 'created_at'], name='inv_move_product_day_idx'),
+            models.Index(fields=['batch', 'warehouse'], name='inv_move_batch_wh_idx'),
+            models.Index(fields=['source_id'], name='inv_move_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} {self.date}: {self.quantity:+d} ({self.source_type})"
+
+
+class StockCheckpoint(models.Model):
+    """
+    Closing stock of a product in a warehouse at the end of ``period_end``.
+    Written when a month is closed; later back-dated movements shift it.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, null=True, blank=True)
+    period_end = models.DateField()
+    quantity = models.IntegerField()
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('product', 'warehouse', 'period_end')
+        indexes = [
+            models.Index(fields=['created_by', 'period_end'], name='inv_checkpoint_tenant_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.period_end}: {self.quantity}"
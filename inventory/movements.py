@@ -0,0 +1,336 @@
+"""
+Append-only stock movement ledger (``StockMovement``) with monthly checkpoints.
+
+Every stock-affecting posting appends signed rows here: purchases, sales,
+returns, stock journals, transfers and opening stock. Edits and deletes never
+touch existing rows; ``reverse`` appends rows that net a document line's
+movements back to zero, dated like the originals.
+
+``close_period`` stores each (product, warehouse) closing quantity at a month
+end in ``StockCheckpoint``. Stock as of a date is then the last checkpoint plus
+the movements after it, and a cardex window only reads the movements inside
+it. Back-dated movements shift the checkpoints they precede, as
+``ledger.balances`` does for account balances.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Min, Sum, Value, When
+from django.utils import timezone
+
+from .models import Product, StockPoint
+from .models_movements import StockCheckpoint, StockMovement
+
+_HUNDRED = Decimal('100')
+
+
+def stock_units(product, quantity, free_quantity, unit):
+    """Quantity in the product's primary unit, counting free quantity."""
+    total_qty = (quantity or 0) + (free_quantity or 0)
+    if product is not None and product.secondary_unit and unit == product.secondary_unit:
+        return total_qty * product.conversion_factor
+    return total_qty
+
+
+def purchase_unit_cost(quantity, price, discount, stock_quantity):
+    """Net purchase cost per primary unit; free quantity dilutes it."""
+    if not stock_quantity:
+        return None
+    gross = Decimal(quantity or 0) * (price or 0)
+    return (gross - gross * (discount or 0) / _HUNDRED) / stock_quantity
+
+
+@transaction.atomic
+def record(movements):
+    """Append ``movements`` (unsaved ``StockMovement`` rows) and shift later checkpoints."""
+    movements = [movement for movement in movements if movement.quantity]
+    if not movements:
+        return []
+    created = StockMovement.objects.bulk_create(movements, batch_size=1000)
+    _shift_checkpoints(created)
+    return created
+
+
+def reverse(source_ids):
+    """Append rows cancelling whatever is still booked against the document lines ``source_ids``."""
+    source_ids = [source_id for source_id in source_ids if source_id]
+    if not source_ids:
+        return []
+    open_rows = (
+        StockMovement.objects.filter(source_id__in=source_ids)
+        .values(
+            'source_id', 'source_type', 'product_id', 'batch_id', 'warehouse_id', 'date',
+            'unit_cost', 'reference', 'created_by_id',
+        )
+        .annotate(net=Sum('quantity'))
+        .exclude(net=0)
+        .order_by()
+    )
+    return record([
+        StockMovement(
+            source_id=row['source_id'],
+            source_type=row['source_type'],
+            product_id=row['product_id'],
+            batch_id=row['batch_id'],
+            warehouse_id=row['warehouse_id'],
+            date=row['date'],
+            unit_cost=row['unit_cost'],
+            reference=row['reference'],
+            created_by_id=row['created_by_id'],
+            quantity=-row['net'],
+            is_reversal=True,
+        )
+        for row in open_rows
+    ])
+
+
+def _shift_checkpoints(movements):
+    """
+    Add back-dated ``movements`` to every closed period they precede. A
+    (product, warehouse) without a row in a closed period held nothing at its
+    close (``close_period`` skips zero rows), so its row is created.
+    """
+    earliest = min(movement.date for movement in movements)
+    closed = defaultdict(list)
+    for tenant_id, period_end in (
+        StockCheckpoint.objects.filter(
+            created_by_id__in={movement.created_by_id for movement in movements},
+            period_end__gte=earliest,
+        ).order_by().values_list('created_by_id', 'period_end').distinct()
+    ):
+        closed[tenant_id].append(period_end)
+    if not closed:
+        return
+
+    existing = {
+        (product_id, warehouse_id, period_end): pk
+        for pk, product_id, warehouse_id, period_end in StockCheckpoint.objects.filter(
+            product_id__in={movement.product_id for movement in movements},
+            period_end__gte=earliest,
+        ).values_list('pk', 'product_id', 'warehouse_id', 'period_end')
+    }
+
+    by_key = defaultdict(list)
+    for movement in movements:
+        by_key[(movement.created_by_id, movement.product_id, movement.warehouse_id)].append(movement)
+
+    deltas = {}
+    missing = []
+    for (tenant_id, product_id, warehouse_id), key_movements in by_key.items():
+        for period_end in closed.get(tenant_id, ()):
+            delta = sum(m.quantity for m in key_movements if m.date <= period_end)
+            if not delta:
+                continue
+            pk = existing.get((product_id, warehouse_id, period_end))
+            if pk is not None:
+                deltas[pk] = delta
+            else:
+                missing.append(StockCheckpoint(
+                    created_by_id=tenant_id, product_id=product_id, warehouse_id=warehouse_id,
+                    period_end=period_end, quantity=delta,
+                ))
+    if deltas:
+        StockCheckpoint.objects.filter(pk__in=list(deltas)).update(quantity=F('quantity') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+    if missing:
+        StockCheckpoint.objects.bulk_create(missing, batch_size=1000)
+
+
+@transaction.atomic
+def close_period(tenant, period_end):
+    """
+    Store ``tenant``'s closing stock per (product, warehouse) at ``period_end``
+    from the previous checkpoint and the movements since. Re-closing a period
+    replaces its rows.
+    """
+    StockCheckpoint.objects.filter(created_by=tenant, period_end=period_end).delete()
+    previous_end = (
+        StockCheckpoint.objects.filter(created_by=tenant, period_end__lt=period_end)
+        .aggregate(last=Max('period_end'))['last']
+    )
+
+    closing = defaultdict(int)
+    if previous_end:
+        for product_id, warehouse_id, quantity in StockCheckpoint.objects.filter(
+            created_by=tenant, period_end=previous_end,
+        ).values_list('product_id', 'warehouse_id', 'quantity'):
+            closing[(product_id, warehouse_id)] += quantity
+
+    movements = StockMovement.objects.filter(created_by=tenant, date__lte=period_end)
+    if previous_end:
+        movements = movements.filter(date__gt=previous_end)
+    for row in movements.values('product_id', 'warehouse_id').annotate(total=Sum('quantity')).order_by():
+        closing[(row['product_id'], row['warehouse_id'])] += row['total']
+
+    return StockCheckpoint.objects.bulk_create([
+        StockCheckpoint(
+            created_by=tenant, product_id=product_id, warehouse_id=warehouse_id,
+            period_end=period_end, quantity=quantity,
+        )
+        for (product_id, warehouse_id), quantity in closing.items()
+        if quantity
+    ], batch_size=1000)
+
+
+def stock_as_of(product_id, day, warehouse_id=None):
+    """Stock of a product (optionally in one warehouse) at the end of ``day``."""
+    checkpoints = StockCheckpoint.objects.filter(product_id=product_id, period_end__lte=day)
+    movements = StockMovement.objects.filter(product_id=product_id, date__lte=day)
+    if warehouse_id:
+        checkpoints = checkpoints.filter(warehouse_id=warehouse_id)
+        movements = movements.filter(warehouse_id=warehouse_id)
+
+    last = checkpoints.aggregate(last=Max('period_end'))['last']
+    base = 0
+    if last:
+        base = checkpoints.filter(period_end=last).aggregate(total=Sum('quantity'))['total'] or 0
+        movements = movements.filter(date__gt=last)
+    return base + (movements.aggregate(total=Sum('quantity'))['total'] or 0)
+
+
+def cardex(product_id, start_date=None, end_date=None, warehouse_id=None):
+    """
+    ``(opening_balance, movements)`` for the window, each movement carrying
+    its running ``balance``. Only the window's movements are read.
+    """
+    opening = stock_as_of(product_id, start_date - timedelta(days=1), warehouse_id) if start_date else 0
+    movements = StockMovement.objects.filter(product_id=product_id).select_related('batch')
+    if warehouse_id:
+        movements = movements.filter(warehouse_id=warehouse_id)
+    if start_date:
+        movements = movements.filter(date__gte=start_date)
+    if end_date:
+        movements = movements.filter(date__lte=end_date)
+
+    balance = opening
+    rows = []
+    for movement in movements.order_by('date', 'created_at', 'id'):
+        balance += movement.quantity
+        movement.balance = balance
+        rows.append(movement)
+    return opening, rows
+
+
+def backfill(product_ids):
+    """
+    Book movements for the document lines of ``product_ids`` that have none
+    yet (documents from before the movement ledger existed), then opening
+    rows for stock no movement explains. Safe to re-run; returns the rows
+    appended.
+    """
+    from billing.models import PurchaseBillItem, SalesInvoiceItem
+    from billing.models_returns import CreditNoteItem, DebitNoteItem
+    from .models_sidecar import StockJournalItem
+
+    products = Product.objects.only(
+        'secondary_unit', 'conversion_factor', 'created_by_id', 'stock', 'price',
+    ).in_bulk(list(product_ids))
+    if not products:
+        return []
+    booked = set(
+        StockMovement.objects.filter(product_id__in=list(products), source_id__isnull=False)
+        .values_list('source_id', flat=True).distinct()
+    )
+
+    movements = []
+
+    def add(row, source_type, quantity, unit_cost=None):
+        if row['id'] in booked:
+            return
+        movements.append(StockMovement(
+            product_id=row['product_id'], batch_id=row['batch_id'], warehouse_id=row['warehouse_id'],
+            date=row['day'], quantity=quantity, unit_cost=unit_cost, source_type=source_type,
+            source_id=row['id'], reference=row['reference'] or '', created_by_id=products[row['product_id']].created_by_id,
+        ))
+
+    def lines(model, parent, date_field, number_field, *fields):
+        return model.objects.filter(product_id__in=list(products)).values(
+            'id', 'product_id', 'batch_id', 'quantity', 'unit', *fields,
+            day=F(f'{parent}__{date_field}'),
+            warehouse_id=F(f'{parent}__warehouse_id'),
+            reference=F(f'{parent}__{number_field}'),
+        )
+
+    for row in lines(PurchaseBillItem, 'purchase_bill', 'bill_date', 'bill_number', 'free_quantity', 'price', 'discount'):
+        quantity = stock_units(products[row['product_id']], row['quantity'], row['free_quantity'], row['unit'])
+        add(row, StockMovement.PURCHASE, quantity,
+            purchase_unit_cost(row['quantity'], row['price'], row['discount'], quantity))
+    for row in lines(SalesInvoiceItem, 'sales_invoice', 'invoice_date', 'invoice_number', 'free_quantity'):
+        add(row, StockMovement.SALE, -stock_units(products[row['product_id']], row['quantity'], row['free_quantity'], row['unit']))
+    for row in lines(CreditNoteItem, 'credit_note', 'date', 'credit_note_number'):
+        add(row, StockMovement.SALES_RETURN, row['quantity'])
+    for row in lines(DebitNoteItem, 'debit_note', 'date', 'debit_note_number'):
+        add(row, StockMovement.PURCHASE_RETURN, -row['quantity'])
+    for row in StockJournalItem.objects.filter(product_id__in=list(products)).values(
+        'id', 'product_id', 'batch_id', 'quantity', 'batch__cost_price',
+        day=F('journal__date'), warehouse_id=F('journal__warehouse_id'), reference=F('journal__voucher_no'),
+    ):
+        unit_cost = (row['batch__cost_price'] or None) if row['quantity'] > 0 else None
+        add(row, StockMovement.JOURNAL, row['quantity'], unit_cost)
+
+    recorded = record(movements)
+    return recorded + record(_opening_movements(products))
+
+
+def _opening_movements(products):
+    """
+    Opening rows for stock the booked movements do not explain: per batch and
+    warehouse from ``StockPoint``, and the rest of ``Product.stock`` without a
+    batch. Dated on the product's first movement so every window sees them.
+    """
+    booked = defaultdict(int)
+    product_net = defaultdict(int)
+    first_day = {}
+    for product_id, batch_id, warehouse_id, total, first in (
+        StockMovement.objects.filter(product_id__in=list(products))
+        .values('product_id', 'batch_id', 'warehouse_id')
+        .annotate(total=Sum('quantity'), first=Min('date'))
+        .order_by()
+        .values_list('product_id', 'batch_id', 'warehouse_id', 'total', 'first')
+    ):
+        booked[(product_id, batch_id, warehouse_id)] += total
+        product_net[product_id] += total
+        first_day[product_id] = min(first, first_day.get(product_id, first))
+
+    today = timezone.localdate()
+    openings = []
+
+    def opening(product_id, batch_id, warehouse_id, quantity, unit_cost):
+        openings.append(StockMovement(
+            product_id=product_id, batch_id=batch_id, warehouse_id=warehouse_id,
+            date=first_day.get(product_id, today), quantity=quantity,
+            unit_cost=unit_cost if unit_cost and unit_cost > 0 else None,
+            source_type=StockMovement.OPENING, created_by_id=products[product_id].created_by_id,
+        ))
+        product_net[product_id] += quantity
+
+    for product_id, batch_id, warehouse_id, quantity, cost_price in StockPoint.objects.filter(
+        batch__product_id__in=list(products),
+    ).values_list('batch__product_id', 'batch_id', 'warehouse_id', 'quantity', 'batch__cost_price'):
+        gap = quantity - booked[(product_id, batch_id, warehouse_id)]
+        if gap > 0:
+            opening(product_id, batch_id, warehouse_id, gap, cost_price or products[product_id].price)
+
+    for product_id, product in products.items():
+        gap = (product.stock or 0) - product_net[product_id]
+        if gap > 0:
+            opening(product_id, None, None, gap, product.price)
+    return openings
+
+
+def journal_movements(journal, items):
+    """Movements of a stock journal's ``StockJournalItem`` rows."""
+    return [
+        StockMovement(
+            product_id=item.product_id, batch_id=item.batch_id, warehouse_id=journal.warehouse_id,
+            date=journal.date, quantity=item.quantity, source_type=StockMovement.JOURNAL, source_id=item.pk,
+            unit_cost=(item.batch.cost_price or None) if item.quantity > 0 and item.batch_id else None,
+            reference=journal.voucher_no or '', created_by_id=journal.created_by_id,
+        )
+        for item in items
+    ]
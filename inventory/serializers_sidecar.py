@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from . import movements
+from .costing import note_recorded as note_costs_recorded
 from .models import Product
 from .models_sidecar import ProductMeta, BillOfMaterial, StockJournal, StockJournalItem
 
@@ -78,7 +80,7 @@ class StockJournalSerializer(serializers.ModelSerializer):
         
         journal = StockJournal.objects.create(**validated_data)
         
-        for item_data in items_data:
-            StockJournalItem.objects.create(journal=journal, **item_data)
-            
+        items = [StockJournalItem.objects.create(journal=journal, **item_data) for item_data in items_data]
+
+        note_costs_recorded(movements.record(movements.journal_movements(journal, items)))
         return journal
@@ -1,6 +1,9 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from .models import StockTransfer, StockPoint, Warehouse
+from django.utils import timezone
+from . import movements
+from .costing import note_changed as note_costs_changed, note_recorded as note_costs_recorded
+from .models import Product, StockMovement, StockTransfer, StockPoint, Warehouse
 
 @receiver(post_save, sender=StockTransfer)
 def process_stock_transfer(sender, instance, created, **kwargs):
@@ -11,6 +14,7 @@ def process_stock_transfer(sender, instance, created, **kwargs):
         print(f"DEBUG: Processing Stock Transfer {instance.id}")
         
         # Iterate through items and move stock
+        transfer_movements = []
         for item in instance.items.all():
             try:
                 # Decrease from Source
@@ -32,12 +36,41 @@ def process_stock_transfer(sender, instance, created, **kwargs):
                 dest_stock.quantity += item.quantity
                 dest_stock.save()
                 print(f"DEBUG: Increased {item.quantity} at {instance.destination_warehouse.name}")
+
+                for warehouse, quantity in (
+                    (instance.source_warehouse, -item.quantity),
+                    (instance.destination_warehouse, item.quantity),
+                ):
+                    transfer_movements.append(StockMovement(
+                        product_id=item.product_id, batch_id=item.batch_id, warehouse=warehouse,
+                        date=instance.transfer_date, quantity=quantity, source_type=StockMovement.TRANSFER,
+                        source_id=item.pk, reference=f"TRF-{str(instance.pk)[:8]}", created_by_id=instance.created_by_id,
+                    ))
                 
             except Exception as e:
                 print(f"ERROR processing item {item.id}: {e}")
                 # Ideally, we should rollback here, but signals are already in transaction if atomic/
                 raise e
 
+        movements.record(transfer_movements)
+
 # Actually, relying on post_save of Transfer might be too early if items aren't added yet.
 # Better to have a dedicated 'complete_transfer' action or signal on the Item itself?
 # Or assume the API creates items then updates status to completed.
+
+
+@receiver(post_save, sender=Product)
+def recost_product_on_stock_edit(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Opening stock of a new product is booked as an opening movement; stock
+    that no movement explains (``recalculate_stock``) is costed as an opening
+    layer.
+    """
+    if created and instance.stock:
+        note_costs_recorded(movements.record([StockMovement(
+            product=instance, date=timezone.localdate(), quantity=instance.stock,
+            unit_cost=instance.price if instance.price and instance.price > 0 else None,
+            source_type=StockMovement.OPENING, created_by_id=instance.created_by_id,
+        )]))
+    elif update_fields and 'stock' in update_fields:
+        note_costs_changed({instance.pk})
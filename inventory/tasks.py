@@ -1,9 +1,18 @@
 import csv
 import logging
 import re
+from datetime import date, timedelta
 from io import StringIO
 from celery import shared_task
 from django.db import transaction
+from inventory.bulk_upload import (
+    DECIMAL_FIELDS, EXPECTED_FIELDS, HEADER_ALIASES, INTEGER_FIELDS, OPTIONAL_NULLABLE_FIELDS, UNIT_ALIASES,
+    ProductUpload, normalize_key,
+)
+from inventory.costing import snapshot_valuation
+from inventory.models_costing import ProductCost
+from inventory.models_movements import StockMovement
+from inventory.movements import close_period
 from inventory.serializers import ProductSerializer
 from django.contrib.auth import get_user_model
 
@@ -40,50 +49,33 @@ class FakeRequest:
     def __init__(self, user):
         self.user = user
 
+
+UPLOAD_MODES = ('bulk', 'serializer')
+
+
 @shared_task
-def process_bulk_upload_csv(csv_content: str, user_id: str):
+def process_bulk_upload_csv(csv_content: str, user_id: str, mode: str = 'bulk'):
+    """
+    Import a product catalogue CSV. ``bulk`` (default) validates the file in
+    one pass and upserts by name in chunks; ``serializer`` creates every row
+    through ``ProductSerializer``, one product at a time.
+    """
     user = User.objects.get(id=user_id)
+    if mode == 'bulk':
+        result = ProductUpload(user.active_tenant).run(csv_content)
+        if result['errors']:
+            logger.warning(
+                'Bulk upload completed with validation errors. created=%s updated=%s failed=%s sample_errors=%s',
+                result['created_count'],
+                result['updated_count'],
+                result['failed_count'],
+                result['errors'][:5],
+            )
+        return result
+
     fake_request = FakeRequest(user)
     reader = csv.DictReader(StringIO(csv_content))
 
-    def normalize_key(key):
-        return (key or '').strip().lower().replace(' ', '_').replace('-', '_')
-
-    header_aliases = {
-        'name': ['name', 'product_name', 'item_name', 'product', 'item'],
-        'unit': ['unit', 'uom', 'unit_of_measure', 'measurement_unit'],
-        'cost_price': ['cost_price', 'price', 'purchase_price', 'cost'],
-        'sale_price': ['sale_price', 'sales_price', 'selling_price', 'saleprice', 'salesprice'],
-        'hsn_sac_code': ['hsn_sac_code', 'hsn_code', 'hsn'],
-        'tax': ['tax', 'gst', 'gst_rate', 'tax_rate'],
-        'low_stock_alert': ['low_stock_alert', 'min_stock_level', 'reorder_level'],
-        'stock': ['stock', 'opening_stock', 'current_stock'],
-        'secondary_unit': ['secondary_unit', 'secondaryunit'],
-        'conversion_factor': ['conversion_factor', 'conversionfactor'],
-        'warranty_months': ['warranty_months', 'warranty', 'warranty_month'],
-    }
-
-    expected_fields = ['name', 'hsn_sac_code', 'description', 'tax', 'stock', 'unit', 'secondary_unit', 'conversion_factor', 'cost_price', 'sale_price', 'low_stock_alert', 'warranty_months']
-    optional_nullable_fields = {'hsn_sac_code', 'description', 'secondary_unit', 'sale_price'}
-    integer_fields = {'stock', 'conversion_factor', 'low_stock_alert', 'warranty_months'}
-    decimal_fields = {'tax', 'cost_price', 'sale_price'}
-
-    unit_aliases = {
-        'nos': 'pcs',
-        'no': 'pcs',
-        'piece': 'pcs',
-        'pieces': 'pcs',
-        'pc': 'pcs',
-        'pcs': 'pcs',
-        'unit': 'pcs',
-        'units': 'pcs',
-        'ltr': 'l',
-        'litre': 'l',
-        'liter': 'l',
-        'litres': 'l',
-        'liters': 'l',
-    }
-
     created_count = 0
     errors = []
 
@@ -94,26 +86,26 @@ def process_bulk_upload_csv(csv_content: str, user_id: str):
                 continue
 
             payload = {}
-            for field in expected_fields:
+            for field in EXPECTED_FIELDS:
                 lookup_key = 'cost_price' if field == 'cost_price' else field
                 value = normalized_row.get(lookup_key)
                 if value in (None, ''):
-                    for alias in header_aliases.get(lookup_key, []):
+                    for alias in HEADER_ALIASES.get(lookup_key, []):
                         alias_value = normalized_row.get(alias)
                         if alias_value not in (None, ''):
                             value = alias_value
                             break
 
                 if value in (None, ''):
-                    if field in optional_nullable_fields:
+                    if field in OPTIONAL_NULLABLE_FIELDS:
                         payload[field] = None
                     continue
 
                 if field == 'unit' and isinstance(value, str):
                     normalized_unit = value.strip().lower()
-                    value = unit_aliases.get(normalized_unit, normalized_unit)
+                    value = UNIT_ALIASES.get(normalized_unit, normalized_unit)
 
-                if field in integer_fields:
+                if field in INTEGER_FIELDS:
                     numeric_value = _extract_numeric(value)
                     try:
                         value = int(float(numeric_value))
@@ -122,7 +114,7 @@ def process_bulk_upload_csv(csv_content: str, user_id: str):
                         payload = None
                         break
 
-                if field in decimal_fields:
+                if field in DECIMAL_FIELDS:
                     numeric_value = _extract_numeric(value)
                     try:
                         value = float(numeric_value)
@@ -152,3 +144,33 @@ def process_bulk_upload_csv(csv_content: str, user_id: str):
         )
 
     return {"created_count": created_count, "failed_count": len(errors), "errors": errors}
+
+
+@shared_task
+def snapshot_month_end_valuations(period_end=None):
+    """Store each costed tenant's stock valuation as of the last month end (or ``period_end``)."""
+    if period_end:
+        period_end = date.fromisoformat(period_end)
+    else:
+        period_end = date.today().replace(day=1) - timedelta(days=1)
+    tenant_ids = ProductCost.objects.values_list('created_by_id', flat=True).distinct()
+    snapshots = 0
+    for tenant in User.objects.filter(pk__in=tenant_ids).iterator():
+        snapshots += len(snapshot_valuation(tenant, period_end))
+    logger.info("Stored %s valuation snapshot rows for %s", snapshots, period_end)
+    return snapshots
+
+
+@shared_task
+def close_stock_periods(period_end=None):
+    """Checkpoint each tenant's stock per (product, warehouse) at the last month end (or ``period_end``)."""
+    if period_end:
+        period_end = date.fromisoformat(period_end)
+    else:
+        period_end = date.today().replace(day=1) - timedelta(days=1)
+    tenant_ids = StockMovement.objects.order_by().values_list('created_by_id', flat=True).distinct()
+    checkpoints = 0
+    for tenant in User.objects.filter(pk__in=tenant_ids).iterator():
+        checkpoints += len(close_period(tenant, period_end))
+    logger.info("Stored %s stock checkpoint rows for %s", checkpoints, period_end)
+    return checkpoints
@@ -5,6 +5,8 @@ from rest_framework import status
 from django.contrib.auth import get_user_model
 from inventory.models import Product, Warehouse, ProductBatch, StockPoint
 from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
 
 User = get_user_model()
 
@@ -105,3 +107,341 @@ class ProductCreateIdempotencyTests(TestCase):
 		self.assertEqual(second_response.status_code, status.HTTP_200_OK)
 		self.assertEqual(Product.objects.filter(created_by=self.tenant, name="Idempotent Item").count(), 1)
 		self.assertEqual(first_response.data["id"], second_response.data["id"])
+
+
+class ProductBulkUploadTests(TestCase):
+	def setUp(self):
+		self.tenant = User.objects.create_user(
+			username="tenant_bulk_upload",
+			email="tenant.bulk@test.com",
+			password="testpassword",
+		)
+		self.existing = Product.objects.create(
+			name="Existing Soap",
+			price=10,
+			sale_price=15,
+			stock=7,
+			description="Keep me",
+			created_by=self.tenant,
+		)
+
+	def _upload(self, csv_content, **kwargs):
+		from inventory.bulk_upload import ProductUpload
+		return ProductUpload(self.tenant, **kwargs).run(csv_content)
+
+	def test_bulk_upload_upserts_by_name_and_books_opening_stock(self):
+		from inventory.models_sidecar import ProductMeta
+
+		result = self._upload(
+			"Product Name,UOM,Cost,Selling Price,GST,Opening Stock,Description\n"
+			"Existing Soap,nos,12,18.50,18%,99,\n"
+			"New Shampoo,Litre,\"1,200\",1500,GST 12,40,Herbal\n"
+			"Bad Unit,crate,1,2,0,0,\n"
+			"No Price,pcs,1,,0,0,\n"
+			",,,,,,\n"
+			"New Shampoo,pcs,1,2,0,0,\n"
+			"Fraction,kg,1.234,abc,0,0,\n",
+			chunk_rows=1,
+		)
+
+		self.assertEqual((result["created_count"], result["updated_count"]), (1, 1))
+		self.assertEqual({error["row"]: sorted(error["errors"]) for error in result["errors"]}, {
+			4: ["unit"],
+			5: ["sale_price"],
+			7: ["name"],
+			8: ["cost_price", "sale_price"],
+		})
+
+		self.existing.refresh_from_db()
+		self.assertEqual((self.existing.price, self.existing.sale_price, self.existing.tax), (12, Decimal("18.50"), 18))
+		self.assertEqual(self.existing.stock, 7)
+		self.assertEqual(self.existing.description, "Keep me")
+
+		shampoo = Product.objects.get(created_by=self.tenant, name="New Shampoo")
+		self.assertEqual((shampoo.unit, shampoo.price, shampoo.stock), ("l", 1200, 40))
+		self.assertEqual(StockPoint.objects.get(batch__product=shampoo, batch__batch_number="OPENING").quantity, 40)
+		self.assertEqual(ProductMeta.objects.filter(product__created_by=self.tenant).count(), 2)
+
+	def test_bulk_upload_queries_do_not_grow_with_rows(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+
+		def count_queries(prefix, rows):
+			csv_content = "name,sale_price,stock\n" + "".join(f"{prefix} {n},10,5\n" for n in range(rows))
+			with CaptureQueriesContext(connection) as queries:
+				self.assertEqual(self._upload(csv_content)["created_count"], rows)
+			return len(queries)
+
+		count_queries("Warm", 1)
+		self.assertEqual(count_queries("Small", 2), count_queries("Large", 30))
+
+	def test_bulk_upload_rejects_out_of_range_integers_and_retries_failed_chunk_by_row(self):
+		from unittest.mock import patch
+		from django.db import DatabaseError
+		from inventory.bulk_upload import ProductUpload
+
+		upsert_chunk = ProductUpload._upsert_chunk
+
+		def failing_upsert(upload, records):
+			if any(fields["name"] == "Broken" for _row, fields in records):
+				raise DatabaseError("value rejected")
+			return upsert_chunk(upload, records)
+
+		with patch.object(ProductUpload, "_upsert_chunk", failing_upsert):
+			result = self._upload(
+				"name,sale_price,stock,warranty_months\n"
+				"Huge,10,2147483648,0\n"
+				"Long Warranty,10,0,9999999999\n"
+				"Fine,10,5,0\n"
+				"Broken,10,5,0\n"
+				"Also Fine,10,0,12\n",
+			)
+
+		self.assertEqual(result["created_count"], 2)
+		self.assertEqual({error["row"]: sorted(error["errors"]) for error in result["errors"]}, {
+			2: ["stock"],
+			3: ["warranty_months"],
+			5: ["non_field_errors"],
+		})
+		self.assertEqual(
+			set(Product.objects.filter(created_by=self.tenant).values_list("name", flat=True)),
+			{"Existing Soap", "Fine", "Also Fine"},
+		)
+		self.assertEqual(StockPoint.objects.get(batch__product__name="Fine").quantity, 5)
+
+
+class InventoryCostingTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.tenant = User.objects.create_user(
+			username="tenant_costing",
+			email="tenant.costing@test.com",
+			password="testpassword",
+		)
+		self.client.force_authenticate(user=self.tenant)
+		cache.clear()
+		self.addCleanup(cache.clear)
+		self.product = Product.objects.create(name="Rice", price=12, sale_price=30, created_by=self.tenant)
+		self.warehouse = Warehouse.objects.create(name="Main", created_by=self.tenant)
+		self.batch = ProductBatch.objects.create(product=self.product, batch_number="B1")
+
+	def _purchase(self, number, day, quantity, price):
+		from billing.models import PurchaseBill
+		from billing.posting import post_purchase_bill_items
+
+		bill = PurchaseBill.objects.create(
+			bill_number=number, bill_date=day, vendor_name="Mill", warehouse=self.warehouse,
+			total_amount=quantity * price, created_by=self.tenant,
+		)
+		post_purchase_bill_items(bill, [{
+			"product": self.product, "batch": self.batch, "quantity": quantity, "price": price, "amount": quantity * price,
+		}])
+
+	def _sale(self, number, day, quantity, price):
+		from billing.models import SalesInvoice
+		from billing.posting import post_sales_invoice_items
+
+		invoice = SalesInvoice.objects.create(
+			invoice_number=number, invoice_date=day, customer_name="Walk-in", warehouse=self.warehouse,
+			total_amount=quantity * price, created_by=self.tenant,
+		)
+		post_sales_invoice_items(invoice, [{
+			"product": self.product, "batch": self.batch, "quantity": quantity, "price": price, "amount": quantity * price,
+		}])
+
+	def test_postings_keep_fifo_and_moving_average_costs(self):
+		from inventory.models_costing import CostLayer, IssueCost, ProductCost
+
+		self._purchase("P-1", date(2024, 1, 5), 10, 10)
+		self._purchase("P-2", date(2024, 1, 20), 10, 20)
+		self._sale("S-1", date(2024, 2, 1), 15, 30)
+
+		cost = ProductCost.objects.get(product=self.product)
+		self.assertEqual(cost.quantity, 5)
+		self.assertEqual(cost.average_cost, Decimal("15"))
+		self.assertEqual(cost.average_value, Decimal("75.00"))
+		self.assertEqual(cost.fifo_value, Decimal("100.00"))
+		self.assertEqual(
+			list(CostLayer.objects.order_by("date").values_list("remaining_quantity", "unit_cost")),
+			[(0, Decimal("10")), (5, Decimal("20"))],
+		)
+		issue = IssueCost.objects.get(product=self.product)
+		self.assertEqual((issue.fifo_cost, issue.average_cost), (Decimal("200.00"), Decimal("225.00")))
+
+		fifo = self.client.get("/api/reports/stock-valuation/", {"method": "fifo"}).data
+		self.assertEqual(fifo["total_value"], Decimal("100.00"))
+		self.assertEqual(fifo["items"][0]["avg_cost"], Decimal("20.00"))
+		profit = self.client.get("/api/reports/profit-loss/", {"start_date": "2024-02-01", "end_date": "2024-02-29"}).data
+		self.assertEqual(profit["items"][0]["revenue"], Decimal("450.00"))
+		self.assertEqual(profit["items"][0]["cogs"], Decimal("225.00"))
+		self.assertEqual(self.client.get("/api/reports/stock-valuation/", {"method": "lifo"}).status_code, 400)
+
+	def test_forward_postings_cost_incrementally_and_back_dated_ones_replay(self):
+		from inventory import costing
+		from inventory.models_costing import CostLayer, IssueCost, ProductCost
+
+		def costs():
+			return (
+				ProductCost.objects.filter(product=self.product).values(
+					"quantity", "average_cost", "average_value", "fifo_value", "last_receipt_date", "last_issue_date",
+				).get(),
+				list(CostLayer.objects.order_by("sequence").values_list("sequence", "remaining_quantity", "unit_cost")),
+				list(IssueCost.objects.values_list("date", "quantity", "fifo_cost", "average_cost")),
+			)
+
+		self._purchase("P-1", date(2024, 1, 5), 10, 10)
+		first_layer = CostLayer.objects.get(product=self.product).pk
+		with patch.object(costing, "refresh_costs", wraps=costing.refresh_costs) as replayed, \
+				patch.object(Product.objects, "select_for_update", wraps=Product.objects.select_for_update) as locked:
+			self._purchase("P-2", date(2024, 1, 20), 10, 20)
+			self._sale("S-1", date(2024, 2, 1), 15, 30)
+		replayed.assert_not_called()
+		locked.assert_called_with(of=("self",))
+		self.assertTrue(CostLayer.objects.filter(pk=first_layer, remaining_quantity=0).exists())
+
+		incremental = costs()
+		costing.refresh_costs([self.product.pk])
+		self.assertEqual(incremental, costs())
+
+		with patch.object(costing, "refresh_costs", wraps=costing.refresh_costs) as replayed:
+			self._purchase("P-0", date(2024, 1, 1), 5, 8)
+		replayed.assert_called_once_with({self.product.pk})
+		cost = ProductCost.objects.get(product=self.product)
+		self.assertEqual((cost.quantity, cost.fifo_value), (10, Decimal("200.00")))
+		self.assertEqual(IssueCost.objects.get(product=self.product).fifo_cost, Decimal("140.00"))
+
+	def test_month_end_snapshot_replays_movements_up_to_period_end(self):
+		from inventory.costing import snapshot_valuation
+
+		self._purchase("P-1", date(2024, 1, 5), 10, 10)
+		self._sale("S-1", date(2024, 1, 25), 4, 30)
+		self._purchase("P-2", date(2024, 2, 10), 10, 20)
+
+		snapshot_valuation(self.tenant, date(2024, 1, 31))
+
+		january = self.client.get("/api/reports/stock-valuation/", {"as_of": "2024-01-31"}).data
+		self.assertEqual(january["items"][0]["stock"], 6)
+		self.assertEqual(january["total_value"], Decimal("60.00"))
+		current = self.client.get("/api/reports/stock-valuation/").data
+		self.assertEqual(current["items"][0]["stock"], 16)
+		self.assertEqual(current["total_value"], Decimal("260.00"))
+
+
+class StockMovementLedgerTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		self.tenant = User.objects.create_user(
+			username="tenant_moves",
+			email="tenant.moves@test.com",
+			password="testpassword",
+		)
+		self.client.force_authenticate(user=self.tenant)
+		cache.clear()
+		self.addCleanup(cache.clear)
+		self.product = Product.objects.create(name="Syrup", price=5, sale_price=9, created_by=self.tenant)
+		self.warehouse = Warehouse.objects.create(name="Main", created_by=self.tenant)
+		self.batch = ProductBatch.objects.create(product=self.product, batch_number="S1", expiry_date=date.today())
+
+	def _line(self, quantity):
+		return {"product": self.product, "batch": self.batch, "quantity": quantity, "price": 5, "amount": quantity * 5}
+
+	def _purchase(self, number, day, quantity):
+		from billing.models import PurchaseBill
+		from billing.posting import post_purchase_bill_items
+
+		bill = PurchaseBill.objects.create(
+			bill_number=number, bill_date=day, vendor_name="Pharma", warehouse=self.warehouse,
+			total_amount=0, created_by=self.tenant,
+		)
+		post_purchase_bill_items(bill, [self._line(quantity)])
+
+	def _sale(self, number, day, quantity):
+		from billing.models import SalesInvoice
+		from billing.posting import post_sales_invoice_items
+
+		invoice = SalesInvoice.objects.create(
+			invoice_number=number, invoice_date=day, customer_name="Walk-in", warehouse=self.warehouse,
+			total_amount=0, created_by=self.tenant,
+		)
+		post_sales_invoice_items(invoice, [self._line(quantity)])
+		return invoice
+
+	def test_checkpoints_answer_as_of_and_window_queries(self):
+		from inventory.models import StockCheckpoint
+		from inventory.movements import close_period, stock_as_of
+
+		self._purchase("P-1", date(2024, 1, 5), 10)
+		self._sale("S-1", date(2024, 1, 25), 4)
+		close_period(self.tenant, date(2024, 1, 31))
+		self._purchase("P-2", date(2024, 2, 10), 10)
+		# Back-dated into the closed month: the checkpoint moves with it.
+		self._sale("S-0", date(2024, 1, 20), 1)
+
+		checkpoint = StockCheckpoint.objects.get(product=self.product, period_end=date(2024, 1, 31))
+		self.assertEqual((checkpoint.warehouse_id, checkpoint.quantity), (self.warehouse.pk, 5))
+		self.assertEqual(stock_as_of(self.product.pk, date(2024, 1, 24), self.warehouse.pk), 9)
+		self.assertEqual(stock_as_of(self.product.pk, date(2024, 2, 29)), 15)
+
+		ledger = self.client.get("/api/reports/stock-ledger/", {
+			"product_id": str(self.product.pk), "start_date": "2024-02-01", "end_date": "2024-02-29",
+		}).data["items"]
+		self.assertEqual(
+			[(row["type"], row["reference"], row["qty_in"], row["balance"]) for row in ledger],
+			[("Purchase", "P-2", 10, 15)],
+		)
+
+	def test_back_dated_movement_into_an_unclosed_warehouse_adds_a_checkpoint(self):
+		from inventory.models import StockCheckpoint, StockMovement
+		from inventory.movements import cardex, close_period, record, stock_as_of
+
+		other = Warehouse.objects.create(name="Annex", created_by=self.tenant)
+		self._purchase("P-1", date(2024, 1, 5), 10)
+		close_period(self.tenant, date(2024, 1, 31))
+		record([StockMovement(
+			product=self.product, warehouse=other, date=date(2024, 1, 15), quantity=5,
+			source_type=StockMovement.JOURNAL, created_by=self.tenant,
+		)])
+
+		self.assertEqual(
+			StockCheckpoint.objects.get(product=self.product, warehouse=other, period_end=date(2024, 1, 31)).quantity, 5,
+		)
+		self.assertEqual(stock_as_of(self.product.pk, date(2024, 2, 10)), 15)
+		self.assertEqual(stock_as_of(self.product.pk, date(2024, 2, 10), other.pk), 5)
+		self.assertEqual(cardex(self.product.pk, date(2024, 2, 1))[0], 15)
+
+	def test_edits_append_reversals_and_reports_read_movements(self):
+		from billing.posting import post_sales_invoice_items
+		from inventory.models import StockMovement
+
+		self._purchase("P-1", date(2024, 3, 1), 12)
+		invoice = self._sale("S-1", date(2024, 3, 2), 5)
+		post_sales_invoice_items(invoice, [self._line(2)], replace=True)
+
+		self.assertEqual(
+			list(StockMovement.objects.filter(product=self.product).order_by("created_at").values_list("quantity", "is_reversal")),
+			[(12, False), (-5, False), (5, True), (-2, False)],
+		)
+		ledger = self.client.get("/api/reports/stock-ledger/", {"product_id": str(self.product.pk)}).data["items"]
+		self.assertEqual([row["type"] for row in ledger], ["Purchase", "Sales", "Sales (Reversal)", "Sales"])
+		self.assertEqual(ledger[-1]["balance"], 10)
+
+		expiry = self.client.get("/api/reports/expiry/").data
+		self.assertEqual([(row["batch_number"], row["stock"]) for row in expiry], [("S1", 10)])
+
+	def test_backfill_books_openings_for_stock_no_movement_explains(self):
+		from inventory.models import StockMovement, StockPoint
+		from inventory.movements import backfill
+
+		# Stock from before the movement ledger: no rows explain it.
+		StockPoint.objects.create(batch=self.batch, warehouse=self.warehouse, quantity=7)
+		Product.objects.filter(pk=self.product.pk).update(stock=9)
+
+		backfill([self.product.pk])
+
+		self.assertEqual(
+			sorted(StockMovement.objects.filter(product=self.product).values_list("batch_id", "quantity", "source_type"), key=str),
+			sorted([(self.batch.pk, 7, StockMovement.OPENING), (None, 2, StockMovement.OPENING)], key=str),
+		)
+		self.assertEqual(backfill([self.product.pk]), [])
+		expiry = self.client.get("/api/reports/expiry/").data
+		self.assertEqual([(row["batch_number"], row["stock"]) for row in expiry], [("S1", 7)])
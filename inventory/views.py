@@ -316,6 +316,7 @@ def bulk_upload_products(request):
     """
     Bulk create products from a CSV file.
     Expected file form key: file
+    Optional ``mode``: ``bulk`` (default, upserts by product name) or ``serializer``.
     """
     uploaded_file = request.FILES.get('file')
     if not uploaded_file:
@@ -328,7 +329,11 @@ def bulk_upload_products(request):
     if uploaded_file.size and uploaded_file.size > (10 * 1024 * 1024):
         return Response({'error': 'CSV file too large. Maximum allowed size is 10MB.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    from inventory.tasks import process_bulk_upload_csv
+    from inventory.tasks import UPLOAD_MODES, process_bulk_upload_csv
+
+    mode = (request.data.get('mode') or 'bulk').strip().lower()
+    if mode not in UPLOAD_MODES:
+        return Response({'error': f"mode must be one of: {', '.join(UPLOAD_MODES)}."}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
         csv_bytes = uploaded_file.read()
@@ -345,7 +350,7 @@ def bulk_upload_products(request):
         return Response({'error': 'CSV file is empty.'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        process_bulk_upload_csv.delay(csv_content, str(request.user.id))
+        process_bulk_upload_csv.delay(csv_content, str(request.user.id), mode)
     except Exception:
         return Response({'error': 'Unable to enqueue bulk upload right now. Please try again.'}, status=status.HTTP_400_BAD_REQUEST)
 
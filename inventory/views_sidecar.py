@@ -1,6 +1,8 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from . import movements
+from .costing import note_changed as note_costs_changed
 from .models_sidecar import BillOfMaterial, StockJournal, StockJournalItem
 from .serializers_sidecar import BillOfMaterialSerializer, StockJournalSerializer
 
@@ -80,3 +82,9 @@ class StockJournalDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False): return StockJournal.objects.none()
         return StockJournal.objects.filter(created_by=self.request.user.active_tenant)
+
+    def perform_destroy(self, instance):
+        lines = list(instance.items.values_list('pk', 'product_id'))
+        instance.delete()
+        movements.reverse([pk for pk, _product_id in lines])
+        note_costs_changed({product_id for _pk, product_id in lines})
@@ -7,7 +7,10 @@ from drf_yasg import openapi
 from django.db.models import Q
 from .models import Account, GeneralLedgerEntry, AccountType
 from .serializers import AccountSerializer, AccountBalanceSerializer
+from .balances import balance_before
 from .services import AccountingService
+from cenvoras.pagination import InvalidCursor, cursor_for, cursor_key, decode_cursor, keyset_page, parse_page_limit
+from cenvoras.streaming import STREAM_FORMATS, streaming_rows_response
 import logging
 from django.db.models import Sum, Avg, Max, Count, F
 from django.utils import timezone
@@ -16,6 +19,13 @@ import decimal
 
 logger = logging.getLogger(__name__)
 
+LEDGER_KEYSET_FIELDS = ('date', 'created_at', 'id')
+LEDGER_STREAM_CHUNK_SIZE = 2000
+LEDGER_EXPORT_FIELDS = [
+    'id', 'date', 'account_code', 'account_name', 'account_type',
+    'debit', 'credit', 'description', 'reference', 'created_at',
+]
+
 
 @swagger_auto_schema(
     method='get',
@@ -232,10 +242,14 @@ def general_ledger(request, account_id):
     
     # Also get account balance
     balance_info = AccountingService.get_account_balance(account, request.user, date_to)
+    opening = balance_before(account, date_from)
+    if account.account_type not in [AccountType.ASSET, AccountType.EXPENSE]:
+        opening = -opening
     
     return Response({
         'account': AccountSerializer(account).data,
         'balance': balance_info,
+        'opening_balance': opening,
         'entries': serializer.data
     })
 
@@ -410,6 +424,9 @@ def general_ledger_entry_detail(request, entry_id):
         openapi.Parameter('date_to', openapi.IN_QUERY, description="End date (YYYY-MM-DD)", type=openapi.TYPE_STRING),
         openapi.Parameter('account', openapi.IN_QUERY, description="Filter by account ID", type=openapi.TYPE_STRING),
         openapi.Parameter('description', openapi.IN_QUERY, description="Search by description", type=openapi.TYPE_STRING),
+        openapi.Parameter('limit', openapi.IN_QUERY, description="Page size for keyset paging (max 1000)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="next_cursor from the previous page", type=openapi.TYPE_STRING),
+        openapi.Parameter('export', openapi.IN_QUERY, description="Stream all matching entries as csv or ndjson", type=openapi.TYPE_STRING),
     ],
     responses={200: openapi.Response(description="List of all general ledger entries")}
 )
@@ -442,9 +459,37 @@ def general_ledger_entries_list(request):
     if description:
         entries = entries.filter(description__icontains=description)
     
+    export_format = request.query_params.get('export')
+    if export_format:
+        if export_format not in STREAM_FORMATS:
+            return Response({'success': False, 'error': 'export must be csv or ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+        ordered = entries.order_by('-date', '-created_at', '-id').iterator(chunk_size=LEDGER_STREAM_CHUNK_SIZE)
+        return streaming_rows_response(
+            (_ledger_export_row(entry) for entry in ordered),
+            LEDGER_EXPORT_FIELDS, export_format, 'general_ledger',
+        )
+
+    from .serializers import GeneralLedgerEntrySerializer
+
+    if 'limit' in request.query_params or 'cursor' in request.query_params:
+        # Keyset paging: newest first, resumed strictly after the last row served.
+        try:
+            limit = parse_page_limit(request.query_params.get('limit'))
+            cursor = request.query_params.get('cursor')
+            after = cursor_key(decode_cursor(cursor), GeneralLedgerEntry, LEDGER_KEYSET_FIELDS) if cursor else None
+        except InvalidCursor as exc:
+            return Response({'success': False, 'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        page, has_more = keyset_page(entries, LEDGER_KEYSET_FIELDS, limit, after=after, descending=True)
+        return Response({
+            'success': True,
+            'count': len(page),
+            'entries': GeneralLedgerEntrySerializer(page, many=True).data,
+            'has_more': has_more,
+            'next_cursor': cursor_for(page[-1], LEDGER_KEYSET_FIELDS) if has_more else None,
+        })
+
     entries = entries.order_by('-date', '-created_at')
     
-    from .serializers import GeneralLedgerEntrySerializer
     serializer = GeneralLedgerEntrySerializer(entries, many=True)
     
     return Response({
@@ -454,6 +499,21 @@ def general_ledger_entries_list(request):
     })
 
 
+def _ledger_export_row(entry):
+    return {
+        'id': str(entry.id),
+        'date': str(entry.date),
+        'account_code': entry.account.code,
+        'account_name': entry.account.name,
+        'account_type': entry.account.account_type,
+        'debit': str(entry.debit),
+        'credit': str(entry.credit),
+        'description': entry.description,
+        'reference': entry.reference,
+        'created_at': entry.created_at.isoformat(),
+    }
+
+
 @swagger_auto_schema(
     method='post',
     request_body=openapi.Schema(
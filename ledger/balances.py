@@ -0,0 +1,188 @@
+"""
+Daily account balance rollup (``AccountDailyBalance``).
+
+Ledger writes report the (account, date) days they touched; each day is
+re-totalled from its own entries and the difference is carried forward into
+the running balance of every later day of that account. Opening balances then
+cost one indexed lookup instead of a scan over the account's full history.
+A refresh locks its accounts (in pk order) before reading or writing their
+days, so concurrent postings to an account are applied one after the other.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from .models import Account, AccountDailyBalance, GeneralLedgerEntry
+
+_ZERO = Decimal('0')
+
+_pending_pairs = ContextVar('ledger_rollup_pending_pairs', default=None)
+
+
+def _to_date(value):
+    return GeneralLedgerEntry._meta.get_field('date').to_python(value)
+
+
+def entry_pairs(entries):
+    return {(entry.account_id, _to_date(entry.date)) for entry in entries}
+
+
+@contextmanager
+def batched_refresh():
+    """
+    Collect touched days from every ledger write inside the block and refresh
+    them once on the way out. Nested blocks join the outermost one.
+    """
+    pending = _pending_pairs.get()
+    if pending is not None:
+        yield pending
+        return
+
+    pending = set()
+    token = _pending_pairs.set(pending)
+    try:
+        yield pending
+    finally:
+        _pending_pairs.reset(token)
+    refresh_daily_balances(pending)
+
+
+def note_changed(pairs):
+    """Refresh the given days now, or defer them to the enclosing ``batched_refresh``."""
+    pending = _pending_pairs.get()
+    if pending is not None:
+        pending.update(pairs)
+    else:
+        refresh_daily_balances(pairs)
+
+
+@transaction.atomic
+def refresh_daily_balances(pairs):
+    """Re-total the given ``(account_id, date)`` days and shift later running balances."""
+    pairs = {(account_id, _to_date(day)) for account_id, day in pairs if account_id and day}
+    if not pairs:
+        return
+
+    # Lock the accounts first, in pk order: concurrent refreshes of the same
+    # account then queue here instead of both inserting its first daily row,
+    # and refreshes of overlapping account sets cannot deadlock.
+    tenants = dict(
+        Account.objects.select_for_update()
+        .filter(pk__in={account_id for account_id, _day in pairs})
+        .order_by('pk')
+        .values_list('pk', 'created_by_id')
+    )
+
+    lookup = Q()
+    for account_id, day in pairs:
+        lookup |= Q(account_id=account_id, date=day)
+
+    day_totals = {
+        (row['account_id'], row['date']): row
+        for row in GeneralLedgerEntry.objects.filter(lookup)
+        .values('account_id', 'date')
+        .annotate(debit_total=Sum('debit'), credit_total=Sum('credit'))
+    }
+    stored = {
+        (row.account_id, row.date): row
+        for row in AccountDailyBalance.objects.select_for_update().filter(lookup)
+    }
+
+    by_account = defaultdict(list)
+    for account_id, day in pairs:
+        by_account[account_id].append(day)
+
+    for account_id, days in sorted(by_account.items()):
+        # Ascending, so each new row sees the shifts already applied before it.
+        for day in sorted(days):
+            totals = day_totals.get((account_id, day))
+            debit_total = (totals or {}).get('debit_total') or _ZERO
+            credit_total = (totals or {}).get('credit_total') or _ZERO
+            row = stored.get((account_id, day))
+
+            if row is None:
+                if totals is None:
+                    continue
+                delta = debit_total - credit_total
+                previous = (
+                    AccountDailyBalance.objects.filter(account_id=account_id, date__lt=day)
+                    .order_by('-date')
+                    .values_list('running_balance', flat=True)
+                    .first()
+                ) or _ZERO
+                AccountDailyBalance.objects.create(
+                    created_by_id=tenants[account_id],
+                    account_id=account_id,
+                    date=day,
+                    debit_total=debit_total,
+                    credit_total=credit_total,
+                    running_balance=previous + delta,
+                )
+            else:
+                delta = (debit_total - credit_total) - (row.debit_total - row.credit_total)
+                if totals is None:
+                    row.delete()
+                elif delta or row.debit_total != debit_total or row.credit_total != credit_total:
+                    AccountDailyBalance.objects.filter(pk=row.pk).update(
+                        debit_total=debit_total,
+                        credit_total=credit_total,
+                        running_balance=F('running_balance') + delta,
+                    )
+
+            if delta:
+                AccountDailyBalance.objects.filter(account_id=account_id, date__gt=day).update(
+                    running_balance=F('running_balance') + delta
+                )
+
+
+def rebuild_daily_balances(account_ids=None):
+    """Recompute the rollup from scratch, for all accounts or only ``account_ids``."""
+    accounts = Account.objects.all()
+    if account_ids is not None:
+        accounts = accounts.filter(pk__in=account_ids)
+
+    rebuilt = 0
+    for account_id, tenant_id in list(accounts.values_list('pk', 'created_by_id')):
+        _rebuild_account(account_id, tenant_id)
+        rebuilt += 1
+    return rebuilt
+
+
+@transaction.atomic
+def _rebuild_account(account_id, tenant_id):
+    AccountDailyBalance.objects.filter(account_id=account_id).delete()
+    running = _ZERO
+    rows = []
+    day_totals = (
+        GeneralLedgerEntry.objects.filter(account_id=account_id)
+        .values('date')
+        .annotate(debit_total=Sum('debit'), credit_total=Sum('credit'))
+        .order_by('date')
+    )
+    for day in day_totals:
+        running += day['debit_total'] - day['credit_total']
+        rows.append(AccountDailyBalance(
+            created_by_id=tenant_id,
+            account_id=account_id,
+            date=day['date'],
+            debit_total=day['debit_total'],
+            credit_total=day['credit_total'],
+            running_balance=running,
+        ))
+    AccountDailyBalance.objects.bulk_create(rows, batch_size=1000)
+
+
+def balance_before(account, day) -> Decimal:
+    """Debit-minus-credit balance of ``account`` at the start of ``day``."""
+    if not day:
+        return _ZERO
+    return (
+        AccountDailyBalance.objects.filter(account=account, date__lt=day)
+        .order_by('-date')
+        .values_list('running_balance', flat=True)
+        .first()
+    ) or _ZERO
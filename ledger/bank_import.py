@@ -0,0 +1,148 @@
+"""
+Vectorized bank statement ingestion.
+
+The statement is read once with pandas and every step after that is a column
+operation: header detection, ``pd.to_datetime(dayfirst=True)`` over the whole
+date column, amount cleaning and the signed debit/credit split. Each line gets
+a SHA-256 ``row_hash`` of the account, date, description, amounts, balance and
+its occurrence number among identical rows, so lines already imported from an
+overlapping statement of the same account are skipped with one indexed lookup
+per chunk. New lines go in with chunked ``bulk_create``.
+"""
+import hashlib
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from .models import BankStatementLine
+
+CHUNK_SIZE = 2000
+DESCRIPTION_MAX_LENGTH = 500
+REFERENCE_MAX_LENGTH = 100
+
+
+def read_statement(path):
+    """Load a CSV or Excel statement with lower-cased, stripped headers."""
+    frame = pd.read_csv(path) if str(path).endswith('.csv') else pd.read_excel(path)
+    frame.columns = [str(column).lower().strip() for column in frame.columns]
+    return frame
+
+
+def detect_columns(columns):
+    """Map the statement's headers to date/description/debit/credit/amount/balance/reference."""
+    def first(*needles, exclude=()):
+        return next((c for c in columns if any(n in c for n in needles) and c not in exclude), None)
+
+    debit = first('withdrawal', 'debit')
+    credit = first('deposit', 'credit')
+    return {
+        'date': first('date'),
+        'description': first('narration', 'description', 'particulars'),
+        'debit': debit,
+        'credit': credit,
+        'amount': first('amount', exclude=(debit, credit)),
+        'balance': first('balance'),
+        'reference': first('ref', 'cheque', 'chq'),
+    }
+
+
+def _numbers(frame, column):
+    """Column as floats; thousands separators, currency marks and blanks handled. Missing column -> NaN."""
+    if not column:
+        return pd.Series(np.nan, index=frame.index)
+    values = frame[column]
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    cleaned = values.astype(str).str.replace(r'[^0-9.\-]', '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def _dates(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.date
+    text = values.astype(str).str.strip()
+    parsed = pd.to_datetime(text, dayfirst=True, errors='coerce')
+    # The inferred format misses rows written differently; parse those one by one.
+    retry = parsed.isna() & values.notna() & (text != '')
+    if retry.any():
+        parsed[retry] = pd.to_datetime(text[retry], dayfirst=True, errors='coerce', format='mixed')
+    return parsed.dt.date.where(parsed.notna(), None)
+
+
+def _text(frame, column, max_length):
+    if not column:
+        return pd.Series('', index=frame.index)
+    return frame[column].fillna('').astype(str).str.strip().str.slice(0, max_length)
+
+
+def statement_lines(frame, scope=''):
+    """
+    Normalize ``frame`` into a DataFrame of importable lines with ``date``,
+    ``description``, ``reference_no``, ``debit_amount``, ``credit_amount``,
+    ``balance`` and ``row_hash``. Rows without a date or amount are dropped.
+    Raises ``ValueError`` when the date or description column is missing.
+    """
+    columns = detect_columns(frame.columns)
+    if not columns['date'] or not columns['description']:
+        raise ValueError('Statement needs a date and a description/narration column.')
+
+    debit = _numbers(frame, columns['debit']).abs().fillna(0)
+    credit = _numbers(frame, columns['credit']).abs().fillna(0)
+    amount = _numbers(frame, columns['amount']).fillna(0)
+    signed = np.select([debit != 0, credit != 0], [-debit, credit], default=amount).round(2)
+
+    lines = pd.DataFrame({
+        'date': _dates(frame[columns['date']]),
+        'description': _text(frame, columns['description'], DESCRIPTION_MAX_LENGTH),
+        'reference_no': _text(frame, columns['reference'], REFERENCE_MAX_LENGTH),
+        'debit_amount': np.where(signed < 0, -signed, 0.0),
+        'credit_amount': np.where(signed > 0, signed, 0.0),
+        'balance': _numbers(frame, columns['balance']).round(2),
+    })
+    lines = lines[lines['date'].notna() & (signed != 0)].reset_index(drop=True)
+
+    key_columns = ['date', 'description', 'debit_amount', 'credit_amount', 'balance']
+    occurrence = lines.groupby(key_columns, dropna=False, sort=False).cumcount()
+    lines['row_hash'] = [
+        hashlib.sha256('|'.join(map(str, (scope, *key, n))).encode('utf-8')).hexdigest()
+        for key, n in zip(lines[key_columns].itertuples(index=False, name=None), occurrence)
+    ]
+    return lines
+
+
+def _decimal(value):
+    return None if pd.isna(value) else Decimal(f'{value:.2f}')
+
+
+def ingest_statement(statement, frame, chunk_size=CHUNK_SIZE):
+    """
+    Insert the lines of ``frame`` into ``statement``, skipping any whose hash
+    is already stored for the same tenant. Returns ``{'created', 'duplicates'}``.
+    """
+    scope = f'{statement.uploaded_by_id}|{statement.account_number or statement.bank_name}'
+    lines = statement_lines(frame, scope)
+    existing_lines = BankStatementLine.objects.filter(statement__uploaded_by_id=statement.uploaded_by_id)
+
+    created = 0
+    duplicates = 0
+    for start in range(0, len(lines), chunk_size):
+        chunk = lines.iloc[start:start + chunk_size]
+        seen = set(existing_lines.filter(row_hash__in=list(chunk['row_hash'])).values_list('row_hash', flat=True))
+        fresh = chunk[~chunk['row_hash'].isin(seen)]
+        BankStatementLine.objects.bulk_create([
+            BankStatementLine(
+                statement=statement,
+                date=row.date,
+                description=row.description,
+                reference_no=row.reference_no,
+                debit_amount=_decimal(row.debit_amount),
+                credit_amount=_decimal(row.credit_amount),
+                balance=_decimal(row.balance),
+                row_hash=row.row_hash,
+            )
+            for row in fresh.itertuples(index=False)
+        ])
+        created += len(fresh)
+        duplicates += len(chunk) - len(fresh)
+    return {'created': created, 'duplicates': duplicates}
@@ -5,7 +5,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.db import transaction
 from django.db.models import Q
-from datetime import timedelta, datetime
+from datetime import datetime
 import pandas as pd
 import csv
 import io
@@ -14,6 +14,7 @@ from django.core.files.storage import default_storage
 from .tasks import process_bank_statement_csv
 
 from .models import BankStatement, BankStatementLine, GeneralLedgerEntry
+from .reconciliation import AUTO_RECONCILE_SCORE, MAX_CANDIDATES, ReconciliationEngine
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -49,49 +50,40 @@ def upload_bank_statement(request):
     }, status=status.HTTP_202_ACCEPTED)
 
 
+def _entry_amount(entry):
+    return float(entry.debit if entry.debit > 0 else entry.credit)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def reconciliation_status(request, statement_id):
+    tenant = request.user.active_tenant
     try:
-        statement = BankStatement.objects.get(pk=statement_id)
+        statement = BankStatement.objects.get(pk=statement_id, uploaded_by=tenant)
     except BankStatement.DoesNotExist:
         return Response({'error': 'Statement not found'}, status=404)
 
-    lines = BankStatementLine.objects.filter(statement=statement).order_by('date')
-    
+    # Lines and candidate entries are loaded once; matching runs in memory.
+    engine = ReconciliationEngine(statement, tenant)
+    suggestions = engine.assignments()
+
     results = []
-    for line in lines:
+    for line in engine.lines:
         match_candidates = []
+        suggested = None
         if not line.is_reconciled:
-            # Look for ledger entries with same amount (+/- 2 days)
-            target_amount = line.debit_amount if line.debit_amount > 0 else line.credit_amount
-            is_payment = line.debit_amount > 0 
-
-            start_date = line.date - timedelta(days=2)
-            end_date = line.date + timedelta(days=2)
-
-            # Look for UNMATCHED entries in that date range
-            qs = GeneralLedgerEntry.objects.filter(
-                date__range=[start_date, end_date],
-                created_by=request.user.active_tenant,
-                bank_matches__isnull=True  # Ensure not already matched
-            )
-
-            # Bank Debit (Withdrawal) matches Ledger Credit (Asset decrease for Bank/Cash)
-            # Bank Credit (Deposit) matches Ledger Debit (Asset increase for Bank/Cash)
-            if is_payment:
-                qs = qs.filter(credit=target_amount, debit=0)
-            else:
-                qs = qs.filter(debit=target_amount, credit=0)
-
-            for entry in qs[:5]:
+            for score, entry in engine.candidates(line)[:MAX_CANDIDATES]:
                 match_candidates.append({
                     'id': str(entry.id),
                     'date': entry.date,
                     'account': entry.account.name,
                     'description': entry.description,
-                    'amount': float(entry.debit if entry.debit > 0 else entry.credit)
+                    'amount': _entry_amount(entry),
+                    'score': score,
                 })
+            if line.pk in suggestions:
+                score, entry = suggestions[line.pk]
+                suggested = {'id': str(entry.id), 'score': score}
 
         entry_data = None
         if line.matched_entry:
@@ -109,7 +101,8 @@ def reconciliation_status(request, statement_id):
             'credit': float(line.credit_amount),
             'is_reconciled': line.is_reconciled,
             'matched_entry': entry_data,
-            'candidates': match_candidates
+            'candidates': match_candidates,
+            'suggested_entry': suggested,
         })
 
     return Response({
@@ -121,26 +114,60 @@ def reconciliation_status(request, statement_id):
         'lines': results
     })
 
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def reconcile_line(request, line_id):
+def auto_reconcile_statement(request, statement_id):
+    tenant = request.user.active_tenant
     try:
-        line = BankStatementLine.objects.get(pk=line_id)
-    except BankStatementLine.DoesNotExist:
-        return Response({'error': 'Line not found'}, status=404)
+        statement = BankStatement.objects.get(pk=statement_id, uploaded_by=tenant)
+    except BankStatement.DoesNotExist:
+        return Response({'error': 'Statement not found'}, status=404)
+
+    try:
+        min_score = float(request.data.get('min_score', AUTO_RECONCILE_SCORE))
+    except (TypeError, ValueError):
+        return Response({'error': 'min_score must be a number'}, status=400)
+
+    with transaction.atomic():
+        engine = ReconciliationEngine(statement, tenant)
+        matched = engine.auto_reconcile(min_score=min_score)
 
+    return Response({
+        'matched': len(matched),
+        'unreconciled': len(engine.open_lines),
+        'lines': [{'id': line.id, 'entry_id': str(line.matched_entry_id)} for line in matched],
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def reconcile_line(request, line_id):
+    tenant = request.user.active_tenant
     entry_id = request.data.get('entry_id')
-    if not entry_id:
-        return Response({'error': 'Entry ID required'}, status=400)
 
-    try:
-        entry = GeneralLedgerEntry.objects.get(pk=entry_id)
-    except GeneralLedgerEntry.DoesNotExist:
-        return Response({'error': 'Entry not found'}, status=404)
-
-    line.matched_entry = entry
-    line.is_reconciled = True
-    line.reconciled_at = datetime.now()
-    line.save()
+    # Lock the line, then the entry, as ReconciliationEngine.auto_reconcile does.
+    with transaction.atomic():
+        try:
+            line = BankStatementLine.objects.select_for_update(of=('self',)).get(
+                pk=line_id, statement__uploaded_by=tenant,
+            )
+        except BankStatementLine.DoesNotExist:
+            return Response({'error': 'Line not found'}, status=404)
+
+        if not entry_id:
+            return Response({'error': 'Entry ID required'}, status=400)
+
+        try:
+            entry = GeneralLedgerEntry.objects.select_for_update().get(pk=entry_id, created_by=tenant)
+        except GeneralLedgerEntry.DoesNotExist:
+            return Response({'error': 'Entry not found'}, status=404)
+
+        if BankStatementLine.objects.filter(matched_entry=entry).exclude(pk=line.pk).exists():
+            return Response({'error': 'Entry is already matched to another statement line'}, status=400)
+
+        line.matched_entry = entry
+        line.is_reconciled = True
+        line.reconciled_at = datetime.now()
+        line.save()
 
     return Response({'status': 'matched'})
@@ -13,7 +13,15 @@ from django.db.models import Sum, Q
 from django.shortcuts import get_object_or_404
 from billing.models import SalesInvoiceItem
 from .models import Account, AccountType, GeneralLedgerEntry
+from . import reporting
+from .balances import balance_before
 from .services import AccountingService
+from cenvoras.pagination import InvalidCursor, cursor_for, cursor_key, decode_cursor, keyset_page, parse_page_limit
+from cenvoras.streaming import STREAM_FORMATS, streaming_rows_response
+
+CASHBOOK_KEYSET_FIELDS = ('date', 'created_at', 'id')
+CASHBOOK_STREAM_CHUNK_SIZE = 2000
+CASHBOOK_EXPORT_FIELDS = ['id', 'date', 'description', 'reference', 'debit', 'credit', 'balance']
 
 
 @api_view(['GET'])
@@ -31,57 +39,11 @@ def profit_loss_statement(request):
     # Ensure default accounts exist
     AccountingService.get_or_create_default_accounts(user)
 
-    # Get Revenue accounts
-    revenue_accounts = Account.objects.filter(
-        created_by=user, account_type=AccountType.REVENUE, is_active=True
-    ).order_by('code', 'name')
-
-    # Get Expense accounts
-    expense_accounts = Account.objects.filter(
-        created_by=user, account_type=AccountType.EXPENSE, is_active=True
-    ).order_by('code', 'name')
-
-    def get_balance(account):
-        entries = GeneralLedgerEntry.objects.filter(account=account, created_by=user)
-        if from_date:
-            entries = entries.filter(date__gte=from_date)
-        if to_date:
-            entries = entries.filter(date__lte=to_date)
-        totals = entries.aggregate(
-            total_debit=Sum('debit'),
-            total_credit=Sum('credit')
-        )
-        dr = totals['total_debit'] or Decimal('0')
-        cr = totals['total_credit'] or Decimal('0')
-        if account.account_type in [AccountType.ASSET, AccountType.EXPENSE]:
-            return dr - cr
-        return cr - dr
-
-    revenue_items = []
-    total_revenue = Decimal('0')
-    for acc in revenue_accounts:
-        bal = get_balance(acc)
-        if bal != 0:
-            revenue_items.append({
-                'id': str(acc.id),
-                'code': acc.code,
-                'name': acc.name,
-                'amount': float(bal),
-            })
-            total_revenue += bal
-
-    expense_items = []
-    total_expenses = Decimal('0')
-    for acc in expense_accounts:
-        bal = get_balance(acc)
-        if bal != 0:
-            expense_items.append({
-                'id': str(acc.id),
-                'code': acc.code,
-                'name': acc.name,
-                'amount': float(bal),
-            })
-            total_expenses += bal
+    statement = reporting.profit_and_loss(reporting.account_totals(user, date_from=from_date, date_to=to_date))
+    revenue_items = statement['revenue_items']
+    total_revenue = statement['total_revenue']
+    expense_items = statement['expense_items']
+    total_expenses = statement['total_expenses']
 
     sales_items = SalesInvoiceItem.objects.filter(
         Q(sales_invoice__created_by=user) | Q(sales_invoice__created_by__parent=user),
@@ -157,116 +119,29 @@ def balance_sheet(request):
     # Ensure default accounts exist
     AccountingService.get_or_create_default_accounts(user)
 
-    def get_balance(account):
-        entries = GeneralLedgerEntry.objects.filter(account=account, created_by=user)
-        if as_of:
-            entries = entries.filter(date__lte=as_of)
-        totals = entries.aggregate(
-            total_debit=Sum('debit'),
-            total_credit=Sum('credit')
-        )
-        dr = totals['total_debit'] or Decimal('0')
-        cr = totals['total_credit'] or Decimal('0')
-        if account.account_type in [AccountType.ASSET, AccountType.EXPENSE]:
-            return dr - cr
-        return cr - dr
-
-    # Assets
-    asset_accounts = Account.objects.filter(
-        created_by=user, account_type=AccountType.ASSET, is_active=True
-    ).order_by('code', 'name')
-    asset_items = []
-    total_assets = Decimal('0')
-    for acc in asset_accounts:
-        bal = get_balance(acc)
-        if bal != 0:
-            asset_items.append({
-                'id': str(acc.id),
-                'code': acc.code,
-                'name': acc.name,
-                'amount': float(bal),
-            })
-            total_assets += bal
-
-    # Liabilities
-    liability_accounts = Account.objects.filter(
-        created_by=user, account_type=AccountType.LIABILITY, is_active=True
-    ).order_by('code', 'name')
-    liability_items = []
-    total_liabilities = Decimal('0')
-    for acc in liability_accounts:
-        bal = get_balance(acc)
-        if bal != 0:
-            liability_items.append({
-                'id': str(acc.id),
-                'code': acc.code,
-                'name': acc.name,
-                'amount': float(bal),
-            })
-            total_liabilities += bal
-
-    # Equity
-    equity_accounts = Account.objects.filter(
-        created_by=user, account_type=AccountType.EQUITY, is_active=True
-    ).order_by('code', 'name')
-    equity_items = []
-    total_equity = Decimal('0')
-    for acc in equity_accounts:
-        bal = get_balance(acc)
-        if bal != 0:
-            equity_items.append({
-                'id': str(acc.id),
-                'code': acc.code,
-                'name': acc.name,
-                'amount': float(bal),
-            })
-            total_equity += bal
-
-    # Retained Earnings (Net Profit carried forward)
-    # Revenue - Expenses
-    revenue_total = Decimal('0')
-    for acc in Account.objects.filter(created_by=user, account_type=AccountType.REVENUE):
-        revenue_total += get_balance(acc)
-
-    expense_total = Decimal('0')
-    for acc in Account.objects.filter(created_by=user, account_type=AccountType.EXPENSE):
-        expense_total += get_balance(acc)
-
-    retained_earnings = revenue_total - expense_total
-    total_equity += retained_earnings
-
-    is_balanced = abs(total_assets - (total_liabilities + total_equity)) < Decimal('0.01')
-    difference = total_assets - (total_liabilities + total_equity)
-
-    if not is_balanced:
-        # Append Virtual Suspense Account to Equity so the totals balance mathematically
-        equity_items.append({
-            'id': 'suspense',
-            'code': 'SUSP',
-            'name': 'Suspense Account (Action Required)',
-            'amount': float(difference),
-            'is_suspense': True,
-        })
-        total_equity += difference
+    return Response(_balance_sheet_payload(reporting.account_totals(user, date_to=as_of), as_of))
 
-    return Response({
+
+def _balance_sheet_payload(totals, as_of):
+    statement = reporting.balance_sheet(totals)
+    return {
         'as_of': as_of or 'current',
         'assets': {
-            'items': asset_items,
-            'total': float(total_assets),
+            'items': statement['asset_items'],
+            'total': float(statement['total_assets']),
         },
         'liabilities': {
-            'items': liability_items,
-            'total': float(total_liabilities),
+            'items': statement['liability_items'],
+            'total': float(statement['total_liabilities']),
         },
         'equity': {
-            'items': equity_items,
-            'retained_earnings': float(retained_earnings),
-            'total': float(total_equity),
+            'items': statement['equity_items'],
+            'retained_earnings': float(statement['retained_earnings']),
+            'total': float(statement['total_equity']),
         },
-        'is_balanced': is_balanced,
-        'difference': float(difference),
-    })
+        'is_balanced': statement['is_balanced'],
+        'difference': float(statement['difference']),
+    }
 
 
 @api_view(['GET'])
@@ -342,15 +217,16 @@ def cashbook(request):
     """
     Cashbook — All cash (debit/credit) entries sorted by date.
     Query Params: ?from=YYYY-MM-DD&to=YYYY-MM-DD
+    Paging: ?limit=N[&cursor=...] returns one keyset page plus next_cursor;
+    the running balance is carried in the cursor.
+    Export: ?export=csv|ndjson streams every entry in the range.
     """
     user = request.user
     from_date = request.query_params.get('from')
     to_date = request.query_params.get('to')
 
     # Get cash account
-    cash_account = Account.objects.filter(
-        created_by=user, code='1001', account_type=AccountType.ASSET
-    ).first()
+    cash_account = AccountingService.get_or_create_default_accounts(user).get('cash')
 
     if not cash_account:
         return Response({
@@ -369,18 +245,23 @@ def cashbook(request):
     if to_date:
         entries = entries.filter(date__lte=to_date)
 
-    entries = entries.order_by('date', 'created_at')
-
-    # Opening balance (all entries before from_date)
-    opening_balance = Decimal('0')
-    if from_date:
-        prior_entries = GeneralLedgerEntry.objects.filter(
-            account=cash_account, created_by=user, date__lt=from_date
-        ).aggregate(
-            total_debit=Sum('debit'),
-            total_credit=Sum('credit')
+    # Opening balance (everything before from_date), from the daily rollup
+    opening_balance = balance_before(cash_account, from_date)
+
+    export_format = request.query_params.get('export')
+    if export_format:
+        if export_format not in STREAM_FORMATS:
+            return Response({'error': 'export must be csv or ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+        ordered = entries.order_by(*CASHBOOK_KEYSET_FIELDS).iterator(chunk_size=CASHBOOK_STREAM_CHUNK_SIZE)
+        return streaming_rows_response(
+            _cashbook_rows(ordered, opening_balance, as_text=True),
+            CASHBOOK_EXPORT_FIELDS, export_format, 'cashbook',
         )
-        opening_balance = (prior_entries['total_debit'] or Decimal('0')) - (prior_entries['total_credit'] or Decimal('0'))
+
+    if 'limit' in request.query_params or 'cursor' in request.query_params:
+        return _cashbook_page(request, entries, opening_balance)
+
+    entries = entries.order_by('date', 'created_at')
 
     results = []
     running_balance = opening_balance
@@ -411,6 +292,59 @@ def cashbook(request):
     })
 
 
+def _cashbook_rows(entries, opening_balance, as_text=False):
+    convert = str if as_text else float
+    running_balance = opening_balance
+    for entry in entries:
+        running_balance += entry.debit - entry.credit
+        yield {
+            'id': str(entry.id),
+            'date': str(entry.date),
+            'description': entry.description,
+            'reference': entry.reference,
+            'debit': convert(entry.debit),
+            'credit': convert(entry.credit),
+            'balance': convert(running_balance),
+        }
+
+
+def _cashbook_page(request, entries, opening_balance):
+    try:
+        limit = parse_page_limit(request.query_params.get('limit'))
+        cursor = request.query_params.get('cursor')
+        after = None
+        page_opening = opening_balance
+        if cursor:
+            payload = decode_cursor(cursor)
+            after = cursor_key(payload, GeneralLedgerEntry, CASHBOOK_KEYSET_FIELDS)
+            page_opening = Decimal(payload['balance'])
+    except (InvalidCursor, KeyError, ArithmeticError):
+        return Response({'error': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    totals = entries.aggregate(total_receipts=Sum('debit'), total_payments=Sum('credit'))
+    total_receipts = totals['total_receipts'] or Decimal('0')
+    total_payments = totals['total_payments'] or Decimal('0')
+
+    page, has_more = keyset_page(entries, CASHBOOK_KEYSET_FIELDS, limit, after=after)
+    results = list(_cashbook_rows(page, page_opening))
+    next_cursor = None
+    if has_more:
+        last = page[-1]
+        page_closing = page_opening + sum((entry.debit - entry.credit for entry in page), Decimal('0'))
+        next_cursor = cursor_for(last, CASHBOOK_KEYSET_FIELDS, balance=page_closing)
+
+    return Response({
+        'opening_balance': float(opening_balance),
+        'closing_balance': float(opening_balance + total_receipts - total_payments),
+        'total_receipts': float(total_receipts),
+        'total_payments': float(total_payments),
+        'count': len(results),
+        'entries': results,
+        'has_more': has_more,
+        'next_cursor': next_cursor,
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def balance_sheet_diagnostics(request):
@@ -418,12 +352,14 @@ def balance_sheet_diagnostics(request):
     user = request.user
     as_of = request.query_params.get('as_of')
 
-    trial_data = AccountingService.get_trial_balance(user)
+    # Trial balance and balance sheet share one as-of result set.
+    totals = reporting.account_totals(user, date_to=as_of)
+    trial_data = reporting.trial_balance(totals)
     total_debits = Decimal(str(trial_data.get('total_debits', 0) or 0))
     total_credits = Decimal(str(trial_data.get('total_credits', 0) or 0))
     trial_difference = total_debits - total_credits
 
-    sheet_data = balance_sheet(request).data
+    sheet_data = _balance_sheet_payload(totals, as_of)
     sheet_difference = Decimal(str(sheet_data.get('difference', 0) or 0))
 
     suspect_accounts = []
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ledger.balances import rebuild_daily_balances
+from ledger.models import Account
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the daily account balance rollup from general ledger entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help="Only rebuild accounts owned by this user id.")
+
+    def handle(self, *args, **options):
+        account_ids = None
+        if options.get('tenant'):
+            account_ids = list(Account.objects.filter(created_by_id=options['tenant']).values_list('id', flat=True))
+
+        self.stdout.write(self.style.WARNING("Rebuilding daily account balances..."))
+        rebuilt = rebuild_daily_balances(account_ids)
+        self.stdout.write(self.style.SUCCESS(f"Daily balances rebuilt for {rebuilt} accounts."))
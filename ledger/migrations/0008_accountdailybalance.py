@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:01
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_daily_balances(apps, schema_editor):
+    """Total existing ledger entries per (account, day) and carry the running balance."""
+    Account = apps.get_model('ledger', 'Account')
+    AccountDailyBalance = apps.get_model('ledger', 'AccountDailyBalance')
+    GeneralLedgerEntry = apps.get_model('ledger', 'GeneralLedgerEntry')
+
+    tenants = dict(Account.objects.values_list('pk', 'created_by_id'))
+    day_totals = (
+        GeneralLedgerEntry.objects
+        .values('account_id', 'date')
+        .annotate(debit_total=models.Sum('debit'), credit_total=models.Sum('credit'))
+        .order_by('account_id', 'date')
+    )
+    rows = []
+    account_id, running = None, Decimal('0')
+    for day in day_totals.iterator():
+        if day['account_id'] != account_id:
+            account_id, running = day['account_id'], Decimal('0')
+        running += (day['debit_total'] or 0) - (day['credit_total'] or 0)
+        rows.append(AccountDailyBalance(
+            created_by_id=tenants[account_id],
+            account_id=account_id,
+            date=day['date'],
+            debit_total=day['debit_total'] or 0,
+            credit_total=day['credit_total'] or 0,
+            running_balance=running,
+        ))
+        if len(rows) >= 1000:
+            AccountDailyBalance.objects.bulk_create(rows)
+            rows = []
+    AccountDailyBalance.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0007_generalledgerentry_credit_note_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('running_balance', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='ledger.account')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['account', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'date'), name='ledger_daily_balance_account_date_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_balances, migrations.RunPython.noop),
+    ]
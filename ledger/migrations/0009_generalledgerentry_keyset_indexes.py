@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0026_alter_customer_state_and_more'),
+        ('ledger', '0008_accountdailybalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generalledgerentry',
+            index=models.Index(fields=['created_by', 'date', 'created_at', 'id'], name='ledger_gle_tenant_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generalledgerentry',
+            index=models.Index(fields=['account', 'date', 'created_at', 'id'], name='ledger_gle_account_keyset_idx'),
+        ),
+    ]
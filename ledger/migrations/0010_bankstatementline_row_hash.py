@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0009_generalledgerentry_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankstatementline',
+            name='row_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -49,11 +49,40 @@ class GeneralLedgerEntry(models.Model):
     
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Keyset paging of the ledger and of a single account (cashbook).
+            models.Index(fields=['created_by', 'date', 'created_at', 'id'], name='ledger_gle_tenant_keyset_idx'),
+            models.Index(fields=['account', 'date', 'created_at', 'id'], name='ledger_gle_account_keyset_idx'),
+        ]
     
     
     def __str__(self):
         return f"{self.account.name} - Dr:{self.debit} Cr:{self.credit}"
 
+class AccountDailyBalance(models.Model):
+    """
+    Per-account, per-day ledger rollup.
+
+    ``running_balance`` is the cumulative debit minus credit up to and including
+    ``date``, so an opening balance is the latest row before a date.
+    Maintained by ``ledger.balances``.
+    """
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_balances')
+    date = models.DateField()
+    debit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    running_balance = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='ledger_daily_balance_account_date_uniq'),
+        ]
+        ordering = ['account', 'date']
+
+    def __str__(self):
+        return f"{self.account_id} {self.date}: {self.running_balance}"
+
 class BankStatement(models.Model):
     bank_name = models.CharField(max_length=100)
     account_number = models.CharField(max_length=50, blank=True)
@@ -78,6 +107,10 @@ class BankStatementLine(models.Model):
     matched_entry = models.ForeignKey(GeneralLedgerEntry, null=True, blank=True, on_delete=models.SET_NULL, related_name='bank_matches')
     reconciled_at = models.DateTimeField(null=True, blank=True)
 
+    # Fingerprint of the statement row, used to skip lines already imported
+    # from an overlapping statement of the same account.
+    row_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
     class Meta:
         ordering = ['date']
 
@@ -0,0 +1,207 @@
+"""
+In-memory bank reconciliation matching.
+
+A statement is matched in two queries: its lines, and every unmatched ledger
+entry of the tenant across the statement's date span (widened by the match
+window). Entries are indexed by ``(amount, direction)`` with their dates kept
+sorted, so the candidates for a line are found with a bisect instead of a
+query. Only entries on bank and cash accounts are candidates: asset accounts
+in the ``10xx`` range of the chart (``1001`` is Cash) or named as a bank or
+cash account. A receivable, payable or revenue row of the same amount is never
+offered. A bank withdrawal matches a ledger credit and a deposit a ledger
+debit.
+
+Candidates are scored on date proximity and on reference/description
+similarity, and ``assignments`` pairs lines and entries one-to-one, taking the
+best-scoring pairs first. ``auto_reconcile`` locks the lines and entries of
+the pairs that clear a confidence threshold, drops any a concurrent
+reconciliation took meanwhile and commits the rest with one ``bulk_update``.
+"""
+import bisect
+import re
+from collections import defaultdict
+from datetime import timedelta
+from difflib import SequenceMatcher
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AccountType, BankStatementLine, GeneralLedgerEntry
+
+DATE_WINDOW_DAYS = 2
+MAX_CANDIDATES = 5
+AUTO_RECONCILE_SCORE = 0.8
+
+DATE_WEIGHT = 0.4
+TEXT_WEIGHT = 0.6
+
+PAYMENT = 'payment'
+RECEIPT = 'receipt'
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Bank and cash accounts: asset accounts coded 10xx or named as such.
+CASH_AND_BANK_CODE_PREFIX = '10'
+CASH_AND_BANK_ACCOUNTS = Q(account__account_type=AccountType.ASSET) & (
+    Q(account__code__startswith=CASH_AND_BANK_CODE_PREFIX)
+    | Q(account__name__icontains='bank')
+    | Q(account__name__icontains='cash')
+)
+
+
+def _normalize(text):
+    return ' '.join(_TOKEN_RE.findall((text or '').lower()))
+
+
+def line_key(line):
+    """``(amount, direction)`` of a statement line."""
+    if line.debit_amount > 0:
+        return line.debit_amount, PAYMENT
+    return line.credit_amount, RECEIPT
+
+
+def entry_key(entry):
+    """``(amount, direction)`` of the bank line a ledger entry would match."""
+    if entry.credit > 0:
+        return entry.credit, PAYMENT
+    return entry.debit, RECEIPT
+
+
+def text_score(line, entry):
+    """1.0 when the line carries the entry's reference, else description similarity."""
+    reference = _normalize(entry.reference)
+    line_text = _normalize(f'{line.reference_no} {line.description}')
+    if reference and reference in line_text:
+        return 1.0
+    line_reference = _normalize(line.reference_no)
+    if line_reference and line_reference in _normalize(f'{entry.reference} {entry.description}'):
+        return 1.0
+    return SequenceMatcher(None, _normalize(line.description), _normalize(entry.description)).ratio()
+
+
+class ReconciliationEngine:
+    """Match the lines of ``statement`` against ``tenant``'s unmatched ledger entries."""
+
+    def __init__(self, statement, tenant, *, window_days=DATE_WINDOW_DAYS):
+        self.statement = statement
+        self.tenant = tenant
+        self.window = timedelta(days=window_days)
+        self.lines = list(
+            BankStatementLine.objects.filter(statement=statement)
+            .select_related('matched_entry')
+            .order_by('date', 'id')
+        )
+        self.open_lines = [line for line in self.lines if not line.is_reconciled]
+        self._index = self._load_entries()
+        self._scored = {}
+
+    def _load_entries(self):
+        """``{(amount, direction): (dates, entries)}`` with both lists in date order."""
+        index = defaultdict(lambda: ([], []))
+        if not self.open_lines:
+            return index
+        entries = (
+            GeneralLedgerEntry.objects.filter(
+                CASH_AND_BANK_ACCOUNTS,
+                created_by=self.tenant,
+                date__range=[self.open_lines[0].date - self.window, self.open_lines[-1].date + self.window],
+                bank_matches__isnull=True,
+            )
+            .exclude(debit__gt=0, credit__gt=0)
+            .select_related('account')
+            .order_by('date', 'created_at', 'id')
+        )
+        for entry in entries:
+            amount, direction = entry_key(entry)
+            if amount <= 0:
+                continue
+            dates, bucket = index[(amount, direction)]
+            dates.append(entry.date)
+            bucket.append(entry)
+        return index
+
+    def score(self, line, entry):
+        days = abs((entry.date - line.date).days)
+        date_score = 1 - days / (self.window.days + 1)
+        return round(DATE_WEIGHT * date_score + TEXT_WEIGHT * text_score(line, entry), 4)
+
+    def candidates(self, line):
+        """``[(score, entry)]`` for ``line``, best first."""
+        if line.pk not in self._scored:
+            scored = []
+            key = line_key(line)
+            if key in self._index:
+                dates, entries = self._index[key]
+                low = bisect.bisect_left(dates, line.date - self.window)
+                high = bisect.bisect_right(dates, line.date + self.window)
+                scored = [(self.score(line, entry), entry) for entry in entries[low:high]]
+                scored.sort(key=lambda pair: (-pair[0], abs((pair[1].date - line.date).days)))
+            self._scored[line.pk] = scored
+        return self._scored[line.pk]
+
+    def assignments(self):
+        """``{line_id: (score, entry)}``: one-to-one pairs, highest score first."""
+        pairs = []
+        for line in self.open_lines:
+            for rank, (score, entry) in enumerate(self.candidates(line)):
+                pairs.append((-score, abs((entry.date - line.date).days), line.date, line.pk, rank, line, entry))
+        pairs.sort(key=lambda pair: pair[:5])
+
+        assigned = {}
+        used_entries = set()
+        for negative_score, _days, _date, line_id, _rank, _line, entry in pairs:
+            if line_id in assigned or entry.pk in used_entries:
+                continue
+            assigned[line_id] = (-negative_score, entry)
+            used_entries.add(entry.pk)
+        return assigned
+
+    def auto_reconcile(self, min_score=AUTO_RECONCILE_SCORE):
+        """
+        Reconcile every assigned pair scoring at least ``min_score``; returns
+        the lines matched. Must run inside a transaction: the chosen lines and
+        entries are locked in pk order and re-checked first, so a pair a
+        concurrent reconciliation took meanwhile is left alone.
+        """
+        chosen = {
+            line_id: entry for line_id, (score, entry) in self.assignments().items() if score >= min_score
+        }
+        if not chosen:
+            return []
+
+        still_open = set(
+            BankStatementLine.objects.select_for_update()
+            .filter(pk__in=list(chosen), is_reconciled=False)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        entry_ids = [entry.pk for entry in chosen.values()]
+        list(
+            GeneralLedgerEntry.objects.select_for_update()
+            .filter(pk__in=entry_ids)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        # Read after the entry locks are held, so matches committed by the
+        # transactions we waited for are visible.
+        taken = set(
+            BankStatementLine.objects.filter(matched_entry_id__in=entry_ids)
+            .values_list('matched_entry_id', flat=True)
+        )
+
+        reconciled_at = timezone.now()
+        matched = []
+        lines = {line.pk: line for line in self.open_lines}
+        for line_id, entry in chosen.items():
+            if line_id not in still_open or entry.pk in taken:
+                continue
+            line = lines[line_id]
+            line.matched_entry = entry
+            line.is_reconciled = True
+            line.reconciled_at = reconciled_at
+            matched.append(line)
+        BankStatementLine.objects.bulk_update(matched, ['matched_entry', 'is_reconciled', 'reconciled_at'], batch_size=500)
+        # Lines reconciled elsewhere in the meantime are no longer open either.
+        closed = {line.pk for line in matched} | (chosen.keys() - still_open)
+        self.open_lines = [line for line in self.open_lines if line.pk not in closed]
+        return matched
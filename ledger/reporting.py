@@ -0,0 +1,148 @@
+"""
+Ledger reporting engine.
+
+Every financial statement is derived from a single grouped query that returns
+the debit/credit totals of all of a tenant's accounts for a date window, so a
+statement costs one round-trip regardless of how large the chart of accounts is.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Account, AccountType
+
+_ZERO = Decimal('0')
+_AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+DEBIT_NORMAL_TYPES = (AccountType.ASSET, AccountType.EXPENSE)
+
+
+@dataclass(frozen=True)
+class AccountTotals:
+    account: Account
+    debit_total: Decimal
+    credit_total: Decimal
+
+    @property
+    def balance(self) -> Decimal:
+        if self.account.account_type in DEBIT_NORMAL_TYPES:
+            return self.debit_total - self.credit_total
+        return self.credit_total - self.debit_total
+
+    def as_line(self) -> dict:
+        return {
+            'id': str(self.account.id),
+            'code': self.account.code,
+            'name': self.account.name,
+            'amount': float(self.balance),
+        }
+
+
+def account_totals(user, date_from=None, date_to=None) -> list[AccountTotals]:
+    """
+    Debit/credit totals for every account of ``user`` in one GROUP BY query.
+
+    ``date_from``/``date_to`` bound the entries (inclusive); pass only
+    ``date_to`` for an as-of position. Accounts without entries get zeros.
+    """
+    entry_filter = Q(ledger_entries__created_by=user)
+    if date_from:
+        entry_filter &= Q(ledger_entries__date__gte=date_from)
+    if date_to:
+        entry_filter &= Q(ledger_entries__date__lte=date_to)
+
+    accounts = (
+        Account.objects.filter(created_by=user)
+        .annotate(
+            debit_total=Coalesce(Sum('ledger_entries__debit', filter=entry_filter), Value(_ZERO), output_field=_AMOUNT_FIELD),
+            credit_total=Coalesce(Sum('ledger_entries__credit', filter=entry_filter), Value(_ZERO), output_field=_AMOUNT_FIELD),
+        )
+        .order_by('account_type', 'code', 'name')
+    )
+    return [AccountTotals(account, account.debit_total, account.credit_total) for account in accounts]
+
+
+def _section(totals, account_type):
+    items = []
+    total = _ZERO
+    for row in sorted(
+        (row for row in totals if row.account.account_type == account_type and row.account.is_active),
+        key=lambda row: (row.account.code, row.account.name),
+    ):
+        balance = row.balance
+        if balance != 0:
+            items.append(row.as_line())
+            total += balance
+    return items, total
+
+
+def trial_balance(totals) -> dict:
+    rows = [row for row in totals if row.account.is_active]
+    total_debits = sum((row.debit_total for row in rows), _ZERO)
+    total_credits = sum((row.credit_total for row in rows), _ZERO)
+    return {
+        'accounts': [
+            {
+                'account': row.account,
+                'debit_total': row.debit_total,
+                'credit_total': row.credit_total,
+                'balance': row.balance,
+            }
+            for row in rows
+        ],
+        'total_debits': total_debits,
+        'total_credits': total_credits,
+        'is_balanced': total_debits == total_credits,
+    }
+
+
+def profit_and_loss(totals) -> dict:
+    revenue_items, total_revenue = _section(totals, AccountType.REVENUE)
+    expense_items, total_expenses = _section(totals, AccountType.EXPENSE)
+    return {
+        'revenue_items': revenue_items,
+        'total_revenue': total_revenue,
+        'expense_items': expense_items,
+        'total_expenses': total_expenses,
+    }
+
+
+def balance_sheet(totals) -> dict:
+    asset_items, total_assets = _section(totals, AccountType.ASSET)
+    liability_items, total_liabilities = _section(totals, AccountType.LIABILITY)
+    equity_items, total_equity = _section(totals, AccountType.EQUITY)
+
+    # Retained Earnings (Net Profit carried forward) over all revenue and
+    # expense accounts, including deactivated ones.
+    revenue_total = sum((row.balance for row in totals if row.account.account_type == AccountType.REVENUE), _ZERO)
+    expense_total = sum((row.balance for row in totals if row.account.account_type == AccountType.EXPENSE), _ZERO)
+    retained_earnings = revenue_total - expense_total
+    total_equity += retained_earnings
+
+    difference = total_assets - (total_liabilities + total_equity)
+    is_balanced = abs(difference) < Decimal('0.01')
+
+    if not is_balanced:
+        # Append Virtual Suspense Account to Equity so the totals balance mathematically
+        equity_items.append({
+            'id': 'suspense',
+            'code': 'SUSP',
+            'name': 'Suspense Account (Action Required)',
+            'amount': float(difference),
+            'is_suspense': True,
+        })
+        total_equity += difference
+
+    return {
+        'asset_items': asset_items,
+        'total_assets': total_assets,
+        'liability_items': liability_items,
+        'total_liabilities': total_liabilities,
+        'equity_items': equity_items,
+        'total_equity': total_equity,
+        'retained_earnings': retained_earnings,
+        'is_balanced': is_balanced,
+        'difference': difference,
+    }
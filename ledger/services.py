@@ -1,107 +1,240 @@
+import time
+from collections import defaultdict
 from decimal import Decimal
 from django.db import transaction
 from django.db.models import Sum, Q
+from django.core.cache import cache
 from .models import GeneralLedgerEntry, Account, AccountType
+from .balances import batched_refresh, entry_pairs, note_changed
+from .reporting import account_totals, trial_balance
 from billing.models import SalesInvoice, PurchaseBill
+from cenvoras.cache_utils import CACHE_TTL_LONG, LocalLRUCache, tenant_cache_key
+
+
+# Default chart of accounts provisioned for every tenant: (code, name, type).
+DEFAULT_ACCOUNTS = [
+    # Assets
+    ('1001', 'Cash', AccountType.ASSET),
+    ('1200', 'Accounts Receivable', AccountType.ASSET),
+    ('1300', 'Inventory', AccountType.ASSET),
+    ('1400', 'Office Supplies', AccountType.ASSET),
+    ('1500', 'Equipment', AccountType.ASSET),
+
+    # Liabilities
+    ('2001', 'Accounts Payable', AccountType.LIABILITY),
+    ('2100', 'Accrued Expenses', AccountType.LIABILITY),
+    ('2101', 'Customer Advances', AccountType.LIABILITY),
+
+    # Equity
+    ('3001', 'Owner\'s Equity', AccountType.EQUITY),
+    ('3100', 'Retained Earnings', AccountType.EQUITY),
+
+    # Revenue
+    ('4001', 'Sales Revenue', AccountType.REVENUE),
+    ('4100', 'Service Revenue', AccountType.REVENUE),
+    ('4200', 'Rounding Off', AccountType.REVENUE),
+
+    # Expenses
+    ('5001', 'Cost of Goods Sold', AccountType.EXPENSE),
+    ('5100', 'Office Supplies Expense', AccountType.EXPENSE),
+    ('5200', 'Equipment Expense', AccountType.EXPENSE),
+    ('6001', 'Purchases', AccountType.EXPENSE),
+]
+
+_ACCOUNTS_NAMESPACE = 'ledger_accounts'
+
+# Tenant id -> (version, {code: Account}), per process.
+_local_account_maps = LocalLRUCache(maxsize=2048)
+
+
+def _account_map_version_key(tenant_id):
+    return tenant_cache_key(_ACCOUNTS_NAMESPACE, tenant_id, 'version')
+
+
+def _account_map_version(tenant_id):
+    version_key = _account_map_version_key(tenant_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key)
+    return version
+
+
+def invalidate_account_map(tenant_id):
+    """Drop the cached default account map for a tenant in every process."""
+    _local_account_maps.delete(tenant_id)
+    cache.set(_account_map_version_key(tenant_id), time.time_ns(), None)
+
+
+def _store_account_map(tenant_id, version, accounts_by_code):
+    cache.set(tenant_cache_key(_ACCOUNTS_NAMESPACE, tenant_id, version), accounts_by_code, CACHE_TTL_LONG)
+    if _account_map_version(tenant_id) == version:
+        _local_account_maps.set(tenant_id, (version, accounts_by_code))
+
+
+def _load_default_accounts(user):
+    codes = [code for code, _name, _type in DEFAULT_ACCOUNTS]
+    accounts_by_code = {
+        account.code: account
+        for account in Account.objects.filter(created_by=user, code__in=codes)
+    }
+    missing = [row for row in DEFAULT_ACCOUNTS if row[0] not in accounts_by_code]
+    if not missing:
+        return accounts_by_code
+
+    Account.objects.bulk_create(
+        [
+            Account(
+                code=code,
+                name=name,
+                account_type=account_type,
+                description=f'Default {account_type} account',
+                created_by=user,
+            )
+            for code, name, account_type in missing
+        ],
+        ignore_conflicts=True,
+    )
+    # A tenant may already own an account with a default name under another
+    # code; ignore_conflicts skips that row, so fall back to the name.
+    missing_codes = [code for code, _name, _type in missing]
+    missing_names = [name for _code, name, _type in missing]
+    reloaded = list(Account.objects.filter(created_by=user).filter(Q(code__in=missing_codes) | Q(name__in=missing_names)))
+    by_code = {account.code: account for account in reloaded}
+    by_name = {account.name: account for account in reloaded}
+    for code, name, _type in missing:
+        account = by_code.get(code) or by_name.get(name)
+        if account is not None:
+            accounts_by_code[code] = account
+    return accounts_by_code
 
 
 class AccountingService:
     """Service for handling double-entry accounting operations"""
+
+    # Fields a document re-post may change on an existing ledger row.
+    SYNCED_ENTRY_FIELDS = ['date', 'debit', 'credit', 'description', 'reference', 'customer']
     
     @classmethod
     def get_or_create_default_accounts(cls, user):
-        """Get or create default accounting accounts for a user"""
-        accounts = {}
-        
-        # Define default chart of accounts
-        default_accounts = [
-            # Assets
-            ('1001', 'Cash', AccountType.ASSET),
-            ('1200', 'Accounts Receivable', AccountType.ASSET),
-            ('1300', 'Inventory', AccountType.ASSET),
-            ('1400', 'Office Supplies', AccountType.ASSET),
-            ('1500', 'Equipment', AccountType.ASSET),
-            
-            # Liabilities
-            ('2001', 'Accounts Payable', AccountType.LIABILITY),
-            ('2100', 'Accrued Expenses', AccountType.LIABILITY),
-            ('2101', 'Customer Advances', AccountType.LIABILITY),
-            
-            # Equity
-            ('3001', 'Owner\'s Equity', AccountType.EQUITY),
-            ('3100', 'Retained Earnings', AccountType.EQUITY),
-            
-            # Revenue
-            ('4001', 'Sales Revenue', AccountType.REVENUE),
-            ('4100', 'Service Revenue', AccountType.REVENUE),
-            ('4200', 'Rounding Off', AccountType.REVENUE),
-            
-            # Expenses
-            ('5001', 'Cost of Goods Sold', AccountType.EXPENSE),
-            ('5100', 'Office Supplies Expense', AccountType.EXPENSE),
-            ('5200', 'Equipment Expense', AccountType.EXPENSE),
-            ('6001', 'Purchases', AccountType.EXPENSE),
-        ]
-        
-        existing_accounts = Account.objects.filter(
-            created_by=user,
-            code__in=[code for code, _name, _type in default_accounts],
-        )
-        accounts_by_code = {account.code: account for account in existing_accounts}
+        """
+        Get or create default accounting accounts for a user.
 
-        for code, name, account_type in default_accounts:
-            account = accounts_by_code.get(code)
-            if account is None:
-                account = Account.objects.create(
-                    code=code,
-                    name=name,
-                    account_type=account_type,
-                    description=f'Default {account_type} account',
-                    created_by=user,
+        The map is cached per tenant (process LRU, then Redis) under a version
+        bumped whenever one of the tenant's accounts changes, so the common
+        path issues no database queries, only a Redis read of the version.
+        Missing defaults are provisioned with a single bulk_create.
+        """
+        tenant_id = user.pk
+        # The version is checked even on a process-local hit, so a map another
+        # process invalidated is never served from here.
+        version = _account_map_version(tenant_id)
+        local_entry = _local_account_maps.get(tenant_id)
+        if local_entry is not None and local_entry[0] == version:
+            accounts_by_code = local_entry[1]
+        else:
+            cache_key = tenant_cache_key(_ACCOUNTS_NAMESPACE, tenant_id, version)
+            accounts_by_code = cache.get(cache_key)
+            if accounts_by_code is None:
+                accounts_by_code = _load_default_accounts(user)
+                # Publish only once the (possibly just provisioned) rows are committed.
+                transaction.on_commit(
+                    lambda: _store_account_map(tenant_id, version, accounts_by_code)
                 )
-                accounts_by_code[code] = account
+            else:
+                _local_account_maps.set(tenant_id, (version, accounts_by_code))
 
+        accounts = {}
+        for code, name, _type in DEFAULT_ACCOUNTS:
+            account = accounts_by_code.get(code)
+            if account is None:
+                continue
             # Store by both code and clean name for easy access
             clean_name = name.lower().replace(' ', '_').replace('\'', '')
             accounts[clean_name] = account
             accounts[code] = account
-            
+
         return accounts
-    
+
     @classmethod
-    @transaction.atomic
-    def create_sales_invoice_entries(cls, sales_invoice):
+    def _rounding_off_account(cls, accounts, user):
+        # Ensure the rounding_off account exists (may be missing for older users)
+        rounding_off_account = accounts.get('rounding_off')
+        if rounding_off_account is None:
+            rounding_off_account, _ = Account.objects.get_or_create(
+                code='4200',
+                created_by=user,
+                defaults={
+                    'name': 'Rounding Off',
+                    'account_type': AccountType.REVENUE,
+                    'description': 'Default Revenue account',
+                }
+            )
+            accounts['rounding_off'] = rounding_off_account
+            accounts['4200'] = rounding_off_account
+        return rounding_off_account
+
+    @staticmethod
+    def _line_item_description(prefix, item, suffix):
+        item_description = f"{prefix} {item.product.name}"
+        if item.quantity > 1:
+            item_description += f" (Qty: {item.quantity}"
+            if item.unit:
+                item_description += f" {item.unit}"
+            item_description += f" @ ₹{item.price})"
+        else:
+            item_description += f" @ ₹{item.price}"
+
+        # Add tax information if applicable
+        if item.tax > 0:
+            item_description += f" [Tax: ₹{item.tax}]"
+
+        # Add discount information if applicable
+        if item.discount > 0:
+            item_description += f" [Discount: ₹{item.discount}]"
+
+        return item_description + f" - {suffix}"
+
+    @staticmethod
+    def _line_items_summary(line_items):
+        item_details = []
+        for item in line_items:
+            item_desc = f"{item.product.name} (Qty: {item.quantity}"
+            if item.unit:
+                item_desc += f" {item.unit}"
+            item_desc += f" @ ₹{item.price} = ₹{item.amount})"
+            item_details.append(item_desc)
+        return "; ".join(item_details)
+
+    @classmethod
+    def build_sales_invoice_entries(cls, sales_invoice, accounts_receivable_account=None, sales_revenue_account=None,
+                                    line_items=None, accounts=None):
         """
-        Create detailed accounting entries for a sales invoice using double-entry accounting
-        
-        Creates one entry for Accounts Receivable (total amount)
-        Creates detailed entries for each line item showing actual products sold
+        Build (unsaved) double-entry rows for a sales invoice.
+
+        One Accounts Receivable debit for the total, one Sales Revenue credit per
+        line item and an optional rounding-off entry. Callers posting many
+        invoices pass ``line_items`` (with their products loaded) and the
+        tenant's ``accounts`` map to skip the per-invoice lookups.
         """
         user = sales_invoice.created_by
-        accounts = cls.get_or_create_default_accounts(user)
-        
-        # Get all line items for this invoice
-        from billing.models import SalesInvoiceItem
-        line_items = SalesInvoiceItem.objects.filter(sales_invoice=sales_invoice)
-        
-        # Create detailed description with line items
-        if line_items.exists():
-            item_details = []
-            for item in line_items:
-                item_desc = f"{item.product.name} (Qty: {item.quantity}"
-                if item.unit:
-                    item_desc += f" {item.unit}"
-                item_desc += f" @ ₹{item.price} = ₹{item.amount})"
-                item_details.append(item_desc)
-            
-            detailed_description = f"Sales to {sales_invoice.customer_name or 'Customer'} - Items: " + "; ".join(item_details)
+        accounts = accounts or cls.get_or_create_default_accounts(user)
+        receivable_account = accounts_receivable_account or accounts['accounts_receivable']
+        revenue_account = sales_revenue_account or accounts['sales_revenue']
+
+        if line_items is None:
+            from billing.models import SalesInvoiceItem
+            line_items = list(SalesInvoiceItem.objects.filter(sales_invoice=sales_invoice).select_related('product'))
+
+        if line_items:
+            detailed_description = f"Sales to {sales_invoice.customer_name or 'Customer'} - Items: " + cls._line_items_summary(line_items)
         else:
             detailed_description = f"Sales to {sales_invoice.customer_name or 'Customer'}"
-        
+
         # Debit: Accounts Receivable (increase what customer owes)
-        GeneralLedgerEntry.objects.create(
+        entries = [GeneralLedgerEntry(
             date=sales_invoice.invoice_date,
-            account=accounts['accounts_receivable'],
+            account=receivable_account,
             debit=sales_invoice.total_amount,
             credit=0,
             description=detailed_description,
@@ -109,180 +242,228 @@ class AccountingService:
             sales_invoice=sales_invoice,
             customer=sales_invoice.customer,
             created_by=user
-        )
-        
-        # Create detailed credit entries for each line item
+        )]
+
+        # Credit: Sales Revenue (record income for each item)
         for item in line_items:
-            item_description = f"Sale of {item.product.name}"
-            if item.quantity > 1:
-                item_description += f" (Qty: {item.quantity}"
-                if item.unit:
-                    item_description += f" {item.unit}"
-                item_description += f" @ ₹{item.price})"
-            else:
-                item_description += f" @ ₹{item.price}"
-            
-            # Add tax information if applicable
-            if item.tax > 0:
-                item_description += f" [Tax: ₹{item.tax}]"
-            
-            # Add discount information if applicable
-            if item.discount > 0:
-                item_description += f" [Discount: ₹{item.discount}]"
-                
-            item_description += f" - Invoice {sales_invoice.invoice_number}"
-        
-            # Credit: Sales Revenue (record income for each item)
-            GeneralLedgerEntry.objects.create(
+            entries.append(GeneralLedgerEntry(
                 date=sales_invoice.invoice_date,
-                account=accounts['sales_revenue'],
+                account=revenue_account,
                 debit=0,
                 credit=item.amount,
-                description=item_description,
+                description=cls._line_item_description("Sale of", item, f"Invoice {sales_invoice.invoice_number}"),
                 reference=f"{sales_invoice.invoice_number}-{item.id}",
                 sales_invoice=sales_invoice,
                 # Revenue belongs to the sales account, not customer settlement.
                 # Keep customer null so customer-ledger credit appears only on payment receipt.
                 customer=None,
                 created_by=user
-            )
-        
+            ))
+
         # Credit/Debit: Rounding Off (handle the difference to keep Balance Sheet balanced)
         round_off = getattr(sales_invoice, 'round_off', Decimal('0.00')) or Decimal('0.00')
         if round_off != 0:
-            # Ensure the rounding_off account exists (may be missing for older users)
-            rounding_off_account = accounts.get('rounding_off')
-            if rounding_off_account is None:
-                rounding_off_account, _ = Account.objects.get_or_create(
-                    code='4200',
-                    created_by=user,
-                    defaults={
-                        'name': 'Rounding Off',
-                        'account_type': AccountType.REVENUE,
-                        'description': 'Default Revenue account',
-                    }
-                )
-                accounts['rounding_off'] = rounding_off_account
-                accounts['4200'] = rounding_off_account
-
-            GeneralLedgerEntry.objects.create(
+            entries.append(GeneralLedgerEntry(
                 date=sales_invoice.invoice_date,
-                account=rounding_off_account,
+                account=cls._rounding_off_account(accounts, user),
                 debit=abs(round_off) if round_off < 0 else 0,
                 credit=round_off if round_off > 0 else 0,
                 description=f"Rounding off adjustment for Invoice {sales_invoice.invoice_number}",
                 reference=sales_invoice.invoice_number,
                 sales_invoice=sales_invoice,
                 created_by=user
-            )
-        
-        return True
-    
+            ))
+
+        return entries
+
     @classmethod
-    @transaction.atomic
-    def create_purchase_bill_entries(cls, purchase_bill):
+    def build_purchase_bill_entries(cls, purchase_bill, purchases_account=None, accounts_payable_account=None):
         """
-        Create detailed accounting entries for a purchase bill using double-entry accounting
-        
-        Creates detailed entries for each line item showing actual products purchased
-        Creates one entry for Accounts Payable (total amount)
+        Build (unsaved) double-entry rows for a purchase bill.
+
+        One Purchases debit per line item, one Accounts Payable credit for the
+        total and an optional rounding-off entry.
         """
         user = purchase_bill.created_by
         accounts = cls.get_or_create_default_accounts(user)
-        
-        # Get all line items for this purchase bill
+        expense_account = purchases_account or accounts['purchases']
+        payable_account = accounts_payable_account or accounts['accounts_payable']
+
         from billing.models import PurchaseBillItem
-        line_items = PurchaseBillItem.objects.filter(purchase_bill=purchase_bill)
-        
-        # Create detailed debit entries for each line item
-        for item in line_items:
-            item_description = f"Purchase of {item.product.name}"
-            if item.quantity > 1:
-                item_description += f" (Qty: {item.quantity}"
-                if item.unit:
-                    item_description += f" {item.unit}"
-                item_description += f" @ ₹{item.price})"
-            else:
-                item_description += f" @ ₹{item.price}"
-            
-            # Add tax information if applicable
-            if item.tax > 0:
-                item_description += f" [Tax: ₹{item.tax}]"
-            
-            # Add discount information if applicable
-            if item.discount > 0:
-                item_description += f" [Discount: ₹{item.discount}]"
-                
-            item_description += f" - Bill {purchase_bill.bill_number}"
-        
-            # Debit: Purchases/Expense (record what we bought for each item)
-            GeneralLedgerEntry.objects.create(
+        line_items = list(PurchaseBillItem.objects.filter(purchase_bill=purchase_bill).select_related('product'))
+
+        # Debit: Purchases/Expense (record what we bought for each item)
+        entries = [
+            GeneralLedgerEntry(
                 date=purchase_bill.bill_date,
-                account=accounts['purchases'],
+                account=expense_account,
                 debit=item.amount,
                 credit=0,
-                description=item_description,
+                description=cls._line_item_description("Purchase of", item, f"Bill {purchase_bill.bill_number}"),
                 reference=f"{purchase_bill.bill_number}-{item.id}",
                 purchase_bill=purchase_bill,
                 created_by=user
             )
-        
-        # Create detailed description with line items for accounts payable
-        if line_items.exists():
-            item_details = []
-            for item in line_items:
-                item_desc = f"{item.product.name} (Qty: {item.quantity}"
-                if item.unit:
-                    item_desc += f" {item.unit}"
-                item_desc += f" @ ₹{item.price} = ₹{item.amount})"
-                item_details.append(item_desc)
-            
-            detailed_payable_description = f"Amount owed to {purchase_bill.vendor_name} - Items: " + "; ".join(item_details)
+            for item in line_items
+        ]
+
+        if line_items:
+            detailed_payable_description = f"Amount owed to {purchase_bill.vendor_name} - Items: " + cls._line_items_summary(line_items)
         else:
             detailed_payable_description = f"Amount owed to {purchase_bill.vendor_name}"
-        
+
         # Credit: Accounts Payable (record what we owe)
-        GeneralLedgerEntry.objects.create(
+        entries.append(GeneralLedgerEntry(
             date=purchase_bill.bill_date,
-            account=accounts['accounts_payable'],
+            account=payable_account,
             debit=0,
             credit=purchase_bill.total_amount,
             description=detailed_payable_description,
             reference=purchase_bill.bill_number,
             purchase_bill=purchase_bill,
             created_by=user
-        )
+        ))
 
         # Debit/Credit: Rounding Off adjustment for purchase bill
         round_off = getattr(purchase_bill, 'round_off', Decimal('0.00')) or Decimal('0.00')
         if round_off != 0:
-            rounding_off_account = accounts.get('rounding_off')
-            if rounding_off_account is None:
-                rounding_off_account, _ = Account.objects.get_or_create(
-                    code='4200',
-                    created_by=user,
-                    defaults={
-                        'name': 'Rounding Off',
-                        'account_type': AccountType.REVENUE,
-                        'description': 'Default Revenue account',
-                    }
-                )
-                accounts['rounding_off'] = rounding_off_account
-                accounts['4200'] = rounding_off_account
-
-            GeneralLedgerEntry.objects.create(
+            entries.append(GeneralLedgerEntry(
                 date=purchase_bill.bill_date,
-                account=rounding_off_account,
+                account=cls._rounding_off_account(accounts, user),
                 debit=round_off if round_off > 0 else 0,
                 credit=abs(round_off) if round_off < 0 else 0,
                 description=f"Rounding off adjustment for Bill {purchase_bill.bill_number}",
                 reference=purchase_bill.bill_number,
                 purchase_bill=purchase_bill,
                 created_by=user
-            )
+            ))
+
+        return entries
 
+    @classmethod
+    @transaction.atomic
+    def create_sales_invoice_entries(cls, sales_invoice, **account_overrides):
+        """Create accounting entries for a sales invoice using double-entry accounting"""
+        entries = GeneralLedgerEntry.objects.bulk_create(cls.build_sales_invoice_entries(sales_invoice, **account_overrides))
+        note_changed(entry_pairs(entries))
         return True
-    
+
+    @classmethod
+    @transaction.atomic
+    def create_purchase_bill_entries(cls, purchase_bill, **account_overrides):
+        """Create accounting entries for a purchase bill using double-entry accounting"""
+        entries = GeneralLedgerEntry.objects.bulk_create(cls.build_purchase_bill_entries(purchase_bill, **account_overrides))
+        note_changed(entry_pairs(entries))
+        return True
+
+    @classmethod
+    @transaction.atomic
+    def sync_sales_invoice_entries(cls, sales_invoice):
+        """Bring the invoice's ledger rows in line with the invoice, touching only what changed"""
+        return cls.sync_document_entries(
+            GeneralLedgerEntry.objects.filter(sales_invoice=sales_invoice),
+            cls.build_sales_invoice_entries(sales_invoice),
+        )
+
+    @classmethod
+    @transaction.atomic
+    def create_sales_invoices_entries(cls, invoices_with_items):
+        """
+        Post the ledger rows of many new invoices with one ``bulk_create``.
+
+        ``invoices_with_items`` is ``[(invoice, line_items)]`` for invoices that
+        have no ledger rows yet (bulk imports), so there is nothing to diff.
+        """
+        accounts_by_owner = {}
+        entries = []
+        for invoice, line_items in invoices_with_items:
+            if invoice.created_by_id not in accounts_by_owner:
+                accounts_by_owner[invoice.created_by_id] = cls.get_or_create_default_accounts(invoice.created_by)
+            entries.extend(cls.build_sales_invoice_entries(
+                invoice, line_items=line_items, accounts=accounts_by_owner[invoice.created_by_id],
+            ))
+        with batched_refresh():
+            GeneralLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+            note_changed(entry_pairs(entries))
+        return entries
+
+    @classmethod
+    @transaction.atomic
+    def sync_purchase_bill_entries(cls, purchase_bill):
+        """Bring the bill's ledger rows in line with the bill, touching only what changed"""
+        return cls.sync_document_entries(
+            GeneralLedgerEntry.objects.filter(purchase_bill=purchase_bill),
+            cls.build_purchase_bill_entries(purchase_bill),
+        )
+
+    @classmethod
+    def sync_document_entries(cls, existing_entries, desired_entries):
+        """
+        Diff ``desired_entries`` (unsaved) against ``existing_entries`` and apply
+        the minimal bulk_create / bulk_update / delete.
+
+        Rows are matched on (account, reference). Leftover rows of the same
+        account are reused for unmatched desired rows (e.g. line items that
+        were replaced and got new ids), so an edit rewrites rows in place
+        instead of deleting and re-inserting them.
+        """
+        existing_by_key = defaultdict(list)
+        for entry in existing_entries.order_by('created_at', 'id'):
+            existing_by_key[(entry.account_id, entry.reference)].append(entry)
+        previous_days = entry_pairs(entry for entries in existing_by_key.values() for entry in entries)
+
+        to_update = []
+        unmatched = []
+        for desired in desired_entries:
+            candidates = existing_by_key.get((desired.account_id, desired.reference))
+            if candidates:
+                current = candidates.pop(0)
+                if cls._copy_entry_fields(desired, current):
+                    to_update.append(current)
+            else:
+                unmatched.append(desired)
+
+        leftovers_by_account = defaultdict(list)
+        for entries in existing_by_key.values():
+            for entry in entries:
+                leftovers_by_account[entry.account_id].append(entry)
+
+        to_create = []
+        for desired in unmatched:
+            leftovers = leftovers_by_account.get(desired.account_id)
+            if leftovers:
+                current = leftovers.pop(0)
+                cls._copy_entry_fields(desired, current)
+                to_update.append(current)
+            else:
+                to_create.append(desired)
+
+        to_delete = [entry.pk for entries in leftovers_by_account.values() for entry in entries]
+
+        # Days touched before and after the sync, for the daily balance rollup.
+        touched_days = previous_days | entry_pairs(desired_entries)
+        with batched_refresh():
+            if to_delete:
+                GeneralLedgerEntry.objects.filter(pk__in=to_delete).delete()
+            if to_update:
+                GeneralLedgerEntry.objects.bulk_update(to_update, cls.SYNCED_ENTRY_FIELDS)
+            if to_create:
+                GeneralLedgerEntry.objects.bulk_create(to_create)
+            note_changed(touched_days)
+
+        return {'created': len(to_create), 'updated': len(to_update), 'deleted': len(to_delete)}
+
+    @classmethod
+    def _copy_entry_fields(cls, source, target):
+        changed = False
+        for field in cls.SYNCED_ENTRY_FIELDS:
+            attname = GeneralLedgerEntry._meta.get_field(field).attname
+            value = getattr(source, attname)
+            if getattr(target, attname) != value:
+                setattr(target, attname, value)
+                changed = True
+        return changed
+
     @classmethod
     @transaction.atomic
     def create_payment_received_entries(cls, customer, amount, description, date, user, invoice=None, payment_id=None):
@@ -369,8 +550,9 @@ class AccountingService:
         if date_to:
             entries = entries.filter(date__lte=date_to)
         
-        total_debits = entries.aggregate(Sum('debit'))['debit__sum'] or Decimal('0')
-        total_credits = entries.aggregate(Sum('credit'))['credit__sum'] or Decimal('0')
+        totals = entries.aggregate(total_debit=Sum('debit'), total_credit=Sum('credit'))
+        total_debits = totals['total_debit'] or Decimal('0')
+        total_credits = totals['total_credit'] or Decimal('0')
         
         # Calculate balance based on account type
         if account.account_type in [AccountType.ASSET, AccountType.EXPENSE]:
@@ -387,29 +569,7 @@ class AccountingService:
     @classmethod
     def get_trial_balance(cls, user, date_to=None):
         """Get trial balance for all accounts"""
-        accounts = Account.objects.filter(created_by=user, is_active=True).order_by('account_type', 'code', 'name')
-        
-        accounts_data = []
-        total_debits = Decimal('0')
-        total_credits = Decimal('0')
-        
-        for account in accounts:
-            balance_info = cls.get_account_balance(account, user, date_to)
-            accounts_data.append({
-                'account': account,
-                'debit_total': balance_info['debit_total'],
-                'credit_total': balance_info['credit_total'],
-                'balance': balance_info['balance']
-            })
-            total_debits += balance_info['debit_total']
-            total_credits += balance_info['credit_total']
-        
-        return {
-            'accounts': accounts_data,
-            'total_debits': total_debits,
-            'total_credits': total_credits,
-            'is_balanced': total_debits == total_credits
-        }
+        return trial_balance(account_totals(user, date_to=date_to))
     
     @classmethod
     def get_general_ledger_entries(cls, account, user, date_from=None, date_to=None):
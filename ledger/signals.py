@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .balances import entry_pairs, note_changed
+from .models import Account, GeneralLedgerEntry
+from .services import invalidate_account_map
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_account_map_on_change(sender, instance, **kwargs):
+    tenant_id = instance.created_by_id
+    invalidate_account_map(tenant_id)
+    transaction.on_commit(lambda: invalidate_account_map(tenant_id))
+
+
+@receiver(pre_save, sender=GeneralLedgerEntry)
+def remember_rollup_day(sender, instance, **kwargs):
+    if instance._state.adding:
+        return
+    previous = GeneralLedgerEntry.objects.filter(pk=instance.pk).values_list('account_id', 'date').first()
+    instance._rollup_previous_day = previous
+
+
+@receiver(post_save, sender=GeneralLedgerEntry)
+@receiver(post_delete, sender=GeneralLedgerEntry)
+def refresh_rollup_day(sender, instance, **kwargs):
+    pairs = entry_pairs([instance])
+    previous = getattr(instance, '_rollup_previous_day', None)
+    if previous:
+        pairs.add(previous)
+    note_changed(pairs)
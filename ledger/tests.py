@@ -5,6 +5,7 @@ from django.contrib.auth import get_user_model
 from ledger.models import Account, AccountType, GeneralLedgerEntry
 from billing.models import SalesInvoice
 from datetime import date
+from decimal import Decimal
 
 User = get_user_model()
 
@@ -107,3 +108,481 @@ class LedgerDeletionPolicyTests(TestCase):
 
 		res = self.client.delete(f"/api/ledger/general-ledger-entry/{entry.id}/")
 		self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class SalesInvoiceLedgerSyncTests(TestCase):
+	def setUp(self):
+		from billing.models import SalesInvoiceItem
+		from inventory.models import Product
+
+		self.user = User.objects.create_user(
+			username="ledger_sync_user",
+			email="ledger.sync@test.com",
+			password="testpassword",
+		)
+		self.product = Product.objects.create(name="Widget", created_by=self.user)
+		self.invoice = SalesInvoice.objects.create(
+			created_by=self.user,
+			customer_name="Jane",
+			invoice_number="INV-SYNC-1",
+			invoice_date=date(2024, 1, 1),
+			total_amount=30,
+		)
+		self.item = SalesInvoiceItem.objects.create(
+			sales_invoice=self.invoice, product=self.product, quantity=1, price=30, amount=30,
+		)
+		self.invoice.refresh_from_db()
+
+	def _entry_ids(self):
+		return set(GeneralLedgerEntry.objects.filter(sales_invoice=self.invoice).values_list("id", flat=True))
+
+	def test_resync_without_changes_touches_nothing(self):
+		from ledger.services import AccountingService
+
+		first = AccountingService.sync_sales_invoice_entries(self.invoice)
+		self.assertEqual(first, {"created": 2, "updated": 0, "deleted": 0})
+		ids = self._entry_ids()
+
+		second = AccountingService.sync_sales_invoice_entries(self.invoice)
+		self.assertEqual(second, {"created": 0, "updated": 0, "deleted": 0})
+		self.assertEqual(self._entry_ids(), ids)
+
+	def test_replaced_line_items_reuse_existing_rows(self):
+		from billing.models import SalesInvoiceItem
+		from ledger.services import AccountingService
+
+		AccountingService.sync_sales_invoice_entries(self.invoice)
+		ids = self._entry_ids()
+
+		self.item.delete()
+		SalesInvoiceItem.objects.create(
+			sales_invoice=self.invoice, product=self.product, quantity=2, price=25, amount=50,
+		)
+		SalesInvoice.objects.filter(pk=self.invoice.pk).update(total_amount=50)
+		self.invoice.refresh_from_db()
+
+		result = AccountingService.sync_sales_invoice_entries(self.invoice)
+
+		self.assertEqual(result, {"created": 0, "updated": 2, "deleted": 0})
+		self.assertEqual(self._entry_ids(), ids)
+		entries = GeneralLedgerEntry.objects.filter(sales_invoice=self.invoice)
+		self.assertEqual(sum(entry.debit for entry in entries), 50)
+		self.assertEqual(sum(entry.credit for entry in entries), 50)
+
+	def test_removed_line_items_delete_their_rows(self):
+		from billing.models import SalesInvoiceItem
+		from ledger.services import AccountingService
+
+		SalesInvoiceItem.objects.create(
+			sales_invoice=self.invoice, product=self.product, quantity=1, price=20, amount=20,
+		)
+		self.invoice.refresh_from_db()
+		AccountingService.sync_sales_invoice_entries(self.invoice)
+		self.assertEqual(len(self._entry_ids()), 3)
+
+		self.item.delete()
+		self.invoice.refresh_from_db()
+		result = AccountingService.sync_sales_invoice_entries(self.invoice)
+
+		self.assertEqual(result["deleted"], 1)
+		self.assertEqual(len(self._entry_ids()), 2)
+
+
+class DefaultAccountMapCacheTests(TestCase):
+	def setUp(self):
+		from ledger.services import invalidate_account_map
+
+		self.user = User.objects.create_user(
+			username="account_map_user",
+			email="account.map@test.com",
+			password="testpassword",
+		)
+		self.addCleanup(invalidate_account_map, self.user.pk)
+
+	def test_accounts_are_provisioned_once_and_served_from_cache(self):
+		from ledger.services import AccountingService, DEFAULT_ACCOUNTS
+
+		with self.captureOnCommitCallbacks(execute=True):
+			accounts = AccountingService.get_or_create_default_accounts(self.user)
+
+		self.assertEqual(Account.objects.filter(created_by=self.user).count(), len(DEFAULT_ACCOUNTS))
+		self.assertEqual(accounts["cash"], accounts["1001"])
+		with self.assertNumQueries(0):
+			cached = AccountingService.get_or_create_default_accounts(self.user)
+		self.assertEqual(cached["accounts_receivable"].pk, accounts["accounts_receivable"].pk)
+
+	def test_account_change_invalidates_the_map(self):
+		from ledger.services import AccountingService
+
+		with self.captureOnCommitCallbacks(execute=True):
+			AccountingService.get_or_create_default_accounts(self.user)
+
+		Account.objects.filter(created_by=self.user, code="1001").delete()
+		Account.objects.create(code="9999", name="Petty Cash", account_type=AccountType.ASSET, created_by=self.user)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			accounts = AccountingService.get_or_create_default_accounts(self.user)
+		self.assertTrue(Account.objects.filter(pk=accounts["cash"].pk, code="1001").exists())
+
+	def test_process_local_map_is_dropped_when_another_process_invalidates(self):
+		from django.core.cache import cache
+		from ledger.services import AccountingService, _account_map_version_key
+
+		with self.captureOnCommitCallbacks(execute=True):
+			stale = AccountingService.get_or_create_default_accounts(self.user)
+
+		# Another worker changes the account and bumps the shared version; no
+		# signal reaches this process, which still holds its local copy.
+		Account.objects.filter(pk=stale["cash"].pk).update(code="1001-OLD", name="Old Cash")
+		cache.set(_account_map_version_key(self.user.pk), 0, None)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			accounts = AccountingService.get_or_create_default_accounts(self.user)
+		self.assertNotEqual(accounts["cash"].pk, stale["cash"].pk)
+		self.assertTrue(Account.objects.filter(pk=accounts["cash"].pk, code="1001").exists())
+
+	def test_existing_account_with_default_name_is_reused(self):
+		from ledger.services import AccountingService
+
+		legacy_cash = Account.objects.create(code="100", name="Cash", account_type=AccountType.ASSET, created_by=self.user)
+
+		accounts = AccountingService.get_or_create_default_accounts(self.user)
+
+		self.assertEqual(accounts["cash"].pk, legacy_cash.pk)
+
+
+class LedgerReportingTests(TestCase):
+	def setUp(self):
+		from ledger.services import invalidate_account_map
+
+		self.client = APIClient()
+		self.user = User.objects.create_user(
+			username="reporting_user",
+			email="reporting@test.com",
+			password="testpassword",
+		)
+		self.addCleanup(invalidate_account_map, self.user.pk)
+		self.client.force_authenticate(user=self.user)
+
+		self.cash = Account.objects.create(code="1001", name="Cash", account_type=AccountType.ASSET, created_by=self.user)
+		self.sales = Account.objects.create(code="4001", name="Sales Revenue", account_type=AccountType.REVENUE, created_by=self.user)
+		for day, amount in ((date(2024, 1, 10), 100), (date(2024, 2, 10), 40)):
+			GeneralLedgerEntry.objects.create(
+				date=day, account=self.cash, debit=amount, credit=0, description="Sale", created_by=self.user,
+			)
+			GeneralLedgerEntry.objects.create(
+				date=day, account=self.sales, debit=0, credit=amount, description="Sale", created_by=self.user,
+			)
+
+	def test_account_totals_is_a_single_query(self):
+		from ledger.reporting import account_totals
+
+		with self.assertNumQueries(1):
+			totals = {row.account.code: row for row in account_totals(self.user, date_to=date(2024, 1, 31))}
+
+		self.assertEqual(totals["1001"].balance, 100)
+		self.assertEqual(totals["4001"].balance, 100)
+
+	def test_balance_sheet_and_diagnostics_share_the_result_set(self):
+		res = self.client.get("/api/ledger/balance-sheet/", {"as_of": "2024-01-31"})
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		self.assertEqual(res.data["assets"]["total"], 100.0)
+		self.assertEqual(res.data["equity"]["retained_earnings"], 100.0)
+		self.assertTrue(res.data["is_balanced"])
+
+		res = self.client.get("/api/ledger/balance-sheet/diagnostics/")
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		self.assertTrue(res.data["trial_balance"]["is_balanced"])
+		self.assertEqual(res.data["trial_balance"]["total_debits"], 140.0)
+		self.assertTrue(res.data["balance_sheet"]["is_balanced"])
+
+	def test_profit_loss_honours_date_range(self):
+		res = self.client.get("/api/ledger/profit-loss/", {"from": "2024-02-01", "to": "2024-02-28"})
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		self.assertEqual(res.data["revenue"]["total"], 40.0)
+
+
+class AccountDailyBalanceTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			username="rollup_user",
+			email="rollup@test.com",
+			password="testpassword",
+		)
+		self.cash = Account.objects.create(code="1001", name="Cash", account_type=AccountType.ASSET, created_by=self.user)
+
+	def _post(self, day, debit=0, credit=0):
+		return GeneralLedgerEntry.objects.create(
+			date=day, account=self.cash, debit=debit, credit=credit, description="Cash", created_by=self.user,
+		)
+
+	def _running(self):
+		from ledger.models import AccountDailyBalance
+		return list(AccountDailyBalance.objects.filter(account=self.cash).order_by("date").values_list("date", "running_balance"))
+
+	def test_postings_keep_running_balances_in_step(self):
+		from ledger.balances import balance_before
+
+		self._post(date(2024, 1, 5), debit=100)
+		self._post(date(2024, 1, 20), credit=30)
+		backdated = self._post(date(2024, 1, 10), debit=50)
+
+		self.assertEqual(self._running(), [
+			(date(2024, 1, 5), 100),
+			(date(2024, 1, 10), 150),
+			(date(2024, 1, 20), 120),
+		])
+		self.assertEqual(balance_before(self.cash, date(2024, 1, 15)), 150)
+
+		backdated.delete()
+		self.assertEqual(self._running(), [(date(2024, 1, 5), 100), (date(2024, 1, 20), 70)])
+
+	def test_rebuild_matches_incremental_rollup(self):
+		from ledger.balances import rebuild_daily_balances
+
+		self._post(date(2024, 1, 5), debit=100)
+		self._post(date(2024, 1, 5), credit=40)
+		self._post(date(2024, 2, 1), debit=10)
+		incremental = self._running()
+
+		rebuild_daily_balances([self.cash.pk])
+
+		self.assertEqual(self._running(), incremental)
+		self.assertEqual(incremental[-1], (date(2024, 2, 1), 70))
+
+	def test_refresh_locks_accounts_before_writing_their_days(self):
+		from unittest.mock import patch
+		from ledger.balances import batched_refresh
+
+		bank = Account.objects.create(code="1002", name="Bank", account_type=AccountType.ASSET, created_by=self.user)
+		with patch.object(Account.objects, "select_for_update", wraps=Account.objects.select_for_update) as lock:
+			with batched_refresh():
+				self._post(date(2024, 1, 5), debit=100)
+				GeneralLedgerEntry.objects.create(
+					date=date(2024, 1, 5), account=bank, credit=100, description="Bank", created_by=self.user,
+				)
+
+		lock.assert_called_once_with()
+		self.assertEqual(self._running(), [(date(2024, 1, 5), 100)])
+
+
+class LedgerKeysetPagingTests(TestCase):
+	def setUp(self):
+		from ledger.services import invalidate_account_map
+
+		self.client = APIClient()
+		self.user = User.objects.create_user(
+			username="paging_user",
+			email="paging@test.com",
+			password="testpassword",
+		)
+		self.addCleanup(invalidate_account_map, self.user.pk)
+		self.client.force_authenticate(user=self.user)
+
+		self.cash = Account.objects.create(code="1001", name="Cash", account_type=AccountType.ASSET, created_by=self.user)
+		GeneralLedgerEntry.objects.create(
+			date=date(2023, 12, 31), account=self.cash, debit=500, credit=0, description="Opening", created_by=self.user,
+		)
+		for day in range(1, 6):
+			GeneralLedgerEntry.objects.create(
+				date=date(2024, 1, day), account=self.cash, debit=100, credit=30 if day % 2 else 0,
+				description=f"Day {day}", created_by=self.user,
+			)
+
+	def _walk(self, url, params):
+		pages = []
+		cursor = None
+		while True:
+			query = dict(params, **({"cursor": cursor} if cursor else {}))
+			response = self.client.get(url, query)
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			pages.append(response.data)
+			cursor = response.data["next_cursor"]
+			if not cursor:
+				return pages
+
+	def test_cashbook_pages_carry_running_balance(self):
+		full = self.client.get("/api/ledger/cashbook/", {"from": "2024-01-01"}).data
+		pages = self._walk("/api/ledger/cashbook/", {"from": "2024-01-01", "limit": 2})
+
+		self.assertEqual(len(pages), 3)
+		paged_entries = [entry for page in pages for entry in page["entries"]]
+		self.assertEqual(paged_entries, full["entries"])
+		self.assertEqual(pages[0]["opening_balance"], 500)
+		self.assertEqual(pages[-1]["closing_balance"], full["closing_balance"])
+		self.assertEqual(pages[0]["total_receipts"], full["total_receipts"])
+
+	def test_ledger_entries_keyset_pages_cover_every_entry_once(self):
+		pages = self._walk("/api/ledger/general-ledger-entries/", {"limit": 4})
+
+		ids = [entry["id"] for page in pages for entry in page["entries"]]
+		self.assertEqual(len(ids), 6)
+		self.assertEqual(len(set(ids)), 6)
+		self.assertFalse(pages[-1]["has_more"])
+
+		bad = self.client.get("/api/ledger/general-ledger-entries/", {"cursor": "not-a-cursor"})
+		self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_cashbook_streams_csv_export(self):
+		response = self.client.get("/api/ledger/cashbook/", {"from": "2024-01-01", "export": "csv"})
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertTrue(response.streaming)
+		lines = b"".join(response.streaming_content).decode().splitlines()
+		self.assertEqual(lines[0], "id,date,description,reference,debit,credit,balance")
+		self.assertEqual(len(lines), 6)
+		self.assertTrue(lines[-1].endswith(",910.00"))
+
+
+class BankStatementIngestTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			username="bank_user",
+			email="bank@test.com",
+			password="testpassword",
+		)
+
+	def _upload(self, csv_text):
+		from django.core.files.base import ContentFile
+		from django.core.files.storage import default_storage
+		from ledger.models import BankStatement
+		from ledger.tasks import process_bank_statement_csv
+
+		statement = BankStatement.objects.create(
+			bank_name="HDFC", account_number="0042", uploaded_by=self.user, file_name="statement.csv",
+		)
+		path = default_storage.save("bank_statements/statement.csv", ContentFile(csv_text.encode()))
+		self.addCleanup(lambda: default_storage.exists(path) and default_storage.delete(path))
+		return statement, process_bank_statement_csv(statement.id, self.user.id, path)
+
+	def test_columns_are_parsed_into_signed_lines(self):
+		statement, result = self._upload(
+			"Txn Date,Narration,Chq/Ref No,Withdrawal Amt,Deposit Amt,Closing Balance\n"
+			"03/02/2024,NEFT from Acme,UTR1,,\"1,500.00\",\"11,500.00\"\n"
+			"04/02/2024,ATM withdrawal,,200.50,,\"11,299.50\"\n"
+			",Opening note,,,,\n"
+			"05/02/2024,Zero row,,0,0,11299.50\n"
+		)
+
+		self.assertEqual(result, {"created": 2, "duplicates": 0})
+		lines = list(statement.lines.order_by("date").values_list(
+			"date", "description", "reference_no", "debit_amount", "credit_amount", "balance",
+		))
+		self.assertEqual(lines, [
+			(date(2024, 2, 3), "NEFT from Acme", "UTR1", 0, 1500, 11500),
+			(date(2024, 2, 4), "ATM withdrawal", "", Decimal("200.50"), 0, Decimal("11299.50")),
+		])
+		self.assertTrue(all(len(line.row_hash) == 64 for line in statement.lines.all()))
+
+	def test_overlapping_statement_only_adds_new_lines(self):
+		header = "Date,Description,Amount,Balance\n"
+		self._upload(header + "01/03/2024,Rent,-1000,9000\n02/03/2024,Fee,-10,8990\n02/03/2024,Fee,-10,8980\n")
+		statement, result = self._upload(
+			header + "02/03/2024,Fee,-10,8990\n02/03/2024,Fee,-10,8980\n03/03/2024,Salary,5000,13980\n"
+		)
+
+		self.assertEqual(result, {"created": 1, "duplicates": 2})
+		self.assertEqual(list(statement.lines.values_list("description", "credit_amount")), [("Salary", 5000)])
+
+
+class BankReconciliationMatchingTests(TestCase):
+	def setUp(self):
+		from ledger.models import BankStatement, BankStatementLine
+
+		self.client = APIClient()
+		self.user = User.objects.create_user(
+			username="recon_user",
+			email="recon@test.com",
+			password="testpassword",
+		)
+		self.client.force_authenticate(user=self.user)
+		self.bank = Account.objects.create(code="1002", name="Bank", account_type=AccountType.ASSET, created_by=self.user)
+		self.statement = BankStatement.objects.create(bank_name="HDFC", uploaded_by=self.user, file_name="march.csv")
+
+		def line(day, description, debit=0, credit=0, reference=""):
+			return BankStatementLine.objects.create(
+				statement=self.statement, date=date(2024, 3, day), description=description,
+				reference_no=reference, debit_amount=debit, credit_amount=credit,
+			)
+
+		def entry(day, description, debit=0, credit=0, reference=""):
+			return GeneralLedgerEntry.objects.create(
+				date=date(2024, 3, day), account=self.bank, debit=debit, credit=credit,
+				description=description, reference=reference, created_by=self.user,
+			)
+
+		self.rent_line = line(1, "RENT MARCH", debit=1000)
+		self.fee_a = line(5, "Card fee", debit=10)
+		self.fee_b = line(6, "Card fee", debit=10)
+		self.receipt_line = line(10, "NEFT ACME LTD", credit=5000, reference="INV-7")
+
+		self.rent = entry(2, "Rent for March", credit=1000)
+		self.fee_entry = entry(5, "Bank charges", credit=10)
+		self.receipt = entry(9, "Payment received", debit=5000, reference="INV-7")
+		entry(10, "Sales", credit=5000)  # wrong direction
+		entry(20, "Rent for April", credit=1000)  # outside the window
+
+	def test_engine_matches_one_to_one_in_two_queries(self):
+		from ledger.reconciliation import ReconciliationEngine
+
+		with self.assertNumQueries(2):
+			engine = ReconciliationEngine(self.statement, self.user)
+			assignments = engine.assignments()
+
+		self.assertEqual(assignments[self.rent_line.pk][1], self.rent)
+		self.assertEqual(assignments[self.receipt_line.pk], (0.8667, self.receipt))
+		self.assertEqual(assignments[self.fee_a.pk][1], self.fee_entry)
+		self.assertNotIn(self.fee_b.pk, assignments)
+		self.assertEqual([entry for _score, entry in engine.candidates(self.fee_b)], [self.fee_entry])
+
+	def test_status_lists_scored_candidates_and_auto_reconcile_commits_confident_matches(self):
+		response = self.client.get(f"/api/ledger/bank-statements/{self.statement.pk}/reconciliation/")
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		lines = {line["id"]: line for line in response.data["lines"]}
+		self.assertEqual(lines[self.receipt_line.pk]["suggested_entry"], {"id": str(self.receipt.pk), "score": 0.8667})
+		self.assertEqual([c["id"] for c in lines[self.rent_line.pk]["candidates"]], [str(self.rent.pk)])
+
+		response = self.client.post(f"/api/ledger/bank-statements/{self.statement.pk}/auto-reconcile/", {"min_score": 0.85})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data["matched"], 1)
+		self.receipt_line.refresh_from_db()
+		self.assertTrue(self.receipt_line.is_reconciled)
+		self.assertEqual(self.receipt_line.matched_entry, self.receipt)
+
+		response = self.client.post(f"/api/ledger/bank-statements/{self.statement.pk}/auto-reconcile/", {"min_score": 0})
+		self.assertEqual(response.data["matched"], 2)
+		self.assertEqual(response.data["unreconciled"], 1)
+
+	def test_only_bank_and_cash_entries_are_candidates(self):
+		from ledger.reconciliation import ReconciliationEngine
+
+		receivable = Account.objects.create(
+			code="1200", name="Accounts Receivable", account_type=AccountType.ASSET, created_by=self.user,
+		)
+		GeneralLedgerEntry.objects.create(
+			date=date(2024, 3, 10), account=receivable, debit=5000, description="NEFT ACME LTD",
+			reference="INV-7", created_by=self.user,
+		)
+
+		engine = ReconciliationEngine(self.statement, self.user)
+		self.assertEqual([entry for _score, entry in engine.candidates(self.receipt_line)], [self.receipt])
+		matched = engine.auto_reconcile(min_score=0.85)
+		self.assertEqual([line.matched_entry for line in matched], [self.receipt])
+
+	def test_auto_reconcile_skips_entries_matched_after_loading(self):
+		from ledger.reconciliation import ReconciliationEngine
+
+		engine = ReconciliationEngine(self.statement, self.user)
+		response = self.client.post(
+			f"/api/ledger/bank-statement-lines/{self.fee_b.pk}/reconcile/", {"entry_id": str(self.fee_entry.pk)},
+		)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+		matched = engine.auto_reconcile(min_score=0)
+		self.assertNotIn(self.fee_a.pk, [line.pk for line in matched])
+		self.assertEqual(GeneralLedgerEntry.objects.get(pk=self.fee_entry.pk).bank_matches.count(), 1)
+
+		response = self.client.post(
+			f"/api/ledger/bank-statement-lines/{self.fee_a.pk}/reconcile/", {"entry_id": str(self.fee_entry.pk)},
+		)
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -30,4 +30,10 @@ urlpatterns = [
     path('balance-sheet/account/<uuid:account_id>/', financial_views.balance_sheet_account_detail, name='balance_sheet_account_detail'),
     path('balance-sheet/diagnostics/', financial_views.balance_sheet_diagnostics, name='balance_sheet_diagnostics'),
     path('cashbook/', financial_views.cashbook, name='cashbook'),
+
+    # Bank Reconciliation
+    path('bank-statements/upload/', bank_views.upload_bank_statement, name='upload_bank_statement'),
+    path('bank-statements/<int:statement_id>/reconciliation/', bank_views.reconciliation_status, name='bank_reconciliation_status'),
+    path('bank-statements/<int:statement_id>/auto-reconcile/', bank_views.auto_reconcile_statement, name='bank_auto_reconcile'),
+    path('bank-statement-lines/<int:line_id>/reconcile/', bank_views.reconcile_line, name='bank_reconcile_line'),
 ]
\ No newline at end of file
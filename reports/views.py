@@ -1,5 +1,6 @@
 from .services import get_stock_valuation, get_expiry_report, get_item_wise_profit, get_stock_ledger
 from django.utils import timezone
+from inventory.costing import AVERAGE
 import datetime
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -10,8 +11,15 @@ from rest_framework.response import Response
 def stock_valuation_view(request):
     """
     Get current stock valuation.
+    Query Params: ?method=average|fifo & ?as_of=YYYY-MM-DD (a stored month-end snapshot)
     """
-    data = get_stock_valuation(request.user.active_tenant)
+    method = request.query_params.get('method', AVERAGE)
+    as_of_str = request.query_params.get('as_of')
+    as_of = datetime.datetime.strptime(as_of_str, '%Y-%m-%d').date() if as_of_str else None
+    try:
+        data = get_stock_valuation(request.user.active_tenant, method=method, as_of=as_of)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
     return Response(data)
 
 @api_view(['GET'])
@@ -30,7 +38,7 @@ def expiry_report_view(request):
 def profit_loss_view(request):
     """
     Get Item-Wise Profit & Loss.
-    Query Params: ?start_date=YYYY-MM-DD & ?end_date=YYYY-MM-DD
+    Query Params: ?start_date=YYYY-MM-DD & ?end_date=YYYY-MM-DD & ?method=average|fifo
     """
     today = timezone.now().date()
     start_date_str = request.query_params.get('start_date')
@@ -39,7 +47,11 @@ def profit_loss_view(request):
     start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else today.replace(day=1)
     end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else today
     
-    data = get_item_wise_profit(start_date, end_date, tenant=request.user.active_tenant)
+    method = request.query_params.get('method', AVERAGE)
+    try:
+        data = get_item_wise_profit(start_date, end_date, tenant=request.user.active_tenant, method=method)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
     return Response(data)
 
 @api_view(['GET'])
@@ -47,7 +59,7 @@ def profit_loss_view(request):
 def stock_ledger_view(request):
     """
     Get Detailed Stock Ledger for an Item.
-    Query Params: ?product_id=UUID & start_date=... & end_date=...
+    Query Params: ?product_id=UUID & start_date=... & end_date=... & warehouse=UUID
     """
     product_id = request.query_params.get('product_id')
     if not product_id:
@@ -59,5 +71,6 @@ def stock_ledger_view(request):
     start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else None
     end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
     
-    data = get_stock_ledger(product_id, start_date, end_date, tenant=request.user.active_tenant)
+    warehouse_id = request.query_params.get('warehouse') or None
+    data = get_stock_ledger(product_id, start_date, end_date, tenant=request.user.active_tenant, warehouse_id=warehouse_id)
     return Response({'items': data})
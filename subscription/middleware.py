@@ -1,62 +1,21 @@
 from django.http import JsonResponse
 
+from cenvoras.route_policy import get_route_policy
+
 from .services import can_use_feature, get_effective_plan_code, is_vip_user
 
 
 class SubscriptionAccessMiddleware:
     """
     Enforces plan-gated API access on the backend so frontend-only locks cannot be bypassed.
-    """
 
-    # Free plan: only these API surfaces stay unlocked.
-    FREE_ALLOWED_PREFIXES = (
-        '/api/subscription/',
-        '/api/users/profile/',
-        '/api/users/profile/update/',
-        '/api/users/profile/setup/',
-        '/api/billing/sales-invoices/',
-        '/api/billing/customers/',
-        '/api/billing/payments/',
-    )
-
-    # Route-based feature checks (ordered from specific to generic).
-    FEATURE_RULES = (
-        ('/api/analytics/ml-predictions/', 'sales_forecast'),
-        ('/api/inventory/warehouses/', 'multi_warehouse'),
-        ('/api/reports/profit-loss/', 'item_wise_pnl'),
-        ('/api/reports/stock-ledger/', 'stock_ledger'),
-        ('/api/reports/shortage/', 'shortage_management'),
-        ('/api/reports/', 'advanced_reports'),
-        ('/api/integration/', 'integrations'),
-        ('/api/analytics/', 'advanced_analytics'),
-        ('/api/inventory/', 'inventory_core'),
-        ('/api/hr/payroll-runs/', 'hr_payroll'),
-        ('/api/hr/payslips/', 'hr_payroll'),
-        ('/api/hr/', 'hr_basic'),
-    )
+    Route prefixes (free-plan surfaces and feature rules) are registered in
+    cenvoras.route_policy.
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
 
-    @staticmethod
-    def _normalize(path: str) -> str:
-        if not path:
-            return '/'
-        return path if path.endswith('/') else f'{path}/'
-
-    @classmethod
-    def _path_matches_prefix(cls, path: str, prefix: str) -> bool:
-        return cls._normalize(path).startswith(cls._normalize(prefix))
-
-    def _free_route_allowed(self, path: str) -> bool:
-        return any(self._path_matches_prefix(path, prefix) for prefix in self.FREE_ALLOWED_PREFIXES)
-
-    def _required_feature_for_path(self, path: str):
-        for prefix, feature_code in self.FEATURE_RULES:
-            if self._path_matches_prefix(path, prefix):
-                return feature_code
-        return None
-
     def _forbidden(self, code: str, message: str, path: str):
         return JsonResponse(
             {
@@ -85,10 +44,11 @@ class SubscriptionAccessMiddleware:
         if is_vip_user(user):
             return self.get_response(request)
 
+        route_policy = get_route_policy(request)
         plan_code = get_effective_plan_code(user)
 
         # Free plan hard gate.
-        if plan_code == 'free' and not self._free_route_allowed(path):
+        if plan_code == 'free' and not route_policy.free_plan_allowed:
             return self._forbidden(
                 code='plan_locked',
                 message='Your Free plan can access only Sales Invoices, Customers, Payments, and Profile.',
@@ -96,7 +56,7 @@ class SubscriptionAccessMiddleware:
             )
 
         # Feature gate for all paid tiers (and free where applicable).
-        required_feature = self._required_feature_for_path(path)
+        required_feature = route_policy.required_feature
         if required_feature and not can_use_feature(user, required_feature):
             return self._forbidden(
                 code='feature_locked',
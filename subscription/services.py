@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
 from typing import Any
 from datetime import timedelta
 
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Count
 from django.utils import timezone
 
 from cenvoras.cache_utils import (
+    CACHE_TTL_MEDIUM,
     CACHE_TTL_SHORT,
+    LocalLRUCache,
     cache_get_or_set,
     cache_delete_many,
     tenant_cache_key,
@@ -46,6 +51,33 @@ MODULE_FEATURES = {
 }
 
 
+FREE_FEATURES = frozenset({
+    'customer_management',
+    'basic_invoicing',
+})
+
+PRO_FEATURES = frozenset({
+    'customer_management',
+    'basic_invoicing',
+    'inventory_core',
+    'advanced_analytics',
+    'dashboard_analytics',
+    'integrations',
+    'advanced_reports',
+    'team_management',
+    'hr_basic',
+})
+
+ENTITLEMENT_LIMIT_FIELDS = (
+    'max_managers',
+    'max_team_members',
+    'max_invoices_per_month',
+    'max_customers',
+)
+
+_local_snapshots = LocalLRUCache(maxsize=4096)
+
+
 def normalize_plan_code(code: str | None) -> str:
     return PLAN_CODE_ALIASES.get((code or 'free').strip().lower(), 'free')
 
@@ -59,13 +91,34 @@ def is_vip_user(user: User) -> bool:
     return bool(getattr(tenant, 'is_lifetime_free', False))
 
 
+def get_tenant_id(user: User) -> Any:
+    """Tenant id without loading the parent row for team members."""
+    return getattr(user, 'parent_id', None) or user.id
+
+
 def get_tenant_subscription(user: User):
     tenant = get_tenant(user)
     return getattr(tenant, 'subscription', None)
 
 
-def _is_legacy_trial_active(tenant: User) -> bool:
+def _legacy_status_lapsed(tenant: User, subscription=None) -> bool:
+    """True while ``_sync_legacy_status_on_expiry`` still has to downgrade ``tenant``."""
     status = (getattr(tenant, 'subscription_status', '') or '').lower()
+    return subscription is not None and not subscription.is_valid and status in {'active', 'trial'}
+
+
+def _legacy_status(tenant: User, subscription=None) -> str:
+    """
+    The tenant's legacy ``subscription_status`` with a lapsed ``subscription``
+    already applied, so entitlements do not wait for the sync job.
+    """
+    if _legacy_status_lapsed(tenant, subscription):
+        return 'expired'
+    return (getattr(tenant, 'subscription_status', '') or '').lower()
+
+
+def _is_legacy_trial_active(tenant: User, subscription=None) -> bool:
+    status = _legacy_status(tenant, subscription)
     if status != 'trial':
         return False
     trial_ends_at = getattr(tenant, 'trial_ends_at', None)
@@ -82,19 +135,21 @@ def _sync_legacy_status_on_expiry(tenant: User) -> None:
         tenant.save(update_fields=['subscription_status', 'subscription_tier'])
 
 
-def get_active_tenant_subscription(user: User):
-    subscription = get_tenant_subscription(user)
-    if not subscription:
-        return None
-
-    now = timezone.now()
+def apply_subscription_transitions(subscription, now=None) -> list[str]:
+    """
+    Apply due billing transitions to ``subscription`` in memory and return the
+    names of the fields that changed. Persisting them is left to the caller
+    (see ``subscription.tasks.sync_subscription_states``).
+    """
+    now = now or timezone.now()
+    changed: list[str] = []
 
     # New billing rule: only Free can be scheduled without payment.
     # Clean up any legacy paid pending plans created by older logic.
     if subscription.pending_plan and normalize_plan_code(getattr(subscription.pending_plan, 'code', 'free')) != 'free':
         subscription.pending_plan = None
         subscription.pending_plan_starts_at = None
-        subscription.save(update_fields=['pending_plan', 'pending_plan_starts_at', 'updated_at'])
+        changed += ['pending_plan', 'pending_plan_starts_at']
 
     # Prepaid behavior: if a next plan was purchased earlier, activate it automatically
     # when its start time arrives.
@@ -107,7 +162,7 @@ def get_active_tenant_subscription(user: User):
         subscription.pending_plan = None
         subscription.pending_plan_starts_at = None
         subscription.cancel_at_period_end = False
-        subscription.save(update_fields=[
+        changed += [
             'plan',
             'status',
             'current_period_start',
@@ -115,14 +170,39 @@ def get_active_tenant_subscription(user: User):
             'pending_plan',
             'pending_plan_starts_at',
             'cancel_at_period_end',
-            'updated_at',
-        ])
+        ]
+
+    if not subscription.is_valid and subscription.status in {'active', 'trial'}:
+        subscription.status = 'past_due'
+        changed.append('status')
+
+    return list(dict.fromkeys(changed))
+
+
+def _schedule_subscription_state_sync(tenant_id: Any) -> None:
+    lock_key = tenant_cache_key('subscription', tenant_id, 'sync_pending')
+    if not cache.add(lock_key, 1, CACHE_TTL_SHORT):
+        return
+
+    from .tasks import sync_subscription_states
+
+    transaction.on_commit(lambda: sync_subscription_states.delay(tenant_id=str(tenant_id)))
+
+
+def get_active_tenant_subscription(user: User):
+    """
+    Read-only: due transitions are applied to the in-memory instance only and
+    persisted asynchronously, so this never writes inside the request path.
+    """
+    subscription = get_tenant_subscription(user)
+    if not subscription:
+        return None
+
+    changed = apply_subscription_transitions(subscription)
+    if changed or _legacy_status_lapsed(get_tenant(user), subscription):
+        _schedule_subscription_state_sync(subscription.tenant_id)
 
     if not subscription.is_valid:
-        if subscription.status in {'active', 'trial'}:
-            subscription.status = 'past_due'
-            subscription.save(update_fields=['status', 'updated_at'])
-        _sync_legacy_status_on_expiry(get_tenant(user))
         return None
 
     return subscription
@@ -135,29 +215,105 @@ def get_tenant_plan(user: User):
     return None
 
 
-def get_effective_plan_code(user: User) -> str:
-    if is_vip_user(user):
-        return 'business'
-
+def _build_entitlement_snapshot(user: User) -> dict[str, Any]:
     tenant = get_tenant(user)
-    if _is_legacy_trial_active(tenant):
-        return 'pro'
+    now = timezone.now()
+    vip = bool(getattr(tenant, 'is_lifetime_free', False))
+    subscription = get_active_tenant_subscription(user)
+    plan = subscription.plan if subscription else None
+    # The stored subscription, lapsed or not, after the in-memory transitions above.
+    stored_subscription = get_tenant_subscription(user)
+
+    # Earliest instant at which the answer below can change without a write.
+    boundaries = []
+    if subscription:
+        boundaries.append(subscription.current_period_end)
+        if subscription.pending_plan_id:
+            boundaries.append(subscription.pending_plan_starts_at)
+
+    trial_active = _is_legacy_trial_active(tenant, stored_subscription)
+    if trial_active:
+        boundaries.append(getattr(tenant, 'trial_ends_at', None))
+
+    if vip:
+        plan_code = 'business'
+    elif trial_active:
+        plan_code = 'pro'
+    elif plan:
+        plan_code = normalize_plan_code(plan.code)
+    elif _legacy_status(tenant, stored_subscription) != 'active':
+        plan_code = 'free'
+    else:
+        plan_code = normalize_plan_code(getattr(tenant, 'subscription_tier', 'FREE'))
+
+    if plan_code == 'pro':
+        features = PRO_FEATURES
+    elif plan_code == 'free':
+        features = FREE_FEATURES
+    else:
+        features = frozenset()
+
+    future_boundaries = [moment for moment in boundaries if moment and moment > now]
+
+    return {
+        'tenant_id': str(tenant.id),
+        'is_vip': vip,
+        'plan_code': plan_code,
+        'has_plan': plan is not None,
+        'all_features': vip or trial_active or plan_code == 'business',
+        'features': features,
+        'limits': {field: getattr(plan, field, None) for field in ENTITLEMENT_LIMIT_FIELDS} if plan else {},
+        'expires_at': min(future_boundaries).timestamp() if future_boundaries else None,
+    }
 
-    plan = get_tenant_plan(user)
-    if plan:
-        return normalize_plan_code(plan.code)
 
-    if not _is_legacy_trial_active(tenant):
-        tenant_status = (getattr(tenant, 'subscription_status', '') or '').lower()
-        if tenant_status != 'active':
-            return 'free'
+def _snapshot_timeout(snapshot: dict[str, Any], now_ts: float) -> float:
+    expires_at = snapshot.get('expires_at')
+    if expires_at is None:
+        return CACHE_TTL_MEDIUM
+    return min(CACHE_TTL_MEDIUM, expires_at - now_ts)
 
-    return normalize_plan_code(getattr(tenant, 'subscription_tier', 'FREE'))
+
+def get_entitlement_snapshot(user: User) -> dict[str, Any]:
+    """
+    Per-tenant plan code, feature set, limits and expiry instant.
+
+    Served from a per-process LRU in front of the shared cache; rebuilding it
+    is write-free. Invalidated by ``invalidate_subscription_cache``.
+    """
+    cache_key = tenant_cache_key('subscription', get_tenant_id(user), 'snapshot')
+    now_ts = time.time()
+
+    snapshot = _local_snapshots.get(cache_key)
+    if snapshot is not None and _snapshot_timeout(snapshot, now_ts) > 0:
+        return snapshot
+
+    snapshot = cache.get(cache_key)
+    if snapshot is None or _snapshot_timeout(snapshot, now_ts) <= 0:
+        snapshot = _build_entitlement_snapshot(user)
+        timeout = _snapshot_timeout(snapshot, now_ts)
+        if timeout > 0:
+            cache.set(cache_key, snapshot, timeout)
+
+    _local_snapshots.set(cache_key, snapshot, _snapshot_timeout(snapshot, now_ts))
+    return snapshot
+
+
+def get_effective_plan_code(user: User) -> str:
+    return get_entitlement_snapshot(user)['plan_code']
+
+
+def invalidate_tenant_subscription_cache(tenant_id: Any) -> None:
+    snapshot_key = tenant_cache_key('subscription', tenant_id, 'snapshot')
+    _local_snapshots.delete(snapshot_key)
+    cache_delete_many(
+        tenant_cache_key('subscription', tenant_id, 'entitlements'),
+        snapshot_key,
+    )
 
 
 def invalidate_subscription_cache(user: User) -> None:
-    tenant = get_tenant(user)
-    cache_delete_many(tenant_cache_key('subscription', tenant.id, 'entitlements'))
+    invalidate_tenant_subscription_cache(get_tenant_id(user))
 
 
 def get_effective_limit(user: User, field_name: str, default: int = -1) -> int:
@@ -166,13 +322,17 @@ def get_effective_limit(user: User, field_name: str, default: int = -1) -> int:
             return 5
         return -1
 
-    plan = get_tenant_plan(user)
-    if not plan:
+    snapshot = get_entitlement_snapshot(user)
+    if not snapshot['has_plan']:
         return default
 
-    value = getattr(plan, field_name, None)
+    limits = snapshot['limits']
+    if field_name in limits:
+        value = limits[field_name]
+    else:
+        value = getattr(get_tenant_plan(user), field_name, None)
     if value is None and field_name == 'max_team_members':
-        value = getattr(plan, 'max_managers', default)
+        value = limits.get('max_managers', default)
         
     res = default if value is None else int(value)
     if res == -1:
@@ -200,38 +360,10 @@ def get_current_usage(user: User) -> dict[str, int]:
 
 
 def can_use_feature(user: User, feature_code: str) -> bool:
-    if is_vip_user(user):
+    snapshot = get_entitlement_snapshot(user)
+    if snapshot['all_features']:
         return True
-
-    tenant = get_tenant(user)
-    if _is_legacy_trial_active(tenant):
-        return True
-
-    plan_code = get_effective_plan_code(user)
-    feature_code = (feature_code or '').strip().lower()
-
-    if plan_code == 'business':
-        return True
-
-    if plan_code == 'pro':
-        allowed = {
-            'customer_management',
-            'basic_invoicing',
-            'inventory_core',
-            'advanced_analytics',
-            'dashboard_analytics',
-            'integrations',
-            'advanced_reports',
-            'team_management',
-            'hr_basic',
-        }
-        return feature_code in allowed
-
-    free_allowed = {
-        'customer_management',
-        'basic_invoicing',
-    }
-    return feature_code in free_allowed
+    return (feature_code or '').strip().lower() in snapshot['features']
 
 
 def can_auto_create_inventory_product(user: User) -> bool:
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import TenantSubscription
+from .services import invalidate_tenant_subscription_cache
+
+# Legacy tenant fields that still decide the effective plan.
+ENTITLEMENT_USER_FIELDS = {
+    'is_lifetime_free',
+    'subscription_status',
+    'subscription_tier',
+    'trial_ends_at',
+}
+
+
+def _invalidate_now_and_on_commit(tenant_id):
+    # Invalidate again on commit so readers that rebuilt the snapshot
+    # mid-transaction do not keep serving the old plan.
+    invalidate_tenant_subscription_cache(tenant_id)
+    transaction.on_commit(lambda: invalidate_tenant_subscription_cache(tenant_id))
+
+
+@receiver(post_save, sender=TenantSubscription)
+@receiver(post_delete, sender=TenantSubscription)
+def invalidate_entitlements_on_subscription_change(sender, instance, **kwargs):
+    _invalidate_now_and_on_commit(instance.tenant_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_entitlements_on_tenant_change(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields is not None and not set(update_fields) & ENTITLEMENT_USER_FIELDS:
+        return
+    _invalidate_now_and_on_commit(instance.parent_id or instance.id)
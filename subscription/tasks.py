@@ -11,6 +11,7 @@ import requests
 from celery import shared_task
 from celery.exceptions import MaxRetriesExceededError
 from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from integration.models import NotificationLog
@@ -23,7 +24,13 @@ from .models import (
     TenantSubscription,
     WebhookEvent,
 )
-from .services import invalidate_subscription_cache
+from .services import (
+    PLAN_CODE_ALIASES,
+    _sync_legacy_status_on_expiry,
+    apply_subscription_transitions,
+    invalidate_subscription_cache,
+)
+from cenvoras.cache_utils import cache_delete_many, tenant_cache_key
 from integration.tasks import send_async_email_notification
 
 User = get_user_model()
@@ -801,6 +808,49 @@ Cenvora Team
     return {'activated': activated}
 
 
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_jitter=True, max_retries=2)
+def sync_subscription_states(self, tenant_id=None):
+    """
+    Persist due subscription state transitions (legacy paid pending-plan cleanup,
+    pending-plan activation, past_due marking and legacy tenant status sync).
+    The request path only applies these in memory; run via Celery Beat every
+    5 minutes and queued per tenant as soon as a request notices one is due.
+    """
+    now = timezone.now()
+    live_statuses = [SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIAL]
+    paid_plan_codes = [code for code, canonical in PLAN_CODE_ALIASES.items() if canonical != 'free']
+
+    subscriptions = TenantSubscription.objects.select_related('tenant', 'plan', 'pending_plan').filter(
+        Q(pending_plan__isnull=False, pending_plan_starts_at__lte=now)
+        | Q(pending_plan__code__in=paid_plan_codes)
+        | Q(status__in=live_statuses, current_period_end__lte=now)
+        | (
+            Q(tenant__subscription_status__in=['active', 'trial'])
+            & (~Q(status__in=live_statuses) | Q(current_period_end__lte=now))
+        )
+    )
+    if tenant_id:
+        subscriptions = subscriptions.filter(tenant_id=tenant_id)
+
+    updated = 0
+    for subscription in subscriptions:
+        try:
+            changed_fields = apply_subscription_transitions(subscription, now)
+            if changed_fields:
+                subscription.save(update_fields=[*changed_fields, 'updated_at'])
+                updated += 1
+            if not subscription.is_valid:
+                _sync_legacy_status_on_expiry(subscription.tenant)
+            invalidate_subscription_cache(subscription.tenant)
+        except Exception as e:
+            logger.error(f"Error syncing subscription state {subscription.id}: {e}")
+
+    if tenant_id:
+        cache_delete_many(tenant_cache_key('subscription', tenant_id, 'sync_pending'))
+
+    return {'updated': updated}
+
+
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_jitter=True, max_retries=2)
 def auto_downgrade_cancelled_subscriptions():
     """
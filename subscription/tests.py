@@ -1,10 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.http import JsonResponse
-from django.test import RequestFactory, SimpleTestCase
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from datetime import timedelta
 import json
 from unittest.mock import patch
 
+from cenvoras.route_policy import (
+    FEATURE_PREFIXES,
+    FREE_PLAN_PREFIXES,
+    MODULE_PREFIXES,
+    PERMISSION_EXEMPT_PREFIXES,
+    get_route_policy,
+    resolve_route_policy,
+)
+
 from .middleware import SubscriptionAccessMiddleware
-from . import tasks
+from .models import Plan, TenantSubscription
+from . import services, tasks
+
+User = get_user_model()
 
 
 class _UserStub:
@@ -95,6 +111,139 @@ class TestSubscriptionAccessMiddleware(SimpleTestCase):
         self.assertEqual(response.status_code, 200)
 
 
+def _legacy_normalize(path):
+    if not path:
+        return '/'
+    return path if path.endswith('/') else f'{path}/'
+
+
+def _legacy_free_route_allowed(path):
+    return any(_legacy_normalize(path).startswith(_legacy_normalize(prefix)) for prefix in FREE_PLAN_PREFIXES)
+
+
+def _legacy_required_feature(path):
+    for prefix, feature_code in FEATURE_PREFIXES:
+        if _legacy_normalize(path).startswith(_legacy_normalize(prefix)):
+            return feature_code
+    return None
+
+
+def _legacy_permission_exempt(path):
+    return any(path.startswith(prefix) for prefix in ['/api/users/', '/api/subscription/', '/api/ai/', '/api/integration/'])
+
+
+def _legacy_manager_module(path):
+    if path.startswith('/api/billing/sales-invoices') or \
+       path.startswith('/api/billing/customers') or \
+       path.startswith('/api/billing/quotations') or \
+       path.startswith('/api/billing/sales-orders') or \
+       path.startswith('/api/billing/credit-notes') or \
+       path.startswith('/api/billing/delivery-challans') or \
+       path.startswith('/api/billing/invoice-settings'):
+        return 'sales'
+    if path.startswith('/api/billing/purchase-bills') or \
+       path.startswith('/api/billing/vendors') or \
+       path.startswith('/api/billing/vendor-products') or \
+       path.startswith('/api/billing/debit-notes'):
+        return 'purchases'
+    if path.startswith('/api/inventory'):
+        return 'inventory'
+    if path.startswith('/api/ledger') or \
+       path.startswith('/api/billing/payments') or \
+       path.startswith('/api/billing/gst') or \
+       path.startswith('/api/billing/reports') or \
+       path.startswith('/api/reports') or \
+       path.startswith('/api/analytics'):
+        return 'financials'
+    return None
+
+
+ROUTE_POLICY_PATHS = (
+    '',
+    '/',
+    '/api/',
+    '/api',
+    '/admin/',
+    '/api/users',
+    '/api/users/',
+    '/api/users/profile',
+    '/api/users/profile/update/',
+    '/api/users/team/',
+    '/api/subscription/entitlements/',
+    '/api/ai/chat/',
+    '/api/aix/',
+    '/api/integration',
+    '/api/integration/notifications/',
+    '/api/billing/sales-invoices/',
+    '/api/billing/sales-invoices/3f1c/pdf/',
+    '/api/billing/sales-invoices-export/',
+    '/api/billing/sales-orders/',
+    '/api/billing/customers',
+    '/api/billing/customers/12/ledger/',
+    '/api/billing/quotations/next-number/',
+    '/api/billing/credit-notes/',
+    '/api/billing/delivery-challans/',
+    '/api/billing/invoice-settings/',
+    '/api/billing/purchase-bills/',
+    '/api/billing/vendors/',
+    '/api/billing/vendor-products/',
+    '/api/billing/debit-notes/',
+    '/api/billing/payments/',
+    '/api/billing/gst/gstr1/',
+    '/api/billing/reports/overdue/',
+    '/api/billing/unknown/',
+    '/api/inventory',
+    '/api/inventory/',
+    '/api/inventory/products/',
+    '/api/inventory/warehouses',
+    '/api/inventory/warehouses/1/',
+    '/api/inventoryx/',
+    '/api/ledger/cashbook/',
+    '/api/reports',
+    '/api/reports/profit-loss/',
+    '/api/reports/stock-ledger/7/',
+    '/api/reports/shortage/',
+    '/api/reports/gst/',
+    '/api/analytics/',
+    '/api/analytics/ml-predictions',
+    '/api/analytics/dashboard-summary/',
+    '/api/hr/',
+    '/api/hr/payroll-runs/',
+    '/api/hr/payslips/1/pdf/',
+    '/api/hr/employees/',
+    '/api/references/hsn/',
+)
+
+
+class TestRoutePolicyEquivalence(SimpleTestCase):
+    def _all_paths(self):
+        registered = [prefix for prefix in FREE_PLAN_PREFIXES]
+        registered += [prefix for prefix, _feature in FEATURE_PREFIXES]
+        registered += [prefix for prefix in PERMISSION_EXEMPT_PREFIXES]
+        registered += [prefix for prefix, _module in MODULE_PREFIXES]
+        variants = []
+        for prefix in registered:
+            variants += [prefix, prefix.rstrip('/'), f'{prefix}x/', f'{prefix.rstrip("/")}-x/']
+        return list(ROUTE_POLICY_PATHS) + variants
+
+    def test_route_policy_matches_legacy_middleware_rules(self):
+        for path in self._all_paths():
+            with self.subTest(path=path):
+                policy = resolve_route_policy(path)
+                self.assertEqual(policy.free_plan_allowed, _legacy_free_route_allowed(path))
+                self.assertEqual(policy.required_feature, _legacy_required_feature(path))
+                self.assertEqual(policy.permission_exempt, _legacy_permission_exempt(path))
+                self.assertEqual(policy.module, _legacy_manager_module(path))
+
+    def test_route_policy_is_resolved_once_per_request(self):
+        request = RequestFactory().get('/api/inventory/warehouses/')
+        policy = get_route_policy(request)
+
+        self.assertIs(request.route_policy, policy)
+        self.assertEqual(policy.required_feature, 'multi_warehouse')
+        self.assertEqual(policy.module, 'inventory')
+
+
 class TestSubscriptionWebhookFollowup(SimpleTestCase):
     @patch('subscription.tasks._handle_payment_failed', return_value={'status': 'failed'})
     @patch('subscription.tasks._handle_payment_success', return_value={'status': 'success'})
@@ -118,3 +267,102 @@ class TestSubscriptionWebhookFollowup(SimpleTestCase):
 
         self.assertEqual(result['status'], 'failed')
         self.assertTrue(mock_failed.called)
+
+
+class TestEntitlementSnapshot(TestCase):
+    def setUp(self):
+        cache.clear()
+        services._local_snapshots.clear()
+        self.tenant = User.objects.create_user(
+            username='snapshot-tenant',
+            password='testpassword',
+            subscription_status='active',
+        )
+        self.free_plan = Plan.objects.get(code='free')
+        self.pro_plan = Plan.objects.get(code='pro')
+        self.subscription = TenantSubscription.objects.create(
+            tenant=self.tenant,
+            plan=self.pro_plan,
+            status='active',
+            current_period_end=timezone.now() + timedelta(days=10),
+        )
+
+    def _fresh_tenant(self):
+        return User.objects.get(pk=self.tenant.pk)
+
+    def test_snapshot_is_served_from_cache_after_first_resolution(self):
+        self.assertEqual(services.get_effective_plan_code(self._fresh_tenant()), 'pro')
+
+        tenant = self._fresh_tenant()
+        with self.assertNumQueries(0):
+            self.assertEqual(services.get_effective_plan_code(tenant), 'pro')
+            self.assertTrue(services.can_use_feature(tenant, 'inventory_core'))
+            self.assertFalse(services.can_use_feature(tenant, 'multi_warehouse'))
+
+    def test_subscription_save_invalidates_snapshot(self):
+        self.assertEqual(services.get_effective_plan_code(self._fresh_tenant()), 'pro')
+
+        self.subscription.plan = Plan.objects.get(code='business')
+        self.subscription.save(update_fields=['plan', 'updated_at'])
+
+        self.assertEqual(services.get_effective_plan_code(self._fresh_tenant()), 'business')
+
+    def test_due_pending_plan_is_resolved_without_writes(self):
+        self.subscription.pending_plan = self.free_plan
+        self.subscription.pending_plan_starts_at = timezone.now() - timedelta(minutes=1)
+        self.subscription.save(update_fields=['pending_plan', 'pending_plan_starts_at', 'updated_at'])
+
+        self.assertEqual(services.get_effective_plan_code(self._fresh_tenant()), 'free')
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.plan_id, self.pro_plan.id)
+        self.assertEqual(self.subscription.pending_plan_id, self.free_plan.id)
+
+    def test_expired_subscription_is_not_written_in_request_path(self):
+        self.subscription.current_period_end = timezone.now() - timedelta(minutes=1)
+        self.subscription.save(update_fields=['current_period_end', 'updated_at'])
+
+        self.assertEqual(services.get_effective_plan_code(self._fresh_tenant()), 'free')
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'active')
+
+    def test_lapsed_subscription_ignores_paid_legacy_tier_until_synced(self):
+        User.objects.filter(pk=self.tenant.pk).update(subscription_tier='PRO')
+        self.subscription.status = 'past_due'
+        self.subscription.current_period_end = timezone.now() - timedelta(minutes=1)
+        self.subscription.save(update_fields=['status', 'current_period_end', 'updated_at'])
+
+        with patch.object(services, '_schedule_subscription_state_sync') as schedule_sync:
+            self.assertEqual(services.get_effective_plan_code(self._fresh_tenant()), 'free')
+
+        schedule_sync.assert_called_with(self.tenant.pk)
+        self.assertEqual(self._fresh_tenant().subscription_status, 'active')
+
+    def test_sync_job_persists_pending_activation_and_past_due(self):
+        self.subscription.pending_plan = self.free_plan
+        self.subscription.pending_plan_starts_at = timezone.now() - timedelta(minutes=1)
+        self.subscription.save(update_fields=['pending_plan', 'pending_plan_starts_at', 'updated_at'])
+
+        expired_tenant = User.objects.create_user(
+            username='snapshot-expired',
+            password='testpassword',
+            subscription_status='active',
+        )
+        expired = TenantSubscription.objects.create(
+            tenant=expired_tenant,
+            plan=self.pro_plan,
+            status='active',
+            current_period_end=timezone.now() - timedelta(minutes=1),
+        )
+
+        result = tasks.sync_subscription_states.run()
+
+        self.assertEqual(result['updated'], 2)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.plan_id, self.free_plan.id)
+        self.assertIsNone(self.subscription.pending_plan_id)
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, 'past_due')
+        expired_tenant.refresh_from_db()
+        self.assertEqual(expired_tenant.subscription_status, 'expired')
@@ -0,0 +1,115 @@
+import copy
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from cenvoras.cache_utils import LocalLRUCache
+
+JWT_USER_CACHE_SECONDS = int(getattr(settings, 'JWT_USER_CACHE_SECONDS', 30))
+
+# Validated access token -> user row snapshot, per process.
+_token_users = LocalLRUCache(maxsize=4096, timeout=JWT_USER_CACHE_SECONDS)
+
+_MISSING = object()
+
+
+def _token_cache_key(raw_token) -> str:
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode('utf-8')
+    return hashlib.sha256(raw_token).hexdigest()
+
+
+def _snapshot_user(user) -> dict:
+    return {
+        'db': user._state.db,
+        'field_names': [field.attname for field in user._meta.concrete_fields],
+        'values': [getattr(user, field.attname) for field in user._meta.concrete_fields],
+    }
+
+
+def _user_from_snapshot(snapshot):
+    # Fresh instance per request; deep copy so JSON fields such as
+    # ``permissions`` are never shared between requests.
+    return get_user_model().from_db(
+        snapshot['db'],
+        snapshot['field_names'],
+        copy.deepcopy(snapshot['values']),
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that authenticates a request at most once and reuses
+    recently validated tokens from a short-TTL per-process cache.
+
+    The result is memoized on the underlying HttpRequest, so the middleware
+    pass (``request.jwt_user``) and DRF's view authentication share it.
+    """
+
+    def authenticate(self, request):
+        http_request = getattr(request, '_request', request)
+        result = getattr(http_request, '_jwt_auth_result', _MISSING)
+        if result is not _MISSING:
+            return result
+
+        result = self._authenticate_cached(http_request)
+        http_request._jwt_auth_result = result
+        return result
+
+    def _authenticate_cached(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cache_key = _token_cache_key(raw_token)
+        entry = _token_users.get(cache_key)
+        if entry is not None:
+            return _user_from_snapshot(entry['user']), entry['token']
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+
+        # Never keep a token around past its own expiry.
+        expires_in = float(validated_token.get('exp', 0)) - time.time()
+        _token_users.set(
+            cache_key,
+            {'user': _snapshot_user(user), 'token': validated_token},
+            timeout=expires_in,
+        )
+        return user, validated_token
+
+
+_jwt_authentication = CachedJWTAuthentication()
+
+
+def _resolve_jwt_user(request):
+    try:
+        auth_result = _jwt_authentication.authenticate(request)
+    except Exception:
+        return AnonymousUser()
+    return auth_result[0] if auth_result else AnonymousUser()
+
+
+def attach_jwt_user(request) -> None:
+    """Expose the bearer-token user as a lazy, request-scoped ``request.jwt_user``."""
+    if not hasattr(request, 'jwt_user'):
+        request.jwt_user = SimpleLazyObject(lambda: _resolve_jwt_user(request))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_token_users(sender, **kwargs):
+    # Role, permission or activation changes must not outlive this process's
+    # cache; other workers converge within JWT_USER_CACHE_SECONDS.
+    _token_users.clear()
@@ -1,5 +1,8 @@
 from django.http import JsonResponse
-from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from cenvoras.route_policy import get_route_policy
+
+from .authentication import attach_jwt_user
 
 
 def _resolve_permission_level(permissions, module):
@@ -21,56 +24,31 @@ class ManagerPermissionMiddleware:
     """
     def __init__(self, get_response):
         self.get_response = get_response
-        self.jwt_auth = JWTAuthentication()
 
     def __call__(self, request):
         path = request.path
         if not path.startswith('/api/'):
             return self.get_response(request)
             
-        bypass = ['/api/users/', '/api/subscription/', '/api/ai/', '/api/integration/']
-        if any(path.startswith(prefix) for prefix in bypass):
+        route_policy = get_route_policy(request)
+        if route_policy.permission_exempt:
             return self.get_response(request)
 
-        # Attempt to authenticate if not already done by Django session auth
+        # Attempt to authenticate if not already done by Django session auth.
+        # The bearer token is resolved once per request and reused by DRF's
+        # CachedJWTAuthentication inside the view.
+        attach_jwt_user(request)
         if not hasattr(request, 'user') or not request.user.is_authenticated:
-            try:
-                auth_result = self.jwt_auth.authenticate(request)
-                if auth_result:
-                    request.user = auth_result[0]
-            except Exception:
-                pass
+            if request.jwt_user.is_authenticated:
+                request.user = request.jwt_user
 
         if hasattr(request, 'user') and request.user.is_authenticated and getattr(request.user, 'role', '') != 'admin':
             permissions = getattr(request.user, 'permissions', {}) or {}
             if not isinstance(permissions, dict):
                 permissions = {}
             
-            module = None
-            
-            if path.startswith('/api/billing/sales-invoices') or \
-               path.startswith('/api/billing/customers') or \
-               path.startswith('/api/billing/quotations') or \
-               path.startswith('/api/billing/sales-orders') or \
-               path.startswith('/api/billing/credit-notes') or \
-               path.startswith('/api/billing/delivery-challans') or \
-               path.startswith('/api/billing/invoice-settings'):
-                module = 'sales'
-            elif path.startswith('/api/billing/purchase-bills') or \
-                 path.startswith('/api/billing/vendors') or \
-                 path.startswith('/api/billing/vendor-products') or \
-                 path.startswith('/api/billing/debit-notes'):
-                module = 'purchases'
-            elif path.startswith('/api/inventory'):
-                module = 'inventory'
-            elif path.startswith('/api/ledger') or \
-                 path.startswith('/api/billing/payments') or \
-                 path.startswith('/api/billing/gst') or \
-                 path.startswith('/api/billing/reports') or \
-                 path.startswith('/api/reports') or \
-                 path.startswith('/api/analytics'):
-                module = 'financials'
-            
+            module = route_policy.module
+
             if module:
                 perm_level = _resolve_permission_level(permissions, module)
                 
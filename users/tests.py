@@ -1,8 +1,14 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 
+from users import authentication
+from users.middleware import ManagerPermissionMiddleware
+
 User = get_user_model()
 
 class PasswordChangeTests(APITestCase):
@@ -98,3 +104,60 @@ class PasswordChangeTests(APITestCase):
         response = self.client.patch(self.url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('current_password', response.data)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        authentication._token_users.clear()
+        self.factory = RequestFactory()
+        self.tenant = User.objects.create_user(username='jwt-tenant', password='testpassword', role='admin')
+        self.manager = User.objects.create_user(
+            username='jwt-manager',
+            password='testpassword',
+            role='manager',
+            parent=self.tenant,
+            permissions={'inventory': 'view'},
+        )
+        authentication._token_users.clear()
+        self.token = str(AccessToken.for_user(self.manager))
+
+    def _request(self, path='/api/inventory/products/', method='get'):
+        return getattr(self.factory, method)(path, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_request_is_authenticated_once_for_middleware_and_view(self):
+        request = self._request()
+        authenticator = authentication.CachedJWTAuthentication()
+
+        with self.assertNumQueries(1):
+            authentication.attach_jwt_user(request)
+            self.assertEqual(request.jwt_user.pk, self.manager.pk)
+            user, _token = authenticator.authenticate(request)
+
+        self.assertEqual(user.pk, self.manager.pk)
+
+    def test_validated_token_user_is_reused_across_requests(self):
+        authenticator = authentication.CachedJWTAuthentication()
+        authenticator.authenticate(self._request())
+
+        with self.assertNumQueries(0):
+            user, _token = authenticator.authenticate(self._request())
+
+        self.assertEqual(user.role, 'manager')
+        self.assertEqual(user.parent_id, self.tenant.pk)
+        self.assertEqual(user.permissions, {'inventory': 'view'})
+
+    def test_user_save_invalidates_cached_snapshot(self):
+        authenticator = authentication.CachedJWTAuthentication()
+        authenticator.authenticate(self._request())
+
+        self.manager.permissions = {'inventory': 'edit'}
+        self.manager.save(update_fields=['permissions'])
+
+        user, _token = authenticator.authenticate(self._request())
+        self.assertEqual(user.permissions, {'inventory': 'edit'})
+
+    def test_manager_middleware_uses_request_scoped_jwt_user(self):
+        middleware = ManagerPermissionMiddleware(lambda request: JsonResponse({'ok': True}))
+
+        self.assertEqual(middleware(self._request()).status_code, 200)
+        self.assertEqual(middleware(self._request(method='post')).status_code, 403)